@@ -2,8 +2,8 @@
 API依赖注入
 提供常用的依赖函数，如认证、权限验证等
 """
-from typing import Optional
-from fastapi import Depends, HTTPException, status
+from typing import Optional, Union
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.db.base import get_db
@@ -13,6 +13,8 @@ from app.models.user import User
 
 # HTTP Bearer认证方案
 security = HTTPBearer()
+# 可选认证：未携带Token时不报错（用于允许匿名访问的接口）
+optional_security = HTTPBearer(auto_error=False)
 
 
 async def get_current_user(
@@ -69,6 +71,50 @@ async def get_current_user(
     return user
 
 
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    """
+    获取当前登录用户（可选）
+
+    未携带Token或Token无效时返回None，而不是拒绝请求
+
+    Args:
+        credentials: HTTP Authorization头中的Bearer Token
+        db: 数据库会话
+
+    Returns:
+        当前用户对象或None
+    """
+    if credentials is None:
+        return None
+    try:
+        return await get_current_user(credentials, db)
+    except HTTPException:
+        return None
+
+
+def request_user_key(request: Request, user: Optional[User]) -> Union[int, str, None]:
+    """
+    LLM公平排队使用的用户标识
+
+    已登录时为用户ID；匿名请求按客户端地址区分，避免所有匿名调用共用一个排队份额
+
+    Args:
+        request: 当前请求
+        user: 当前用户（可为None）
+
+    Returns:
+        用户ID、"anon:客户端地址"，无法识别客户端时为None
+    """
+    if user is not None:
+        return user.id
+    if request.client is not None and request.client.host:
+        return f"anon:{request.client.host}"
+    return None
+
+
 async def get_current_active_superuser(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -19,6 +19,7 @@ from app.models.character_schemas import (
 from app.crud import character as character_crud
 from app.crud import novel as novel_crud
 from app.api.dependencies import get_current_user
+from app.services.llm_scheduler import set_llm_priority
 from app.services.character_mcp_service import character_mcp_service
 from loguru import logger
 
@@ -390,6 +391,7 @@ async def execute_mcp_action(
     db: Session = Depends(get_db)
 ):
     """执行MCP角色操作"""
+    set_llm_priority("standard", current_user.id)
     try:
         # 如果有novel_id，验证权限
         if action.novel_id:
@@ -1,7 +1,8 @@
 """
 内容生成路由
 """
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.models.schemas import (
@@ -18,30 +19,26 @@ from app.models.schemas import (
     RewriteRequest,
     RewriteResponse,
 )
+from app.services.llm_scheduler import set_llm_priority
 from app.services.agent_service import agent_service
 from app.services.rag_service import rag_service
 from app.db.base import get_db
 from app.crud import novel as novel_crud
 from app.api.routes.auth import get_current_user
+from app.api.dependencies import get_optional_user, request_user_key
 from app.models.user import User
 from pydantic import BaseModel
 from loguru import logger
-from langchain_openai import ChatOpenAI
+from app.services.llm_client import llm_registry
 from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
 import json
-import asyncio
 
 router = APIRouter()
 
 
 # 初始化设定使用的LLM
-init_llm = ChatOpenAI(
-    model=settings.OPENAI_MODEL_COMPLEX,
-    api_key=settings.OPENAI_API_KEY,
-    base_url=settings.OPENAI_API_BASE,
-    temperature=0.8,
-)
+init_llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.8)
 
 
 class ContinueRequest(BaseModel):
@@ -83,6 +80,7 @@ async def init_novel(
 
     根据小说的标题、类型和用户提供的主题，自动生成世界观、主要角色、大纲和剧情线索。
     """
+    set_llm_priority("standard", current_user.id)
     try:
         logger.info(
             "生成剧情选项请求：novel_id=%s, chapter_id=%s, num_options=%s",
@@ -190,7 +188,11 @@ async def init_novel(
 
 
 @router.post("/generate", response_model=GenerationResponse)
-async def generate_content(request: GenerationRequest):
+async def generate_content(
+    request: GenerationRequest,
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_optional_user),
+):
     """
     生成小说内容
 
@@ -201,6 +203,8 @@ async def generate_content(request: GenerationRequest):
 
     Args:
         request: 生成请求
+        http_request: 原始请求（匿名调用按客户端地址公平排队）
+        current_user: 当前用户（允许匿名访问）
 
     Returns:
         生成响应（包含最终内容和各Agent输出）
@@ -208,6 +212,7 @@ async def generate_content(request: GenerationRequest):
     Raises:
         HTTPException: 生成失败时抛出
     """
+    set_llm_priority("interactive", request_user_key(http_request, current_user))
     try:
         logger.info(f"收到生成请求：小说{request.novel_id}，提示词:'{request.prompt}'")
         response = await agent_service.generate_content(request)
@@ -230,6 +235,7 @@ async def generate_plot_options(
 
     用于在续写前给用户提供多个可选的剧情发展方向，由AI给出结构化描述。
     """
+    set_llm_priority("interactive", current_user.id)
     try:
         # 验证小说所有权
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
@@ -364,6 +370,7 @@ async def auto_create_chapter(
 
     根据小说设定和参考章节，自动生成下一章的章节号、标题和正文，并写入数据库。
     """
+    set_llm_priority("standard", current_user.id)
     try:
         # 验证小说所有权
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
@@ -499,6 +506,7 @@ async def rewrite_text(
 
     根据用户选择的改写类型，对一小段文本进行润色/重写/压缩/扩写。
     """
+    set_llm_priority("interactive", current_user.id)
     try:
         # 权限校验：至少校验小说归属
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
@@ -585,6 +593,7 @@ async def continue_chapter(
     Returns:
         续写的内容
     """
+    set_llm_priority("interactive", current_user.id)
     try:
         logger.info(
             "章节续写请求：novel_id=%s, chapter_id=%s, target_length=%s, pace=%s, tone=%s, plot_direction_hint=%s",
@@ -771,9 +780,10 @@ async def continue_chapter_stream(
 ):
     """章节续写流式接口
     
-    使用与 `/generation/continue` 相同的多Agent工作流，但通过SSE将结果按块推送给前端，
-    以便工作台实现真正的流式展示效果。
+    使用与 `/generation/continue` 相同的多Agent工作流，Agent C的LLM输出通过SSE逐token推送给前端；
+    一致性检查在正文推送完成后进行，未通过而重新生成时先推送 `reset` 事件。
     """
+    set_llm_priority("interactive", current_user.id)
     try:
         logger.info(
             "章节续写流式请求：novel_id=%s, chapter_id=%s",
@@ -891,9 +901,17 @@ async def continue_chapter_stream(
 
         async def event_generator():
             """SSE事件生成器"""
+            streamed = False
             try:
                 async for event in agent_service.generate_content_stream(gen_request):
-                    if event["type"] == "final_response":
+                    if event["type"] == "token":
+                        # 正文随Agent C的LLM输出实时转发
+                        streamed = True
+                        yield f"data: {json.dumps({'type': 'chunk', 'content': event['content']}, ensure_ascii=False)}\n\n"
+                    elif event["type"] == "reset":
+                        streamed = False
+                        yield f"data: {json.dumps(event)}\n\n"
+                    elif event["type"] == "final_response":
                         response = event["data"]
                         
                         # 发送元数据
@@ -917,15 +935,11 @@ async def continue_chapter_stream(
                             }
                         }
                         yield f"data: {json.dumps({'type': 'metadata', 'data': metadata}, default=str)}\n\n"
-                        
-                        # 发送正文块
-                        full_content = response.final_content
-                        chunk_size = 5  # 每次发送5个字符，模拟打字
-                        for i in range(0, len(full_content), chunk_size):
-                            chunk = full_content[i:i+chunk_size]
-                            yield f"data: {json.dumps({'type': 'chunk', 'content': chunk}, ensure_ascii=False)}\n\n"
-                            await asyncio.sleep(0.01)
-                        
+
+                        # 模型不支持流式输出时，一次性补发正文
+                        if not streamed and response.final_content:
+                            yield f"data: {json.dumps({'type': 'chunk', 'content': response.final_content}, ensure_ascii=False)}\n\n"
+
                         yield f"data: {json.dumps({'type': 'done'})}\n\n"
                     else:
                         # 转发Agent事件
@@ -969,6 +983,7 @@ async def generate_outline(
     Returns:
         生成的大纲（章节列表）
     """
+    set_llm_priority("standard", current_user.id)
     try:
         # 验证小说所有权
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
@@ -1031,6 +1046,7 @@ async def generate_character(
     Returns:
         生成的角色设定
     """
+    set_llm_priority("standard", current_user.id)
     try:
         # 验证小说所有权
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
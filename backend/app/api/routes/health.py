@@ -3,6 +3,8 @@
 """
 from fastapi import APIRouter
 from app.core.config import settings
+from app.services.rag_service import rag_service
+from app.services.llm_client import llm_registry
 
 router = APIRouter()
 
@@ -13,10 +15,23 @@ async def health_check():
     return {
         "status": "healthy",
         "app_name": settings.APP_NAME,
-        "version": settings.APP_VERSION
+        "version": settings.APP_VERSION,
+        "rag": rag_service.status,
     }
 
 
+@router.get("/health/rag")
+async def rag_health():
+    """RAG服务就绪状态（initializing / ready / degraded）"""
+    return rag_service.get_status()
+
+
+@router.get("/health/llm")
+async def llm_health():
+    """LLM客户端连接池与各模型并发统计"""
+    return llm_registry.get_stats()
+
+
 @router.get("/ping")
 async def ping():
     """简单ping接口"""
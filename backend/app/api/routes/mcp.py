@@ -15,6 +15,7 @@ from app.models.worldview_schemas import (
 )
 from app.crud import novel as novel_crud
 from app.api.dependencies import get_current_user
+from app.services.llm_scheduler import set_llm_priority
 from app.services.unified_mcp_service import unified_mcp_service
 from app.services.mcp_audit_service import mcp_audit_service
 from loguru import logger
@@ -56,6 +57,7 @@ async def execute_unified_mcp_action(
     - auto_fix: 自动修复
     - smart_suggest: 智能建议
     """
+    set_llm_priority("standard", current_user.id)
     try:
         # 获取客户端信息
         ip_address = request.client.host if request.client else None
@@ -93,6 +95,7 @@ async def analyze_novel_comprehensive(
     - style: 文风一致性和特色
     - consistency: 整体一致性检查
     """
+    set_llm_priority("batch", current_user.id)
     try:
         # 验证小说权限
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
@@ -133,6 +136,7 @@ async def optimize_novel_comprehensive(
     - 评估优化影响和优先级
     - 提供可执行的优化步骤
     """
+    set_llm_priority("batch", current_user.id)
     try:
         # 验证小说权限
         novel = novel_crud.get_novel_by_id(db, request.novel_id)
@@ -176,6 +180,7 @@ async def ai_takeover_novel(
     - 自动执行优化操作
     - 持续监控和调整
     """
+    set_llm_priority("batch", current_user.id)
     try:
         # 验证小说权限
         novel = novel_crud.get_novel_by_id(db, novel_id)
@@ -259,6 +264,7 @@ async def enable_ai_autopilot(
     - 在授权范围内自动执行改进
     - 定期生成管理报告
     """
+    set_llm_priority("batch", current_user.id)
     try:
         # 验证小说权限
         novel = novel_crud.get_novel_by_id(db, novel_id)
@@ -19,6 +19,7 @@ from app.models.schemas import (
 )
 from app.crud import novel as novel_crud
 from app.api.dependencies import get_current_user
+from app.services.llm_scheduler import set_llm_priority
 from app.services.rag_service import rag_service
 from app.services.editor_service import editor_service
 from app.services.consistency_service import consistency_service
@@ -308,6 +309,7 @@ async def update_chapter(
 
     需要认证，只能更新自己小说的章节
     """
+    set_llm_priority("standard", current_user.id)
     # 验证小说存在且有权限
     db_novel = novel_crud.get_novel_by_id(db, novel_id)
     if not db_novel:
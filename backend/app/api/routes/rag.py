@@ -7,11 +7,14 @@ from sqlalchemy.orm import Session
 
 from app.db.base import get_db
 from app.models.user import User
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, get_current_active_superuser
 from app.models.schemas import RAGQuery, RAGResponse
 from app.crud import novel as novel_crud
 from app.services.rag_service import rag_service
+from app.services.rag_reindex import rag_reindexer
+from app.services.rag_reconcile import rag_reconciler
 from pydantic import BaseModel
+from typing import List, Optional
 from loguru import logger
 
 router = APIRouter()
@@ -105,3 +108,121 @@ async def cleanup_rag_data(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"清理RAG数据失败: {str(e)}",
         )
+
+
+@router.get("/stats")
+async def rag_stats(
+    current_user: User = Depends(get_current_user),
+) -> dict:
+    """RAG运行统计
+
+    返回Embedding与向量库线程池各类操作的排队深度、并发数和平均耗时，用于观察尾延迟；
+    以及检索结果缓存和Embedding缓存的命中率。
+    """
+    return {
+        "status": rag_service.status,
+        "executors": rag_service.get_executor_stats(),
+        "caches": rag_service.get_cache_stats(),
+        "storage": rag_service.get_storage_stats(),
+    }
+
+
+class RAGReindexRequest(BaseModel):
+    """RAG重建索引请求"""
+    novel_ids: Optional[List[int]] = None  # 为空表示全部小说
+    force: bool = False  # 强制重新计算全部向量（同维度更换Embedding模型时使用）
+    resume: bool = True  # 存在未完成的检查点时从断点继续
+
+
+@router.post("/reindex")
+async def start_reindex(
+    request: RAGReindexRequest,
+    current_user: User = Depends(get_current_active_superuser),
+) -> dict:
+    """启动RAG批量重建索引任务（管理员）
+
+    从数据库分页读取章节重新分块、计算向量并写入当前集合，返回任务进度。
+    """
+    try:
+        job = await rag_reindexer.start(request.novel_ids, force=request.force, resume=request.resume)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        )
+    return job.to_dict()
+
+
+@router.get("/reindex")
+async def list_reindex_jobs(
+    current_user: User = Depends(get_current_active_superuser),
+) -> list:
+    """查看本进程中的重建索引任务（管理员）"""
+    return rag_reindexer.list_jobs()
+
+
+@router.get("/reindex/{job_id}")
+async def get_reindex_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> dict:
+    """查询重建索引任务进度与吞吐量（管理员）"""
+    job = rag_reindexer.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="重建索引任务不存在",
+        )
+    return job.to_dict()
+
+
+@router.post("/reindex/{job_id}/cancel")
+async def cancel_reindex_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> dict:
+    """取消正在运行的重建索引任务（管理员，检查点保留，可稍后继续）"""
+    if not rag_reindexer.cancel(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="没有正在运行的该任务",
+        )
+    return {"success": True, "job_id": job_id}
+
+
+class RAGReconcileRequest(BaseModel):
+    """RAG向量库对账请求"""
+    novel_ids: Optional[List[int]] = None
+    dry_run: bool = False
+
+
+@router.post("/reconcile")
+async def start_reconcile(
+    request: RAGReconcileRequest,
+    current_user: User = Depends(get_current_active_superuser),
+) -> dict:
+    """启动RAG向量库对账（管理员）
+
+    比较数据库章节与向量库分块：删除孤儿向量、重新索引缺失章节，dry_run时只统计漂移。
+    """
+    try:
+        report = await rag_reconciler.start(request.novel_ids, dry_run=request.dry_run)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        )
+    return report.to_dict()
+
+
+@router.get("/reconcile")
+async def get_reconcile_report(
+    current_user: User = Depends(get_current_active_superuser),
+) -> dict:
+    """查询最近一次对账的进度与漂移汇总（管理员）"""
+    if rag_reconciler.last_report is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="尚未运行过对账任务",
+        )
+    return rag_reconciler.last_report.to_dict()
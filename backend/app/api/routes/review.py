@@ -1,9 +1,12 @@
 """章节审核API路由"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from loguru import logger
+from app.api.dependencies import get_optional_user, request_user_key
+from app.models.user import User
+from app.services.llm_scheduler import set_llm_priority
 from app.services.review_agent_service import review_agent_service
 import json
 import asyncio
@@ -22,7 +25,11 @@ class ChapterReviewRequest(BaseModel):
 
 
 @router.post("/chapter")
-async def review_chapter(request: ChapterReviewRequest):
+async def review_chapter(
+    request: ChapterReviewRequest,
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_optional_user),
+):
     """
     对章节进行全面审核
     
@@ -34,6 +41,7 @@ async def review_chapter(request: ChapterReviewRequest):
     - 语言风格
     - 内容安全
     """
+    set_llm_priority("standard", request_user_key(http_request, current_user))
     logger.info(f"收到章节审核请求: novel_id={request.novel_id}, chapter={request.chapter_number}")
     
     try:
@@ -54,12 +62,17 @@ async def review_chapter(request: ChapterReviewRequest):
 
 
 @router.post("/chapter-stream")
-async def review_chapter_stream(request: ChapterReviewRequest):
+async def review_chapter_stream(
+    request: ChapterReviewRequest,
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_optional_user),
+):
     """
     流式章节审核
     
     实时返回各个Agent的审核进度和结果
     """
+    set_llm_priority("standard", request_user_key(http_request, current_user))
     logger.info(f"收到流式章节审核请求: novel_id={request.novel_id}, chapter={request.chapter_number}")
     
     async def event_generator():
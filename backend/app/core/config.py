@@ -3,7 +3,7 @@
 使用Pydantic Settings管理环境变量
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -21,6 +21,58 @@ class Settings(BaseSettings):
     OPENAI_MODEL_COMPLEX: str = "gpt-4o"  # 复杂任务使用
     OPENAI_MODEL_SIMPLE: str = "gpt-4o-mini"  # 简单任务使用
 
+    # LLM客户端连接池：所有LLM客户端共享一个keep-alive HTTP连接池，并按模型限制并发请求数
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_HTTP_TIMEOUT: float = 120.0
+    LLM_MAX_CONCURRENCY_PER_MODEL: int = 16
+    # 按模型覆盖并发上限，如 {"gpt-4o": 8}
+    LLM_MODEL_CONCURRENCY: Dict[str, int] = {}
+
+    # LLM准入控制：按模型的每分钟请求数/token数配额（0表示不限），可按模型覆盖，如 {"gpt-4o": {"rpm": 500, "tpm": 30000}}
+    LLM_RPM_LIMIT: int = 0
+    LLM_TPM_LIMIT: int = 0
+    LLM_MODEL_RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    # 未指定max_tokens时预估的输出token数（用于token配额预占，调用完成后按实际用量修正）
+    LLM_ESTIMATED_COMPLETION_TOKENS: int = 800
+    # AIMD自适应并发：遇到429/5xx时并发上限乘以缩减系数（冷却期内只缩减一次），成功时逐步恢复
+    LLM_MIN_CONCURRENCY: int = 1
+    LLM_AIMD_DECREASE_FACTOR: float = 0.5
+    LLM_AIMD_COOLDOWN_SECONDS: float = 5.0
+    # LLM优先级调度：batch类别最多占用的并发比例（为交互调用预留名额），排队每超过该秒数提升一级优先级（最多提升到standard）
+    LLM_BATCH_CONCURRENCY_SHARE: float = 0.5
+    LLM_STARVATION_SECONDS: float = 10.0
+    # 429/5xx/连接错误的重试：指数退避加随机抖动，且不短于Retry-After
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 30.0
+
+    # LLM响应缓存（按调用点开启）：以 (模型, 温度, 提示消息哈希) 为键持久化到SQLite，
+    # 温度高于上限的创作类调用默认不缓存
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "./llm_cache/responses.db"
+    LLM_CACHE_MAX_ENTRIES: int = 20000
+    LLM_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.5
+
+    # LLM后端："openai" 请求 OPENAI_API_BASE；"mock" 使用进程内模拟后端（离线压测/CI，不访问网络）
+    # 也可运行 python -m app.services.llm_mock 启动独立模拟服务，再将 OPENAI_API_BASE 指向它
+    LLM_BACKEND: str = "openai"
+    # 模拟后端首token延迟分布（fixed/uniform/normal/lognormal）：LATENCY_MS为中位数，JITTER_MS为离散程度
+    LLM_MOCK_LATENCY_DISTRIBUTION: str = "lognormal"
+    LLM_MOCK_LATENCY_MS: float = 300.0
+    LLM_MOCK_LATENCY_JITTER_MS: float = 100.0
+    # 每个输出token的生成耗时，以及流式输出时每个片段包含的token数
+    LLM_MOCK_TOKEN_DELAY_MS: float = 2.0
+    LLM_MOCK_STREAM_CHUNK_TOKENS: int = 4
+    # 错误注入：按比例返回的错误状态码（429附带retry-after-ms响应头）
+    LLM_MOCK_ERROR_RATE: float = 0.0
+    LLM_MOCK_ERROR_STATUSES: List[int] = [429, 500, 503]
+    LLM_MOCK_RETRY_AFTER_MS: float = 200.0
+    # 延迟与错误注入的随机种子（响应内容只由提示词决定）
+    LLM_MOCK_SEED: int = 42
+
     # PostgreSQL配置
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
@@ -35,6 +87,83 @@ class Settings(BaseSettings):
     # Ollama Embedding配置（本地）
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_EMBED_MODEL: str = "mofanke/m3e-base"  # 或 "bge-small-zh-v1.5"
+    # Embedding提供方：ollama（默认，失败时回退HuggingFace）或 hash（本地哈希向量，离线开发/基准测试用）
+    RAG_EMBED_PROVIDER: str = "ollama"
+    RAG_HASH_EMBED_DIM: int = 256
+
+    # RAG Embedding缓存配置（按内容哈希复用分块向量）
+    RAG_EMBED_CACHE_ENABLED: bool = True
+    RAG_EMBED_CACHE_PATH: str = "./rag_cache/embedding_cache.db"
+    RAG_EMBED_CACHE_MAX_ENTRIES: int = 200000
+
+    # RAG分块配置：目标分块大小（中文字符数，约等于token数）、相邻分块重叠、单次写入窗口
+    RAG_CHUNK_SIZE: int = 500
+    RAG_CHUNK_OVERLAP: int = 80
+    RAG_INDEX_WINDOW: int = 256
+
+    # RAG检索配置（向量库不支持元数据过滤时的扩大召回倍数与上限）
+    RAG_OVERFETCH_FACTOR: int = 4
+    RAG_OVERFETCH_MAX_K: int = 200
+    # 混合检索：BM25关键词通道开关、各通道候选倍数、RRF平滑常数
+    RAG_BM25_ENABLED: bool = True
+    RAG_HYBRID_CANDIDATE_FACTOR: int = 2
+    RAG_RRF_K: int = 60
+    # 内存中保留关键词索引的小说数上限（LRU淘汰，被淘汰的小说下次检索时重新加载）
+    RAG_KEYWORD_INDEX_MAX_NOVELS: int = 256
+    # 检索结果多样化：MMR重排（lambda越大越偏重相关性）与同章节重叠分块去重
+    # （序号相差不超过窗口的相邻分块、或字符二元组包含率达到阈值的分块只保留一个）
+    # 默认关闭，需先用 benchmarks/rag_retrieval.py --mmr --dedup 对比召回再开启
+    RAG_MMR_ENABLED: bool = False
+    RAG_MMR_LAMBDA: float = 0.7
+    RAG_DEDUP_ENABLED: bool = False
+    RAG_DEDUP_ADJACENT_WINDOW: int = 1
+    RAG_DEDUP_OVERLAP_THRESHOLD: float = 0.6
+    # 角色检索：最多为几个提到的角色分别检索上下文（未提到任何角色时检索主要角色）
+    RAG_CHARACTER_CONTEXT_MAX: int = 3
+    # 角色名匹配器核对数据库版本的间隔（秒），用于发现其他进程对角色的修改
+    CHARACTER_MATCHER_RECHECK_SECONDS: float = 5.0
+    # RAG阻塞调用线程池：Embedding与向量库I/O分池，并按操作类型限制并发
+    RAG_EMBED_WORKERS: int = 2
+    RAG_STORE_WORKERS: int = 4
+    RAG_INDEX_CONCURRENCY: int = 2
+    RAG_SEARCH_CONCURRENCY: int = 4
+    RAG_DELETE_CONCURRENCY: int = 1
+    # Embedding微批处理：单批最大文本数与凑批等待时间（毫秒）
+    RAG_EMBED_BATCH_SIZE: int = 32
+    RAG_EMBED_BATCH_WAIT_MS: float = 5.0
+    # RAG后台初始化期间，依赖RAG的请求最多等待的秒数（超时按不可用降级）
+    RAG_READY_WAIT_SECONDS: float = 2.0
+    # RAG检索结果缓存：相同小说的重复查询直接复用结果，索引或删除内容时按小说失效
+    # 失效只作用于本进程：多个worker进程时，其他进程写入的内容最多要等TTL过期后才能被检索到
+    RAG_QUERY_CACHE_ENABLED: bool = True
+    RAG_QUERY_CACHE_MAX_ENTRIES: int = 2048
+    RAG_QUERY_CACHE_TTL_SECONDS: float = 60.0
+    # RAG批量重建索引：每页读取的章节数、单批Embedding文本数、并发计算的批数与检查点目录
+    RAG_REINDEX_PAGE_SIZE: int = 50
+    RAG_REINDEX_EMBED_BATCH_SIZE: int = 128
+    RAG_REINDEX_CONCURRENCY: int = 2
+    RAG_REINDEX_CHECKPOINT_DIR: str = "./rag_cache/reindex"
+    # RAG向量库对账：孤儿向量每批删除数量、共享集合扫描分页大小
+    RAG_RECONCILE_DELETE_BATCH_SIZE: int = 500
+    RAG_RECONCILE_SCAN_PAGE_SIZE: int = 5000
+    # 向量分区：每本小说独立分区（Chroma为每本小说一个集合），同时打开的分区数上限
+    # 默认关闭：开启后不再检索旧的共享集合，已有安装开启时需运行 reindex_rag.py 把内容重建到分区
+    # Chroma后端的分区上限只限制缓存的集合句柄数，索引段内存由 RAG_CHROMA_MEMORY_LIMIT_BYTES 控制
+    RAG_PARTITION_BY_NOVEL: bool = False
+    RAG_MAX_OPEN_PARTITIONS: int = 64
+    # Chroma索引段内存上限（字节），大于0时按LRU卸载不常用的集合
+    RAG_CHROMA_MEMORY_LIMIT_BYTES: int = 0
+    # 向量库后端：chroma（默认）或 numpy（按小说分区的内存映射文件，精确检索）
+    RAG_VECTOR_BACKEND: str = "chroma"
+    RAG_NUMPY_STORE_PATH: str = "./numpy_vectors"
+    RAG_NUMPY_DTYPE: str = "float16"  # float16 / float32 / int8 / pq
+    # 按集合名单独指定存储精度，如 {"novel_embeddings_768": "int8"}（环境变量用JSON）
+    RAG_NUMPY_COLLECTION_DTYPES: Dict[str, str] = {}
+    # 量化存储：int8是否在磁盘保留全精度副本用于重排（pq始终保留），重排候选倍数，PQ子空间数与训练阈值
+    RAG_NUMPY_KEEP_FULL_PRECISION: bool = True
+    RAG_NUMPY_RERANK_FACTOR: int = 4
+    RAG_PQ_SUBVECTORS: int = 16
+    RAG_PQ_TRAIN_SIZE: int = 1024
 
     # Redis配置
     REDIS_HOST: str = "localhost"
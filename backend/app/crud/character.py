@@ -10,6 +10,7 @@ from app.models.character_schemas import (
     CharacterRelationshipCreate, CharacterRelationshipUpdate,
     CharacterAppearanceCreate
 )
+from app.services.character_matcher import character_matcher
 from datetime import datetime
 
 
@@ -20,6 +21,7 @@ def create_character(db: Session, character: CharacterCreate) -> Character:
     db_character = Character(
         novel_id=character.novel_id,
         name=character.name,
+        aliases=character.aliases or [],
         age=character.age,
         gender=character.gender,
         occupation=character.occupation,
@@ -35,6 +37,7 @@ def create_character(db: Session, character: CharacterCreate) -> Character:
     db.add(db_character)
     db.commit()
     db.refresh(db_character)
+    character_matcher.upsert_character(db_character)
     return db_character
 
 
@@ -83,6 +86,7 @@ def update_character(
     db_character.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(db_character)
+    character_matcher.upsert_character(db_character)
     return db_character
 
 
@@ -104,8 +108,10 @@ def delete_character(db: Session, character_id: int) -> bool:
         CharacterAppearance.character_id == character_id
     ).delete()
     
+    novel_id = db_character.novel_id
     db.delete(db_character)
     db.commit()
+    character_matcher.remove_character(novel_id, character_id)
     return True
 
 
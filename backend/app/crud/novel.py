@@ -5,6 +5,7 @@ from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.models.novel import Novel, Chapter, StyleSample
 from app.models.schemas import NovelCreate, NovelUpdate, ChapterCreate, ChapterUpdate, StyleSampleCreate
+from app.services.character_matcher import character_matcher
 
 
 # ========== Novel CRUD ==========
@@ -109,6 +110,7 @@ def delete_novel(db: Session, novel_id: int) -> bool:
 
     db.delete(db_novel)
     db.commit()
+    character_matcher.drop_novel(novel_id)
     return True
 
 
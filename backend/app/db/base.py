@@ -2,7 +2,8 @@
 数据库基础配置
 使用SQLite简化开发
 """
-from sqlalchemy import create_engine
+from typing import List
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -18,6 +19,33 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# 已有数据库中新增的列：(表名, 列名, 列定义)；create_all不会修改已存在的表
+ADDED_COLUMNS = [
+    ("characters", "aliases", "JSON"),
+]
+
+
+def ensure_columns(bind=None) -> List[str]:
+    """
+    为旧数据库补上新增的列（幂等，已存在的列和尚未创建的表跳过）
+
+    Args:
+        bind: 数据库引擎，默认使用 engine
+
+    Returns:
+        新添加的列（"表名.列名"）
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    added = []
+    with bind.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            if table in tables and column not in {c["name"] for c in inspector.get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                added.append(f"{table}.{column}")
+    return added
+
 
 def get_db():
     """
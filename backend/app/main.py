@@ -5,6 +5,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.routes import generation, health, auth, novels, style, research, rag, consistency, characters, mcp, review
+from app.services.rag_service import rag_service
+from app.services.llm_client import llm_registry
+from app.db.base import ensure_columns
 from loguru import logger
 import sys
 
@@ -55,6 +58,14 @@ async def startup_event():
     logger.info(f"📝 文档地址: http://localhost:8000/docs")
     logger.info(f"🔧 调试模式: {settings.DEBUG}")
     logger.info(f"🤖 LLM配置: base={settings.OPENAI_API_BASE}, complex={settings.OPENAI_MODEL_COMPLEX}, simple={settings.OPENAI_MODEL_SIMPLE}")
+    # 旧数据库补上新增的列（幂等），无需手动运行init_db.py
+    try:
+        for column in ensure_columns():
+            logger.info(f"✅ 已为旧数据库添加{column}列")
+    except Exception as e:
+        logger.warning(f"⚠️ 检查数据库新增列失败: {e}")
+    # RAG服务在后台线程中初始化（探测Ollama/加载Embedding模型），不阻塞启动
+    rag_service.start_warmup()
     logger.info(f"📋 已注册路由: 健康检查, 用户认证, 小说管理, 角色管理, 统一MCP控制, 内容生成, 文风样本, 资料检索, RAG调试, 一致性检查, 章节审核")
 
 
@@ -62,6 +73,8 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭事件"""
     logger.info(f"👋 {settings.APP_NAME} 正在关闭...")
+    rag_service.shutdown()
+    await llm_registry.aclose()
 
 
 if __name__ == "__main__":
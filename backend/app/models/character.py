@@ -14,6 +14,8 @@ class Character(Base):
     id = Column(Integer, primary_key=True, index=True)
     novel_id = Column(Integer, ForeignKey("novels.id"), nullable=False)
     name = Column(String(100), nullable=False, index=True)
+    # 别名、称号（用于在正文中识别角色）
+    aliases = Column(JSON, default=list)
     
     # 基本信息
     age = Column(Integer)
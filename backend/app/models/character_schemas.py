@@ -11,6 +11,7 @@ from datetime import datetime
 class CharacterBase(BaseModel):
     """角色基础信息"""
     name: str = Field(..., min_length=1, max_length=100, description="角色姓名")
+    aliases: Optional[List[str]] = Field(default_factory=list, description="别名、称号")
     age: Optional[int] = Field(None, ge=0, le=1000, description="角色年龄")
     gender: Optional[str] = Field(None, max_length=20, description="角色性别")
     occupation: Optional[str] = Field(None, max_length=100, description="角色职业")
@@ -32,6 +33,7 @@ class CharacterCreate(CharacterBase):
 class CharacterUpdate(BaseModel):
     """更新角色请求"""
     name: Optional[str] = Field(None, min_length=1, max_length=100)
+    aliases: Optional[List[str]] = None
     age: Optional[int] = Field(None, ge=0, le=1000)
     gender: Optional[str] = Field(None, max_length=20)
     occupation: Optional[str] = Field(None, max_length=100)
@@ -424,7 +424,8 @@ class RAGResult(BaseModel):
     """RAG检索结果"""
     content: str
     metadata: Dict[str, Any]
-    score: float
+    score: float  # 向量余弦相似度（只由关键词通道召回时为0）
+    fused_score: Optional[float] = None  # 混合检索的RRF融合得分（结果按此排序，无关键词结果时为空）
 
 
 class RAGResponse(BaseModel):
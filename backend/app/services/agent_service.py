@@ -5,7 +5,7 @@
 """
 from typing import TypedDict, Annotated, Dict, Any, List
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from app.services.llm_client import llm_registry
 from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
 from app.models.schemas import (
@@ -18,6 +18,7 @@ from app.models.schemas import (
 )
 from app.models.workflow_schemas import AgentWorkflowStep, AgentWorkflowTrace
 from app.services.rag_service import rag_service
+from app.services.character_matcher import character_matcher
 from app.services.consistency_service import consistency_service
 from loguru import logger
 from datetime import datetime
@@ -63,18 +64,8 @@ class AgentService:
     def __init__(self):
         """初始化Agent服务"""
         # 初始化LLM
-        self.llm_complex = ChatOpenAI(
-            model=settings.OPENAI_MODEL_COMPLEX,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_API_BASE,
-            temperature=0.8
-        )
-        self.llm_simple = ChatOpenAI(
-            model=settings.OPENAI_MODEL_SIMPLE,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_API_BASE,
-            temperature=0.7
-        )
+        self.llm_complex = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.8)
+        self.llm_simple = llm_registry.get(settings.OPENAI_MODEL_SIMPLE, temperature=0.7)
 
         # 构建工作流图
         self.workflow = self._build_workflow()
@@ -121,21 +112,25 @@ class AgentService:
         current_chapter = state.get("chapter", 1)
         max_chapter = current_chapter if current_chapter > 0 else None
 
-        # 检索世界观相关内容
+        # 用角色名自动机找出提示词中提到的角色，只检索这些角色的上下文
         step_start = datetime.utcnow()
-        worldview_context = await rag_service.retrieve_worldview(
-            novel_id=state["novel_id"],
-            query=state["prompt"],
-            max_chapter=max_chapter,
+        character_names = await character_matcher.select_characters(
+            state["novel_id"], state["prompt"], limit=settings.RAG_CHARACTER_CONTEXT_MAX
         )
 
-        # 检索角色相关内容（假设提示词中包含角色名）
-        # TODO: 实际应该通过NER提取角色名
-        character_context = await rag_service.retrieve_character_info(
+        # 世界观与各角色多路检索：一次合批计算查询向量，并发检索
+        grouped = await rag_service.retrieve_many(
             novel_id=state["novel_id"],
-            character_name="主角",  # 简化处理
+            queries={
+                "worldview": state["prompt"],
+                **{f"character:{name}": rag_service.character_query(name) for name in character_names},
+            },
             max_chapter=max_chapter,
         )
+        worldview_context = grouped.pop("worldview")
+        character_context = list(dict.fromkeys(
+            chunk for chunks in grouped.values() for chunk in chunks
+        ))
         step_end = datetime.utcnow()
 
         # 记录工作流步骤
@@ -154,6 +149,7 @@ class AgentService:
                 "max_chapter": max_chapter,
             },
             output={
+                "characters": character_names,
                 "worldview_chunks": len(worldview_context or []),
                 "character_chunks": len(character_context or []),
             },
@@ -630,6 +626,12 @@ class AgentService:
     ):
         """
         流式生成小说内容，yield事件
+
+        事件类型：
+        - agent: 各节点的进度
+        - token: Agent C生成的正文片段（随LLM输出实时推送）
+        - reset: 一致性检查未通过、Agent C即将重新生成，此前推送的正文作废
+        - final_response: 一致性检查完成后的完整结果
         """
         logger.info(f"开始流式生成内容：小说{request.novel_id}，章节{request.chapter}")
 
@@ -656,8 +658,23 @@ class AgentService:
         # yield initial event
         yield {"type": "agent", "agent": "System", "status": "初始化完成", "data": None}
 
-        async for output in self.workflow.astream(initial_state):
-            for node_name, node_data in output.items():
+        # 同时订阅节点更新与LLM消息流：Agent C的输出逐token转发，其余节点仍按完成事件推送
+        plot_runs_completed = 0
+        streaming_run = 0
+        async for mode, payload in self.workflow.astream(initial_state, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message, metadata = payload
+                if metadata.get("langgraph_node") != "agent_c_plot" or not message.content:
+                    continue
+                # 一致性检查失败后Agent C重新生成：通知前端丢弃上一次已推送的正文
+                if streaming_run != plot_runs_completed + 1:
+                    if plot_runs_completed:
+                        yield {"type": "reset", "attempt": plot_runs_completed + 1}
+                    streaming_run = plot_runs_completed + 1
+                yield {"type": "token", "content": message.content, "attempt": streaming_run}
+                continue
+
+            for node_name, node_data in payload.items():
                 # 更新最终状态
                 final_state.update(node_data)
                 
@@ -675,6 +692,7 @@ class AgentService:
                     yield {"type": "agent", "agent": "Agent C", "status": "正在生成剧情...", "data": None}
                 
                 elif node_name == "agent_c_plot":
+                    plot_runs_completed += 1
                     yield {"type": "agent", "agent": "Agent C", "status": "剧情生成完成", "data": {"preview": node_data.get("plot_output", "")[:50]}}
                     yield {"type": "agent", "agent": "Consistency", "status": "正在检查一致性...", "data": None}
                 
@@ -831,12 +849,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.8
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.8)
             
             chain = prompt | llm
             response = await chain.ainvoke(context)
@@ -941,12 +954,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.3
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.3, cache=True)
             
             # 格式化关系和出场信息
             relationships_str = "\n".join([
@@ -1059,12 +1067,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.5
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.5)
             
             # 格式化上下文
             optimization_context = {
@@ -1169,12 +1172,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.3
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.3, cache=True)
             
             chain = prompt | llm
             response = await chain.ainvoke(context)
@@ -1268,12 +1266,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.5
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.5)
             
             chain = prompt | llm
             response = await chain.ainvoke(context)
@@ -1335,12 +1328,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.7
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.7)
             
             chain = prompt | llm
             response = await chain.ainvoke(context)
@@ -1397,12 +1385,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.3
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.3, cache=True)
             
             chain = prompt | llm
             response = await chain.ainvoke(context)
@@ -1446,12 +1429,7 @@ class AgentService:
         """)
         
         try:
-            llm = ChatOpenAI(
-                model=settings.OPENAI_MODEL_COMPLEX,
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_API_BASE,
-                temperature=0.4
-            )
+            llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.4)
             
             chain = prompt | llm
             response = await chain.ainvoke(context)
@@ -0,0 +1,385 @@
+"""
+角色名匹配
+按小说把角色姓名与别名构建为Aho-Corasick自动机，一次线性扫描提示词或章节即可找出其中提到的角色，
+用于替代硬编码的"主角"检索。自动机在首次使用时从characters表加载，角色增删改时只更新对应小说，
+并在下次扫描时整本重建（一本小说的角色数很少，重建只需微秒级）。
+其他进程的修改通过版本（角色数与最大updated_at）发现：已加载的小说每隔一段时间核对一次版本，变化时重新加载。
+"""
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import asyncio
+import threading
+import time
+
+from loguru import logger
+
+from app.core.config import settings
+
+
+# 短于该长度的姓名/别名不参与匹配（单字极易误命中）
+_MIN_NAME_LENGTH = 2
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配自动机"""
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        构建自动机
+
+        Args:
+            patterns: 模式串（重复的会被合并）
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态结束的模式串长度（含经失败链可达的输出）
+        self._output: List[List[int]] = [[]]
+        self.patterns: Set[str] = set()
+        for pattern in patterns:
+            if pattern and pattern not in self.patterns:
+                self.patterns.add(pattern)
+                self._insert(pattern)
+        self._build_links()
+
+    def _insert(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(pattern))
+
+    def _build_links(self) -> None:
+        """广度优先计算失败链接，并把失败状态的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        扫描文本
+
+        Yields:
+            (起始位置, 结束位置) 命中的所有模式串（可能相互重叠）
+        """
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for end, char in enumerate(text, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length in output[state]:
+                yield end - length, end
+
+
+class CharacterMention:
+    """文本中提到的一个角色"""
+
+    def __init__(self, character_id: int, name: str, first_position: int):
+        self.character_id = character_id
+        self.name = name
+        self.first_position = first_position
+        self.count = 0
+        self.terms: Set[str] = set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "character_id": self.character_id,
+            "name": self.name,
+            "count": self.count,
+            "terms": sorted(self.terms),
+            "first_position": self.first_position,
+        }
+
+
+class NovelCharacterMatcher:
+    """单本小说的角色名匹配器（角色变化后在下次扫描时重建自动机）"""
+
+    def __init__(self):
+        self._characters: Dict[int, Tuple[str, Set[str], bool]] = {}
+        self._automaton: Optional[AhoCorasick] = None
+        self._term_owners: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+        # 加载时数据库中的角色版本与最近一次核对时间（monotonic）
+        self.version: Optional[Tuple[int, Any]] = None
+        self.checked_at = 0.0
+
+    def upsert(self, character_id: int, name: str, aliases: Iterable[str] = (), is_main: bool = False) -> None:
+        """新增或更新角色"""
+        terms = {term.strip() for term in [name, *(aliases or [])] if isinstance(term, str)}
+        terms = {term for term in terms if len(term) >= _MIN_NAME_LENGTH}
+        with self._lock:
+            self._characters[character_id] = (name, terms, is_main)
+            self._automaton = None
+
+    def remove(self, character_id: int) -> None:
+        """移除角色"""
+        with self._lock:
+            if self._characters.pop(character_id, None) is not None:
+                self._automaton = None
+
+    def main_characters(self) -> List[Tuple[int, str]]:
+        """主要角色 (ID, 姓名)"""
+        return [
+            (character_id, name)
+            for character_id, (name, _, is_main) in sorted(self._characters.items())
+            if is_main
+        ]
+
+    def _ensure_automaton(self) -> Tuple[AhoCorasick, Dict[str, Set[int]]]:
+        with self._lock:
+            if self._automaton is None:
+                owners: Dict[str, Set[int]] = {}
+                for character_id, (_, terms, _) in self._characters.items():
+                    for term in terms:
+                        owners.setdefault(term, set()).add(character_id)
+                self._term_owners = owners
+                self._automaton = AhoCorasick(owners)
+            return self._automaton, self._term_owners
+
+    def find(self, text: str) -> List[CharacterMention]:
+        """
+        找出文本中提到的角色
+
+        重叠的命中只保留最长的一个（"林风华"不会同时算作"林风"），同一别名属于多个角色时都计入。
+
+        Args:
+            text: 提示词或章节内容
+
+        Returns:
+            按首次出现位置排序的角色列表
+        """
+        if not text:
+            return []
+        automaton, owners = self._ensure_automaton()
+        if not owners:
+            return []
+
+        # 按起点升序、长度降序，贪心选取互不重叠的最长命中
+        matches = sorted(automaton.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        mentions: Dict[int, CharacterMention] = {}
+        covered_until = 0
+        for start, end in matches:
+            if start < covered_until:
+                continue
+            covered_until = end
+            term = text[start:end]
+            for character_id in owners.get(term, ()):
+                mention = mentions.get(character_id)
+                if mention is None:
+                    mention = mentions[character_id] = CharacterMention(
+                        character_id, self._characters[character_id][0], start
+                    )
+                mention.count += 1
+                mention.terms.add(term)
+        return sorted(mentions.values(), key=lambda mention: mention.first_position)
+
+
+class CharacterMatcherRegistry:
+    """按小说缓存角色名匹配器（LRU），首次使用时从数据库加载"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Any]] = None,
+        max_novels: int = 256,
+        recheck_seconds: float = 5.0,
+    ):
+        """
+        Args:
+            session_factory: 数据库会话工厂，默认使用 SessionLocal
+            max_novels: 同时缓存的小说数上限
+            recheck_seconds: 已加载的小说隔多久核对一次数据库版本（发现其他进程的角色修改）
+        """
+        self._session_factory = session_factory
+        self.max_novels = max(1, max_novels)
+        self.recheck_seconds = recheck_seconds
+        self._matchers: "OrderedDict[int, NovelCharacterMatcher]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.db.base import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    @staticmethod
+    def _query_version(db, novel_id: int) -> Tuple[int, Any]:
+        """角色版本：角色数与最大updated_at（增、改会刷新updated_at，删会改变数量）"""
+        from sqlalchemy import func
+        from app.models.character import Character
+
+        count, updated_at = (
+            db.query(func.count(Character.id), func.max(Character.updated_at))
+            .filter(Character.novel_id == novel_id)
+            .one()
+        )
+        return int(count or 0), updated_at
+
+    def _version(self, novel_id: int) -> Optional[Tuple[int, Any]]:
+        """查询角色版本（阻塞调用），失败时返回None"""
+        db = self._session()
+        try:
+            return self._query_version(db, novel_id)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"核对小说{novel_id}的角色版本失败: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _load(self, novel_id: int) -> NovelCharacterMatcher:
+        """从characters表加载一本小说的全部角色（阻塞调用）"""
+        from app.models.character import Character
+
+        matcher = NovelCharacterMatcher()
+        db = self._session()
+        try:
+            matcher.version = self._query_version(db, novel_id)
+            rows = (
+                db.query(Character.id, Character.name, Character.aliases, Character.importance_level)
+                .filter(Character.novel_id == novel_id)
+                .all()
+            )
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"加载小说{novel_id}的角色失败，角色匹配不可用: {e}")
+            rows = []
+        finally:
+            db.close()
+        for character_id, name, aliases, importance_level in rows:
+            matcher.upsert(character_id, name, aliases or [], importance_level == "main")
+        matcher.checked_at = time.monotonic()
+        return matcher
+
+    def preload(self, novel_id: int, characters: Iterable[Tuple[int, str, Iterable[str], bool]]) -> None:
+        """
+        直接放入一本小说的角色，不查询数据库（用于离线基准测试）
+
+        Args:
+            novel_id: 小说ID
+            characters: (角色ID, 姓名, 别名列表, 是否主要角色) 列表
+        """
+        matcher = NovelCharacterMatcher()
+        for character_id, name, aliases, is_main in characters:
+            matcher.upsert(character_id, name, aliases, is_main)
+        # 不对应数据库，永不核对版本
+        matcher.checked_at = float("inf")
+        with self._lock:
+            self._matchers[novel_id] = matcher
+            self._matchers.move_to_end(novel_id)
+            while len(self._matchers) > self.max_novels:
+                self._matchers.popitem(last=False)
+
+    def is_loaded(self, novel_id: int) -> bool:
+        return novel_id in self._matchers
+
+    def _check_due(self, matcher: NovelCharacterMatcher) -> bool:
+        return time.monotonic() - matcher.checked_at >= self.recheck_seconds
+
+    def needs_database(self, novel_id: int) -> bool:
+        """获取匹配器是否需要查询数据库（未加载或到了核对版本的时间）"""
+        matcher = self._matchers.get(novel_id)
+        return matcher is None or self._check_due(matcher)
+
+    def get(self, novel_id: int) -> NovelCharacterMatcher:
+        """获取小说的匹配器（未加载时从数据库加载，版本变化时重新加载，阻塞调用）"""
+        with self._lock:
+            stale = self._matchers.get(novel_id)
+            if stale is not None:
+                self._matchers.move_to_end(novel_id)
+                if not self._check_due(stale):
+                    return stale
+        if stale is not None:
+            version = self._version(novel_id)
+            if version is None or version == stale.version:
+                stale.checked_at = time.monotonic()
+                return stale
+            logger.info(f"小说{novel_id}的角色已在其他地方修改，重新加载角色匹配器")
+        matcher = self._load(novel_id)
+        with self._lock:
+            # 加载期间其他线程可能已经放入新的匹配器
+            current = self._matchers.get(novel_id)
+            if current is None or current is stale:
+                self._matchers[novel_id] = matcher
+            else:
+                matcher = current
+            self._matchers.move_to_end(novel_id)
+            while len(self._matchers) > self.max_novels:
+                self._matchers.popitem(last=False)
+        return matcher
+
+    def find_characters(self, novel_id: int, text: str) -> List[CharacterMention]:
+        """找出文本中提到的角色（阻塞调用，首次使用某本小说时会查询数据库）"""
+        return self.get(novel_id).find(text)
+
+    async def afind_characters(self, novel_id: int, text: str) -> List[CharacterMention]:
+        """异步版本：只有需要查询数据库时才切换到线程执行"""
+        if self.needs_database(novel_id):
+            await asyncio.to_thread(self.get, novel_id)
+        return self.find_characters(novel_id, text)
+
+    def main_characters(self, novel_id: int) -> List[Tuple[int, str]]:
+        return self.get(novel_id).main_characters()
+
+    async def select_characters(self, novel_id: int, text: str, limit: int = 3) -> List[str]:
+        """
+        选出需要检索上下文的角色姓名
+
+        优先取文本中提到次数最多的角色；没有提到任何已知角色时取主要角色，仍没有时返回["主角"]。
+
+        Args:
+            novel_id: 小说ID
+            text: 提示词或章节内容
+            limit: 最多返回几个角色
+
+        Returns:
+            角色姓名列表
+        """
+        mentions = await self.afind_characters(novel_id, text)
+        if mentions:
+            ranked = sorted(mentions, key=lambda mention: (-mention.count, mention.first_position))
+            return [mention.name for mention in ranked[:limit]]
+        main = [name for _, name in self.main_characters(novel_id)]
+        return main[:limit] or ["主角"]
+
+    # ------------------------------------------------------------------
+    # 角色增删改时的增量更新（只更新本进程已加载的小说，未加载的下次使用时自然读到最新数据；
+    # 其他进程的修改由版本核对发现）
+    # ------------------------------------------------------------------
+
+    def upsert_character(self, character) -> None:
+        """角色创建或更新后调用"""
+        matcher = self._matchers.get(character.novel_id)
+        if matcher is not None:
+            matcher.upsert(
+                character.id,
+                character.name,
+                getattr(character, "aliases", None) or [],
+                character.importance_level == "main",
+            )
+
+    def remove_character(self, novel_id: int, character_id: int) -> None:
+        """角色删除后调用"""
+        matcher = self._matchers.get(novel_id)
+        if matcher is not None:
+            matcher.remove(character_id)
+
+    def drop_novel(self, novel_id: int) -> None:
+        """小说删除后调用"""
+        with self._lock:
+            self._matchers.pop(novel_id, None)
+
+
+# 创建全局实例
+character_matcher = CharacterMatcherRegistry(recheck_seconds=settings.CHARACTER_MATCHER_RECHECK_SECONDS)
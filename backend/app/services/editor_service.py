@@ -5,11 +5,11 @@
 from datetime import datetime
 from typing import Optional
 
-from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from loguru import logger
 
 from app.core.config import settings
+from app.services.llm_client import llm_registry
 from app.models.schemas import EditorReview
 from app.models.novel import Novel, Chapter
 
@@ -18,13 +18,8 @@ class EditorService:
     """网文编辑Agent服务类"""
 
     def __init__(self) -> None:
-        # 复用相对便宜的简单模型，用于轻量点评
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL_SIMPLE,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_API_BASE,
-            temperature=0.5,
-        )
+        # 复用相对便宜的简单模型，用于轻量点评；未修改的章节重复点评时命中响应缓存
+        self.llm = llm_registry.get(settings.OPENAI_MODEL_SIMPLE, temperature=0.5, cache=True)
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
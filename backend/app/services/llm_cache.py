@@ -0,0 +1,219 @@
+"""
+LLM响应缓存
+以 (模型, 温度, 提示消息sha256) 为键，将分析、审核类LLM调用的响应持久化到本地SQLite；
+摘要同时覆盖调用的后端与API地址，模拟后端或其他同名模型接口的响应不会被真实调用读到。
+同一输入重复分析（重复点击"分析"、保存未修改的章节）时直接命中缓存，不再调用付费接口。
+缓存按调用点开启；温度高于上限的创作类调用即使开启也不缓存。
+"""
+from typing import Any, Dict, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.messages import BaseMessage
+from loguru import logger
+
+
+CacheKey = Tuple[str, float, str]
+
+
+def messages_sha256(messages: Sequence[BaseMessage], stop: Optional[Sequence[str]] = None,
+                    extra: Optional[Dict[str, Any]] = None, endpoint: Optional[str] = None) -> str:
+    """计算提示消息（含stop、其他调用参数与接口标识）的sha256摘要"""
+    payload = {
+        "endpoint": endpoint,
+        "messages": [[message.type, message.content, message.additional_kwargs] for message in messages],
+        "stop": list(stop) if stop else None,
+        "extra": extra or {},
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """基于SQLite的持久化LLM响应缓存（过期失效 + 按最近访问时间做LRU淘汰）"""
+
+    def __init__(self, path: str, max_entries: int = 20_000, ttl_seconds: float = 7 * 24 * 3600,
+                 max_temperature: float = 0.5):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite文件路径
+            max_entries: 最大缓存条目数，超出后淘汰最久未访问的条目
+            ttl_seconds: 条目有效期（秒），<=0 表示不过期
+            max_temperature: 允许缓存的最高温度
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, temperature, prompt_hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def make_key(self, model: str, temperature: Optional[float], messages: Sequence[BaseMessage],
+                 stop: Optional[Sequence[str]] = None, extra: Optional[Dict[str, Any]] = None,
+                 endpoint: Optional[str] = None) -> Optional[CacheKey]:
+        """
+        构造缓存键
+
+        Args:
+            endpoint: 接口标识（后端与API地址），不同接口的同名模型互不命中
+
+        Returns:
+            缓存键；温度高于上限时返回None（不缓存）
+        """
+        temperature = round(float(temperature if temperature is not None else 1.0), 2)
+        if temperature > self.max_temperature:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        return model, temperature, messages_sha256(messages, stop, extra, endpoint)
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存
+
+        Returns:
+            {"content": 响应文本, "metadata": 响应元数据}，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata, created_at FROM responses "
+                "WHERE model = ? AND temperature = ? AND prompt_hash = ?",
+                key,
+            ).fetchone()
+            if row is not None and self.ttl_seconds > 0 and now - row[2] > self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE model = ? AND temperature = ? AND prompt_hash = ?", key
+                )
+                self._conn.commit()
+                self._size -= 1
+                self.expired += 1
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE model = ? AND temperature = ? AND prompt_hash = ?",
+                (now, *key),
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        return {"content": row[0], "metadata": json.loads(row[1])}
+
+    def put(self, key: CacheKey, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """写入缓存"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(model, temperature, prompt_hash, content, metadata, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, content, json.dumps(metadata or {}, ensure_ascii=False, default=str), now, now),
+            )
+            self._conn.commit()
+            # 被替换的行也会计入，这里只是上界估计；超限时重新统计再决定是否淘汰
+            self._size += 1
+            if self._size > self.max_entries:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                if self._size > self.max_entries:
+                    self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """先删除过期条目，仍超限时淘汰最久未访问的条目，腾出10%的空间"""
+        if self.ttl_seconds > 0:
+            deleted = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            self.expired += max(deleted, 0)
+            self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+        target = int(self.max_entries * 0.9)
+        overflow = self._size - target
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid IN ("
+                "SELECT rowid FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            logger.info(f"LLM响应缓存淘汰{overflow}条，当前{self._size}条")
+        self._conn.commit()
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "max_temperature": self.max_temperature,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        """关闭SQLite连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def build_llm_cache(path: str, max_entries: int, ttl_seconds: float,
+                    max_temperature: float) -> Optional[LLMResponseCache]:
+    """创建LLM响应缓存，失败时返回None（退化为不缓存）"""
+    try:
+        return LLMResponseCache(path, max_entries=max_entries, ttl_seconds=ttl_seconds,
+                                max_temperature=max_temperature)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"LLM响应缓存初始化失败，将不使用缓存: {e}")
+        return None
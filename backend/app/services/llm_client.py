@@ -0,0 +1,401 @@
+"""
+LLM客户端注册表
+按 (模型, API地址, 温度档位) 复用ChatOpenAI客户端，所有客户端共享同一个keep-alive HTTP连接池，
+避免每次调用都新建客户端、重新握手；并按模型限制同时进行的请求数，提供连接池与排队统计。
+分析、审核类调用点可开启LLM响应缓存（见 llm_cache）；所有调用经过按模型的准入控制（见 llm_rate_limiter）。
+LLM_BACKEND="mock" 时共享连接池改用进程内模拟后端（见 llm_mock），用于离线压测。
+"""
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple, TypeVar
+import asyncio
+import threading
+
+import httpx
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+from loguru import logger
+
+from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache, build_llm_cache
+from app.services.llm_mock import MockLLMBackend, MockLLMTransport, build_mock_backend
+from app.services.llm_rate_limiter import ModelAdmission, backoff_delay, classify_error
+
+
+# 温度档位：(档位名, 档位上限, 档位默认温度)，同一档位共用一个客户端，具体温度在调用时绑定
+TEMPERATURE_CLASSES: List[Tuple[str, float, float]] = [
+    ("precise", 0.35, 0.3),
+    ("balanced", 0.65, 0.5),
+    ("creative", 2.0, 0.8),
+]
+
+# 当前调用链已占用并发名额的模型（流式调用内部回落到非流式时不重复占用）
+_held_models: ContextVar[FrozenSet[str]] = ContextVar("llm_held_models", default=frozenset())
+
+T = TypeVar("T")
+
+
+def temperature_class(temperature: float) -> Tuple[str, float]:
+    """
+    温度所属档位
+
+    Returns:
+        (档位名, 档位默认温度)
+    """
+    for name, upper, default in TEMPERATURE_CLASSES:
+        if temperature <= upper:
+            return name, default
+    name, _, default = TEMPERATURE_CLASSES[-1]
+    return name, default
+
+
+def estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int] = None) -> int:
+    """粗略估计一次调用的token数：中文约一字一token，加上预计输出长度"""
+    prompt_tokens = sum(len(str(message.content)) for message in messages)
+    return prompt_tokens + (max_tokens or settings.LLM_ESTIMATED_COMPLETION_TOKENS)
+
+
+class PooledChatOpenAI(ChatOpenAI):
+    """经注册表按模型限制并发的ChatOpenAI
+
+    异步调用（ainvoke/astream）经过准入控制并由注册表统一重试；同步调用（invoke/stream）无法在事件循环外排队，
+    不经过准入控制，改由SDK自身重试（见 LLMClientRegistry.get）。响应缓存对同步与异步的非流式调用都生效。
+    """
+
+    response_cache: bool = False
+    """是否读写LLM响应缓存（只对非流式调用生效）"""
+
+    def _cache_key(self, messages, stop, kwargs) -> Tuple[Optional[LLMResponseCache], Any]:
+        """开启缓存时返回 (缓存, 缓存键)，温度过高等不缓存的情况键为None"""
+        cache = llm_registry.response_cache if self.response_cache else None
+        if cache is None:
+            return None, None
+        extra = {name: value for name, value in kwargs.items() if name != "temperature"}
+        return cache, cache.make_key(
+            self.model_name, kwargs.get("temperature", self.temperature), messages, stop, extra,
+            endpoint=f"{settings.LLM_BACKEND}:{self.openai_api_base}",
+        )
+
+    @staticmethod
+    def _cached_result(cached: Dict[str, Any]) -> ChatResult:
+        metadata = {**cached["metadata"], "cache_hit": True}
+        message = AIMessage(content=cached["content"], response_metadata=metadata)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _cacheable(result: ChatResult) -> Optional[AIMessage]:
+        """可写入缓存的响应消息（被截断的响应不缓存）"""
+        if len(result.generations) != 1:
+            return None
+        message = result.generations[0].message
+        if isinstance(message.content, str) and message.response_metadata.get("finish_reason") != "length":
+            return message
+        return None
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        cache, key = self._cache_key(messages, stop, kwargs)
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return self._cached_result(cached)
+
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        message = self._cacheable(result) if key is not None else None
+        if message is not None:
+            cache.put(key, message.content, message.response_metadata)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        cache, key = self._cache_key(messages, stop, kwargs)
+        if key is not None:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                return self._cached_result(cached)
+
+        generate = super()._agenerate
+        result = await llm_registry.call(
+            self.model_name,
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            estimate_tokens(messages, kwargs.get("max_tokens", self.max_tokens)),
+        )
+
+        message = self._cacheable(result) if key is not None else None
+        if message is not None:
+            await asyncio.to_thread(cache.put, key, message.content, message.response_metadata)
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # 已输出的片段无法撤回，只在收到第一个片段之前重试
+        admission = llm_registry.limiter(self.model_name)
+        estimated = estimate_tokens(messages, kwargs.get("max_tokens", self.max_tokens))
+        attempt = 0
+        while True:
+            started = False
+            delay = 0.0
+            async with llm_registry.slot(self.model_name, estimated):
+                try:
+                    async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    attempt += 1
+                    delay = llm_registry._retry_delay(admission, e, attempt, retryable=not started)
+                    if delay is None:
+                        raise
+                else:
+                    admission.on_success()
+                    return
+            admission.retries += 1
+            await asyncio.sleep(delay)
+
+
+class LLMClientRegistry:
+    """LLM客户端注册表"""
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str, str, bool], ChatOpenAI] = {}
+        self._response_cache: Optional[LLMResponseCache] = None
+        self._cache_initialized = False
+        self._limiters: Dict[str, ModelAdmission] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._mock_backend: Optional[MockLLMBackend] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 共享HTTP连接池
+    # ------------------------------------------------------------------
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def _ensure_http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """创建共享的HTTP客户端（调用方持有锁）"""
+        if self._http_async_client is None:
+            timeout = httpx.Timeout(settings.LLM_HTTP_TIMEOUT, connect=10.0)
+            transport: Dict[str, Any] = {}
+            if settings.LLM_BACKEND == "mock":
+                # 模拟后端：请求在进程内应答，不访问网络
+                self._mock_backend = build_mock_backend()
+                transport = {"transport": MockLLMTransport(self._mock_backend)}
+                logger.info("✅ LLM使用进程内模拟后端（LLM_BACKEND=mock）")
+            elif settings.LLM_BACKEND != "openai":
+                raise ValueError(f"未知的LLM后端: {settings.LLM_BACKEND}（可选: openai, mock）")
+            self._http_client = httpx.Client(limits=self._limits(), timeout=timeout, **transport)
+            self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=timeout, **transport)
+        return self._http_client, self._http_async_client
+
+    # ------------------------------------------------------------------
+    # 客户端
+    # ------------------------------------------------------------------
+
+    def get(
+        self,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        base_url: Optional[str] = None,
+        cache: bool = False,
+    ) -> Runnable:
+        """
+        获取LLM客户端
+
+        Args:
+            model: 模型名，默认 OPENAI_MODEL_COMPLEX
+            temperature: 采样温度（同一档位共用客户端，调用时使用这里指定的精确温度）
+            base_url: API地址，默认 OPENAI_API_BASE
+            cache: 是否使用LLM响应缓存（温度高于 LLM_CACHE_MAX_TEMPERATURE 时仍不缓存）
+
+        Returns:
+            可直接用于 `prompt | llm` 的客户端
+        """
+        model = model or settings.OPENAI_MODEL_COMPLEX
+        base_url = base_url or settings.OPENAI_API_BASE
+        class_name, class_temperature = temperature_class(temperature)
+        key = (model, base_url, class_name, cache)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                http_client, http_async_client = self._ensure_http_clients()
+                client = PooledChatOpenAI(
+                    model=model,
+                    api_key=settings.OPENAI_API_KEY,
+                    base_url=base_url,
+                    temperature=class_temperature,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    # 异步调用的重试由准入控制统一处理，避免SDK内部重试绕过限流
+                    max_retries=0,
+                    response_cache=cache,
+                )
+                # 同步调用不经过准入控制，保留SDK自身的重试（异步客户端仍不重试）
+                client.root_client = client.root_client.with_options(max_retries=settings.LLM_MAX_RETRIES)
+                client.client = client.root_client.chat.completions
+                self._clients[key] = client
+                logger.info(f"✅ 创建LLM客户端：{model}（{class_name}{'，缓存' if cache else ''}） @ {base_url}")
+
+        if temperature == class_temperature:
+            return client
+        return client.bind(temperature=temperature)
+
+    @property
+    def response_cache(self) -> Optional[LLMResponseCache]:
+        """LLM响应缓存（首次使用时创建，未启用或创建失败时为None）"""
+        if not self._cache_initialized:
+            with self._lock:
+                if not self._cache_initialized:
+                    if settings.LLM_CACHE_ENABLED:
+                        self._response_cache = build_llm_cache(
+                            settings.LLM_CACHE_PATH,
+                            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                            max_temperature=settings.LLM_CACHE_MAX_TEMPERATURE,
+                        )
+                    self._cache_initialized = True
+        return self._response_cache
+
+    # ------------------------------------------------------------------
+    # 按模型的准入控制
+    # ------------------------------------------------------------------
+
+    def limiter(self, model: str) -> ModelAdmission:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(model)
+                if limiter is None:
+                    rate_limits = settings.LLM_MODEL_RATE_LIMITS.get(model, {})
+                    limiter = self._limiters[model] = ModelAdmission(
+                        max_concurrency=settings.LLM_MODEL_CONCURRENCY.get(
+                            model, settings.LLM_MAX_CONCURRENCY_PER_MODEL
+                        ),
+                        min_concurrency=settings.LLM_MIN_CONCURRENCY,
+                        rpm=rate_limits.get("rpm", settings.LLM_RPM_LIMIT),
+                        tpm=rate_limits.get("tpm", settings.LLM_TPM_LIMIT),
+                        decrease_factor=settings.LLM_AIMD_DECREASE_FACTOR,
+                        cooldown_seconds=settings.LLM_AIMD_COOLDOWN_SECONDS,
+                        batch_share=settings.LLM_BATCH_CONCURRENCY_SHARE,
+                        starvation_seconds=settings.LLM_STARVATION_SECONDS,
+                    )
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, model: str, tokens: float = 0) -> AsyncIterator[None]:
+        """获得模型的一次准入许可（同一调用链内重入时不重复占用）"""
+        held = _held_models.get()
+        if model in held:
+            yield
+            return
+        async with self.limiter(model).slot(tokens):
+            token = _held_models.set(held | {model})
+            try:
+                yield
+            finally:
+                _held_models.reset(token)
+
+    def _retry_delay(self, admission: ModelAdmission, error: BaseException, attempt: int,
+                     retryable: bool = True) -> Optional[float]:
+        """记录失败并计算重试前的等待时间，不可重试时返回None"""
+        can_retry, overloaded, retry_after = classify_error(error)
+        if overloaded:
+            status = getattr(error, "status_code", None)
+            admission.on_overload(status == 429, retry_after)
+        if not (can_retry and retryable) or attempt > settings.LLM_MAX_RETRIES:
+            return None
+        delay = backoff_delay(attempt, retry_after, settings.LLM_RETRY_BASE_DELAY, settings.LLM_RETRY_MAX_DELAY)
+        logger.warning(f"⚠️ LLM调用失败（{type(error).__name__}），{delay:.1f}秒后第{attempt}次重试")
+        return delay
+
+    async def call(self, model: str, func: Callable[[], Awaitable[T]], estimated_tokens: float = 0) -> T:
+        """
+        经准入控制执行一次LLM调用，429/5xx/连接错误时退避重试
+
+        Args:
+            model: 模型名
+            func: 发起调用的函数（每次重试重新调用）
+            estimated_tokens: 预计消耗的token数
+
+        Returns:
+            调用结果
+        """
+        if model in _held_models.get():
+            return await func()
+
+        admission = self.limiter(model)
+        attempt = 0
+        while True:
+            async with self.slot(model, estimated_tokens):
+                try:
+                    result = await func()
+                except Exception as e:
+                    attempt += 1
+                    delay = self._retry_delay(admission, e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    usage = (getattr(result, "llm_output", None) or {}).get("token_usage") or {}
+                    admission.on_success(estimated_tokens, usage.get("total_tokens"))
+                    return result
+            admission.retries += 1
+            await asyncio.sleep(delay)
+
+    # ------------------------------------------------------------------
+    # 统计与关闭
+    # ------------------------------------------------------------------
+
+    def _pool_connections(self) -> Tuple[int, int]:
+        """共享连接池中的 (连接数, 空闲连接数)（读取httpx内部状态，失败时返回0）"""
+        client = self._http_async_client
+        try:
+            connections = list(client._transport._pool.connections)  # type: ignore[union-attr]
+        except Exception:  # noqa: BLE001
+            return 0, 0
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return len(connections), idle
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池、各模型准入控制与响应缓存统计"""
+        open_connections, idle_connections = self._pool_connections()
+        return {
+            "http_pool": {
+                "max_connections": settings.LLM_HTTP_MAX_CONNECTIONS,
+                "max_keepalive": settings.LLM_HTTP_MAX_KEEPALIVE,
+                "keepalive_expiry": settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+                "open_connections": open_connections,
+                "idle_connections": idle_connections,
+            },
+            "clients": [
+                {"model": model, "base_url": base_url, "temperature_class": class_name, "cache": cache}
+                for model, base_url, class_name, cache in self._clients
+            ],
+            "models": {model: limiter.to_dict() for model, limiter in self._limiters.items()},
+            "response_cache": self._response_cache.stats() if self._response_cache is not None else None,
+            "mock_backend": self._mock_backend.stats() if self._mock_backend is not None else None,
+        }
+
+    async def aclose(self) -> None:
+        """关闭共享HTTP连接池与响应缓存（应用关闭时调用）"""
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._http_client = self._http_async_client = None
+            self._mock_backend = None
+            self._clients.clear()
+            if self._response_cache is not None:
+                self._response_cache.close()
+            self._response_cache = None
+            self._cache_initialized = False
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+
+# 创建全局实例
+llm_registry = LLMClientRegistry()
@@ -0,0 +1,675 @@
+"""
+模拟LLM后端
+离线压测、容量评估与CI基准测试使用的OpenAI兼容模拟服务，不访问真实API：
+- 按提示词识别调用类型（Agent A/B/C正文、六类审核、编辑点评、剧情选项、章节初稿、角色生成与分析等），
+  返回确定性的、符合各调用点JSON结构的响应（相同模型与提示词得到相同内容，便于响应缓存与回归对比）
+- 模拟首token延迟分布（固定/均匀/正态/对数正态）、逐token耗时与流式输出
+- 按比例注入429/5xx错误（429附带retry-after-ms），用于验证准入控制与重试
+
+两种接入方式：
+- 进程内：LLM_BACKEND="mock" 时，LLM客户端注册表的共享HTTP连接池改用 MockLLMTransport，
+  请求仍经过ChatOpenAI/openai SDK的完整解析，以及准入控制、重试与响应缓存
+- 独立服务：python -m app.services.llm_mock --port 8100，再将 OPENAI_API_BASE 设为 http://127.0.0.1:8100/v1
+"""
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+
+LATENCY_DISTRIBUTIONS: Tuple[str, ...] = ("fixed", "uniform", "normal", "lognormal")
+
+# (调用类型, 识别关键词)：按顺序匹配提示词全文，取第一个命中的类型
+PROMPT_FAMILIES: List[Tuple[str, str]] = [
+    ("review_pace", "小说节奏审核专家"),
+    ("review_quality", "小说质量审核专家"),
+    ("review_coherence", "情节连贯性审核专家"),
+    ("review_character", "角色一致性审核专家"),
+    ("review_style", "文学风格审核专家"),
+    ("review_safety", "内容安全审核专家"),
+    ("editor", "资深中文网文编辑"),
+    ("plot_options", "剧情走向选项"),
+    ("novel_init", "生成完整的设定与大纲"),
+    ("auto_chapter", "自动生成新章节"),
+    ("character_generate", "小说角色设计师"),
+    ("character_analysis", "角色分析师"),
+    ("agent_a", "世界观描写专家"),
+    ("agent_b", "角色描写专家"),
+    ("agent_c", "剧情控制专家"),
+]
+
+_WORLDVIEW_SENTENCES = [
+    "夜雾从山谷深处漫上来，把石阶一级级吞没。",
+    "城墙上的符文忽明忽暗，像是在缓慢地呼吸。",
+    "远处的钟楼敲过三更，风里夹着铁锈与雨水的味道。",
+    "灵脉在地底低鸣，檐角的铜铃无风自动。",
+    "集市的灯笼一盏盏熄灭，只剩巡夜人的火把在巷口摇晃。",
+    "古树的根须缠住残破的石碑，碑上的字迹早已被苔藓覆盖。",
+    "天边的裂隙透出暗紫色的光，照得整座城池一片死寂。",
+    "潮湿的青石路上，积水倒映着摇摇欲坠的星辰。",
+]
+
+_CHARACTER_SENTENCES = [
+    "“你来晚了。”他把茶盏推过去，指节在桌面上轻轻叩了两下。",
+    "她没有回答，只是攥紧了袖口，目光落在门外的雨幕上。",
+    "“这件事，我一个人去。”少年抬起头，声音不大，却没有丝毫犹豫。",
+    "老者眯起眼，笑意里藏着几分审视：“你可想清楚了？”",
+    "他的呼吸乱了一瞬，随即又压得平稳，仿佛什么都没有发生。",
+    "“别回头。”她低声说，手指已经按上了剑柄。",
+    "他想起师父临别时的那句话，喉咙里像堵了一团火。",
+    "两人对视片刻，谁也没有先开口。",
+]
+
+_PLOT_SENTENCES = [
+    "就在这时，门外传来急促的脚步声。",
+    "信纸在烛火上卷曲，露出背面一行从未见过的小字。",
+    "他们并不知道，这一夜之后，城中再无安宁。",
+    "剑光一闪，桌案应声而裂，碎木四散。",
+    "那枚玉佩忽然发烫，隐隐映出一道陌生的纹路。",
+    "追兵的火把越来越近，山道却在前方断成了悬崖。",
+    "她终于明白，那场大火并非意外。",
+    "远处传来第一声号角，沉闷得像是从地底升起。",
+]
+
+_ISSUES = [
+    "开场铺垫略长，核心冲突出现偏晚",
+    "部分对话信息量重复",
+    "环境描写与情节推进衔接生硬",
+    "配角的行动动机交代不足",
+    "章节结尾的悬念不够集中",
+    "中段有两处段落节奏拖沓",
+]
+
+_SUGGESTIONS = [
+    "将核心冲突前置到前三段",
+    "删减重复的心理描写，用动作展示情绪",
+    "在场景转换处增加一句过渡",
+    "为配角补充一处动机暗示",
+    "结尾保留一个未解的疑问",
+    "适当穿插短句以加快节奏",
+]
+
+_NAMES = ["沈砚", "林晚照", "顾长风", "苏清辞", "陆沉舟", "温如玉", "韩烈", "叶知秋"]
+_TAGS = ["爽文", "慢热", "悬疑", "成长", "群像", "权谋"]
+
+
+def _pick(rng: random.Random, items: Sequence[str], k: int) -> List[str]:
+    return rng.sample(list(items), min(k, len(items)))
+
+
+def _prose(rng: random.Random, length: int, *banks: Sequence[str]) -> str:
+    """从句库中确定性地拼出约length字的正文，每三句分一段"""
+    sentences: List[str] = []
+    total = 0
+    while total < length:
+        sentence = rng.choice(banks[len(sentences) % len(banks)])
+        sentences.append(sentence)
+        total += len(sentence)
+    paragraphs = ["".join(sentences[i:i + 3]) for i in range(0, len(sentences), 3)]
+    return "\n\n".join(paragraphs)
+
+
+def _int_after(pattern: str, text: str, default: int) -> int:
+    match = re.search(pattern, text)
+    return int(match.group(1)) if match else default
+
+
+# ----------------------------------------------------------------------
+# 各调用类型的响应内容
+# ----------------------------------------------------------------------
+
+def _agent_a(rng: random.Random, text: str) -> str:
+    return _prose(rng, rng.randint(150, 200), _WORLDVIEW_SENTENCES)
+
+
+def _agent_b(rng: random.Random, text: str) -> str:
+    return _prose(rng, rng.randint(200, 250), _CHARACTER_SENTENCES)
+
+
+def _agent_c(rng: random.Random, text: str) -> str:
+    length = _int_after(r"控制在总计(\d+)字", text, 800)
+    return _prose(rng, length, _WORLDVIEW_SENTENCES, _CHARACTER_SENTENCES, _PLOT_SENTENCES)
+
+
+def _review_pace(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "pace_type": rng.choice(["slow", "medium", "fast", "uneven"]),
+        "issues": _pick(rng, _ISSUES, 2),
+        "suggestions": _pick(rng, _SUGGESTIONS, 2),
+        "details": {
+            "plot_speed": "主线推进基本顺畅，中段略有停顿",
+            "balance": "描写与对话比例大致均衡",
+            "rhythm": "有一处小高潮，结尾节奏收得稍快",
+        },
+    }
+
+
+def _review_quality(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "grammar_score": rng.randint(70, 98),
+        "logic_score": rng.randint(60, 95),
+        "description_score": rng.randint(60, 95),
+        "issues": _pick(rng, _ISSUES, 2),
+        "suggestions": _pick(rng, _SUGGESTIONS, 2),
+    }
+
+
+def _review_coherence(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "coherence_issues": _pick(rng, _ISSUES, 1),
+        "plot_holes": _pick(rng, ["前文提到的信件去向未交代", "角色赶路所用时间与距离不符"], rng.randint(0, 1)),
+        "suggestions": _pick(rng, _SUGGESTIONS, 2),
+    }
+
+
+def _review_character(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "inconsistencies": [
+            {"type": rng.choice(["性格", "对话", "能力", "关系"]), "description": issue}
+            for issue in _pick(rng, ["语气比前文更加急躁", "能力表现较上一章明显增强"], rng.randint(0, 2))
+        ],
+        "suggestions": _pick(rng, _SUGGESTIONS, 2),
+    }
+
+
+def _review_style(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "style_type": rng.choice(["现代简洁", "古典雅致", "诗意抒情", "冷峻克制"]),
+        "consistency_score": rng.randint(60, 95),
+        "issues": _pick(rng, _ISSUES, 1),
+        "suggestions": _pick(rng, _SUGGESTIONS, 2),
+    }
+
+
+def _review_safety(rng: random.Random, text: str) -> Dict[str, Any]:
+    risk_level = rng.choices(["low", "medium"], weights=[9, 1])[0]
+    flagged = [] if risk_level == "low" else [
+        {"type": "暴力血腥", "description": "打斗场面的伤势描写较为直接", "severity": "medium"}
+    ]
+    return {
+        "is_safe": True,
+        "risk_level": risk_level,
+        "flagged_content": flagged,
+        "suggestions": ["适当淡化伤势细节"] if flagged else [],
+    }
+
+
+def _editor(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "summary": "整体节奏较为流畅，冲突可以再前置一些。",
+        "issues": [
+            {
+                "type": rng.choice(["节奏", "爽点", "信息量", "重复度", "人物"]),
+                "level": rng.choice(["info", "warn"]),
+                "message": issue,
+                "suggestion": suggestion,
+            }
+            for issue, suggestion in zip(_pick(rng, _ISSUES, 2), _pick(rng, _SUGGESTIONS, 2))
+        ],
+        "suggested_tags": _pick(rng, _TAGS, 2),
+    }
+
+
+def _plot_options(rng: random.Random, text: str) -> Dict[str, Any]:
+    count = _int_after(r"给出(\d+)个", text, 3)
+    return {
+        "options": [
+            {
+                "title": f"走向{index}：{_pick(rng, ['夜探', '反目', '结盟', '伏击', '真相'], 1)[0]}",
+                "summary": _prose(rng, 60, _PLOT_SENTENCES),
+                "impact": rng.choice(["节奏加快，情绪走高", "埋下新的伏笔", "回收前文伏笔"]),
+                "risk": rng.choice(["", "可能让冲突过早爆发", "配角戏份被削弱"]),
+            }
+            for index in range(1, count + 1)
+        ]
+    }
+
+
+def _novel_init(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "worldview": _prose(rng, 300, _WORLDVIEW_SENTENCES),
+        "main_characters": [f"{name}：{rng.choice(['隐忍的少年剑客', '心思缜密的谋士', '背负血仇的公主', '来历成谜的游商'])}"
+                            for name in _pick(rng, _NAMES, 4)],
+        "outline": _prose(rng, 300, _PLOT_SENTENCES),
+        "plot_hooks": _pick(rng, _PLOT_SENTENCES, 4),
+    }
+
+
+def _auto_chapter(rng: random.Random, text: str) -> Dict[str, Any]:
+    length = _int_after(r"目标字数：约(\d+)字", text, 2000)
+    return {
+        "title": rng.choice(["夜雨惊变", "故人来信", "断崖", "灯下密谈", "烽火初起"]),
+        "content": _prose(rng, length, _WORLDVIEW_SENTENCES, _CHARACTER_SENTENCES, _PLOT_SENTENCES),
+    }
+
+
+def _character_generate(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "name": rng.choice(_NAMES),
+        "age": rng.randint(16, 60),
+        "gender": rng.choice(["男", "女"]),
+        "occupation": rng.choice(["剑客", "药师", "商人", "书吏"]),
+        "appearance": _prose(rng, 100, _CHARACTER_SENTENCES),
+        "personality": "外冷内热，认定的事绝不回头，对弱者心软。",
+        "background": _prose(rng, 200, _PLOT_SENTENCES),
+        "skills": _pick(rng, ["剑术", "医术", "易容", "机关术", "辨毒"], 3),
+        "character_arc": "从独来独往到学会信任同伴",
+        "importance_level": rng.choice(["main", "secondary", "minor"]),
+    }
+
+
+def _character_analysis(rng: random.Random, text: str) -> Dict[str, Any]:
+    def score() -> int:
+        return rng.randint(5, 9)
+
+    return {
+        "personality_analysis": {
+            "core_traits": _pick(rng, ["坚韧", "多疑", "重情", "冷静"], 2),
+            "strengths": _pick(rng, ["行动果断", "观察敏锐", "守信"], 2),
+            "weaknesses": _pick(rng, ["过于固执", "不善表达", "易冲动"], 2),
+            "consistency_score": score(),
+            "development_potential": "有从被动应对转向主动布局的空间",
+        },
+        "development_analysis": {
+            "arc_completeness": score(),
+            "growth_trajectory": "成长节点清晰，但转变的动因铺垫不足",
+            "pacing_assessment": "前期成长略快",
+            "future_suggestions": _pick(rng, _SUGGESTIONS, 2),
+        },
+        "relationship_analysis": {
+            "network_complexity": score(),
+            "dynamic_changes": "与主要配角的关系逐步从对立走向合作",
+            "conflict_potential": "与师门的矛盾仍有较大展开空间",
+            "development_suggestions": _pick(rng, _SUGGESTIONS, 2),
+        },
+        "consistency_check": {
+            "behavior_consistency": score(),
+            "dialogue_consistency": score(),
+            "value_consistency": score(),
+            "inconsistencies": _pick(rng, ["个别场景语气过于轻佻"], rng.randint(0, 1)),
+        },
+        "improvement_suggestions": _pick(rng, _SUGGESTIONS, 3),
+        "overall_score": score(),
+        "summary": "角色形象鲜明，成长线完整，动机铺垫可以再加强。",
+    }
+
+
+def _generic_json(rng: random.Random, text: str) -> Dict[str, Any]:
+    return {
+        "score": rng.randint(60, 95),
+        "summary": "整体完成度较好，仍有可打磨之处。",
+        "suggestions": _pick(rng, _SUGGESTIONS, 3),
+    }
+
+
+def _generic_prose(rng: random.Random, text: str) -> str:
+    return _prose(rng, rng.randint(200, 400), _WORLDVIEW_SENTENCES, _CHARACTER_SENTENCES, _PLOT_SENTENCES)
+
+
+_BUILDERS: Dict[str, Callable[[random.Random, str], Any]] = {
+    "agent_a": _agent_a,
+    "agent_b": _agent_b,
+    "agent_c": _agent_c,
+    "review_pace": _review_pace,
+    "review_quality": _review_quality,
+    "review_coherence": _review_coherence,
+    "review_character": _review_character,
+    "review_style": _review_style,
+    "review_safety": _review_safety,
+    "editor": _editor,
+    "plot_options": _plot_options,
+    "novel_init": _novel_init,
+    "auto_chapter": _auto_chapter,
+    "character_generate": _character_generate,
+    "character_analysis": _character_analysis,
+    "json": _generic_json,
+    "prose": _generic_prose,
+}
+
+
+def classify_prompt(text: str) -> str:
+    """识别提示词所属的调用类型；未识别时按是否要求JSON返回 json / prose"""
+    for family, keyword in PROMPT_FAMILIES:
+        if keyword in text:
+            return family
+    return "json" if "JSON" in text else "prose"
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+# ----------------------------------------------------------------------
+# 模拟后端
+# ----------------------------------------------------------------------
+
+@dataclass
+class MockReply:
+    """一次模拟请求的应答计划"""
+
+    status: int
+    headers: Dict[str, str]
+    delay: float
+    """返回响应头之前的等待秒数"""
+    body: bytes = b""
+    chunks: List[Tuple[float, bytes]] = field(default_factory=list)
+    """流式响应的 (发送前等待秒数, SSE事件)"""
+
+    @property
+    def streaming(self) -> bool:
+        return bool(self.chunks)
+
+
+class MockLLMBackend:
+    """OpenAI Chat Completions 接口的模拟实现"""
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        distribution: str = "lognormal",
+        token_delay_ms: float = 2.0,
+        chunk_tokens: int = 4,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (429, 500, 503),
+        retry_after_ms: float = 200.0,
+        seed: int = 42,
+    ):
+        """
+        Args:
+            latency_ms: 首token延迟（分布的中位数）
+            jitter_ms: 延迟离散程度：uniform为半宽，normal为标准差，lognormal按 σ=ln(1+jitter/latency) 形成长尾
+            distribution: 延迟分布 fixed/uniform/normal/lognormal
+            token_delay_ms: 每个输出token的生成耗时
+            chunk_tokens: 流式输出时每个片段的token数
+            error_rate: 返回错误的请求比例（0-1）
+            error_statuses: 注入错误时随机选择的状态码
+            retry_after_ms: 429响应附带的retry-after-ms
+            seed: 延迟与错误注入的随机种子
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {distribution}（可选: {', '.join(LATENCY_DISTRIBUTIONS)}）")
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.token_delay_ms = token_delay_ms
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses) or [500]
+        self.retry_after_ms = retry_after_ms
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # 统计
+        self.requests = 0
+        self.streamed = 0
+        self.completion_tokens = 0
+        self.errors: Dict[int, int] = {}
+        self.families: Dict[str, int] = {}
+
+    def sample_latency(self) -> float:
+        """按配置的分布采样一次首token延迟（秒）"""
+        median, jitter = self.latency_ms, self.jitter_ms
+        with self._lock:
+            if self.distribution == "uniform":
+                value = self._rng.uniform(median - jitter, median + jitter)
+            elif self.distribution == "normal":
+                value = self._rng.gauss(median, jitter)
+            elif self.distribution == "lognormal" and median > 0:
+                value = self._rng.lognormvariate(math.log(median), math.log1p(jitter / median))
+            else:
+                value = median
+        return max(0.0, value) / 1000
+
+    def complete(self, model: str, messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """
+        生成确定性的回复内容
+
+        Returns:
+            (调用类型, 回复内容)
+        """
+        text = "\n".join(_message_text(message) for message in messages)
+        family = classify_prompt(text)
+        digest = hashlib.sha256(f"{model}\n{text}".encode("utf-8")).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big"))
+        content = _BUILDERS[family](rng, text)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, indent=2)
+        return family, content
+
+    def _injected_error(self) -> Optional[int]:
+        if self.error_rate <= 0:
+            return None
+        with self._lock:
+            if self._rng.random() >= self.error_rate:
+                return None
+            return self._rng.choice(self.error_statuses)
+
+    def reply(self, payload: Dict[str, Any]) -> MockReply:
+        """
+        根据请求体生成应答计划（内容、延迟与流式片段）
+
+        Args:
+            payload: /chat/completions 请求体
+        """
+        with self._lock:
+            self.requests += 1
+            request_index = self.requests
+
+        status = self._injected_error()
+        if status is not None:
+            with self._lock:
+                self.errors[status] = self.errors.get(status, 0) + 1
+            return self._error_reply(status)
+
+        model = str(payload.get("model") or "mock")
+        messages = payload.get("messages") or []
+        family, content = self.complete(model, messages)
+        finish_reason = "stop"
+        max_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens")
+        # 模拟按字计token（与 llm_client.estimate_tokens 的估算口径一致）
+        if max_tokens and len(content) > max_tokens:
+            content = content[:max_tokens]
+            finish_reason = "length"
+        usage = {
+            "prompt_tokens": sum(len(_message_text(message)) for message in messages),
+            "completion_tokens": len(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        streaming = bool(payload.get("stream"))
+        with self._lock:
+            self.families[family] = self.families.get(family, 0) + 1
+            self.completion_tokens += len(content)
+            if streaming:
+                self.streamed += 1
+
+        base = {"id": f"chatcmpl-mock-{request_index}", "created": int(time.time()), "model": model}
+        first_token = self.sample_latency()
+        token_delay = self.token_delay_ms / 1000
+        if not streaming:
+            body = {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                    "logprobs": None,
+                }],
+                "usage": usage,
+            }
+            return MockReply(
+                status=200,
+                headers={"content-type": "application/json"},
+                delay=first_token + len(content) * token_delay,
+                body=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+            )
+
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+            data = {**base, "object": "chat.completion.chunk", "choices": choices, **extra}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        chunks = [(0.0, event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))]
+        for start in range(0, len(content), self.chunk_tokens):
+            piece = content[start:start + self.chunk_tokens]
+            chunks.append((len(piece) * token_delay, event(
+                [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            )))
+        chunks.append((0.0, event([{"index": 0, "delta": {}, "finish_reason": finish_reason}])))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            chunks.append((0.0, event([], usage=usage)))
+        chunks.append((0.0, b"data: [DONE]\n\n"))
+        return MockReply(status=200, headers={"content-type": "text/event-stream"}, delay=first_token, chunks=chunks)
+
+    def _error_reply(self, status: int) -> MockReply:
+        headers = {"content-type": "application/json"}
+        if status == 429:
+            headers["retry-after-ms"] = str(int(self.retry_after_ms))
+            error_type = "rate_limit_error"
+        else:
+            error_type = "server_error"
+        body = {"error": {"message": f"模拟后端注入的{status}错误", "type": error_type, "code": str(status)}}
+        return MockReply(status=status, headers=headers, delay=0.0,
+                         body=json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "distribution": self.distribution,
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "token_delay_ms": self.token_delay_ms,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "streamed": self.streamed,
+            "completion_tokens": self.completion_tokens,
+            "errors": {str(status): count for status, count in sorted(self.errors.items())},
+            "families": dict(sorted(self.families.items())),
+        }
+
+
+def build_mock_backend() -> MockLLMBackend:
+    """按配置创建模拟后端"""
+    return MockLLMBackend(
+        latency_ms=settings.LLM_MOCK_LATENCY_MS,
+        jitter_ms=settings.LLM_MOCK_LATENCY_JITTER_MS,
+        distribution=settings.LLM_MOCK_LATENCY_DISTRIBUTION,
+        token_delay_ms=settings.LLM_MOCK_TOKEN_DELAY_MS,
+        chunk_tokens=settings.LLM_MOCK_STREAM_CHUNK_TOKENS,
+        error_rate=settings.LLM_MOCK_ERROR_RATE,
+        error_statuses=settings.LLM_MOCK_ERROR_STATUSES,
+        retry_after_ms=settings.LLM_MOCK_RETRY_AFTER_MS,
+        seed=settings.LLM_MOCK_SEED,
+    )
+
+
+# ----------------------------------------------------------------------
+# 接入方式
+# ----------------------------------------------------------------------
+
+class _MockEventStream(httpx.AsyncByteStream):
+    """按计划的间隔逐个发送SSE事件"""
+
+    def __init__(self, chunks: List[Tuple[float, bytes]]):
+        self._chunks = chunks
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for delay, data in self._chunks:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield data
+
+
+class MockLLMTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """把 /chat/completions 请求交给模拟后端处理的httpx传输层（同步与异步客户端均可使用）"""
+
+    def __init__(self, backend: MockLLMBackend):
+        self.backend = backend
+
+    @staticmethod
+    def _not_found(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404, json={"error": {"message": f"模拟后端不支持 {request.url.path}"}})
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not request.url.path.endswith("/chat/completions"):
+            return self._not_found(request)
+        reply = self.backend.reply(json.loads(await request.aread()))
+        if reply.delay > 0:
+            await asyncio.sleep(reply.delay)
+        if reply.streaming:
+            return httpx.Response(reply.status, headers=reply.headers, stream=_MockEventStream(reply.chunks))
+        return httpx.Response(reply.status, headers=reply.headers, content=reply.body)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not request.url.path.endswith("/chat/completions"):
+            return self._not_found(request)
+        reply = self.backend.reply(json.loads(request.read()))
+        # 同步调用不逐片段等待，一次性返回整个事件流
+        time.sleep(reply.delay + sum(delay for delay, _ in reply.chunks))
+        content = b"".join(data for _, data in reply.chunks) if reply.streaming else reply.body
+        return httpx.Response(reply.status, headers=reply.headers, content=content)
+
+
+def create_mock_app(backend: Optional[MockLLMBackend] = None):
+    """独立模拟服务（OpenAI兼容的 /v1/chat/completions）"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import Response, StreamingResponse
+
+    backend = backend or build_mock_backend()
+    app = FastAPI(title="Mock LLM")
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        reply = backend.reply(await request.json())
+        if reply.delay > 0:
+            await asyncio.sleep(reply.delay)
+        if reply.streaming:
+            return StreamingResponse(_MockEventStream(reply.chunks).__aiter__(), status_code=reply.status,
+                                     headers=reply.headers, media_type="text/event-stream")
+        return Response(reply.body, status_code=reply.status, headers=reply.headers)
+
+    @app.get("/stats")
+    async def stats():
+        return backend.stats()
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="启动OpenAI兼容的模拟LLM服务（延迟与错误注入见 LLM_MOCK_* 配置）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args(argv)
+
+    logger.info(f"✅ 模拟LLM服务：http://{args.host}:{args.port}/v1（OPENAI_API_BASE 指向该地址即可）")
+    uvicorn.run(create_mock_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+LLM准入控制
+进程内按模型协调所有对外LLM调用：
+- 令牌桶限制每分钟请求数与每分钟token数
+- AIMD自适应并发：成功时缓慢加性增加并发上限，遇到429/5xx时乘性减小
+- 429/5xx/连接错误按指数退避加随机抖动重试，并遵守服务端返回的Retry-After
+- 并发名额按优先级类别与用户公平分配（见 llm_scheduler），批量任务最多占用一部分并发
+- 统计排队时间、限流、重试等指标
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+import asyncio
+import random
+import time
+
+import openai
+
+from app.services.llm_scheduler import PRIORITY_CLASSES, FairScheduler, UserKey, current_llm_priority
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶（允许透支，透支部分换算为等待时间，保证先到先得）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        预占令牌
+
+        Returns:
+            需要等待的秒数（0表示立即可用）
+        """
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """按实际用量修正预占量（delta>0 表示多扣，<0 表示退还）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def classify_error(error: BaseException) -> Tuple[bool, bool, Optional[float]]:
+    """
+    判断LLM调用错误是否可重试
+
+    Returns:
+        (是否可重试, 是否为过载信号(429/5xx), 服务端要求的等待秒数)
+    """
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        overloaded = status == 429 or status >= 500
+        return overloaded, overloaded, _retry_after(error.response)
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True, False, None
+    return False, False, None
+
+
+def _retry_after(response: Any) -> Optional[float]:
+    """解析 Retry-After / retry-after-ms 响应头"""
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float], base: float, maximum: float) -> float:
+    """
+    第attempt次重试前的等待时间：指数退避加全抖动，且不短于Retry-After
+
+    Args:
+        attempt: 已失败次数（从1开始）
+        retry_after: 服务端要求的等待秒数
+        base: 退避基数（秒）
+        maximum: 退避上限（秒）
+    """
+    delay = random.uniform(0, min(maximum, base * (2 ** (attempt - 1))))
+    if retry_after is not None:
+        # 在Retry-After基础上再加少量抖动，避免所有等待者同时醒来
+        delay = max(delay, retry_after + random.uniform(0, base))
+    return delay
+
+
+class ModelAdmission:
+    """单个模型的准入控制：令牌桶 + AIMD并发上限 + 统计"""
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, rpm: int = 0, tpm: int = 0,
+                 decrease_factor: float = 0.5, cooldown_seconds: float = 5.0,
+                 batch_share: float = 1.0, starvation_seconds: float = 10.0):
+        """
+        Args:
+            max_concurrency: 并发上限（AIMD不会超过该值）
+            min_concurrency: 并发下限
+            rpm: 每分钟请求数，0表示不限
+            tpm: 每分钟token数，0表示不限
+            decrease_factor: 遇到过载时并发上限的乘性缩减系数
+            cooldown_seconds: 两次缩减之间的最短间隔（同一波429只缩减一次）
+            batch_share: batch类别最多占用的并发比例（至少1个），为交互调用预留名额
+            starvation_seconds: 排队每超过这么久提升一级优先级
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.request_bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.token_bucket = TokenBucket(tpm) if tpm > 0 else None
+
+        self.batch_share = batch_share
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._scheduler = FairScheduler(starvation_seconds)
+        self._class_in_flight: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        # 统计
+        self.requests = 0
+        self.failed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self._recent_waits: Deque[float] = deque(maxlen=1000)
+        self._class_admitted: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._class_wait_ms: Dict[str, float] = {name: 0.0 for name in PRIORITY_CLASSES}
+
+    @property
+    def waiting(self) -> int:
+        return len(self._scheduler)
+
+    # ------------------------------------------------------------------
+    # 准入
+    # ------------------------------------------------------------------
+
+    async def _wait_rate(self, tokens: float) -> None:
+        """等待暂停期结束并按令牌桶配额排队"""
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens > 0:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+        if delay > 0:
+            self.throttled += 1
+            await asyncio.sleep(delay)
+
+    def _can_admit(self, priority_class: str) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        if priority_class == "batch":
+            return self._class_in_flight["batch"] < max(1, int(self.limit * self.batch_share))
+        return True
+
+    async def _acquire(self, priority_class: str, user_id: UserKey, cost: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        waiter = self._scheduler.push(future, priority_class, user_id, cost)
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已获得名额后才取消，归还名额
+                self._release(priority_class)
+            else:
+                self._scheduler.remove(waiter)
+            raise
+
+    def _release(self, priority_class: str) -> None:
+        self.in_flight -= 1
+        self._class_in_flight[priority_class] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.in_flight < int(self.limit):
+            waiter = self._scheduler.pop(self._can_admit)
+            if waiter is None:
+                break
+            self.in_flight += 1
+            self._class_in_flight[waiter.priority_class] += 1
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, tokens: float = 0) -> AsyncIterator[None]:
+        """
+        获得一次调用的准入许可
+
+        优先级类别与用户取自调用链上的标注（见 llm_scheduler）。先按优先级获得并发名额，
+        再按令牌桶配额排队，使配额紧张时高优先级调用也先获得配额。
+
+        Args:
+            tokens: 预计消耗的token数（用于每分钟token配额与公平排队计费）
+        """
+        priority_class, user_id = current_llm_priority()
+        wait_start = time.perf_counter()
+        await self._acquire(priority_class, user_id, tokens)
+        try:
+            await self._wait_rate(tokens)
+        except BaseException:
+            self._release(priority_class)
+            raise
+        run_start = time.perf_counter()
+        wait_ms = (run_start - wait_start) * 1000
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self._recent_waits.append(wait_ms)
+        self._class_admitted[priority_class] += 1
+        self._class_wait_ms[priority_class] += wait_ms
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.requests += 1
+            self.total_run_ms += (time.perf_counter() - run_start) * 1000
+            self._release(priority_class)
+
+    # ------------------------------------------------------------------
+    # AIMD反馈
+    # ------------------------------------------------------------------
+
+    def on_success(self, estimated_tokens: float = 0, actual_tokens: Optional[float] = None) -> None:
+        """调用成功：加性增加并发上限，并按实际token用量修正配额"""
+        if self.limit < self.max_concurrency:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._wake()
+        if self.token_bucket is not None and actual_tokens is not None:
+            self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def on_overload(self, status_429: bool, retry_after: Optional[float] = None) -> None:
+        """收到429/5xx：乘性减小并发上限；有Retry-After时暂停该模型的新请求"""
+        if status_429:
+            self.rate_limited += 1
+        else:
+            self.server_errors += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown_seconds:
+            self.limit = max(float(self.min_concurrency), self.limit * self.decrease_factor)
+            self._last_decrease = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        recent = sorted(self._recent_waits)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "max_concurrency": self.max_concurrency,
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "server_errors": self.server_errors,
+            "throttled": self.throttled,
+            "rpm_limit": int(self.request_bucket.capacity) if self.request_bucket else 0,
+            "tpm_limit": int(self.token_bucket.capacity) if self.token_bucket else 0,
+            "avg_wait_ms": round(self.total_wait_ms / self.requests, 2) if self.requests else 0.0,
+            "p95_wait_ms": round(p95, 2),
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "avg_run_ms": round(self.total_run_ms / self.requests, 2) if self.requests else 0.0,
+            "promoted": self._scheduler.promoted,
+            "classes": {
+                name: {
+                    "in_flight": self._class_in_flight[name],
+                    "waiting": waiting,
+                    "admitted": self._class_admitted[name],
+                    "avg_wait_ms": round(self._class_wait_ms[name] / self._class_admitted[name], 2)
+                    if self._class_admitted[name] else 0.0,
+                }
+                for name, waiting in self._scheduler.waiting_by_class().items()
+            },
+        }
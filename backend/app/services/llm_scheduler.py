@@ -0,0 +1,205 @@
+"""
+LLM调用优先级调度
+每次LLM调用都带有优先级类别与所属用户（由路由和服务通过上下文变量标注）：
+- interactive: 作者在编辑器中等待结果的调用（续写、改写、剧情选项）
+- standard: 普通请求（默认）
+- batch: 全书分析/优化、AI接管等后台批量任务
+
+并发名额空出时按类别严格优先，同一类别内按用户做加权公平排队（按预计token数计费，
+避免单个用户的批量任务占满队列）；等待过久的调用逐级提升优先级，防止饿死。
+提升最多到standard，交互调用不会排在其他类别提升上来的调用之后；各类别的虚拟时间互不可比，
+提升后的调用与目标类别的调用按入队时间排队，而不是比较虚拟完成时间。
+
+用户标识一般是用户ID；未登录的请求可用 "anon:客户端地址" 之类的字符串，各自单独排队。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import asyncio
+import itertools
+import time
+
+
+PRIORITY_CLASSES: Tuple[str, ...] = ("interactive", "standard", "batch")
+DEFAULT_PRIORITY = "standard"
+# 防饿死提升所能达到的最高类别（interactive 只留给作者正在等待的调用）
+PROMOTION_CEILING = "standard"
+
+# 公平排队的用户标识：用户ID，或未登录请求的字符串标识
+UserKey = Optional[Union[int, str]]
+
+# (优先级类别, 用户标识)
+_llm_priority: ContextVar[Tuple[str, UserKey]] = ContextVar(
+    "llm_priority", default=(DEFAULT_PRIORITY, None)
+)
+
+
+def _check_priority(priority_class: str) -> None:
+    if priority_class not in PRIORITY_CLASSES:
+        raise ValueError(f"未知的LLM优先级类别: {priority_class}（可选: {', '.join(PRIORITY_CLASSES)}）")
+
+
+def current_llm_priority() -> Tuple[str, UserKey]:
+    """当前调用链的 (优先级类别, 用户标识)"""
+    return _llm_priority.get()
+
+
+def set_llm_priority(priority_class: str, user_id: UserKey = None) -> None:
+    """
+    标注当前请求后续LLM调用的优先级（用于路由函数，作用到请求结束）
+
+    Args:
+        priority_class: interactive / standard / batch
+        user_id: 发起请求的用户ID（未登录时为字符串标识）
+    """
+    _check_priority(priority_class)
+    _llm_priority.set((priority_class, user_id))
+
+
+@contextmanager
+def llm_priority(priority_class: Optional[str] = None, user_id: UserKey = None) -> Iterator[None]:
+    """
+    在代码块内标注LLM调用的优先级（用于服务内部），未指定的字段沿用外层标注
+
+    Args:
+        priority_class: interactive / standard / batch
+        user_id: 发起请求的用户ID
+    """
+    current_class, current_user = _llm_priority.get()
+    if priority_class is not None:
+        _check_priority(priority_class)
+    token = _llm_priority.set((priority_class or current_class, user_id if user_id is not None else current_user))
+    try:
+        yield
+    finally:
+        _llm_priority.reset(token)
+
+
+_CEILING_RANK = PRIORITY_CLASSES.index(PROMOTION_CEILING)
+
+
+class Waiter:
+    """排队中的一次LLM调用"""
+
+    __slots__ = ("future", "priority_class", "rank", "user_id", "finish_tag", "seq", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority_class: str, user_id: UserKey,
+                 finish_tag: float, seq: int):
+        self.future = future
+        self.priority_class = priority_class
+        self.rank = PRIORITY_CLASSES.index(priority_class)
+        self.user_id = user_id
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+
+
+class FairScheduler:
+    """按类别优先、类别内按用户加权公平的等待队列"""
+
+    def __init__(self, starvation_seconds: float = 10.0):
+        """
+        Args:
+            starvation_seconds: 每等待这么久提升一级优先级，<=0 表示不提升
+        """
+        self.starvation_seconds = starvation_seconds
+        self._waiters: List[Waiter] = []
+        self._seq = itertools.count()
+        # 每个类别的虚拟时间，以及各用户在该类别中最后一个请求的虚拟完成时间
+        self._virtual_time: Dict[str, float] = {name: 0.0 for name in PRIORITY_CLASSES}
+        self._user_finish: Dict[Tuple[str, UserKey], float] = {}
+        self.promoted = 0
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def push(self, future: asyncio.Future, priority_class: str, user_id: UserKey, cost: float = 1.0) -> Waiter:
+        """
+        加入等待队列
+
+        Args:
+            future: 获得名额时设置结果的Future
+            priority_class: 优先级类别
+            user_id: 用户标识
+            cost: 本次调用的计费量（预计token数）
+        """
+        _check_priority(priority_class)
+        key = (priority_class, user_id)
+        start = max(self._virtual_time[priority_class], self._user_finish.get(key, 0.0))
+        finish_tag = start + max(1.0, cost)
+        self._user_finish[key] = finish_tag
+        waiter = Waiter(future, priority_class, user_id, finish_tag, next(self._seq))
+        self._waiters.append(waiter)
+        return waiter
+
+    def remove(self, waiter: Waiter) -> None:
+        """移除等待者（取消时调用）"""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _effective_rank(self, waiter: Waiter, now: float) -> int:
+        if self.starvation_seconds <= 0 or waiter.rank <= _CEILING_RANK:
+            return waiter.rank
+        return max(_CEILING_RANK, waiter.rank - int((now - waiter.enqueued_at) / self.starvation_seconds))
+
+    def _order_key(self, waiter: Waiter, now: float) -> Tuple[int, int, float, int]:
+        """
+        出队顺序：先按（提升后的）类别；同一类别内提升上来的调用优先并按入队时间排队，
+        本类别的调用按虚拟完成时间公平排队（不同类别的虚拟时间不可比较）
+        """
+        rank = self._effective_rank(waiter, now)
+        if rank < waiter.rank:
+            return rank, 0, waiter.enqueued_at, waiter.seq
+        return rank, 1, waiter.finish_tag, waiter.seq
+
+    def pop(self, can_admit: Callable[[str], bool] = lambda _: True) -> Optional[Waiter]:
+        """
+        取出下一个应获得名额的等待者
+
+        Args:
+            can_admit: 判断某类别当前能否获得名额（用于批量任务的并发份额限制）
+
+        Returns:
+            等待者；没有可放行的等待者时返回None
+        """
+        now = time.monotonic()
+        best: Optional[Waiter] = None
+        best_key: Optional[Tuple[int, int, float, int]] = None
+        for waiter in self._waiters:
+            if waiter.future.done() or not can_admit(waiter.priority_class):
+                continue
+            key = self._order_key(waiter, now)
+            if best_key is None or key < best_key:
+                best, best_key = waiter, key
+        # 清理已取消的等待者
+        self._waiters = [waiter for waiter in self._waiters if not waiter.future.done() and waiter is not best]
+        if best is None:
+            return None
+
+        if best_key[0] < best.rank:
+            self.promoted += 1
+        self._virtual_time[best.priority_class] = max(self._virtual_time[best.priority_class], best.finish_tag)
+        self._prune(best.priority_class)
+        return best
+
+    def _prune(self, priority_class: str) -> None:
+        """删除已落后于虚拟时间的用户记录，避免字典无限增长"""
+        if len(self._user_finish) < 1024:
+            return
+        virtual_time = self._virtual_time[priority_class]
+        self._user_finish = {
+            key: finish for key, finish in self._user_finish.items()
+            if key[0] != priority_class or finish > virtual_time
+        }
+
+    def waiting_by_class(self) -> Dict[str, int]:
+        counts = {name: 0 for name in PRIORITY_CLASSES}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                counts[waiter.priority_class] += 1
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"waiting": self.waiting_by_class(), "promoted": self.promoted}
@@ -0,0 +1,136 @@
+"""
+RAG文本分块
+按中文句末标点（。！？…及其后的引号）和段落边界切分句子，再把句子装箱为接近目标大小的分块，
+相邻分块之间保留若干整句作为重叠。全程以生成器实现，超长章节也只占用有限内存。
+"""
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+import re
+
+
+# 句末标点（可连续出现）及紧随其后的闭合引号/括号与换行；或单独的换行（段落边界）
+_SENTENCE_END = re.compile(r"(?:[。！？!?]+|…+|\.{3,})[」』”’\"）)》]*\n*|\n+")
+
+
+def iter_sentences(text: Union[str, Iterable[str]]) -> Iterator[Tuple[str, bool]]:
+    """
+    逐句切分文本
+
+    Args:
+        text: 完整文本，或按顺序到达的文本片段（如逐段读取的超长章节）
+
+    Yields:
+        (句子, 是否为段落结尾)
+    """
+    pieces = [text] if isinstance(text, str) else text
+    carry = ""
+    for piece in pieces:
+        buffer = carry + piece
+        start = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            # 片段末尾的标点后可能还有下一片段中的引号，留到下一轮一起处理
+            if match.end() == len(buffer):
+                break
+            yield buffer[start:match.end()], "\n" in match.group()
+            start = match.end()
+        carry = buffer[start:]
+
+    if carry:
+        yield carry, carry.endswith("\n")
+
+
+def _split_long(sentence: str, chunk_size: int, length_fn: Callable[[str], int]) -> Iterator[str]:
+    """
+    把超长句子切成按length_fn计量不超过chunk_size的片段
+
+    二分查找每段能容纳的最长前缀（length_fn需随文本增长单调不减），每段至少一个字符。
+    """
+    if length_fn is len:
+        for start in range(0, len(sentence), chunk_size):
+            yield sentence[start:start + chunk_size]
+        return
+
+    start = 0
+    while start < len(sentence):
+        low, high = start + 1, len(sentence)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if length_fn(sentence[start:middle]) <= chunk_size:
+                low = middle
+            else:
+                high = middle - 1
+        yield sentence[start:low]
+        start = low
+
+
+def iter_chunks(
+    text: Union[str, Iterable[str]],
+    chunk_size: int = 500,
+    overlap: int = 0,
+    length_fn: Callable[[str], int] = len,
+) -> Iterator[str]:
+    """
+    按句子边界生成分块
+
+    Args:
+        text: 完整文本，或按顺序到达的文本片段
+        chunk_size: 目标分块大小（按length_fn计量，中文下字符数约等于token数）
+        overlap: 相邻分块之间的重叠大小（以整句为单位，不超过该值）
+        length_fn: 长度计量函数
+
+    Yields:
+        分块文本（已去除首尾空白，空白分块会被跳过）
+    """
+    chunk_size = max(1, chunk_size)
+    overlap = max(0, min(overlap, chunk_size // 2))
+    # 累计超过一半目标大小后遇到段落结尾即提前成块，尽量不跨段落
+    paragraph_flush_size = chunk_size // 2
+
+    # 当前分块中的 (句子, 长度)，以及其中尚未输出过的句子数（其余为上一分块的重叠）
+    sentences: List[Tuple[str, int]] = []
+    size = 0
+    fresh = 0
+
+    def flush() -> Iterator[str]:
+        nonlocal sentences, size, fresh
+        if fresh:
+            chunk = "".join(sentence for sentence, _ in sentences).strip()
+            if chunk:
+                yield chunk
+
+        # 保留末尾若干整句作为下一分块的开头
+        kept: List[Tuple[str, int]] = []
+        kept_size = 0
+        for sentence, length in reversed(sentences):
+            if kept_size + length > overlap:
+                break
+            kept.insert(0, (sentence, length))
+            kept_size += length
+        sentences, size, fresh = kept, kept_size, 0
+
+    for sentence, paragraph_end in iter_sentences(text):
+        length = length_fn(sentence)
+
+        # 单句超过目标大小时硬切分
+        if length > chunk_size:
+            yield from flush()
+            sentences, size = [], 0
+            for piece in _split_long(sentence, chunk_size, length_fn):
+                piece = piece.strip()
+                if piece:
+                    yield piece
+            continue
+
+        if size + length > chunk_size:
+            yield from flush()
+            # 重叠部分加上新句子仍超限时放弃重叠
+            if size + length > chunk_size:
+                sentences, size = [], 0
+
+        sentences.append((sentence, length))
+        size += length
+        fresh += 1
+
+        if paragraph_end and size >= paragraph_flush_size:
+            yield from flush()
+
+    yield from flush()
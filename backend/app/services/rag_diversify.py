@@ -0,0 +1,140 @@
+"""
+RAG检索结果多样化
+最大边际相关性（MMR）重排与同章节重叠分块去重：候选的两两相似度用NumPy一次性算出，
+逐个挑选时只维护"与已选结果的最大相似度"向量，避免把相邻、内容高度重合的分块同时塞进提示词。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def mmr_rank(
+    relevance: Sequence[float],
+    embeddings: np.ndarray,
+    lambda_mult: float = 0.7,
+    k: Optional[int] = None,
+) -> List[int]:
+    """
+    按最大边际相关性排序候选
+
+    Args:
+        relevance: 候选的相关性得分（任意尺度，内部归一化到[0, 1]）
+        embeddings: (n, dim) 候选向量；全零向量视为与其他候选不相似
+        lambda_mult: 相关性权重，1.0时退化为按相关性排序
+        k: 需要的数量，默认对全部候选排序
+
+    Returns:
+        候选下标，按选中顺序排列
+    """
+    scores = np.asarray(relevance, dtype=np.float32)
+    n = len(scores)
+    k = n if k is None else min(k, n)
+    if k <= 0:
+        return []
+
+    span = float(scores.max() - scores.min())
+    scores = (scores - scores.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(n, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = vectors / norms
+    similarity = unit @ unit.T
+
+    # 与已选结果的最大相似度（负相关不加分）
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    order: List[int] = []
+    for _ in range(k):
+        mmr = lambda_mult * scores - (1.0 - lambda_mult) * redundancy
+        mmr[~available] = -np.inf
+        chosen = int(mmr.argmax())
+        order.append(chosen)
+        available[chosen] = False
+        np.maximum(redundancy, similarity[chosen], out=redundancy)
+    return order
+
+
+def _bigrams(text: str) -> set:
+    text = "".join(text.split())
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _same_chapter(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return (
+        a.get("chapter") is not None
+        and a.get("chapter") == b.get("chapter")
+        and a.get("source") == b.get("source")
+    )
+
+
+def is_overlapping(
+    text_a: str,
+    metadata_a: Dict[str, Any],
+    text_b: str,
+    metadata_b: Dict[str, Any],
+    adjacent_window: int = 1,
+    overlap_threshold: float = 0.6,
+) -> bool:
+    """
+    判断两个分块是否为同一章节中相互重叠的内容
+
+    Args:
+        text_a/text_b: 分块文本
+        metadata_a/metadata_b: 分块元数据（chapter、chunk_index、source）
+        adjacent_window: 同章节内分块序号相差不超过该值即视为重叠（分块之间本就保留了重叠句），0表示不按序号判断
+        overlap_threshold: 字符二元组的包含率达到该值即视为重复，1以上表示不按文本判断
+
+    Returns:
+        是否重叠
+    """
+    if not _same_chapter(metadata_a, metadata_b):
+        return False
+
+    index_a, index_b = metadata_a.get("chunk_index"), metadata_b.get("chunk_index")
+    if adjacent_window > 0 and index_a is not None and index_b is not None:
+        if abs(index_a - index_b) <= adjacent_window:
+            return True
+
+    if overlap_threshold > 1:
+        return False
+    grams_a, grams_b = _bigrams(text_a), _bigrams(text_b)
+    return len(grams_a & grams_b) / min(len(grams_a), len(grams_b)) >= overlap_threshold
+
+
+def suppress_overlaps(
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    order: Sequence[int],
+    limit: int,
+    adjacent_window: int = 1,
+    overlap_threshold: float = 0.6,
+) -> List[int]:
+    """
+    按给定顺序挑选候选，跳过与已选分块重叠的候选
+
+    Args:
+        texts: 候选文本
+        metadatas: 候选元数据
+        order: 候选的优先顺序（下标）
+        limit: 最多返回数量
+        adjacent_window: 见 is_overlapping
+        overlap_threshold: 见 is_overlapping
+
+    Returns:
+        保留的候选下标
+    """
+    kept: List[int] = []
+    for index in order:
+        if len(kept) >= limit:
+            break
+        if any(
+            is_overlapping(
+                texts[index], metadatas[index], texts[other], metadatas[other],
+                adjacent_window=adjacent_window, overlap_threshold=overlap_threshold,
+            )
+            for other in kept
+        ):
+            continue
+        kept.append(index)
+    return kept
@@ -0,0 +1,152 @@
+"""
+RAG Embedding微批处理
+把并发请求（章节索引、检索查询）中的文本在极短的时间窗口内合并为一批，
+只发起一次批量Embedding调用，再把结果分发回各个调用方。
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+
+from loguru import logger
+
+
+Vector = List[float]
+
+
+def embed_query_batch(embed_model: Any, queries: List[str]) -> List[Vector]:
+    """
+    批量计算查询向量
+
+    LlamaIndex没有批量查询向量接口；底层模型提供查询格式化与通用批量接口时（如Ollama）
+    一次请求完成，否则逐条计算。
+
+    Args:
+        embed_model: Embedding模型（可以是CachedEmbedding包装器）
+        queries: 查询文本列表
+
+    Returns:
+        查询向量列表
+    """
+    inner = getattr(embed_model, "inner", embed_model)
+    if hasattr(inner, "_format_query") and hasattr(inner, "get_general_text_embeddings"):
+        return inner.get_general_text_embeddings([inner._format_query(q) for q in queries])
+    return [embed_model.get_query_embedding(q) for q in queries]
+
+
+class EmbeddingBatcher:
+    """Embedding微批处理器
+
+    达到最大批量或等待超过max_wait_ms时立即发出一批；同一批内相同文本只计算一次。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[str]], List[Vector]],
+        runner: Callable[[Callable[[List[str]], List[Vector]], List[str]], Awaitable[List[Vector]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        初始化批处理器
+
+        Args:
+            name: 名称（用于日志和统计）
+            batch_fn: 同步批量Embedding函数
+            runner: 执行批量函数的协程（通常交给Embedding线程池执行）
+            max_batch_size: 单批最大文本数
+            max_wait_ms: 凑批的最长等待时间（毫秒）
+        """
+        self.name = name
+        self.batch_fn = batch_fn
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.texts = 0
+        self.unique_texts = 0
+        self.max_observed_batch = 0
+
+    async def embed(self, texts: List[str]) -> List[Vector]:
+        """
+        提交文本并等待所在批次完成
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # 事件循环变化（如测试中每个用例新建循环）时丢弃旧状态
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+
+        if len(self._pending) >= self.max_batch_size or self.max_wait == 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        """把当前待处理文本按最大批量切分并发出"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = self._loop.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """执行一批Embedding并把结果分发给各调用方"""
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.texts += len(batch)
+        self.unique_texts += len(unique_texts)
+        self.max_observed_batch = max(self.max_observed_batch, len(batch))
+
+        try:
+            vectors = await self.runner(self.batch_fn, unique_texts)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Embedding批处理失败（{self.name}，{len(unique_texts)}条）: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text: Dict[str, Vector] = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> Dict[str, Any]:
+        """返回批处理统计"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "batches": self.batches,
+            "texts": self.texts,
+            "unique_texts": self.unique_texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "max_observed_batch": self.max_observed_batch,
+            "pending": len(self._pending),
+        }
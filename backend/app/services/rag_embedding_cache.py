@@ -0,0 +1,267 @@
+"""
+RAG Embedding缓存
+以 (Embedding模型, 向量维度, 文本sha256) 为键，将分块向量持久化到本地SQLite，
+章节重复保存时未变化的分块直接命中缓存，不再调用Ollama/HuggingFace计算向量。
+"""
+from array import array
+from typing import Dict, List, Optional, Sequence
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from loguru import logger
+
+
+def text_sha256(text: str) -> str:
+    """计算文本的sha256摘要（十六进制）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """基于SQLite的持久化Embedding缓存（按最近访问时间做LRU淘汰）"""
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite文件路径
+            max_entries: 最大缓存条目数，超出后淘汰最久未访问的条目
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, dim, text_hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get_many(self, model: str, dim: int, text_hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        批量读取缓存
+
+        Args:
+            model: Embedding模型名称
+            dim: 向量维度
+            text_hashes: 文本sha256列表
+
+        Returns:
+            命中的 {text_hash: 向量} 字典
+        """
+        unique_hashes = list(dict.fromkeys(text_hashes))
+        if not unique_hashes:
+            return {}
+
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        with self._lock:
+            # SQLite单条语句的参数个数有限，分批查询
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dim = ? AND text_hash IN ({placeholders})",
+                    (model, dim, *batch),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND dim = ? AND text_hash = ?",
+                    [(now, model, dim, h) for h in found],
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(unique_hashes) - len(found)
+
+        return found
+
+    def put_many(self, model: str, dim: int, items: Dict[str, Sequence[float]]) -> None:
+        """
+        批量写入缓存
+
+        Args:
+            model: Embedding模型名称
+            dim: 向量维度
+            items: {text_hash: 向量} 字典
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (model, dim, text_hash, array("f", vector).tobytes(), now)
+            for text_hash, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dim, text_hash, vector, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            # 被替换的行也会计入，这里只是上界估计；超限时重新统计再决定是否淘汰
+            self._size += len(rows)
+            if self._size > self.max_entries:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if self._size > self.max_entries:
+                    self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """淘汰最久未访问的条目，腾出10%的空间，避免每次写入都触发淘汰"""
+        target = int(self.max_entries * 0.9)
+        overflow = self._size - target
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            "SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (overflow,),
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Embedding缓存淘汰{overflow}条，当前{self._size}条")
+
+    def stats(self) -> Dict[str, float]:
+        """返回缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self) -> None:
+        """关闭SQLite连接"""
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """带持久化缓存的Embedding包装器
+
+    文本向量先查缓存，只对未命中的文本调用底层模型；查询向量直接透传。
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+    _dim: int = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: EmbeddingCache, embed_dim: int, **kwargs):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._cache = cache
+        self._dim = embed_dim
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        """底层Embedding模型"""
+        return self._inner
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        """Embedding缓存"""
+        return self._cache
+
+    def _lookup(self, texts: List[str]) -> tuple:
+        """查询缓存，返回 (文本哈希列表, 命中字典, 未命中文本列表)"""
+        hashes = [text_sha256(text) for text in texts]
+        try:
+            cached = self._cache.get_many(self.model_name, self._dim, hashes)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"读取Embedding缓存失败: {e}")
+            cached = {}
+
+        missing: Dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+        return hashes, cached, missing
+
+    def _store(self, cached: Dict[str, Embedding], missing: Dict[str, str], vectors: List[Embedding]) -> None:
+        """将新计算的向量写回缓存"""
+        fresh = dict(zip(missing.keys(), vectors))
+        cached.update(fresh)
+        try:
+            self._cache.put_many(self.model_name, self._dim, fresh)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"写入Embedding缓存失败: {e}")
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        hashes, cached, missing = self._lookup(texts)
+        if missing:
+            vectors = self._inner._get_text_embeddings(list(missing.values()))
+            self._store(cached, missing, vectors)
+        return [cached[h] for h in hashes]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        hashes, cached, missing = self._lookup(texts)
+        if missing:
+            vectors = await self._inner._aget_text_embeddings(list(missing.values()))
+            self._store(cached, missing, vectors)
+        return [cached[h] for h in hashes]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._inner._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self._inner._aget_query_embedding(query)
+
+
+def build_embedding_cache(path: str, max_entries: int) -> Optional[EmbeddingCache]:
+    """创建Embedding缓存，失败时返回None（退化为不缓存）"""
+    try:
+        return EmbeddingCache(path, max_entries=max_entries)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Embedding缓存初始化失败，将不使用缓存: {e}")
+        return None
@@ -0,0 +1,143 @@
+"""
+RAG阻塞调用执行器
+LlamaIndex/Chroma/Ollama的接口均为同步阻塞调用，这里用独立的有界线程池执行，
+并按操作类型限制并发，避免单次章节索引阻塞整个事件循环。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import functools
+import threading
+import time
+import weakref
+
+
+class OperationStats:
+    """单类操作的统计数据"""
+
+    __slots__ = ("waiting", "running", "completed", "failed", "max_queue_depth", "total_wait_ms", "total_run_ms")
+
+    def __init__(self):
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": round(self.total_wait_ms / finished, 2) if finished else 0.0,
+            "avg_run_ms": round(self.total_run_ms / finished, 2) if finished else 0.0,
+        }
+
+
+class RAGExecutor:
+    """有界线程池执行器，支持按操作类型限制并发并统计排队情况"""
+
+    def __init__(self, name: str, max_workers: int, limits: Optional[Dict[str, int]] = None):
+        """
+        初始化执行器
+
+        Args:
+            name: 执行器名称（同时作为线程名前缀）
+            max_workers: 线程池大小
+            limits: 各操作类型的最大并发数，未配置的操作只受线程池大小限制
+        """
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.limits = dict(limits or {})
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._stats: Dict[str, OperationStats] = {}
+        self._stats_lock = threading.Lock()
+        # 信号量与事件循环绑定，按事件循环分别创建
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphore(self, operation: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(operation)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(operation, self.max_workers))
+            semaphores[operation] = semaphore
+        return semaphore
+
+    def _operation_stats(self, operation: str) -> OperationStats:
+        stats = self._stats.get(operation)
+        if stats is None:
+            stats = self._stats.setdefault(operation, OperationStats())
+        return stats
+
+    async def run(self, operation: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        在线程池中执行阻塞函数
+
+        Args:
+            operation: 操作类型（如index/search/delete），用于并发限制和统计
+            func: 阻塞函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        stats = self._operation_stats(operation)
+        queued_at = time.perf_counter()
+        with self._stats_lock:
+            stats.waiting += 1
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.waiting)
+
+        started_at: Optional[float] = None
+        call = functools.partial(func, *args, **kwargs)
+
+        def _run_in_thread() -> Any:
+            nonlocal started_at
+            started_at = time.perf_counter()
+            with self._stats_lock:
+                stats.waiting -= 1
+                stats.running += 1
+            return call()
+
+        succeeded = False
+        try:
+            async with self._semaphore(operation):
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, _run_in_thread)
+            succeeded = True
+            return result
+        finally:
+            finished_at = time.perf_counter()
+            with self._stats_lock:
+                if started_at is None:
+                    # 未进入线程池就被取消
+                    stats.waiting -= 1
+                    stats.total_wait_ms += (finished_at - queued_at) * 1000
+                else:
+                    stats.running -= 1
+                    stats.total_wait_ms += (started_at - queued_at) * 1000
+                    stats.total_run_ms += (finished_at - started_at) * 1000
+                if succeeded:
+                    stats.completed += 1
+                else:
+                    stats.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回执行器统计信息"""
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "limits": dict(self.limits),
+                "operations": {operation: stats.to_dict() for operation, stats in self._stats.items()},
+            }
+
+    def shutdown(self) -> None:
+        """关闭线程池（不等待正在执行的任务）"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,340 @@
+"""
+RAG关键词索引
+按小说维护内存倒排索引（中文字符二元组分词 + BM25打分），作为混合检索中的关键词通道，
+弥补向量检索在人名、地名等精确词匹配上的不足。
+"""
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import math
+import re
+import threading
+
+
+# 连续的中日韩字符，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[A-Za-z0-9]+")
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：中文按字符二元组切分，英文/数字按整词切分（小写）
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        词项列表
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall(text or ""):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+class KeywordHit:
+    """关键词检索命中结果"""
+
+    __slots__ = ("node_id", "score", "text", "metadata")
+
+    def __init__(self, node_id: str, score: float, text: str, metadata: Dict[str, Any]):
+        self.node_id = node_id
+        self.score = score
+        self.text = text
+        self.metadata = metadata
+
+
+class NovelKeywordIndex:
+    """单本小说的BM25倒排索引
+
+    文档以连续整数编号，倒排表为 词项 -> (文档编号数组, 词频数组)；
+    删除只做标记，失效文档过多时整体压缩。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._reset()
+
+    def _reset(self) -> None:
+        """清空索引数据"""
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._node_ids: List[Optional[str]] = []
+        self._texts: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._chapters = array("i")
+        self._lengths = array("I")
+        self._alive = bytearray()
+        self._slot_by_id: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_by_id)
+
+    def add(self, node_id: str, text: str, metadata: Dict[str, Any]) -> None:
+        """添加（或替换）一个分块"""
+        if node_id in self._slot_by_id:
+            self.remove([node_id])
+
+        tokens = tokenize(text)
+        slot = len(self._node_ids)
+        self._node_ids.append(node_id)
+        self._texts.append(text)
+        self._metadatas.append(metadata)
+        self._chapters.append(int(metadata.get("chapter", 0) or 0))
+        self._lengths.append(len(tokens))
+        self._alive.append(1)
+        self._slot_by_id[node_id] = slot
+        self._total_length += len(tokens)
+
+        term_freqs: Dict[str, int] = {}
+        for token in tokens:
+            term_freqs[token] = term_freqs.get(token, 0) + 1
+        for term, freq in term_freqs.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = (array("I"), array("I"))
+                self._postings[term] = posting
+            posting[0].append(slot)
+            posting[1].append(freq)
+
+    def remove(self, node_ids: Iterable[str]) -> int:
+        """删除分块，返回实际删除的数量"""
+        removed = 0
+        for node_id in node_ids:
+            slot = self._slot_by_id.pop(node_id, None)
+            if slot is None:
+                continue
+            self._alive[slot] = 0
+            self._total_length -= self._lengths[slot]
+            self._texts[slot] = None
+            self._metadatas[slot] = None
+            removed += 1
+
+        # 失效文档超过一半时压缩，避免倒排表无限增长
+        if removed and len(self._node_ids) > 2 * max(len(self._slot_by_id), 32):
+            self._compact()
+        return removed
+
+    def remove_chapter(self, chapter: int) -> int:
+        """删除某一章节的全部分块"""
+        node_ids = [
+            node_id for node_id, slot in self._slot_by_id.items()
+            if self._chapters[slot] == chapter
+        ]
+        return self.remove(node_ids)
+
+    def _compact(self) -> None:
+        """重建索引，丢弃已删除的文档"""
+        live = [
+            (self._node_ids[slot], self._texts[slot], self._metadatas[slot])
+            for slot in self._slot_by_id.values()
+        ]
+        self._reset()
+        for node_id, text, metadata in live:
+            self.add(node_id, text, metadata)
+
+    def search(self, query: str, top_k: int, max_chapter: Optional[int] = None) -> List[KeywordHit]:
+        """
+        BM25检索
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+            max_chapter: 最大章节号（用于过滤）
+
+        Returns:
+            按得分降序的命中列表
+        """
+        doc_count = len(self._slot_by_id)
+        if doc_count == 0 or top_k <= 0:
+            return []
+
+        avg_length = self._total_length / doc_count if doc_count else 0.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            slots, freqs = posting
+            live = [(slot, freq) for slot, freq in zip(slots, freqs) if self._alive[slot]]
+            if not live:
+                continue
+            idf = math.log(1 + (doc_count - len(live) + 0.5) / (len(live) + 0.5))
+            for slot, freq in live:
+                if max_chapter is not None and self._chapters[slot] > max_chapter:
+                    continue
+                norm = 1 - self.b + self.b * (self._lengths[slot] / avg_length if avg_length else 0.0)
+                scores[slot] = scores.get(slot, 0.0) + idf * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            KeywordHit(self._node_ids[slot], score, self._texts[slot], self._metadatas[slot])
+            for slot, score in ranked
+        ]
+
+
+class KeywordIndex:
+    """按小说划分的关键词索引集合
+
+    已加载的小说按LRU保留有限个数，被淘汰的小说在下次检索时重新从向量库加载。
+    加载期间（读取向量库快照到安装索引之间）到达的增删会先缓冲，安装时按顺序重放，
+    避免快照之后写入的分块丢失。检索只在取索引引用时持有全局锁，打分使用各小说自己的锁。
+    """
+
+    def __init__(self, max_novels: int = 256):
+        """
+        Args:
+            max_novels: 同时保留在内存中的小说数上限
+        """
+        self.max_novels = max(1, max_novels)
+        self._novels: "OrderedDict[int, NovelKeywordIndex]" = OrderedDict()
+        self._novel_locks: Dict[int, threading.Lock] = {}
+        # 正在加载的小说：加载者数量与加载期间缓冲的操作
+        self._loaders: Dict[int, int] = {}
+        self._pending: Dict[int, List[Tuple[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self.evicted = 0
+
+    def is_loaded(self, novel_id: int) -> bool:
+        """该小说的索引是否已在内存中"""
+        return novel_id in self._novels
+
+    def begin_load(self, novel_id: int) -> None:
+        """开始加载（在读取向量库快照之前调用），此后的增删会被缓冲直到 load/abort_load"""
+        with self._lock:
+            self._loaders[novel_id] = self._loaders.get(novel_id, 0) + 1
+            self._pending.setdefault(novel_id, [])
+
+    def abort_load(self, novel_id: int) -> None:
+        """放弃加载（读取快照失败时调用）"""
+        with self._lock:
+            self._finish_load(novel_id)
+
+    def _finish_load(self, novel_id: int) -> List[Tuple[str, Any]]:
+        remaining = self._loaders.get(novel_id, 0) - 1
+        pending = self._pending.get(novel_id, [])
+        if remaining > 0:
+            self._loaders[novel_id] = remaining
+            return list(pending)
+        self._loaders.pop(novel_id, None)
+        self._pending.pop(novel_id, None)
+        return pending
+
+    def load(self, novel_id: int, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """
+        用 (分块ID, 文本, 元数据) 快照构建某本小说的索引
+
+        应先调用 begin_load 再读取快照；安装时重放加载期间缓冲的增删（增删按分块幂等，重放已包含在快照中的操作不影响结果）。
+        其他加载者已先完成安装时丢弃本次快照。
+        """
+        novel_index = NovelKeywordIndex()
+        for node_id, text, metadata in items:
+            novel_index.add(node_id, text or "", metadata or {})
+        with self._lock:
+            pending = self._finish_load(novel_id) if novel_id in self._loaders else []
+            if novel_id in self._novels:
+                return
+            for operation, argument in pending:
+                self._apply(novel_index, operation, argument)
+            self._novels[novel_id] = novel_index
+            self._novel_locks[novel_id] = threading.Lock()
+            self._evict()
+
+    def _evict(self) -> None:
+        """超出上限时淘汰最久未使用的小说（调用方持有锁）"""
+        while len(self._novels) > self.max_novels:
+            novel_id, _ = self._novels.popitem(last=False)
+            self._novel_locks.pop(novel_id, None)
+            self.evicted += 1
+
+    @staticmethod
+    def _apply(novel_index: NovelKeywordIndex, operation: str, argument: Any) -> int:
+        if operation == "upsert":
+            for node_id, text, metadata in argument:
+                novel_index.add(node_id, text or "", metadata or {})
+            return 0
+        if operation == "remove":
+            return novel_index.remove(argument)
+        if operation == "remove_chapter":
+            return novel_index.remove_chapter(argument)
+        novel_index._reset()
+        return 0
+
+    def _update(self, novel_id: int, operation: str, argument: Any) -> int:
+        """对已加载的小说执行增删；正在加载的小说先缓冲；未加载的小说忽略（首次检索时整体加载）"""
+        with self._lock:
+            novel_index = self._novels.get(novel_id)
+            if novel_index is None:
+                if novel_id in self._loaders:
+                    self._pending[novel_id].append((operation, argument))
+                return 0
+            novel_lock = self._novel_locks[novel_id]
+        with novel_lock:
+            return self._apply(novel_index, operation, argument)
+
+    def upsert(self, novel_id: int, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """增量写入分块"""
+        self._update(novel_id, "upsert", list(items))
+
+    def remove(self, novel_id: int, node_ids: Iterable[str]) -> int:
+        """删除指定分块"""
+        return self._update(novel_id, "remove", list(node_ids))
+
+    def remove_chapter(self, novel_id: int, chapter: int) -> int:
+        """删除某一章节的分块"""
+        return self._update(novel_id, "remove_chapter", chapter)
+
+    def drop_novel(self, novel_id: int) -> None:
+        """丢弃整本小说的索引（正在加载时清空缓冲前的快照）"""
+        with self._lock:
+            self._novels.pop(novel_id, None)
+            self._novel_locks.pop(novel_id, None)
+            if novel_id in self._loaders:
+                self._pending[novel_id].append(("clear", None))
+
+    def search(
+        self,
+        novel_id: int,
+        query: str,
+        top_k: int,
+        max_chapter: Optional[int] = None,
+    ) -> List[KeywordHit]:
+        """在某本小说内执行BM25检索"""
+        with self._lock:
+            novel_index = self._novels.get(novel_id)
+            if novel_index is None:
+                return []
+            self._novels.move_to_end(novel_id)
+            novel_lock = self._novel_locks[novel_id]
+        with novel_lock:
+            return novel_index.search(query, top_k, max_chapter=max_chapter)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回已加载的小说数与淘汰次数"""
+        with self._lock:
+            return {"loaded_novels": len(self._novels), "max_novels": self.max_novels, "evicted": self.evicted}
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    倒数排名融合（RRF）
+
+    Args:
+        rankings: 多路检索各自的ID排名列表
+        k: 平滑常数
+
+    Returns:
+        {ID: 融合得分}
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank + 1)
+    return fused
@@ -0,0 +1,74 @@
+"""
+本地哈希Embedding
+把文本的字符一元组、二元组经哈希映射到固定维度并带随机符号累加（特征哈希 / 随机投影），
+再做L2归一化。不依赖任何外部服务且结果确定，词面相近的文本向量相近，
+用于离线开发、单元测试与检索基准测试，替代Ollama。
+"""
+import hashlib
+from typing import List
+
+import numpy as np
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import Field
+
+
+def _gram_features(text: str, dim: int) -> np.ndarray:
+    """计算文本各n元组的哈希桶编号与符号"""
+    text = "".join(text.split())
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    if not grams:
+        return np.zeros((0, 2), dtype=np.int64)
+    # blake2b 8字节摘要：低位决定桶，最高位决定符号
+    digests = np.frombuffer(
+        b"".join(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest() for gram in grams),
+        dtype="<u8",
+    )
+    buckets = (digests % np.uint64(dim)).astype(np.int64)
+    signs = np.where(digests >> np.uint64(63), -1, 1).astype(np.int64)
+    return np.stack([buckets, signs], axis=1)
+
+
+def hash_embedding(text: str, dim: int = 256) -> List[float]:
+    """
+    计算单条文本的哈希向量
+
+    Args:
+        text: 文本
+        dim: 向量维度
+
+    Returns:
+        L2归一化后的向量（空文本返回全零向量）
+    """
+    features = _gram_features(text, dim)
+    vector = np.zeros(dim, dtype=np.float32)
+    if len(features):
+        np.add.at(vector, features[:, 0], features[:, 1])
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+
+class HashEmbedding(BaseEmbedding):
+    """确定性的本地哈希Embedding（不需要Ollama或模型文件）"""
+
+    dim: int = Field(default=256, description="向量维度")
+
+    def __init__(self, dim: int = 256, **kwargs):
+        super().__init__(model_name=f"hash-{dim}", dim=dim, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dim)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(text, self.dim) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return hash_embedding(query, self.dim)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return hash_embedding(query, self.dim)
@@ -0,0 +1,667 @@
+"""
+RAG NumPy向量库后端
+每本小说一个分区：向量存放在连续的内存映射文件中（float16/float32，或int8/PQ量化编码），
+ID、章节号、原文与元数据存放在SQLite附属文件中。检索时按元数据条件生成掩码，
+对候选向量做一次矩阵-向量乘积（PQ为查表）得到top-k，量化模式再用全精度副本重排。
+
+对外提供与Chroma集合一致的 get/upsert/add/delete/query/count 接口（只实现本项目用到的子集），
+可直接交给 ChromaVectorStore 包装使用，RAGService的其余代码无需区分后端。
+多个进程可共享同一目录：向量页通过操作系统页缓存共享，其他进程写入后通过SQLite的data_version感知并重新加载。
+写入（分配槽位、写向量、提交元数据）在SQLite的 BEGIN IMMEDIATE 事务中进行，同一分区同时只有一个进程在写。
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+from loguru import logger
+
+from app.services.rag_partitions import PartitionedCollection
+from app.services.rag_quantization import (
+    FLOAT_DTYPES,
+    QUANTIZED_DTYPES,
+    ProductQuantizer,
+    choose_subvectors,
+    dequantize_int8,
+    quantize_int8,
+)
+
+
+# 每次从内存映射文件取出参与计算的向量行数（限制float32临时矩阵的内存占用）
+_BLOCK_ROWS = 4096
+# 等待其他进程释放分区写锁的秒数
+_WRITE_LOCK_TIMEOUT = 30.0
+_COMPARATORS = {
+    "$eq": np.equal,
+    "$ne": np.not_equal,
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+
+def _match_value(value: Any, condition: Any) -> bool:
+    """单个元数据值是否满足条件（支持 $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin）"""
+    if not isinstance(condition, dict):
+        return value == condition
+    for operator, expected in condition.items():
+        if operator == "$in":
+            ok = value in expected
+        elif operator == "$nin":
+            ok = value not in expected
+        elif operator in _COMPARATORS:
+            try:
+                ok = bool(_COMPARATORS[operator](value, expected))
+            except TypeError:
+                ok = False
+        else:
+            raise ValueError(f"不支持的过滤操作符: {operator}")
+        if not ok:
+            return False
+    return True
+
+
+class NovelVectorPartition:
+    """单本小说的向量分区
+
+    存储精度在分区创建时确定并记录在附属文件中：
+    - float16/float32：直接存储，精确检索；
+    - int8：每个向量一个缩放系数的标量量化，常驻内存约为float32的1/4；
+    - pq：乘积量化，分块数达到训练阈值后训练码本，之前使用全精度向量检索。
+    量化模式下可在磁盘保留全精度副本（pq始终保留），近似距离筛选出候选后用全精度向量重排。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "float16",
+        keep_full_precision: bool = True,
+        rerank_factor: int = 4,
+        pq_subvectors: int = 16,
+        pq_train_size: int = 1024,
+    ):
+        """
+        打开（或创建）分区
+
+        Args:
+            path: 分区目录
+            dtype: 新建分区时的存储精度（float16/float32/int8/pq，已有分区沿用创建时的设置）
+            keep_full_precision: 新建的int8分区是否保留全精度副本用于重排
+            rerank_factor: 量化检索时按 top_k * rerank_factor 取候选做全精度重排
+            pq_subvectors: PQ子空间数（调整为维度的约数）
+            pq_train_size: 分块数达到该值时训练PQ码本
+        """
+        if dtype not in FLOAT_DTYPES + QUANTIZED_DTYPES:
+            raise ValueError(f"不支持的向量存储精度: {dtype}")
+        self.path = path
+        self.rerank_factor = max(1, rerank_factor)
+        self.pq_subvectors = pq_subvectors
+        self.pq_train_size = max(256, pq_train_size)
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, "meta.db"), timeout=_WRITE_LOCK_TIMEOUT, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, chapter INTEGER, "
+            "document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("INSERT OR IGNORE INTO info VALUES ('dtype', ?)", (dtype,))
+        self._conn.execute(
+            "INSERT OR IGNORE INTO info VALUES ('full_precision', ?)",
+            ("1" if dtype == "pq" or (dtype == "int8" and keep_full_precision) else "0",),
+        )
+        self._conn.commit()
+        self.dtype = self._info("dtype")
+        self.quantized = self.dtype in QUANTIZED_DTYPES
+        self.keep_full = self._info("full_precision") == "1"
+        self._data_version: Optional[int] = None
+        self._load()
+
+    def _info(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO info VALUES (?, ?)", (key, value))
+
+    # ------------------------------------------------------------------
+    # 加载与刷新
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        """从附属文件加载槽位信息并映射向量文件"""
+        dim = self._info("dim")
+        self.dim = int(dim) if dim else None
+        subvectors = self._info("subvectors")
+        self.code_width = int(subvectors) if subvectors else self.dim
+        rows = self._conn.execute("SELECT slot, id, chapter FROM chunks").fetchall()
+        size = max((slot for slot, _, _ in rows), default=-1) + 1
+
+        self.ids: List[Optional[str]] = [None] * size
+        self.chapters = np.zeros(size, dtype=np.int64)
+        self.alive = np.zeros(size, dtype=bool)
+        self.id_to_slot: Dict[str, int] = {}
+        for slot, chunk_id, chapter in rows:
+            self.ids[slot] = chunk_id
+            self.chapters[slot] = chapter if chapter is not None else -1
+            self.alive[slot] = True
+            self.id_to_slot[chunk_id] = slot
+        self.free_slots = [slot for slot in range(size) if not self.alive[slot]]
+
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._full: Optional[np.memmap] = None
+        self.pq: Optional[ProductQuantizer] = None
+        self.sq_norms = np.zeros(size, dtype=np.float32)
+        if self.dim:
+            self._map_vectors()
+            codebook_path = os.path.join(self.path, "codebook.npy")
+            if self.dtype == "pq" and os.path.exists(codebook_path):
+                self.pq = ProductQuantizer(np.load(codebook_path))
+            if self.dtype != "pq":
+                live = np.flatnonzero(self.alive)
+                for start in range(0, len(live), _BLOCK_ROWS):
+                    block = live[start:start + _BLOCK_ROWS]
+                    approx = self._approx_vectors(block)
+                    self.sq_norms[block] = np.einsum("ij,ij->i", approx, approx)
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _memmap(self, name: str, dtype: Any, width: int, capacity: int) -> np.memmap:
+        """映射单个存储文件，文件不足capacity行时补齐"""
+        file_path = os.path.join(self.path, name)
+        row_bytes = max(1, width) * np.dtype(dtype).itemsize
+        if not os.path.exists(file_path):
+            open(file_path, "wb").close()
+        if os.path.getsize(file_path) < capacity * row_bytes:
+            with open(file_path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+        shape = (capacity, width) if width else (capacity,)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=shape)
+
+    def _map_vectors(self, capacity: Optional[int] = None) -> None:
+        """映射编码、缩放系数与全精度副本文件（容量由编码文件大小决定）"""
+        code_dtype = {"int8": np.int8, "pq": np.uint8}.get(self.dtype, self.dtype)
+        if capacity is None:
+            codes_path = os.path.join(self.path, "vectors.bin")
+            row_bytes = self.code_width * np.dtype(code_dtype).itemsize
+            existing = os.path.getsize(codes_path) // row_bytes if os.path.exists(codes_path) else 0
+            capacity = max(64, existing)
+        self._codes = self._memmap("vectors.bin", code_dtype, self.code_width, capacity)
+        if self.dtype == "int8":
+            self._scales = self._memmap("scales.bin", np.float32, 0, capacity)
+        if self.keep_full:
+            self._full = self._memmap("full.bin", np.float32, self.dim, capacity)
+
+    def _flush(self) -> None:
+        for mapped in (self._codes, self._scales, self._full):
+            if mapped is not None:
+                mapped.flush()
+
+    def _refresh(self) -> None:
+        """其他进程写入过该分区时重新加载"""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._load()
+
+    @contextmanager
+    def _write_transaction(self) -> Iterator[None]:
+        """
+        跨进程写锁（调用方持有线程锁）
+
+        BEGIN IMMEDIATE 取得SQLite保留锁，其他进程的写入在此期间等待；进入后先重新加载，
+        槽位分配基于最新的槽位表，向量与元数据在同一个临界区内写入并提交。
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._refresh()
+            yield
+        except BaseException:
+            self._conn.rollback()
+            # 内存中的槽位表可能已改动，下次使用时从SQLite重新加载
+            self._data_version = None
+            raise
+        self._conn.commit()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _ensure_capacity(self, size: int) -> None:
+        """存储文件容量不足时按倍数扩容"""
+        capacity = self._codes.shape[0]
+        if size <= capacity:
+            return
+        self._flush()
+        self._codes = self._scales = self._full = None
+        self._map_vectors(max(size, capacity * 2))
+
+    def _grow_arrays(self, size: int) -> None:
+        extra = size - len(self.ids)
+        if extra <= 0:
+            return
+        self.ids.extend([None] * extra)
+        self.chapters = np.concatenate([self.chapters, np.full(extra, -1, dtype=np.int64)])
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self.sq_norms = np.concatenate([self.sq_norms, np.zeros(extra, dtype=np.float32)])
+
+    def _approx_vectors(self, slots: np.ndarray) -> np.ndarray:
+        """按存储编码还原向量（浮点模式即为原值）"""
+        if self.dtype == "int8":
+            return dequantize_int8(self._codes[slots], self._scales[slots])
+        if self.dtype == "pq":
+            if self.pq is None:
+                return self._full[slots].astype(np.float32)
+            return self.pq.decode(self._codes[slots])
+        return self._codes[slots].astype(np.float32)
+
+    def _vectors_for(self, slots: np.ndarray) -> np.ndarray:
+        """读取向量（优先使用全精度副本）"""
+        if self._full is not None:
+            return np.asarray(self._full[slots], dtype=np.float32)
+        return self._approx_vectors(slots)
+
+    def _train_pq(self) -> None:
+        """用全部全精度向量训练PQ码本并对已有分块编码"""
+        live = np.flatnonzero(self.alive)
+        quantizer = ProductQuantizer.train(self._full[live], self.code_width)
+        codebook_path = os.path.join(self.path, "codebook.npy")
+        tmp_path = f"{codebook_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, quantizer.codebook)
+        os.replace(tmp_path, codebook_path)
+        for start in range(0, len(live), _BLOCK_ROWS):
+            block = live[start:start + _BLOCK_ROWS]
+            self._codes[block] = quantizer.encode(self._full[block])
+        self._codes.flush()
+        self.pq = quantizer
+        # 写入info让其他进程感知并重新加载码本（随写事务提交）
+        self._set_info("pq_trained", str(len(live)))
+        logger.info(f"✅ PQ码本训练完成：{self.path}（{len(live)}个向量，{self.code_width}个子空间）")
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self.id_to_slot)
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Iterable[Iterable[float]],
+        documents: List[Optional[str]],
+        metadatas: List[Dict[str, Any]],
+    ) -> None:
+        """写入（或覆盖）分块"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("向量数量与ID数量不一致")
+
+        with self._lock, self._write_transaction():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.code_width = choose_subvectors(self.dim, self.pq_subvectors) if self.dtype == "pq" else self.dim
+                self._set_info("dim", str(self.dim))
+                self._set_info("subvectors", str(self.code_width))
+                self._map_vectors()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配：期望{self.dim}，实际{vectors.shape[1]}")
+
+            slots = []
+            for chunk_id in ids:
+                slot = self.id_to_slot.get(chunk_id)
+                if slot is None:
+                    slot = self.free_slots.pop() if self.free_slots else len(self.ids)
+                    self._grow_arrays(slot + 1)
+                    self.id_to_slot[chunk_id] = slot
+                    self.ids[slot] = chunk_id
+                slots.append(slot)
+            slot_array = np.asarray(slots, dtype=np.int64)
+
+            # 先写向量再提交元数据，其他进程看到元数据时向量已就绪
+            self._ensure_capacity(len(self.ids))
+            if self._full is not None:
+                self._full[slot_array] = vectors
+            if self.dtype == "int8":
+                codes, scales = quantize_int8(vectors)
+                self._codes[slot_array] = codes
+                self._scales[slot_array] = scales
+            elif self.dtype == "pq":
+                if self.pq is not None:
+                    self._codes[slot_array] = self.pq.encode(vectors)
+            else:
+                self._codes[slot_array] = vectors.astype(self.dtype)
+            self._flush()
+            if self.dtype != "pq":
+                approx = self._approx_vectors(slot_array)
+                self.sq_norms[slot_array] = np.einsum("ij,ij->i", approx, approx)
+
+            chapters = [int((metadata or {}).get("chapter", -1)) for metadata in metadatas]
+            self.chapters[slot_array] = chapters
+            self.alive[slot_array] = True
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (slot, id, chapter, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (slot, chunk_id, chapter, document, json.dumps(metadata or {}, ensure_ascii=False))
+                    for slot, chunk_id, chapter, document, metadata in zip(
+                        slots, ids, chapters, documents, metadatas
+                    )
+                ],
+            )
+
+            if self.dtype == "pq" and self.pq is None and len(self.id_to_slot) >= self.pq_train_size:
+                self._train_pq()
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> int:
+        """只更新已有分块的元数据（向量不变，不存在的ID忽略），返回更新数量"""
+        with self._lock, self._write_transaction():
+            rows = []
+            for chunk_id, metadata in zip(ids, metadatas):
+                slot = self.id_to_slot.get(chunk_id)
+                if slot is None:
+                    continue
+                chapter = int((metadata or {}).get("chapter", -1))
+                self.chapters[slot] = chapter
+                rows.append((chapter, json.dumps(metadata or {}, ensure_ascii=False), slot))
+            if rows:
+                self._conn.executemany("UPDATE chunks SET chapter = ?, metadata = ? WHERE slot = ?", rows)
+            return len(rows)
+
+    def delete(self, novel_id: int, ids: Optional[Iterable[str]] = None,
+               where: Optional[Dict[str, Any]] = None) -> int:
+        """
+        删除分块，槽位留待复用
+
+        在写锁内按最新的槽位表定位，避免按其他进程写入前的旧映射删错分块。
+
+        Args:
+            novel_id: 分区所属小说ID（用于匹配where条件）
+            ids: 分块ID，None表示不按ID限定
+            where: 元数据条件
+
+        Returns:
+            删除数量
+        """
+        with self._lock, self._write_transaction():
+            if ids is None:
+                slots = np.flatnonzero(self._where_mask(novel_id, where) & self.alive).tolist()
+            else:
+                slots = [self.id_to_slot[chunk_id] for chunk_id in ids if chunk_id in self.id_to_slot]
+                if where:
+                    allowed = self._where_mask(novel_id, where)
+                    slots = [slot for slot in slots if allowed[slot]]
+            if not slots:
+                return 0
+            self._conn.executemany("DELETE FROM chunks WHERE slot = ?", [(slot,) for slot in slots])
+            for slot in slots:
+                self.id_to_slot.pop(self.ids[slot], None)
+                self.ids[slot] = None
+                self.alive[slot] = False
+                self.chapters[slot] = -1
+                self.free_slots.append(slot)
+            return len(slots)
+
+    def select(self, novel_id: int, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """返回满足条件的槽位（升序）"""
+        with self._lock:
+            self._refresh()
+            mask = self._where_mask(novel_id, where)
+            return np.flatnonzero(mask & self.alive)
+
+    def _where_mask(self, novel_id: int, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """把where条件转换为槽位掩码：novel_id与chapter直接向量化计算，其余字段逐条匹配元数据"""
+        size = len(self.ids)
+        if not where:
+            return np.ones(size, dtype=bool)
+
+        mask = np.ones(size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(novel_id, clause)
+            elif key == "$or":
+                either = np.zeros(size, dtype=bool)
+                for clause in condition:
+                    either |= self._where_mask(novel_id, clause)
+                mask &= either
+            elif key == "novel_id":
+                if not _match_value(novel_id, condition):
+                    mask[:] = False
+            elif key == "chapter":
+                mask &= self._chapter_mask(condition)
+            else:
+                metadatas = self._metadatas(np.flatnonzero(self.alive))
+                field_mask = np.zeros(size, dtype=bool)
+                for slot, metadata in metadatas.items():
+                    field_mask[slot] = _match_value(metadata.get(key), condition)
+                mask &= field_mask
+        return mask
+
+    def _chapter_mask(self, condition: Any) -> np.ndarray:
+        if not isinstance(condition, dict):
+            return self.chapters == condition
+        mask = np.ones(len(self.ids), dtype=bool)
+        for operator, expected in condition.items():
+            if operator == "$in":
+                mask &= np.isin(self.chapters, list(expected))
+            elif operator == "$nin":
+                mask &= ~np.isin(self.chapters, list(expected))
+            elif operator in _COMPARATORS:
+                mask &= _COMPARATORS[operator](self.chapters, expected)
+            else:
+                raise ValueError(f"不支持的过滤操作符: {operator}")
+        return mask
+
+    def _metadatas(self, slots: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        return {slot: metadata for slot, (_, metadata) in self._rows(slots).items()}
+
+    def _rows(self, slots: Iterable[int]) -> Dict[int, tuple]:
+        """按槽位读取 (原文, 元数据)"""
+        slots = [int(slot) for slot in slots]
+        rows: Dict[int, tuple] = {}
+        for start in range(0, len(slots), 500):
+            part = slots[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for slot, document, metadata in self._conn.execute(
+                f"SELECT slot, document, metadata FROM chunks WHERE slot IN ({placeholders})", part
+            ):
+                rows[slot] = (document, json.loads(metadata) if metadata else {})
+        return rows
+
+    def fetch(self, slots: Iterable[int], include: Iterable[str]) -> Dict[str, Any]:
+        """按槽位读取Chroma格式的结果字段"""
+        slots = [int(slot) for slot in slots]
+        include = set(include)
+        with self._lock:
+            rows = self._rows(slots) if include & {"documents", "metadatas"} else {}
+            result: Dict[str, Any] = {"ids": [self.ids[slot] for slot in slots]}
+            result["documents"] = [rows[slot][0] for slot in slots] if "documents" in include else None
+            result["metadatas"] = [rows[slot][1] for slot in slots] if "metadatas" in include else None
+            result["embeddings"] = None
+            if "embeddings" in include:
+                result["embeddings"] = self._vectors_for(np.asarray(slots, dtype=np.int64)).tolist() if slots else []
+            return result
+
+    def search(self, query: np.ndarray, n_results: int, novel_id: int, where: Optional[Dict[str, Any]]):
+        """
+        top-k检索（平方L2距离，与Chroma默认度量一致）
+
+        浮点模式为精确检索；量化模式先用近似距离取 top_k * rerank_factor 个候选，
+        有全精度副本时再用全精度向量重排，返回的距离为重排后的精确距离。
+
+        Returns:
+            (槽位数组, 距离数组)，按距离升序
+        """
+        with self._lock:
+            self._refresh()
+            if self.dim is None or n_results <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            if len(query) != self.dim:
+                raise ValueError(f"查询向量维度不匹配：期望{self.dim}，实际{len(query)}")
+
+            candidates = np.flatnonzero(self._where_mask(novel_id, where) & self.alive)
+            if len(candidates) == 0:
+                return candidates, np.empty(0, dtype=np.float32)
+
+            exact = self.dtype in FLOAT_DTYPES or (self.dtype == "pq" and self.pq is None)
+            distances = self._distances(query, candidates, approximate=not exact)
+
+            if not exact and self._full is not None:
+                shortlist = self._top(distances, n_results * self.rerank_factor)
+                candidates = candidates[shortlist]
+                distances = self._distances(query, candidates, approximate=False)
+
+            top = self._top(distances, n_results)
+            return candidates[top], np.maximum(distances[top], 0.0)
+
+    def _distances(self, query: np.ndarray, slots: np.ndarray, approximate: bool) -> np.ndarray:
+        """分块计算候选的平方L2距离：|x-q|² = |x|² + |q|² - 2x·q，PQ模式查表计算"""
+        distances = np.empty(len(slots), dtype=np.float32)
+        query_sq = float(query @ query)
+        table = self.pq.distance_table(query) if approximate and self.dtype == "pq" else None
+
+        for start in range(0, len(slots), _BLOCK_ROWS):
+            block = slots[start:start + _BLOCK_ROWS]
+            if table is not None:
+                distances[start:start + len(block)] = self.pq.distances(table, self._codes[block])
+            elif approximate:
+                # int8：先用整数编码做乘积，再乘以各向量的缩放系数
+                dots = (self._codes[block].astype(np.float32) @ query) * self._scales[block]
+                distances[start:start + len(block)] = self.sq_norms[block] + query_sq - 2 * dots
+            elif self.dtype in FLOAT_DTYPES:
+                dots = self._codes[block].astype(np.float32) @ query
+                distances[start:start + len(block)] = self.sq_norms[block] + query_sq - 2 * dots
+            else:
+                rows = np.asarray(self._full[block], dtype=np.float32) - query
+                distances[start:start + len(block)] = np.einsum("ij,ij->i", rows, rows)
+        return distances
+
+    @staticmethod
+    def _top(distances: np.ndarray, k: int) -> np.ndarray:
+        """距离最小的k个下标（升序）"""
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        return top[np.argsort(distances[top], kind="stable")]
+
+    def stats(self) -> Dict[str, Any]:
+        """返回分区的存储统计"""
+        with self._lock:
+            self._refresh()
+            capacity = self._codes.shape[0] if self._codes is not None else 0
+            resident = sum(m.nbytes for m in (self._codes, self._scales) if m is not None)
+            return {
+                "dtype": self.dtype,
+                "dim": self.dim,
+                "count": len(self.id_to_slot),
+                "capacity": capacity,
+                "resident_bytes": resident,
+                "full_precision_bytes": self._full.nbytes if self._full is not None else 0,
+                "pq_trained": self.pq is not None if self.dtype == "pq" else None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._codes = self._scales = self._full = None
+            self._conn.close()
+
+
+class NumpyVectorCollection(PartitionedCollection):
+    """按小说分区的NumPy向量集合（接口与Chroma集合兼容）"""
+
+    def __init__(
+        self,
+        root: str,
+        name: str,
+        dtype: str = "float16",
+        max_open_partitions: int = 64,
+        **partition_options: Any,
+    ):
+        """
+        初始化集合
+
+        Args:
+            root: 存储根目录
+            name: 集合名称（同一根目录下不同名称互不影响）
+            dtype: 新建分区的存储精度（float16/float32/int8/pq）
+            max_open_partitions: 同时保持打开的分区上限
+            **partition_options: 传给分区的量化选项（keep_full_precision/rerank_factor/pq_subvectors/pq_train_size）
+        """
+        if dtype not in FLOAT_DTYPES + QUANTIZED_DTYPES:
+            raise ValueError(f"不支持的向量存储精度: {dtype}")
+        super().__init__(name, max_open_partitions=max_open_partitions)
+        self.dtype = dtype
+        self.partition_options = partition_options
+        self.path = os.path.join(root, name)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _partition_path(self, novel_id: int) -> str:
+        return os.path.join(self.path, f"novel_{novel_id}")
+
+    def _open_partition(self, novel_id: int, create: bool) -> Optional[NovelVectorPartition]:
+        path = self._partition_path(novel_id)
+        if not create and not os.path.isdir(path):
+            return None
+        return NovelVectorPartition(path, dtype=self.dtype, **self.partition_options)
+
+    def _close_partition(self, partition: NovelVectorPartition) -> None:
+        partition.close()
+
+    def _delete_partition(self, novel_id: int) -> None:
+        shutil.rmtree(self._partition_path(novel_id), ignore_errors=True)
+
+    def _stored_novel_ids(self) -> List[int]:
+        novel_ids = []
+        for entry in os.listdir(self.path):
+            suffix = entry[len("novel_"):] if entry.startswith("novel_") else ""
+            if suffix.isdigit():
+                novel_ids.append(int(suffix))
+        return sorted(novel_ids)
+
+    def _partition_count(self, partition: NovelVectorPartition) -> int:
+        return partition.count()
+
+    def _partition_upsert(self, partition: NovelVectorPartition, ids, embeddings, documents, metadatas) -> None:
+        partition.upsert(ids, embeddings, documents, metadatas)
+
+    def _partition_get(self, partition: NovelVectorPartition, novel_id, ids, where, include) -> Dict[str, Any]:
+        slots = partition.select(novel_id, where)
+        if ids is not None:
+            wanted = set(ids)
+            slots = [slot for slot in slots if partition.ids[slot] in wanted]
+        return partition.fetch(slots, include)
+
+    def _partition_delete(self, partition: NovelVectorPartition, novel_id, ids, where) -> None:
+        partition.delete(novel_id, ids, where)
+
+    def _partition_update(self, partition: NovelVectorPartition, ids, metadatas) -> None:
+        partition.update_metadata(ids, metadatas)
+
+    def _partition_query(self, partition: NovelVectorPartition, novel_id, query, n_results, where, include):
+        slots, distances = partition.search(query, n_results, novel_id, where)
+        result = partition.fetch(slots, include)
+        result["distances"] = distances.tolist()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """返回存储统计（只统计已打开的分区，避免为统计打开全部小说）"""
+        with self._lock:
+            opened = [partition.stats() for partition in self._open.values()]
+        return {
+            "backend": "numpy",
+            "dtype": self.dtype,
+            **super().stats(),
+            "vectors": sum(item["count"] for item in opened),
+            "resident_bytes": sum(item["resident_bytes"] for item in opened),
+            "full_precision_bytes": sum(item["full_precision_bytes"] for item in opened),
+        }
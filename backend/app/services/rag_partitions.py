@@ -0,0 +1,484 @@
+"""
+RAG向量分区
+按小说把向量拆分到独立分区（Chroma后端为每本小说一个集合，NumPy后端为每本小说一个目录），
+检索和按章节删除只访问目标小说的分区，代价与单本小说的规模相关，而不是与全平台数据量相关。
+
+分区在首次访问时打开，已打开的分区按LRU保留有限个数；删除整本小说时直接丢弃其分区。
+NumPy后端关闭分区时释放内存映射；Chroma后端的LRU只限制缓存的集合句柄数，
+索引段的加载与卸载由Chroma自身管理（见 RAG_CHROMA_MEMORY_LIMIT_BYTES）。
+对外提供与Chroma集合一致的 get/upsert/add/update/delete/query/count 接口，可直接交给 ChromaVectorStore 包装。
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+import threading
+
+import numpy as np
+from loguru import logger
+
+
+def novel_ids_in_where(where: Optional[Dict[str, Any]]) -> Optional[Set[int]]:
+    """
+    从where条件中推断涉及的小说ID
+
+    Returns:
+        小说ID集合；条件不限定小说时返回None（需要扫描全部分区）
+    """
+    if not where:
+        return None
+    constrained: Optional[Set[int]] = None
+    for key, condition in where.items():
+        ids: Optional[Set[int]] = None
+        if key == "$and":
+            for clause in condition:
+                clause_ids = novel_ids_in_where(clause)
+                if clause_ids is not None:
+                    ids = clause_ids if ids is None else ids & clause_ids
+        elif key == "$or":
+            parts = [novel_ids_in_where(clause) for clause in condition]
+            if parts and all(part is not None for part in parts):
+                ids = set().union(*parts)
+        elif key == "novel_id":
+            if not isinstance(condition, dict):
+                ids = {condition}
+            elif set(condition) == {"$eq"}:
+                ids = {condition["$eq"]}
+            elif set(condition) == {"$in"}:
+                ids = set(condition["$in"])
+        if ids is not None:
+            constrained = ids if constrained is None else constrained & ids
+    return constrained
+
+
+def _only_novel_filter(where: Optional[Dict[str, Any]]) -> Optional[int]:
+    """where条件只限定单本小说时返回其ID"""
+    if not where or set(where) != {"novel_id"}:
+        return None
+    novel_ids = novel_ids_in_where(where)
+    return next(iter(novel_ids)) if novel_ids and len(novel_ids) == 1 else None
+
+
+class PartitionedCollection:
+    """按小说分区的向量集合基类
+
+    子类实现分区的打开、关闭、删除、枚举以及分区内的读写检索；
+    路由、结果合并与已打开分区的LRU管理由基类完成。
+    """
+
+    def __init__(self, name: str, max_open_partitions: int = 64):
+        """
+        Args:
+            name: 集合名称
+            max_open_partitions: 同时保持打开的分区上限（正在使用的分区不会被关闭）
+        """
+        self.name = name
+        self.max_open_partitions = max(1, max_open_partitions)
+        self._open: "OrderedDict[int, Any]" = OrderedDict()
+        self._in_use: Dict[int, int] = {}
+        # 正在删除的分区：新的使用者等待删除完成，删除方等待已有使用者释放
+        self._dropping: Set[int] = set()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self.opened = 0
+        self.evicted = 0
+
+    # ------------------------------------------------------------------
+    # 子类实现
+    # ------------------------------------------------------------------
+
+    def _open_partition(self, novel_id: int, create: bool) -> Optional[Any]:
+        """打开分区；不存在且create为False时返回None"""
+        raise NotImplementedError
+
+    def _close_partition(self, partition: Any) -> None:
+        """关闭分区（释放文件句柄等资源）"""
+
+    def _delete_partition(self, novel_id: int) -> None:
+        """删除分区的持久化数据"""
+        raise NotImplementedError
+
+    def _stored_novel_ids(self) -> List[int]:
+        """已持久化的全部分区"""
+        raise NotImplementedError
+
+    def _partition_count(self, partition: Any) -> int:
+        raise NotImplementedError
+
+    def _partition_upsert(self, partition: Any, ids, embeddings, documents, metadatas) -> None:
+        raise NotImplementedError
+
+    def _partition_get(self, partition: Any, novel_id: int, ids, where, include) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _partition_delete(self, partition: Any, novel_id: int, ids, where) -> None:
+        raise NotImplementedError
+
+    def _partition_update(self, partition: Any, ids, metadatas) -> None:
+        """只更新已有分块的元数据（不存在的ID忽略）"""
+        raise NotImplementedError
+
+    def _partition_query(self, partition: Any, novel_id: int, query, n_results: int, where, include) -> Dict[str, Any]:
+        """单个查询向量的检索结果（ids/distances/documents/metadatas/embeddings 均为一维列表）"""
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    # 分区管理
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _use(self, novel_id: int, create: bool = False) -> Iterator[Optional[Any]]:
+        """使用分区期间将其标记为占用，避免被LRU关闭"""
+        partition = self._acquire(novel_id, create)
+        try:
+            yield partition
+        finally:
+            if partition is not None:
+                self._release(novel_id)
+
+    def _acquire(self, novel_id: int, create: bool) -> Optional[Any]:
+        with self._lock:
+            while novel_id in self._dropping:
+                self._released.wait()
+            partition = self._open.get(novel_id)
+            if partition is None:
+                partition = self._open_partition(novel_id, create)
+                if partition is None:
+                    return None
+                self._open[novel_id] = partition
+                self.opened += 1
+            self._open.move_to_end(novel_id)
+            self._in_use[novel_id] = self._in_use.get(novel_id, 0) + 1
+            return partition
+
+    def _release(self, novel_id: int) -> None:
+        with self._lock:
+            remaining = self._in_use.get(novel_id, 1) - 1
+            if remaining > 0:
+                self._in_use[novel_id] = remaining
+            else:
+                self._in_use.pop(novel_id, None)
+                self._released.notify_all()
+            # 超出上限时按最久未使用的顺序关闭空闲分区
+            for candidate in list(self._open):
+                if len(self._open) <= self.max_open_partitions:
+                    break
+                if candidate not in self._in_use:
+                    self._close_partition(self._open.pop(candidate))
+                    self.evicted += 1
+
+    def _target_novel_ids(self, where: Optional[Dict[str, Any]]) -> List[int]:
+        novel_ids = novel_ids_in_where(where)
+        return sorted(novel_ids) if novel_ids is not None else self._stored_novel_ids()
+
+    def _route_ids(self, ids: List[str], where: Optional[Dict[str, Any]]) -> Dict[int, List[str]]:
+        """
+        按ID定位分区
+
+        分块ID以 "{novel_id}_" 开头，按前缀定位分区；其他ID分配到条件涉及的全部分区。
+        where限定了小说时，前缀指向其他小说的ID直接忽略。
+        """
+        allowed = novel_ids_in_where(where)
+        routed: Dict[int, List[str]] = {}
+        unrouted: List[str] = []
+        for chunk_id in ids:
+            prefix = chunk_id.split("_", 1)[0]
+            if not prefix.isdigit():
+                unrouted.append(chunk_id)
+            elif allowed is None or int(prefix) in allowed:
+                routed.setdefault(int(prefix), []).append(chunk_id)
+        if unrouted:
+            for target in self._target_novel_ids(where):
+                routed.setdefault(target, []).extend(unrouted)
+        return routed
+
+    def novel_ids(self) -> List[int]:
+        """已持久化分区对应的小说ID"""
+        return self._stored_novel_ids()
+
+    def drop_partition(self, novel_id: int) -> int:
+        """
+        删除整本小说的分区
+
+        先阻止新的使用者，等正在使用该分区的检索/写入全部释放后再关闭并删除数据。
+
+        Args:
+            novel_id: 小说ID
+
+        Returns:
+            删除的向量数量
+        """
+        with self._lock:
+            while novel_id in self._dropping:
+                self._released.wait()
+            self._dropping.add(novel_id)
+            try:
+                while novel_id in self._in_use:
+                    self._released.wait()
+                partition = self._open.pop(novel_id, None)
+                if partition is None:
+                    partition = self._open_partition(novel_id, False)
+                if partition is None:
+                    return 0
+                count = self._partition_count(partition)
+                self._close_partition(partition)
+                self._delete_partition(novel_id)
+            finally:
+                self._dropping.discard(novel_id)
+                self._released.notify_all()
+        logger.info(f"✅ 删除小说{novel_id}的向量分区（{count}个向量）")
+        return count
+
+    # ------------------------------------------------------------------
+    # Chroma兼容接口
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        total = 0
+        for novel_id in self._stored_novel_ids():
+            with self._use(novel_id) as partition:
+                if partition is not None:
+                    total += self._partition_count(partition)
+        return total
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Iterable[Iterable[float]],
+        documents: Optional[List[Optional[str]]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """写入分块（按元数据中的novel_id分区）"""
+        embeddings = list(embeddings)
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{} for _ in ids]
+
+        groups: Dict[int, List[int]] = {}
+        for index, metadata in enumerate(metadatas):
+            novel_id = (metadata or {}).get("novel_id")
+            if novel_id is None:
+                raise ValueError("分区向量库要求元数据包含novel_id")
+            groups.setdefault(int(novel_id), []).append(index)
+
+        for novel_id, indexes in groups.items():
+            with self._use(novel_id, create=True) as partition:
+                self._partition_upsert(
+                    partition,
+                    [ids[i] for i in indexes],
+                    [embeddings[i] for i in indexes],
+                    [documents[i] for i in indexes],
+                    [metadatas[i] for i in indexes],
+                )
+
+    add = upsert
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Iterable[str] = ("metadatas", "documents"),
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """按ID和/或元数据条件读取分块"""
+        include = list(include)
+        merged: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        if ids is None:
+            targets = {novel_id: None for novel_id in self._target_novel_ids(where)}
+        else:
+            targets = self._route_ids(ids, where)
+        for novel_id, chunk_ids in targets.items():
+            with self._use(novel_id) as partition:
+                if partition is None:
+                    continue
+                part = self._partition_get(partition, novel_id, chunk_ids, where, include)
+            for key in merged:
+                values = part.get(key)
+                if values is not None:
+                    merged[key].extend(values)
+
+        start = offset or 0
+        end = start + limit if limit is not None else None
+        return {
+            "ids": merged["ids"][start:end],
+            "documents": merged["documents"][start:end] if "documents" in include else None,
+            "metadatas": merged["metadatas"][start:end] if "metadatas" in include else None,
+            "embeddings": merged["embeddings"][start:end] if "embeddings" in include else None,
+        }
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]], **kwargs: Any) -> None:
+        """只更新元数据（按ID前缀定位分区，保留已有向量）"""
+        metadata_by_id = dict(zip(ids, metadatas))
+        for target, chunk_ids in self._route_ids(ids, None).items():
+            with self._use(target) as partition:
+                if partition is not None:
+                    self._partition_update(partition, chunk_ids, [metadata_by_id[i] for i in chunk_ids])
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        """按ID和/或元数据条件删除；条件只限定小说时直接删除整个分区"""
+        novel_id = _only_novel_filter(where)
+        if ids is None and novel_id is not None:
+            self.drop_partition(novel_id)
+            return
+
+        if ids is None:
+            for target in self._target_novel_ids(where):
+                with self._use(target) as partition:
+                    if partition is not None:
+                        self._partition_delete(partition, target, None, where)
+            return
+
+        for target, chunk_ids in self._route_ids(ids, where).items():
+            with self._use(target) as partition:
+                if partition is not None:
+                    self._partition_delete(partition, target, chunk_ids, where)
+
+    def query(
+        self,
+        query_embeddings: Any,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Iterable[str] = ("metadatas", "documents", "distances"),
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """在目标分区内检索并按距离合并，返回Chroma格式（每个查询向量一组结果）"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        include = set(include) | {"documents", "metadatas", "distances"}
+        targets = self._target_novel_ids(where)
+
+        result: Dict[str, Any] = {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": []}
+        for query in queries:
+            hits = []
+            for novel_id in targets:
+                with self._use(novel_id) as partition:
+                    if partition is None:
+                        continue
+                    part = self._partition_query(partition, novel_id, query, n_results, where, include)
+                embeddings = part.get("embeddings")
+                if embeddings is None:
+                    embeddings = [None] * len(part["ids"])
+                hits.extend(zip(part["distances"], part["ids"], part["documents"], part["metadatas"], embeddings))
+            hits.sort(key=lambda hit: hit[0])
+            hits = hits[:n_results]
+            result["distances"].append([hit[0] for hit in hits])
+            result["ids"].append([hit[1] for hit in hits])
+            result["documents"].append([hit[2] for hit in hits])
+            result["metadatas"].append([hit[3] for hit in hits])
+            result["embeddings"].append([hit[4] for hit in hits])
+
+        if "embeddings" not in include:
+            result["embeddings"] = None
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """返回分区统计"""
+        with self._lock:
+            return {
+                "stored_partitions": len(self._stored_novel_ids()),
+                "open_partitions": len(self._open),
+                "max_open_partitions": self.max_open_partitions,
+                "partitions_opened": self.opened,
+                "partitions_evicted": self.evicted,
+            }
+
+    def close(self) -> None:
+        """关闭所有已打开的分区"""
+        with self._lock:
+            for partition in self._open.values():
+                self._close_partition(partition)
+            self._open.clear()
+
+
+class ChromaPartitionedCollection(PartitionedCollection):
+    """每本小说一个Chroma集合"""
+
+    def __init__(
+        self,
+        client,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        max_open_partitions: int = 64,
+    ):
+        """
+        Args:
+            client: Chroma客户端
+            name: 集合名称前缀（分区集合名为 "{name}_n{novel_id}"）
+            metadata: 新建分区集合的元数据
+            max_open_partitions: 同时保持打开的分区上限
+        """
+        super().__init__(name, max_open_partitions=max_open_partitions)
+        self.client = client
+        self.metadata = metadata
+        self._prefix = f"{name}_n"
+
+    def _partition_name(self, novel_id: int) -> str:
+        return f"{self._prefix}{novel_id}"
+
+    def _open_partition(self, novel_id: int, create: bool):
+        if create:
+            return self.client.get_or_create_collection(name=self._partition_name(novel_id), metadata=self.metadata)
+        try:
+            return self.client.get_collection(name=self._partition_name(novel_id))
+        except Exception:  # noqa: BLE001  不同版本的Chroma抛出ValueError或NotFoundError
+            return None
+
+    def _close_partition(self, partition) -> None:
+        """Chroma没有关闭单个集合的接口，这里只丢弃句柄；索引段由Chroma按内存上限LRU卸载"""
+
+    def _delete_partition(self, novel_id: int) -> None:
+        try:
+            self.client.delete_collection(name=self._partition_name(novel_id))
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"删除Chroma分区集合失败（小说{novel_id}）: {e}")
+
+    def _stored_novel_ids(self) -> List[int]:
+        novel_ids = []
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)
+            suffix = name[len(self._prefix):] if name.startswith(self._prefix) else ""
+            if suffix.isdigit():
+                novel_ids.append(int(suffix))
+        return sorted(novel_ids)
+
+    def _partition_count(self, partition) -> int:
+        return partition.count()
+
+    def _partition_upsert(self, partition, ids, embeddings, documents, metadatas) -> None:
+        partition.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def _partition_get(self, partition, novel_id, ids, where, include) -> Dict[str, Any]:
+        return partition.get(ids=ids, where=where or None, include=include)
+
+    def _partition_delete(self, partition, novel_id, ids, where) -> None:
+        partition.delete(ids=ids, where=where or None)
+
+    def _partition_update(self, partition, ids, metadatas) -> None:
+        existing = set(partition.get(ids=ids, include=[])["ids"])
+        pairs = [(chunk_id, metadata) for chunk_id, metadata in zip(ids, metadatas) if chunk_id in existing]
+        if pairs:
+            partition.update(ids=[chunk_id for chunk_id, _ in pairs], metadatas=[metadata for _, metadata in pairs])
+
+    def _partition_query(self, partition, novel_id, query, n_results, where, include) -> Dict[str, Any]:
+        available = partition.count()
+        if available == 0 or n_results <= 0:
+            return {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": None}
+        results = partition.query(
+            query_embeddings=[query.tolist()],
+            n_results=min(n_results, available),
+            where=where or None,
+            include=sorted(include),
+        )
+        embeddings = results.get("embeddings")
+        return {
+            "ids": results["ids"][0],
+            "distances": results["distances"][0],
+            "documents": results["documents"][0],
+            "metadatas": results["metadatas"][0],
+            "embeddings": list(embeddings[0]) if embeddings is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "chroma", **super().stats()}
@@ -0,0 +1,152 @@
+"""
+RAG向量量化
+标量int8量化（每个向量一个缩放系数）与乘积量化（PQ，每个子空间256个质心），
+用于压缩NumPy向量库中常驻内存的向量；近似距离筛选出候选后再用全精度向量重排。
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+# 支持的存储精度：浮点直接存储，int8/pq为量化存储
+FLOAT_DTYPES = ("float16", "float32")
+QUANTIZED_DTYPES = ("int8", "pq")
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    标量int8量化
+
+    Args:
+        vectors: (n, dim) 浮点向量
+
+    Returns:
+        (int8编码, 每个向量的缩放系数)，x ≈ codes * scale
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """还原int8量化向量"""
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def choose_subvectors(dim: int, requested: int) -> int:
+    """选择不超过requested且能整除dim的最大子空间数"""
+    for m in range(min(max(1, requested), dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd k-means，返回 (k, d) 质心"""
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    data_sq = np.einsum("ij,ij->i", data, data)
+    for _ in range(iterations):
+        distances = data_sq[:, None] - 2 * data @ centroids.T + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        assignment = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # 空簇用距离当前质心最远的点重新初始化
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            farthest = distances[np.arange(len(data)), assignment].argsort()[-len(empty):]
+            centroids[empty] = data[farthest]
+    return centroids
+
+
+class ProductQuantizer:
+    """乘积量化器：把向量切成M个子向量，每个子向量用8位质心编号表示"""
+
+    def __init__(self, codebook: np.ndarray):
+        """
+        Args:
+            codebook: (M, K, dsub) 各子空间的质心
+        """
+        self.codebook = np.asarray(codebook, dtype=np.float32)
+        self.num_subvectors, self.num_centroids, self.sub_dim = self.codebook.shape
+
+    @property
+    def dim(self) -> int:
+        return self.num_subvectors * self.sub_dim
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        num_subvectors: int,
+        num_centroids: int = 256,
+        iterations: int = 15,
+        sample_size: int = 20000,
+        seed: int = 0,
+    ) -> "ProductQuantizer":
+        """
+        训练码本
+
+        Args:
+            vectors: (n, dim) 训练向量，n需不少于num_centroids
+            num_subvectors: 期望的子空间数（会调整为dim的约数）
+            num_centroids: 每个子空间的质心数（不超过256）
+            iterations: k-means迭代次数
+            sample_size: 最多使用的训练样本数
+            seed: 随机种子
+
+        Returns:
+            训练好的量化器
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        num_centroids = min(num_centroids, 256)
+        if n < num_centroids:
+            raise ValueError(f"训练样本不足：需要至少{num_centroids}个，实际{n}个")
+
+        rng = np.random.default_rng(seed)
+        if n > sample_size:
+            vectors = vectors[rng.choice(n, size=sample_size, replace=False)]
+        m = choose_subvectors(dim, num_subvectors)
+        sub_dim = dim // m
+        codebook = np.stack([
+            _kmeans(vectors[:, i * sub_dim:(i + 1) * sub_dim], num_centroids, iterations, rng)
+            for i in range(m)
+        ])
+        return cls(codebook)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """编码为 (n, M) uint8"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((len(vectors), self.num_subvectors), dtype=np.uint8)
+        for i in range(self.num_subvectors):
+            sub = vectors[:, i * self.sub_dim:(i + 1) * self.sub_dim]
+            centroids = self.codebook[i]
+            distances = (
+                np.einsum("ij,ij->i", sub, sub)[:, None]
+                - 2 * sub @ centroids.T
+                + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            )
+            codes[:, i] = distances.argmin(axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """还原为近似向量"""
+        codes = np.asarray(codes)
+        return np.concatenate(
+            [self.codebook[i][codes[:, i]] for i in range(self.num_subvectors)], axis=1
+        )
+
+    def distance_table(self, query: np.ndarray) -> np.ndarray:
+        """查询向量到各子空间质心的平方距离表 (M, K)"""
+        sub_queries = np.asarray(query, dtype=np.float32).reshape(self.num_subvectors, 1, self.sub_dim)
+        return ((self.codebook - sub_queries) ** 2).sum(axis=2)
+
+    def distances(self, table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """查表计算近似平方距离（非对称距离）"""
+        return table[np.arange(self.num_subvectors)[None, :], codes].sum(axis=1)
+
@@ -0,0 +1,120 @@
+"""
+RAG检索结果缓存
+以 (小说ID, 规范化查询, top_k, max_chapter) 为键缓存检索结果；
+每本小说维护一个索引版本号，索引或删除内容时版本号递增，旧版本的缓存自然失效。
+版本号只在进程内维护，其他进程的写入不会使本进程的缓存失效，只能依靠TTL过期。
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import re
+import threading
+import time
+import unicodedata
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询文本（全半角统一、去除多余空白、英文小写）"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query or "")).strip().lower()
+
+
+class QueryResultCache:
+    """带版本失效与LRU淘汰的检索结果缓存"""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 60.0):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大缓存条目数
+            ttl_seconds: 条目存活时间（秒），0表示不过期；也是其他进程写入后本进程缓存陈旧的上限
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, novel_id: int) -> int:
+        """返回小说当前的索引版本号"""
+        return self._versions.get(novel_id, 0)
+
+    def make_key(
+        self,
+        novel_id: int,
+        query: str,
+        top_k: int,
+        max_chapter: Optional[int],
+        *extra: Hashable,
+    ) -> Tuple:
+        """
+        构造缓存键（包含当前版本号，检索开始时生成，避免写入过期结果）
+
+        Args:
+            novel_id: 小说ID
+            query: 查询文本
+            top_k: 返回数量
+            max_chapter: 最大章节号
+            *extra: 其他影响结果的参数
+
+        Returns:
+            缓存键
+        """
+        return (novel_id, self.version(novel_id), normalize_query(query), top_k, max_chapter, *extra)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """读取缓存，未命中、已过期或版本已变化时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                expired = self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds
+                if not expired and key[1] == self._versions.get(key[0], 0):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple, value: Any) -> None:
+        """写入缓存（版本号已变化的结果直接丢弃）"""
+        with self._lock:
+            if key[1] != self._versions.get(key[0], 0):
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, novel_id: int) -> int:
+        """
+        使某本小说的缓存失效（递增版本号并清除已有条目）
+
+        Args:
+            novel_id: 小说ID
+
+        Returns:
+            清除的条目数
+        """
+        with self._lock:
+            self._versions[novel_id] = self._versions.get(novel_id, 0) + 1
+            stale = [key for key in self._entries if key[0] == novel_id]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
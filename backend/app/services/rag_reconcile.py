@@ -0,0 +1,358 @@
+"""
+RAG向量库对账与垃圾回收
+按小说逐本比较数据库中的 (小说ID, 章节号) 与向量库中已有的分块：
+- 向量库中有、数据库中已不存在的章节（或整本小说）视为孤儿，分批删除；
+- 数据库中有内容、向量库中没有任何分块的章节视为缺失，重新索引；
+最后输出漂移汇总。世界观设定以第0章参与对账。
+"""
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import time
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.rag_reindex import RAGReindexer, ReindexItem, ReindexJob, rag_reindexer
+from app.services.rag_service import rag_service
+
+
+# 汇总中最多列出的孤儿/缺失章节样例数
+_SAMPLE_LIMIT = 50
+
+
+class ReconcileReport:
+    """一次对账的漂移汇总"""
+
+    def __init__(self, novel_ids: Optional[List[int]], dry_run: bool):
+        self.novel_ids = sorted(set(novel_ids)) if novel_ids else None
+        self.dry_run = dry_run
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.novels_checked = 0
+        self.db_chapters = 0
+        self.store_chapters = 0
+        self.store_vectors = 0
+        self.orphan_novels: List[int] = []
+        self.orphan_chapters = 0
+        self.orphan_vectors = 0
+        self.vectors_deleted = 0
+        self.missing_chapters = 0
+        self.chapters_reindexed = 0
+        self.chunks_indexed = 0
+        self.orphan_samples: List[Tuple[int, int]] = []
+        self.missing_samples: List[Tuple[int, int]] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def _sample(self, samples: List[Tuple[int, int]], novel_id: int, chapters: Iterable[int]) -> None:
+        for chapter in chapters:
+            if len(samples) >= _SAMPLE_LIMIT:
+                return
+            samples.append((novel_id, chapter))
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "status": self.status,
+            "error": self.error,
+            "dry_run": self.dry_run,
+            "novel_ids": self.novel_ids,
+            "novels_checked": self.novels_checked,
+            "db_chapters": self.db_chapters,
+            "store_chapters": self.store_chapters,
+            "store_vectors": self.store_vectors,
+            "orphan_novels": self.orphan_novels,
+            "orphan_chapters": self.orphan_chapters,
+            "orphan_vectors": self.orphan_vectors,
+            "vectors_deleted": self.vectors_deleted,
+            "missing_chapters": self.missing_chapters,
+            "chapters_reindexed": self.chapters_reindexed,
+            "chunks_indexed": self.chunks_indexed,
+            "orphan_samples": [list(item) for item in self.orphan_samples],
+            "missing_samples": [list(item) for item in self.missing_samples],
+            "elapsed_seconds": round(elapsed, 2),
+        }
+
+
+class RAGReconciler:
+    """RAG向量库对账任务（同一时间只运行一个）"""
+
+    def __init__(
+        self,
+        service,
+        reindexer: RAGReindexer,
+        session_factory: Optional[Callable[[], Any]] = None,
+    ):
+        """
+        初始化对账任务
+
+        Args:
+            service: RAGService实例
+            reindexer: 重建索引任务管理器（复用其数据库读取与分页索引逻辑）
+            session_factory: 数据库会话工厂，默认与reindexer相同
+        """
+        self.service = service
+        self.reindexer = reindexer
+        self._session_factory = session_factory
+        self.last_report: Optional[ReconcileReport] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.last_report is not None and self.last_report.status == "running"
+
+    async def _prepare(self, novel_ids: Optional[List[int]], dry_run: bool) -> ReconcileReport:
+        if not await self.service.wait_until_ready(timeout=300):
+            raise RuntimeError(f"RAG服务不可用（{self.service.status}）")
+        if self.running:
+            raise RuntimeError("已有对账任务在运行")
+        if self.reindexer._running_job is not None:
+            raise RuntimeError(f"重建索引任务{self.reindexer._running_job.job_id}正在运行，请稍后再对账")
+        report = ReconcileReport(novel_ids, dry_run)
+        report.status = "running"
+        self.last_report = report
+        return report
+
+    async def start(self, novel_ids: Optional[List[int]] = None, dry_run: bool = False) -> ReconcileReport:
+        """在后台启动对账，立即返回汇总对象（可轮询进度）"""
+        report = await self._prepare(novel_ids, dry_run)
+        self._task = asyncio.create_task(self._execute(report))
+        return report
+
+    async def run(self, novel_ids: Optional[List[int]] = None, dry_run: bool = False) -> ReconcileReport:
+        """在当前协程中执行对账直到结束（命令行使用）"""
+        report = await self._prepare(novel_ids, dry_run)
+        await self._execute(report)
+        return report
+
+    async def _execute(self, report: ReconcileReport) -> None:
+        report.started_at = time.time()
+        collection = self.service._get_collection()
+        try:
+            store = await self.service.store_executor.run(
+                "index", self._scan_store, collection, report.novel_ids
+            )
+            report.store_chapters = sum(len(chapters) for chapters in store.values())
+            report.store_vectors = sum(sum(chapters.values()) for chapters in store.values())
+
+            async for novel_id in self._iter_db_novel_ids(report.novel_ids):
+                expected = await asyncio.to_thread(self._fetch_expected_chapters, novel_id)
+                await self._reconcile_novel(report, collection, novel_id, expected, store.pop(novel_id, Counter()))
+                report.novels_checked += 1
+
+            # 剩下的都是数据库中已不存在的小说
+            for novel_id, chapters in store.items():
+                report.orphan_novels.append(novel_id)
+                report.orphan_chapters += len(chapters)
+                report.orphan_vectors += sum(chapters.values())
+                report._sample(report.orphan_samples, novel_id, sorted(chapters))
+                if not report.dry_run:
+                    report.vectors_deleted += await self._drop_novel(collection, novel_id)
+
+            report.status = "completed"
+            logger.info(
+                f"✅ RAG对账完成：检查{report.novels_checked}本小说，孤儿小说{len(report.orphan_novels)}本、"
+                f"孤儿章节{report.orphan_chapters}个（{report.orphan_vectors}个向量），"
+                f"缺失章节{report.missing_chapters}个"
+                + ("（仅检查，未修改）" if report.dry_run else
+                   f"，已删除{report.vectors_deleted}个向量、重新索引{report.chapters_reindexed}章")
+            )
+        except asyncio.CancelledError:
+            report.status = "cancelled"
+            logger.warning("⚠️ RAG对账任务已取消")
+        except Exception as e:  # noqa: BLE001
+            report.status = "failed"
+            report.error = str(e)
+            logger.error(f"RAG对账失败: {e}")
+        finally:
+            report.finished_at = time.time()
+
+    async def _reconcile_novel(
+        self,
+        report: ReconcileReport,
+        collection,
+        novel_id: int,
+        expected: Set[int],
+        stored: Counter,
+    ) -> None:
+        """对账单本小说：删除孤儿章节、补齐缺失章节"""
+        report.db_chapters += len(expected)
+
+        orphans = sorted(chapter for chapter in stored if chapter not in expected)
+        if orphans:
+            report.orphan_chapters += len(orphans)
+            report.orphan_vectors += sum(stored[chapter] for chapter in orphans)
+            report._sample(report.orphan_samples, novel_id, orphans)
+            if not report.dry_run:
+                report.vectors_deleted += await self._delete_chapters(collection, novel_id, orphans)
+
+        missing = sorted(chapter for chapter in expected if chapter not in stored)
+        if missing:
+            report.missing_chapters += len(missing)
+            report._sample(report.missing_samples, novel_id, missing)
+            if not report.dry_run:
+                await self._reindex_chapters(report, collection, novel_id, missing)
+
+    async def _delete_chapters(self, collection, novel_id: int, chapters: List[int]) -> int:
+        """分批删除孤儿章节的全部分块"""
+        ids = await self.service.store_executor.run(
+            "delete",
+            collection.get,
+            where={"$and": [{"novel_id": novel_id}, {"chapter": {"$in": chapters}}]},
+            include=[],
+        )
+        ids = (ids or {}).get("ids") or []
+        batch_size = max(1, settings.RAG_RECONCILE_DELETE_BATCH_SIZE)
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            await self.service.store_executor.run("delete", collection.delete, ids=batch)
+            self.service.keyword_index.remove(novel_id, batch)
+        if ids:
+            self.service.query_cache.invalidate(novel_id)
+            logger.info(f"删除小说{novel_id}的{len(chapters)}个孤儿章节（{len(ids)}个向量）")
+        return len(ids)
+
+    async def _drop_novel(self, collection, novel_id: int) -> int:
+        """删除已不存在的小说的全部向量（分区存储直接丢弃分区）"""
+        count = await self.service.store_executor.run(
+            "delete", self.service._delete_where, collection, {"novel_id": novel_id}
+        )
+        self.service.keyword_index.drop_novel(novel_id)
+        self.service.query_cache.invalidate(novel_id)
+        logger.info(f"删除孤儿小说{novel_id}的{count}个向量")
+        return count
+
+    async def _reindex_chapters(self, report: ReconcileReport, collection, novel_id: int, chapters: List[int]) -> None:
+        """分页读取缺失章节的内容并索引（复用重建索引的批量写入逻辑）"""
+        job = ReindexJob(f"reconcile-{novel_id}", [novel_id], force=False, collection=collection.name)
+        page_size = max(1, settings.RAG_REINDEX_PAGE_SIZE)
+        for start in range(0, len(chapters), page_size):
+            items = await asyncio.to_thread(self._fetch_items, novel_id, chapters[start:start + page_size])
+            if items:
+                await self.reindexer._index_page(job, collection, novel_id, items)
+        report.chapters_reindexed += job.chapters_done
+        report.chunks_indexed += job.chunks_embedded
+
+    # ------------------------------------------------------------------
+    # 向量库读取（阻塞调用，在向量库线程池中执行）
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _scan_store(collection, novel_ids: Optional[List[int]]) -> Dict[int, Counter]:
+        """
+        统计向量库中每本小说、每个章节的分块数
+
+        分区存储逐个分区读取元数据；共享集合按页扫描，避免一次读出全部数据。
+        """
+        store: Dict[int, Counter] = {}
+
+        def count(metadatas) -> None:
+            for metadata in metadatas or []:
+                metadata = metadata or {}
+                if metadata.get("novel_id") is None or metadata.get("chapter") is None:
+                    continue
+                store.setdefault(int(metadata["novel_id"]), Counter())[int(metadata["chapter"])] += 1
+
+        if novel_ids is not None:
+            for novel_id in novel_ids:
+                count(collection.get(where={"novel_id": novel_id}, include=["metadatas"]).get("metadatas"))
+            return store
+
+        if hasattr(collection, "novel_ids"):
+            for novel_id in collection.novel_ids():
+                count(collection.get(where={"novel_id": novel_id}, include=["metadatas"]).get("metadatas"))
+            return store
+
+        page_size = max(1, settings.RAG_RECONCILE_SCAN_PAGE_SIZE)
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            metadatas = page.get("metadatas") or []
+            count(metadatas)
+            if len(metadatas) < page_size:
+                return store
+            offset += page_size
+
+    # ------------------------------------------------------------------
+    # 数据库读取（阻塞调用，在线程中执行）
+    # ------------------------------------------------------------------
+
+    def _session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        return self.reindexer._session()
+
+    async def _iter_db_novel_ids(self, novel_ids: Optional[List[int]]):
+        """按ID升序遍历数据库中的小说（指定范围时只遍历其中仍存在的小说）"""
+        page_size = max(1, settings.RAG_REINDEX_PAGE_SIZE)
+        after = None
+        while True:
+            page = await asyncio.to_thread(self._fetch_novel_ids, after, page_size, novel_ids)
+            if not page:
+                return
+            for novel_id in page:
+                yield novel_id
+            after = page[-1]
+
+    def _fetch_novel_ids(self, after_id: Optional[int], limit: int, novel_ids: Optional[List[int]]) -> List[int]:
+        from app.models.novel import Novel
+
+        db = self._session()
+        try:
+            query = db.query(Novel.id)
+            if novel_ids is not None:
+                query = query.filter(Novel.id.in_(novel_ids))
+            if after_id is not None:
+                query = query.filter(Novel.id > after_id)
+            return [row[0] for row in query.order_by(Novel.id).limit(limit).all()]
+        finally:
+            db.close()
+
+    def _fetch_expected_chapters(self, novel_id: int) -> Set[int]:
+        """数据库中有内容、应当存在向量的章节号（世界观设定为第0章）"""
+        from app.models.novel import Chapter, Novel
+
+        db = self._session()
+        try:
+            expected: Set[int] = set()
+            worldview = db.query(Novel.worldview).filter(Novel.id == novel_id).scalar()
+            if worldview and worldview.strip():
+                expected.add(0)
+            rows = (
+                db.query(Chapter.chapter_number)
+                .filter(Chapter.novel_id == novel_id, Chapter.content.isnot(None), Chapter.content != "")
+                .yield_per(1000)
+            )
+            expected.update(chapter_number for (chapter_number,) in rows)
+            return expected
+        finally:
+            db.close()
+
+    def _fetch_items(self, novel_id: int, chapters: List[int]) -> List[ReindexItem]:
+        """读取指定章节的待索引条目"""
+        from app.models.novel import Chapter, Novel
+
+        db = self._session()
+        try:
+            items: List[ReindexItem] = []
+            if 0 in chapters:
+                worldview = db.query(Novel.worldview).filter(Novel.id == novel_id).scalar()
+                items.append((0, worldview or "", {"source": "worldview"}))
+            rows = (
+                db.query(Chapter.id, Chapter.chapter_number, Chapter.content)
+                .filter(Chapter.novel_id == novel_id, Chapter.chapter_number.in_([c for c in chapters if c > 0]))
+                .order_by(Chapter.chapter_number, Chapter.id)
+                .all()
+            )
+            items.extend(
+                (chapter_number, content or "", {"source": "chapter", "chapter_id": chapter_id})
+                for chapter_id, chapter_number, content in rows
+            )
+            return items
+        finally:
+            db.close()
+
+
+# 创建全局实例
+rag_reconciler = RAGReconciler(rag_service, rag_reindexer)
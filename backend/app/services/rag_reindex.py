@@ -0,0 +1,442 @@
+"""
+RAG批量重建索引
+从数据库分页读取章节（及世界观设定），大批量计算向量并批量写入当前向量集合；
+每处理完一页即写入检查点，进程崩溃或任务取消后可从断点继续，并实时统计吞吐量。
+
+更换 OLLAMA_EMBED_MODEL 时，可先用新配置在独立进程中运行 reindex_rag.py 构建新维度的集合，
+线上服务继续使用旧集合，构建完成后再切换配置重启，迁移期间检索不中断。
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.rag_service import rag_service
+
+
+# 单个待索引条目：(章节号, 内容, 元数据)；世界观设定以第0章索引
+ReindexItem = Tuple[int, str, Dict[str, Any]]
+
+
+class ReindexJob:
+    """重建索引任务的进度与检查点"""
+
+    def __init__(self, job_id: str, novel_ids: Optional[List[int]], force: bool, collection: str):
+        self.job_id = job_id
+        # None 表示全部小说
+        self.novel_ids = sorted(set(novel_ids)) if novel_ids else None
+        self.force = force
+        self.collection = collection
+        self.status = "pending"
+        self.error: Optional[str] = None
+        # 检查点游标：最后一个完整写入的 (小说ID, 章节号)
+        self.cursor_novel_id: Optional[int] = None
+        self.cursor_chapter: int = -1
+        self.total_chapters = 0
+        self.chapters_done = 0
+        self.novels_done = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.chunks_deleted = 0
+        self.resumed = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "novel_ids": self.novel_ids,
+            "force": self.force,
+            "collection": self.collection,
+            "status": self.status,
+            "cursor_novel_id": self.cursor_novel_id,
+            "cursor_chapter": self.cursor_chapter,
+            "chapters_done": self.chapters_done,
+            "novels_done": self.novels_done,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_deleted": self.chunks_deleted,
+        }
+
+    def restore(self, checkpoint: Dict[str, Any]) -> None:
+        """从检查点恢复游标与累计计数"""
+        self.cursor_novel_id = checkpoint.get("cursor_novel_id")
+        self.cursor_chapter = checkpoint.get("cursor_chapter", -1)
+        for field in ("chapters_done", "novels_done", "chunks_total", "chunks_embedded", "chunks_deleted"):
+            setattr(self, field, checkpoint.get(field, 0))
+        self.resumed = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed_seconds
+        data = self.to_checkpoint()
+        data.update({
+            "error": self.error,
+            "resumed": self.resumed,
+            "total_chapters": self.total_chapters,
+            "progress": round(self.chapters_done / self.total_chapters, 4) if self.total_chapters else 0.0,
+            "elapsed_seconds": round(elapsed, 2),
+            "chunks_per_second": round(self.chunks_embedded / elapsed, 2) if elapsed > 0 else 0.0,
+        })
+        return data
+
+
+class RAGReindexer:
+    """RAG批量重建索引任务管理器（同一时间只运行一个任务）"""
+
+    def __init__(
+        self,
+        service,
+        session_factory: Optional[Callable[[], Any]] = None,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        """
+        初始化任务管理器
+
+        Args:
+            service: RAGService实例
+            session_factory: 数据库会话工厂，默认使用 SessionLocal
+            checkpoint_dir: 检查点目录，默认使用配置 RAG_REINDEX_CHECKPOINT_DIR
+        """
+        self.service = service
+        self._session_factory = session_factory
+        self.checkpoint_dir = checkpoint_dir or settings.RAG_REINDEX_CHECKPOINT_DIR
+        self.jobs: Dict[str, ReindexJob] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running_job: Optional[ReindexJob] = None
+
+    # ------------------------------------------------------------------
+    # 任务管理
+    # ------------------------------------------------------------------
+
+    def _job_id(self, novel_ids: Optional[List[int]], collection: str) -> str:
+        """同一集合、同一范围的任务使用固定ID，以便找到对应检查点"""
+        target = "all" if not novel_ids else "novels-" + "_".join(str(i) for i in sorted(set(novel_ids)))
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", f"{collection}-{target}")
+
+    def _checkpoint_path(self, job_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{job_id}.json")
+
+    def _load_checkpoint(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._checkpoint_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"读取重建索引检查点失败（{job_id}）: {e}")
+            return None
+
+    def _save_checkpoint(self, job: ReindexJob) -> None:
+        """原子写入检查点（先写临时文件再替换）"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self._checkpoint_path(job.job_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job.to_checkpoint(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    async def _prepare(self, novel_ids: Optional[List[int]], force: bool, resume: bool) -> ReindexJob:
+        """创建任务，必要时从检查点恢复"""
+        if not await self.service.wait_until_ready(timeout=300):
+            raise RuntimeError(f"RAG服务不可用（{self.service.status}）")
+        collection = self.service._get_collection()
+        if collection is None:
+            raise RuntimeError("向量集合不可用")
+        if self._running_job is not None:
+            raise RuntimeError(f"已有重建索引任务正在运行：{self._running_job.job_id}")
+
+        job = ReindexJob(self._job_id(novel_ids, collection.name), novel_ids, force, collection.name)
+        checkpoint = self._load_checkpoint(job.job_id) if resume else None
+        if checkpoint and checkpoint.get("status") != "completed":
+            job.force = checkpoint.get("force", force)
+            job.restore(checkpoint)
+            logger.info(
+                f"从检查点恢复重建索引任务{job.job_id}："
+                f"小说{job.cursor_novel_id}第{job.cursor_chapter}章之后继续"
+            )
+
+        self.jobs[job.job_id] = job
+        self._running_job = job
+        return job
+
+    async def start(
+        self,
+        novel_ids: Optional[List[int]] = None,
+        force: bool = False,
+        resume: bool = True,
+    ) -> ReindexJob:
+        """
+        在后台启动重建索引任务
+
+        Args:
+            novel_ids: 需要重建的小说ID，None表示全部小说
+            force: 是否强制重新计算全部向量（同维度更换Embedding模型时需要）
+            resume: 存在未完成的检查点时是否从断点继续
+
+        Returns:
+            任务对象（可通过get查询进度）
+
+        Raises:
+            RuntimeError: 已有任务在运行或RAG服务不可用
+        """
+        job = await self._prepare(novel_ids, force, resume)
+        self._task = asyncio.create_task(self._execute(job))
+        return job
+
+    async def run(
+        self,
+        novel_ids: Optional[List[int]] = None,
+        force: bool = False,
+        resume: bool = True,
+    ) -> ReindexJob:
+        """运行重建索引任务直到结束（命令行使用），参数同start"""
+        job = await self._prepare(novel_ids, force, resume)
+        await self._execute(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReindexJob]:
+        """查询任务（内存中没有时返回检查点中的记录）"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            checkpoint = self._load_checkpoint(job_id)
+            if checkpoint:
+                job = ReindexJob(job_id, checkpoint.get("novel_ids"), checkpoint.get("force", False),
+                                 checkpoint.get("collection", ""))
+                job.restore(checkpoint)
+                job.status = checkpoint.get("status", "interrupted")
+        return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """返回当前进程中的所有任务"""
+        return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消正在运行的任务（检查点保留，可稍后继续）"""
+        if self._running_job is None or self._running_job.job_id != job_id or self._task is None:
+            return False
+        self._task.cancel()
+        return True
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    async def _execute(self, job: ReindexJob) -> None:
+        """按小说、按页处理章节，每页完成后写入检查点"""
+        job.status = "running"
+        job.started_at = time.time()
+        collection = self.service._get_collection()
+        page_size = max(1, settings.RAG_REINDEX_PAGE_SIZE)
+
+        try:
+            job.total_chapters = await asyncio.to_thread(self._count_items, job.novel_ids)
+            logger.info(f"开始重建索引任务{job.job_id}，共{job.total_chapters}个章节（含世界观）")
+
+            async for novel_id in self._iter_novel_ids(job):
+                after_chapter = job.cursor_chapter if novel_id == job.cursor_novel_id else -1
+                while True:
+                    items = await asyncio.to_thread(self._fetch_page, novel_id, after_chapter, page_size)
+                    if not items:
+                        break
+                    await self._index_page(job, collection, novel_id, items)
+
+                    after_chapter = items[-1][0]
+                    job.cursor_novel_id, job.cursor_chapter = novel_id, after_chapter
+                    self._save_checkpoint(job)
+                    logger.info(
+                        f"重建索引进度 {job.chapters_done}/{job.total_chapters}章，"
+                        f"{job.to_dict()['chunks_per_second']}分块/秒"
+                    )
+                job.novels_done += 1
+
+            job.status = "completed"
+            logger.info(
+                f"✅ 重建索引任务{job.job_id}完成：{job.chapters_done}章，{job.chunks_total}个分块，"
+                f"计算{job.chunks_embedded}个向量，删除{job.chunks_deleted}个失效分块"
+            )
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            logger.warning(f"⚠️ 重建索引任务{job.job_id}已取消，可从检查点继续")
+        except Exception as e:  # noqa: BLE001
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"重建索引任务{job.job_id}失败: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._running_job = None
+            try:
+                self._save_checkpoint(job)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"写入重建索引检查点失败: {e}")
+
+    async def _iter_novel_ids(self, job: ReindexJob):
+        """按ID升序遍历目标小说（从检查点所在小说开始）"""
+        start = job.cursor_novel_id
+        if job.novel_ids is not None:
+            for novel_id in job.novel_ids:
+                if start is None or novel_id >= start:
+                    yield novel_id
+            return
+
+        page_size = max(1, settings.RAG_REINDEX_PAGE_SIZE)
+        after = start - 1 if start is not None else None
+        while True:
+            novel_ids = await asyncio.to_thread(self._fetch_novel_ids, after, page_size)
+            if not novel_ids:
+                return
+            for novel_id in novel_ids:
+                yield novel_id
+            after = novel_ids[-1]
+
+    async def _index_page(self, job: ReindexJob, collection, novel_id: int, items: List[ReindexItem]) -> None:
+        """对一页章节分块、差异比较，并发计算向量并批量写入"""
+        service = self.service
+        nodes = [
+            node
+            for chapter, content, metadata in items
+            for node in service._iter_chunk_nodes(novel_id, chapter, service._iter_chunks(content), metadata)
+        ]
+
+        # 一次查询取出本页所有章节已有分块的内容哈希
+        chapters = [chapter for chapter, _, _ in items]
+        existing = await service.store_executor.run(
+            "index",
+            collection.get,
+            where={"$and": [{"novel_id": novel_id}, {"chapter": {"$in": chapters}}]},
+            include=["metadatas"],
+        )
+        existing_metadatas = dict(zip(existing.get("ids") or [], existing.get("metadatas") or []))
+
+        if job.force:
+            changed, moved = nodes, []
+        else:
+            changed, moved = service._diff_chunks(nodes, existing_metadatas)
+        current_ids = {node.node_id for node in nodes}
+        stale_ids = [node_id for node_id in existing_metadatas if node_id not in current_ids]
+
+        batch_size = max(1, settings.RAG_REINDEX_EMBED_BATCH_SIZE)
+        batches = [changed[i:i + batch_size] for i in range(0, len(changed), batch_size)]
+
+        async def embed_and_write(batch) -> None:
+            # 大批量直接交给Embedding线程池（不经过在线请求的微批处理器），写入与下一批计算重叠进行
+            embeddings = await service.embed_executor.run(
+                "reindex", service.embed_model.get_text_embedding_batch, [node.get_content() for node in batch]
+            )
+            await service.store_executor.run("index", service._write_chunks, collection, batch, embeddings, [])
+            service.keyword_index.upsert(
+                novel_id, [(node.node_id, node.get_content(), node.metadata) for node in batch]
+            )
+            job.chunks_embedded += len(batch)
+
+        await asyncio.gather(*(embed_and_write(batch) for batch in batches))
+
+        if moved:
+            # 只有位置变化的分块只更新元数据
+            await service.store_executor.run("index", service._update_chunk_metadata, collection, moved)
+            service.keyword_index.upsert(
+                novel_id, [(node.node_id, node.get_content(), node.metadata) for node in moved]
+            )
+
+        if stale_ids:
+            await service.store_executor.run("index", service._write_chunks, collection, [], [], stale_ids)
+            service.keyword_index.remove(novel_id, stale_ids)
+        if changed or moved or stale_ids:
+            service.query_cache.invalidate(novel_id)
+
+        job.chapters_done += len(items)
+        job.chunks_total += len(nodes)
+        job.chunks_deleted += len(stale_ids)
+
+    # ------------------------------------------------------------------
+    # 数据库读取（阻塞调用，在线程中执行）
+    # ------------------------------------------------------------------
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.db.base import SessionLocal
+            import app.models  # noqa: F401  确保所有模型关系已注册
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _count_items(self, novel_ids: Optional[List[int]]) -> int:
+        """统计目标章节总数（每本小说的世界观计为一章）"""
+        from sqlalchemy import func
+        from app.models.novel import Chapter, Novel
+
+        db = self._session()
+        try:
+            chapter_query = db.query(func.count(Chapter.id))
+            novel_query = db.query(func.count(Novel.id))
+            if novel_ids is not None:
+                chapter_query = chapter_query.filter(Chapter.novel_id.in_(novel_ids))
+                novel_query = novel_query.filter(Novel.id.in_(novel_ids))
+            return int(chapter_query.scalar() or 0) + int(novel_query.scalar() or 0)
+        finally:
+            db.close()
+
+    def _fetch_novel_ids(self, after_id: Optional[int], limit: int) -> List[int]:
+        """按ID升序分页读取小说ID"""
+        from app.models.novel import Novel
+
+        db = self._session()
+        try:
+            query = db.query(Novel.id)
+            if after_id is not None:
+                query = query.filter(Novel.id > after_id)
+            return [row[0] for row in query.order_by(Novel.id).limit(limit).all()]
+        finally:
+            db.close()
+
+    def _fetch_page(self, novel_id: int, after_chapter: int, limit: int) -> List[ReindexItem]:
+        """
+        按章节号升序读取一页待索引条目（游标分页，不使用OFFSET）
+
+        Args:
+            novel_id: 小说ID
+            after_chapter: 上一页最后的章节号，-1表示从头开始（先返回世界观设定）
+            limit: 每页章节数
+
+        Returns:
+            待索引条目列表
+        """
+        from app.models.novel import Chapter, Novel
+
+        db = self._session()
+        try:
+            items: List[ReindexItem] = []
+            if after_chapter < 0:
+                novel = db.query(Novel.worldview).filter(Novel.id == novel_id).first()
+                if novel is None:
+                    return []
+                items.append((0, novel[0] or "", {"source": "worldview"}))
+
+            rows = (
+                db.query(Chapter.id, Chapter.chapter_number, Chapter.content)
+                .filter(Chapter.novel_id == novel_id, Chapter.chapter_number > max(after_chapter, 0))
+                .order_by(Chapter.chapter_number, Chapter.id)
+                .limit(limit)
+                .all()
+            )
+            items.extend(
+                (chapter_number, content or "", {"source": "chapter", "chapter_id": chapter_id})
+                for chapter_id, chapter_number, content in rows
+            )
+            return items
+        finally:
+            db.close()
+
+
+# 创建全局实例
+rag_reindexer = RAGReindexer(rag_service)
@@ -2,17 +2,34 @@
 RAG检索服务
 使用Chroma向量数据库 + Ollama本地Embedding
 """
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from llama_index.core import VectorStoreIndex, Document, StorageContext
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.ollama import OllamaEmbedding
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from itertools import islice
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.vector_stores import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
 from llama_index.core.embeddings import BaseEmbedding
 from app.core.config import settings
 from app.models.schemas import RAGQuery, RAGResult, RAGResponse
+from app.services.rag_chunker import iter_chunks
+from app.services.rag_diversify import mmr_rank, suppress_overlaps
+from app.services.rag_embedding_batcher import EmbeddingBatcher, embed_query_batch
+from app.services.rag_embedding_cache import CachedEmbedding, build_embedding_cache
+from app.services.rag_executor import RAGExecutor
+from app.services.rag_keyword_index import KeywordHit, KeywordIndex, reciprocal_rank_fusion
+from app.services.rag_query_cache import QueryResultCache
 from loguru import logger
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import numpy as np
 
 
 class RAGService:
@@ -26,24 +43,155 @@ class RAGService:
         self.index = None
         # 当前Embedding向量维度，用于区分不同维度的Chroma集合
         self.embed_dim: Optional[int] = None
+        # 向量库是否支持元数据预过滤（不支持时检索退化为扩大召回后过滤）
+        self.supports_metadata_filters = True
+        # BM25关键词索引（混合检索的关键词通道）
+        self.keyword_index = KeywordIndex(max_novels=settings.RAG_KEYWORD_INDEX_MAX_NOVELS)
+        # 检索结果缓存（按小说索引版本失效）
+        self.query_cache = QueryResultCache(
+            max_entries=settings.RAG_QUERY_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RAG_QUERY_CACHE_TTL_SECONDS,
+        )
+        # 阻塞调用执行器：Embedding计算与向量库I/O分别使用独立的有界线程池
+        self.embed_executor = RAGExecutor(
+            "rag-embed",
+            max_workers=settings.RAG_EMBED_WORKERS,
+            limits={
+                "index": settings.RAG_INDEX_CONCURRENCY,
+                "search": settings.RAG_SEARCH_CONCURRENCY,
+                "reindex": settings.RAG_REINDEX_CONCURRENCY,
+            },
+        )
+        self.store_executor = RAGExecutor(
+            "rag-store",
+            max_workers=settings.RAG_STORE_WORKERS,
+            limits={
+                "index": settings.RAG_INDEX_CONCURRENCY,
+                "search": settings.RAG_SEARCH_CONCURRENCY,
+                "delete": settings.RAG_DELETE_CONCURRENCY,
+            },
+        )
+        # Embedding微批处理：合并并发调用中的文本，一批只调用一次模型
+        self.text_batcher = EmbeddingBatcher(
+            "text",
+            batch_fn=lambda texts: self.embed_model.get_text_embedding_batch(texts),
+            runner=lambda fn, texts: self.embed_executor.run("index", fn, texts),
+            max_batch_size=settings.RAG_EMBED_BATCH_SIZE,
+            max_wait_ms=settings.RAG_EMBED_BATCH_WAIT_MS,
+        )
+        self.query_batcher = EmbeddingBatcher(
+            "query",
+            batch_fn=lambda queries: embed_query_batch(self.embed_model, queries),
+            runner=lambda fn, queries: self.embed_executor.run("search", fn, queries),
+            max_batch_size=settings.RAG_EMBED_BATCH_SIZE,
+            max_wait_ms=settings.RAG_EMBED_BATCH_WAIT_MS,
+        )
 
-        try:
-            # 初始化Embedding模型（Ollama本地）
-            self._init_embedding()
+        # 就绪状态：initializing（初始化中）/ ready（可用）/ degraded（初始化失败，RAG功能降级）
+        # Embedding探测与模型加载可能耗时数十秒，放到后台线程中进行，不阻塞应用启动
+        self.status = "initializing"
+        self.init_error: Optional[str] = None
+        self._ready_event = threading.Event()
+        self._init_lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+
+    def start_warmup(self) -> None:
+        """在后台线程中开始初始化（重复调用无副作用）"""
+        with self._init_lock:
+            if self._warmup_thread is not None or self._ready_event.is_set():
+                return
+            self._warmup_thread = threading.Thread(
+                target=self.initialize,
+                name="rag-warmup",
+                daemon=True,
+            )
+            self._warmup_thread.start()
+
+    def initialize(self) -> bool:
+        """
+        同步初始化Embedding模型与向量库
+
+        Returns:
+            是否初始化成功
+        """
+        with self._init_lock:
+            if self._ready_event.is_set():
+                return self.available
 
-            # 初始化Chroma向量数据库
-            self._init_vector_store()
+            try:
+                # 初始化Embedding模型（Ollama本地）
+                self._init_embedding()
 
-            self.available = True
-            logger.info("✅ RAG服务初始化成功（Chroma + Ollama）")
+                # 初始化Chroma向量数据库
+                self._init_vector_store()
 
-        except Exception as e:
-            logger.warning(f"⚠️ RAG服务初始化失败: {e}")
-            logger.warning("RAG功能将不可用，但不影响其他功能")
-            self.available = False
+                self.available = True
+                self.status = "ready"
+                logger.info("✅ RAG服务初始化成功（Chroma + Ollama）")
+
+            except Exception as e:
+                logger.warning(f"⚠️ RAG服务初始化失败: {e}")
+                logger.warning("RAG功能将不可用，但不影响其他功能")
+                self.available = False
+                self.status = "degraded"
+                self.init_error = str(e)
+
+            finally:
+                self._ready_event.set()
+
+        return self.available
+
+    async def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待初始化完成（尚未开始时会触发后台初始化）
+
+        Args:
+            timeout: 最长等待秒数，默认使用配置 RAG_READY_WAIT_SECONDS
+
+        Returns:
+            RAG服务当前是否可用；超时仍在初始化时返回False，调用方按不可用降级处理
+        """
+        if not self._ready_event.is_set():
+            self.start_warmup()
+            wait_seconds = settings.RAG_READY_WAIT_SECONDS if timeout is None else timeout
+            await asyncio.to_thread(self._ready_event.wait, wait_seconds)
+        return self.available
+
+    def get_status(self) -> Dict[str, Any]:
+        """返回RAG服务就绪状态"""
+        return {
+            "status": self.status,
+            "available": self.available,
+            "embed_dim": self.embed_dim,
+            "error": self.init_error,
+        }
 
     def _init_embedding(self):
         """初始化Embedding模型"""
+        if settings.RAG_EMBED_PROVIDER == "hash":
+            from app.services.rag_local_embedding import HashEmbedding
+
+            self.embed_model = HashEmbedding(dim=settings.RAG_HASH_EMBED_DIM)
+            self.embed_dim = settings.RAG_HASH_EMBED_DIM
+            logger.info(f"✅ 使用本地哈希Embedding，向量维度: {self.embed_dim}")
+        else:
+            self._init_ollama_embedding()
+
+        # 包装持久化缓存：未变化的分块不再重复计算向量
+        if settings.RAG_EMBED_CACHE_ENABLED:
+            cache = build_embedding_cache(
+                settings.RAG_EMBED_CACHE_PATH,
+                max_entries=settings.RAG_EMBED_CACHE_MAX_ENTRIES,
+            )
+            if cache is not None:
+                self.embed_model = CachedEmbedding(self.embed_model, cache, embed_dim=self.embed_dim)
+                logger.info(f"✅ Embedding缓存已启用：{settings.RAG_EMBED_CACHE_PATH}（已缓存{len(cache)}条）")
+
+    def _init_ollama_embedding(self):
+        """初始化Ollama Embedding，不可用时回退HuggingFace本地模型"""
+        # 重量级依赖在后台初始化时才导入，避免拖慢应用启动
+        from llama_index.embeddings.ollama import OllamaEmbedding
+
         try:
             # 尝试使用Ollama本地Embedding
             logger.info("尝试连接Ollama Embedding服务...")
@@ -76,18 +224,8 @@ class RAGService:
             logger.info(f"✅ Embedding向量维度: {self.embed_dim}")
 
     def _init_vector_store(self):
-        """初始化Chroma向量数据库"""
-        # 确保数据目录存在
-        chroma_path = settings.CHROMA_DB_PATH
-        os.makedirs(chroma_path, exist_ok=True)
-
-        # 创建Chroma客户端（持久化存储）
-        chroma_client = chromadb.PersistentClient(
-            path=chroma_path,
-            settings=ChromaSettings(
-                anonymized_telemetry=False
-            )
-        )
+        """初始化向量数据库（Chroma或NumPy内存映射后端）"""
+        from llama_index.vector_stores.chroma import ChromaVectorStore
 
         # 根据Embedding维度区分集合名称，避免维度不匹配
         base_collection_name = settings.CHROMA_COLLECTION_NAME
@@ -96,23 +234,97 @@ class RAGService:
         else:
             collection_name = base_collection_name
 
-        chroma_collection = chroma_client.get_or_create_collection(
-            name=collection_name,
-            metadata={
+        # 哈希向量与模型向量不可混用，单独建集合
+        if settings.RAG_EMBED_PROVIDER == "hash":
+            collection_name = f"{collection_name}_hash"
+
+        if settings.RAG_VECTOR_BACKEND == "numpy":
+            # NumPy后端提供与Chroma集合兼容的接口，同样交给ChromaVectorStore包装
+            from app.services.rag_numpy_store import NumpyVectorCollection
+
+            store_path = settings.RAG_NUMPY_STORE_PATH
+            dtype = settings.RAG_NUMPY_COLLECTION_DTYPES.get(collection_name, settings.RAG_NUMPY_DTYPE)
+            collection = NumpyVectorCollection(
+                store_path,
+                collection_name,
+                dtype=dtype,
+                max_open_partitions=settings.RAG_MAX_OPEN_PARTITIONS,
+                keep_full_precision=settings.RAG_NUMPY_KEEP_FULL_PRECISION,
+                rerank_factor=settings.RAG_NUMPY_RERANK_FACTOR,
+                pq_subvectors=settings.RAG_PQ_SUBVECTORS,
+                pq_train_size=settings.RAG_PQ_TRAIN_SIZE,
+            )
+            logger.info(f"✅ NumPy向量库已初始化：{store_path}（{dtype}）")
+        else:
+            import chromadb
+            from chromadb.config import Settings as ChromaSettings
+
+            # 确保数据目录存在
+            chroma_path = settings.CHROMA_DB_PATH
+            os.makedirs(chroma_path, exist_ok=True)
+
+            # 创建Chroma客户端（持久化存储）；设置内存上限时按LRU卸载不常用集合的索引段
+            chroma_settings = {"anonymized_telemetry": False}
+            if settings.RAG_CHROMA_MEMORY_LIMIT_BYTES > 0:
+                chroma_settings.update(
+                    chroma_segment_cache_policy="LRU",
+                    chroma_memory_limit_bytes=settings.RAG_CHROMA_MEMORY_LIMIT_BYTES,
+                )
+            chroma_client = chromadb.PersistentClient(
+                path=chroma_path,
+                settings=ChromaSettings(**chroma_settings)
+            )
+
+            collection_metadata = {
                 "description": (
                     f"小说内容向量存储（维度={self.embed_dim}）" if self.embed_dim else "小说内容向量存储"
                 )
-            },
-        )
+            }
+            if settings.RAG_PARTITION_BY_NOVEL:
+                from app.services.rag_partitions import ChromaPartitionedCollection
+
+                collection = ChromaPartitionedCollection(
+                    chroma_client,
+                    collection_name,
+                    metadata=collection_metadata,
+                    max_open_partitions=settings.RAG_MAX_OPEN_PARTITIONS,
+                )
+                self._warn_legacy_collection(chroma_client, collection_name)
+            else:
+                collection = chroma_client.get_or_create_collection(
+                    name=collection_name,
+                    metadata=collection_metadata,
+                )
+            logger.info(f"✅ Chroma向量数据库已初始化：{chroma_path}")
 
         # 创建向量存储
         self.vector_store = ChromaVectorStore(
-            chroma_collection=chroma_collection
+            chroma_collection=collection
+        )
+
+        # 基于已有集合构建索引，重启后无需重新写入即可检索
+        self.index = VectorStoreIndex.from_vector_store(
+            self.vector_store,
+            embed_model=self.embed_model,
         )
 
-        logger.info(f"✅ Chroma向量数据库已初始化：{chroma_path}")
         logger.info(f"✅ 集合名称：{collection_name}")
 
+    @staticmethod
+    def _warn_legacy_collection(chroma_client, collection_name: str) -> None:
+        """旧版所有小说共用一个集合，启用分区后其中的数据不再被检索，提示运行重建索引迁移"""
+        try:
+            legacy = chroma_client.get_collection(name=collection_name)
+            count = legacy.count()
+        except Exception:  # noqa: BLE001  集合不存在
+            return
+        if count:
+            logger.warning(
+                f"⚠️ 检测到旧的共享集合{collection_name}中有{count}个向量，"
+                f"已开启按小说分区存储（RAG_PARTITION_BY_NOVEL），旧集合中的内容不会被检索，"
+                f"请运行 reindex_rag.py 迁移（迁移完成后可删除旧集合），或在迁移前关闭分区"
+            )
+
     async def index_content(
         self,
         novel_id: int,
@@ -132,60 +344,252 @@ class RAGService:
         Returns:
             是否成功
         """
-        if not self.available:
-            logger.warning("RAG服务不可用，跳过索引")
+        if not await self.wait_until_ready():
+            logger.warning(f"RAG服务不可用（{self.status}），跳过索引")
             return False
 
-        try:
-            # 分块处理长文本（每500字一块）
-            chunks = self._split_text(content, chunk_size=500)
-
-            # 创建文档列表
-            documents = []
-            for idx, chunk in enumerate(chunks):
-                doc_metadata = {
-                    "novel_id": novel_id,
-                    "chapter": chapter,
-                    "chunk_index": idx,
-                    **(metadata or {})
-                }
-
-                documents.append(
-                    Document(
-                        text=chunk,
-                        metadata=doc_metadata,
-                        id_=f"{novel_id}_{chapter}_{idx}"
-                    )
-                )
+        collection = self._get_collection()
+        if collection is None:
+            logger.warning("向量集合不可用，跳过索引")
+            return False
 
-            # 创建存储上下文
-            storage_context = StorageContext.from_defaults(
-                vector_store=self.vector_store
+        try:
+            # 与库中该章节已有的分块做差异比较（只取ID和内容哈希）
+            existing = await self.store_executor.run(
+                "index",
+                collection.get,
+                where=self._chapter_where(novel_id, chapter),
+                include=["metadatas"],
             )
+            existing_metadatas = dict(zip(existing.get("ids") or [], existing.get("metadatas") or []))
+
+            # 按句子边界流式分块，超长章节按窗口分批写入，内存占用有上限
+            nodes = self._iter_chunk_nodes(novel_id, chapter, self._iter_chunks(content), metadata)
+            current_ids = set()
+            written = 0
+            moved = 0
+            while True:
+                window = list(islice(nodes, settings.RAG_INDEX_WINDOW))
+                if not window:
+                    break
+                current_ids.update(node.node_id for node in window)
+
+                changed_nodes, moved_nodes = self._diff_chunks(window, existing_metadatas)
+                if moved_nodes:
+                    # 内容未变、只是位置变化的分块只更新元数据，不重新计算向量
+                    await self.store_executor.run("index", self._update_chunk_metadata, collection, moved_nodes)
+                    self.keyword_index.upsert(
+                        novel_id,
+                        [(node.node_id, node.get_content(), node.metadata) for node in moved_nodes],
+                    )
+                    self.query_cache.invalidate(novel_id)
+                    moved += len(moved_nodes)
+                if not changed_nodes:
+                    continue
 
-            # 创建或更新索引
-            if self.index is None:
-                self.index = VectorStoreIndex.from_documents(
-                    documents,
-                    storage_context=storage_context,
-                    embed_model=self.embed_model,
-                    show_progress=True
+                # 变化的分块批量计算向量（与其他并发请求合批），一次upsert写入
+                embeddings = await self.text_batcher.embed([node.get_content() for node in changed_nodes])
+                await self.store_executor.run(
+                    "index", self._write_chunks, collection, changed_nodes, embeddings, []
                 )
-            else:
-                # 添加文档到现有索引
-                for doc in documents:
-                    self.index.insert(doc)
-
-            logger.info(f"✅ 成功索引小说{novel_id}章节{chapter}，共{len(chunks)}个分块")
+                self.keyword_index.upsert(
+                    novel_id,
+                    [(node.node_id, node.get_content(), node.metadata) for node in changed_nodes],
+                )
+                self.query_cache.invalidate(novel_id)
+                written += len(changed_nodes)
+
+            # 一次delete删除章节变短或内容变化后不再存在的分块
+            stale_ids = [node_id for node_id in existing_metadatas if node_id not in current_ids]
+            if stale_ids:
+                await self.store_executor.run("index", self._write_chunks, collection, [], [], stale_ids)
+                self.keyword_index.remove(novel_id, stale_ids)
+                self.query_cache.invalidate(novel_id)
+
+            logger.info(
+                f"✅ 成功索引小说{novel_id}章节{chapter}，共{len(current_ids)}个分块"
+                f"（写入{written}，更新位置{moved}，删除{len(stale_ids)}，未变化{len(current_ids) - written - moved}）"
+            )
             return True
 
         except Exception as e:
             logger.error(f"索引内容失败: {e}")
             return False
 
+    @staticmethod
+    def _diff_chunks(
+        nodes: Iterable[TextNode],
+        existing_metadatas: Dict[str, Optional[Dict[str, Any]]],
+    ) -> Tuple[List[TextNode], List[TextNode]]:
+        """
+        与库中已有分块比较
+
+        Args:
+            nodes: 当前分块节点
+            existing_metadatas: 库中已有分块 {节点ID: 元数据}
+
+        Returns:
+            (内容或元数据变化需要重新写入的节点, 只有chunk_index变化的节点)
+        """
+        changed, moved = [], []
+        for node in nodes:
+            stored = existing_metadatas.get(node.node_id)
+            if stored is None or stored.get("content_hash") != node.metadata["content_hash"]:
+                changed.append(node)
+            elif stored.get("chunk_index") != node.metadata["chunk_index"]:
+                moved.append(node)
+        return changed, moved
+
+    @staticmethod
+    def _update_chunk_metadata(collection, nodes: List[TextNode]) -> None:
+        """只更新分块元数据，保留已有向量（阻塞调用，在向量库线程池中执行）"""
+        collection.update(
+            ids=[node.node_id for node in nodes],
+            metadatas=[
+                node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+                for node in nodes
+            ],
+        )
+
+    @staticmethod
+    def _write_chunks(
+        collection,
+        nodes: List[TextNode],
+        embeddings: List[List[float]],
+        stale_ids: List[str],
+    ) -> None:
+        """批量写入分块并删除失效分块（阻塞调用，在向量库线程池中执行）"""
+        if nodes:
+            collection.upsert(
+                ids=[node.node_id for node in nodes],
+                embeddings=embeddings,
+                documents=[node.get_content() for node in nodes],
+                metadatas=[
+                    node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+                    for node in nodes
+                ],
+            )
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+
+    @staticmethod
+    def _delete_where(collection, where: Dict[str, Any]) -> int:
+        """按元数据条件删除向量，返回删除数量（阻塞调用，在向量库线程池中执行）"""
+        # 分区存储按小说删除时直接丢弃整个分区，无需逐条查询
+        if set(where) == {"novel_id"} and hasattr(collection, "drop_partition"):
+            return collection.drop_partition(where["novel_id"])
+        results = collection.get(where=where, include=[])
+        ids = (results or {}).get("ids") or []
+        if ids:
+            collection.delete(ids=ids)
+        return len(ids)
+
+    def get_executor_stats(self) -> Dict[str, Any]:
+        """返回RAG执行器的并发、排队与Embedding合批统计"""
+        return {
+            "embedding": self.embed_executor.stats(),
+            "vector_store": self.store_executor.stats(),
+            "batching": {
+                "text": self.text_batcher.stats(),
+                "query": self.query_batcher.stats(),
+            },
+        }
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        """返回向量库存储统计（NumPy后端包含量化精度与常驻内存占用）"""
+        collection = self._get_collection()
+        if collection is None:
+            return {}
+        if hasattr(collection, "stats"):
+            return collection.stats()
+        return {"backend": "chroma", "vectors": collection.count()}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """返回检索结果缓存与Embedding缓存的统计"""
+        stats: Dict[str, Any] = {"query": self.query_cache.stats()}
+        if isinstance(self.embed_model, CachedEmbedding):
+            stats["embedding"] = self.embed_model.cache.stats()
+        return stats
+
+    def shutdown(self) -> None:
+        """关闭RAG执行器线程池（NumPy后端同时关闭已打开的分区）"""
+        self.embed_executor.shutdown()
+        self.store_executor.shutdown()
+        collection = self._get_collection()
+        if hasattr(collection, "close"):
+            collection.close()
+
+    def _get_collection(self):
+        """获取底层Chroma集合（LlamaIndex抽象层不支持按元数据upsert/delete，直接操作collection）"""
+        if self.vector_store and hasattr(self.vector_store, '_collection'):
+            return self.vector_store._collection
+        return None
+
+    @staticmethod
+    def _chapter_where(novel_id: int, chapter: int) -> Dict[str, Any]:
+        """构造按小说+章节过滤的Chroma where条件"""
+        return {"$and": [{"novel_id": novel_id}, {"chapter": chapter}]}
+
+    @classmethod
+    def _build_chunk_nodes(
+        cls,
+        novel_id: int,
+        chapter: int,
+        chunks: List[str],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> List[TextNode]:
+        """为章节分块构造节点列表（见 _iter_chunk_nodes）"""
+        return list(cls._iter_chunk_nodes(novel_id, chapter, chunks, metadata))
+
+    @staticmethod
+    def _iter_chunk_nodes(
+        novel_id: int,
+        chapter: int,
+        chunks: Iterable[str],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[TextNode]:
+        """
+        为章节分块逐个构造节点
+
+        节点ID由内容哈希决定，同一段文本在章节中位置不变时ID不变；
+        content_hash覆盖文本和除位置（chunk_index）外的元数据，用于判断分块是否需要重新计算向量。
+        章节前部增删分块只会改变后续分块的chunk_index，这类分块只更新元数据（见 _diff_chunks）。
+
+        Args:
+            novel_id: 小说ID
+            chapter: 章节号
+            chunks: 分块文本序列
+            metadata: 额外元数据
+
+        Yields:
+            节点
+        """
+        occurrences: Dict[str, int] = {}
+        for idx, chunk in enumerate(chunks):
+            text_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+            # 同一章节内出现重复文本时追加序号，保证ID唯一
+            occurrence = occurrences.get(text_hash, 0)
+            occurrences[text_hash] = occurrence + 1
+            node_id = f"{novel_id}_{chapter}_{text_hash}"
+            if occurrence:
+                node_id = f"{node_id}_{occurrence}"
+
+            node_metadata = {
+                "novel_id": novel_id,
+                "chapter": chapter,
+                **(metadata or {})
+            }
+            signature = json.dumps(node_metadata, sort_keys=True, ensure_ascii=False, default=str)
+            node_metadata["content_hash"] = hashlib.sha256(
+                f"{chunk}\x00{signature}".encode("utf-8")
+            ).hexdigest()
+            node_metadata["chunk_index"] = idx
+
+            yield TextNode(id_=node_id, text=chunk, metadata=node_metadata)
+
     async def hybrid_search(self, query: RAGQuery) -> RAGResponse:
         """
-        混合检索（向量检索 + 元数据过滤）
+        混合检索（向量检索 + BM25关键词检索，RRF融合，均按元数据预过滤；可选MMR多样化与重叠分块去重）
 
         Args:
             query: 检索请求
@@ -193,53 +597,108 @@ class RAGService:
         Returns:
             检索响应
         """
-        if not self.available or self.index is None:
-            logger.warning("RAG服务不可用，返回空结果")
-            return RAGResponse(
-                query=query.query,
-                results=[],
-                retrieval_method="hybrid"
-            )
+        return (await self.multi_search([query]))[0]
 
-        try:
-            # 创建检索器
-            retriever = self.index.as_retriever(
-                similarity_top_k=query.top_k
-            )
-
-            # 执行检索
-            nodes = retriever.retrieve(query.query)
+    async def multi_search(self, queries: List[RAGQuery]) -> List[RAGResponse]:
+        """
+        批量混合检索：未命中缓存的查询一次合批计算向量，各路检索并发执行
 
-            # 过滤结果（根据novel_id和max_chapter）
-            filtered_nodes = []
-            for node in nodes:
-                metadata = node.metadata
+        Args:
+            queries: 检索请求列表（可以属于不同小说）
 
-                # 检查novel_id
-                if metadata.get("novel_id") != query.novel_id:
+        Returns:
+            与请求一一对应的检索响应
+        """
+        if not queries:
+            return []
+        if not await self.wait_until_ready() or self.index is None:
+            logger.warning(f"RAG服务不可用（{self.status}），返回空结果")
+            return [self._empty_response(query) for query in queries]
+
+        responses: List[Optional[RAGResponse]] = [None] * len(queries)
+        cache_keys: List[Optional[tuple]] = [None] * len(queries)
+        pending: List[int] = []
+        for i, query in enumerate(queries):
+            # 缓存键在检索开始时生成（包含索引版本），检索期间索引变化时结果不会写入缓存
+            if settings.RAG_QUERY_CACHE_ENABLED:
+                cache_keys[i] = self.query_cache.make_key(
+                    query.novel_id, query.query, query.top_k, query.max_chapter,
+                    settings.RAG_BM25_ENABLED, self._diversify_enabled(),
+                )
+                cached = self.query_cache.get(cache_keys[i])
+                if cached is not None:
+                    logger.debug(f"检索缓存命中，查询:'{query.query}'")
+                    responses[i] = RAGResponse(
+                        query=query.query,
+                        results=[result.model_copy(deep=True) for result in cached],
+                        retrieval_method="hybrid"
+                    )
                     continue
+            pending.append(i)
+
+        if pending:
+            try:
+                # 相同查询文本只计算一次向量
+                texts = list(dict.fromkeys(queries[i].query for i in pending))
+                embeddings = dict(zip(texts, await self.query_batcher.embed(texts)))
+            except Exception as e:
+                logger.error(f"混合检索失败: {e}")
+                embeddings = None
+
+            if embeddings is None:
+                for i in pending:
+                    responses[i] = self._empty_response(queries[i])
+            else:
+                searched = await asyncio.gather(*(
+                    self._search_with_embedding(queries[i], embeddings[queries[i].query], cache_keys[i])
+                    for i in pending
+                ))
+                for i, response in zip(pending, searched):
+                    responses[i] = response
+
+        return responses
+
+    async def _search_with_embedding(
+        self,
+        query: RAGQuery,
+        query_embedding: List[float],
+        cache_key: Optional[tuple],
+    ) -> RAGResponse:
+        """使用预先计算的查询向量执行一次混合检索，失败时返回空结果"""
+        try:
+            # 两路检索各自多取一些候选，供融合排序使用
+            candidate_k = query.top_k * settings.RAG_HYBRID_CANDIDATE_FACTOR
+            candidate_query = query.model_copy(update={"top_k": candidate_k})
 
-                # 检查max_chapter
-                if query.max_chapter is not None:
-                    if metadata.get("chapter", 0) > query.max_chapter:
-                        continue
+            # 向量通道与关键词通道（BM25精确匹配人名、地名等）并发执行，均按novel_id/max_chapter预过滤
+            vector_task = self.store_executor.run(
+                "search", self._retrieve_nodes, candidate_query, query_embedding
+            )
+            if settings.RAG_BM25_ENABLED:
+                nodes, keyword_hits = await asyncio.gather(
+                    vector_task,
+                    self.store_executor.run("search", self._keyword_search, candidate_query),
+                )
+            else:
+                nodes, keyword_hits = await vector_task, []
 
-                filtered_nodes.append(node)
+            # 兜底校验（根据novel_id和max_chapter）
+            filtered_nodes = [node for node in nodes if self._match_query(node.metadata, query)]
 
-            # 转换为RAGResult
-            results = [
-                RAGResult(
-                    content=node.get_content(),
-                    metadata={
-                        "chapter": node.metadata.get("chapter"),
-                        "chunk_index": node.metadata.get("chunk_index"),
-                        **{k: v for k, v in node.metadata.items()
-                           if k not in ["chapter", "chunk_index", "novel_id"]}
-                    },
-                    score=node.score if hasattr(node, 'score') else 0.0
+            if self._diversify_enabled():
+                # 保留全部融合候选，多样化后再截取top_k
+                candidates = self._fuse_candidates(filtered_nodes, keyword_hits, candidate_k)
+                candidates = await self.store_executor.run(
+                    "search", self._diversify, candidates, query.top_k, query.novel_id
                 )
-                for node in filtered_nodes[:query.top_k]
+            else:
+                candidates = self._fuse_candidates(filtered_nodes, keyword_hits, query.top_k)
+            results = [
+                self._to_result(content, metadata, score, fused_score)
+                for _, content, metadata, score, fused_score in candidates
             ]
+            if cache_key is not None:
+                self.query_cache.put(cache_key, [result.model_copy(deep=True) for result in results])
 
             logger.info(f"✅ 混合检索完成，查询:'{query.query}'，返回{len(results)}条结果")
 
@@ -251,11 +710,240 @@ class RAGService:
 
         except Exception as e:
             logger.error(f"混合检索失败: {e}")
-            return RAGResponse(
-                query=query.query,
-                results=[],
-                retrieval_method="hybrid"
+            return self._empty_response(query)
+
+    @staticmethod
+    def _empty_response(query: RAGQuery) -> RAGResponse:
+        return RAGResponse(
+            query=query.query,
+            results=[],
+            retrieval_method="hybrid"
+        )
+
+    def _retrieve_nodes(self, query: RAGQuery, query_embedding: List[float]) -> List[NodeWithScore]:
+        """
+        执行向量检索（阻塞调用，在向量库线程池中执行）
+
+        优先使用元数据预过滤；向量库不支持过滤时退化为自适应扩大召回数量后在内存中过滤。
+
+        Args:
+            query: 检索请求
+            query_embedding: 预先计算好的查询向量
+
+        Returns:
+            检索到的节点列表（按相似度排序）
+        """
+        query_bundle = QueryBundle(query_str=query.query, embedding=query_embedding)
+        if self.supports_metadata_filters:
+            try:
+                retriever = self.index.as_retriever(
+                    similarity_top_k=query.top_k,
+                    filters=self._build_metadata_filters(query),
+                )
+                return retriever.retrieve(query_bundle)
+            except (NotImplementedError, ValueError) as e:
+                logger.warning(f"向量库不支持元数据预过滤，改用扩大召回后过滤: {e}")
+                self.supports_metadata_filters = False
+
+        fetch_k = query.top_k * settings.RAG_OVERFETCH_FACTOR
+        while True:
+            retriever = self.index.as_retriever(similarity_top_k=fetch_k)
+            nodes = retriever.retrieve(query_bundle)
+            matched = [node for node in nodes if self._match_query(node.metadata, query)]
+            # 命中足够、库中已无更多结果或达到上限时停止扩大
+            if (
+                len(matched) >= query.top_k
+                or len(nodes) < fetch_k
+                or fetch_k >= settings.RAG_OVERFETCH_MAX_K
+            ):
+                return matched
+            fetch_k = min(fetch_k * 2, settings.RAG_OVERFETCH_MAX_K)
+
+    @staticmethod
+    def _build_metadata_filters(query: RAGQuery) -> MetadataFilters:
+        """根据检索请求构造元数据过滤条件"""
+        filters = [
+            MetadataFilter(key="novel_id", value=query.novel_id, operator=FilterOperator.EQ),
+        ]
+        if query.max_chapter is not None:
+            filters.append(
+                MetadataFilter(key="chapter", value=query.max_chapter, operator=FilterOperator.LTE)
+            )
+        return MetadataFilters(filters=filters, condition=FilterCondition.AND)
+
+    @staticmethod
+    def _match_query(metadata: Dict[str, Any], query: RAGQuery) -> bool:
+        """判断节点元数据是否满足检索请求的novel_id和max_chapter条件"""
+        if metadata.get("novel_id") != query.novel_id:
+            return False
+        if query.max_chapter is not None and metadata.get("chapter", 0) > query.max_chapter:
+            return False
+        return True
+
+    def _keyword_search(self, query: RAGQuery) -> List[KeywordHit]:
+        """
+        BM25关键词检索（首次加载需读取向量库，在向量库线程池中执行）
+
+        小说的关键词索引在首次检索时从向量集合整体加载，之后随索引/删除增量维护。
+
+        Args:
+            query: 检索请求
+
+        Returns:
+            关键词命中列表
+        """
+        if not self.keyword_index.is_loaded(query.novel_id):
+            collection = self._get_collection()
+            if collection is None:
+                return []
+            # 先登记加载再读取快照，读取期间的增删由索引缓冲并在安装时重放
+            self.keyword_index.begin_load(query.novel_id)
+            try:
+                stored = collection.get(
+                    where={"novel_id": query.novel_id},
+                    include=["documents", "metadatas"],
+                )
+                items = [
+                    (node_id, text, metadata_dict_to_node(metadata, text=text).metadata)
+                    for node_id, text, metadata in zip(
+                        stored.get("ids") or [], stored.get("documents") or [], stored.get("metadatas") or []
+                    )
+                ]
+            except Exception:
+                self.keyword_index.abort_load(query.novel_id)
+                raise
+            self.keyword_index.load(query.novel_id, items)
+
+        return self.keyword_index.search(
+            query.novel_id,
+            query.query,
+            top_k=query.top_k,
+            max_chapter=query.max_chapter,
+        )
+
+    def _fuse_candidates(
+        self,
+        vector_nodes: List[NodeWithScore],
+        keyword_hits: List[KeywordHit],
+        top_k: int,
+    ) -> List[tuple]:
+        """
+        使用倒数排名融合（RRF）合并向量与关键词两路结果
+
+        Args:
+            vector_nodes: 向量检索结果（按相似度排序）
+            keyword_hits: 关键词检索结果（按BM25得分排序）
+            top_k: 返回数量
+
+        Returns:
+            融合后的候选 [(节点ID, 文本, 元数据, 向量相似度, RRF融合得分)]，按融合得分排序；
+            只由关键词通道召回的候选向量相似度为0，没有关键词结果时融合得分为None
+        """
+        if not keyword_hits:
+            return [
+                (node.node.node_id, node.get_content(), node.metadata, node.score or 0.0, None)
+                for node in vector_nodes[:top_k]
+            ]
+
+        candidates: Dict[str, tuple] = {}
+        for hit in keyword_hits:
+            candidates[hit.node_id] = (hit.text, hit.metadata, 0.0)
+        for node in vector_nodes:
+            candidates[node.node.node_id] = (node.get_content(), node.metadata, node.score or 0.0)
+
+        fused = reciprocal_rank_fusion(
+            [
+                [node.node.node_id for node in vector_nodes],
+                [hit.node_id for hit in keyword_hits],
+            ],
+            k=settings.RAG_RRF_K,
+        )
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            (node_id, *candidates[node_id], fused_score)
+            for node_id, fused_score in ranked
+        ]
+
+    @staticmethod
+    def _diversify_enabled() -> bool:
+        return settings.RAG_MMR_ENABLED or settings.RAG_DEDUP_ENABLED
+
+    def _diversify(self, candidates: List[tuple], top_k: int, novel_id: int) -> List[tuple]:
+        """
+        对融合候选做MMR重排与同章节重叠分块去重（阻塞调用，在向量库线程池中执行）
+
+        Args:
+            candidates: 融合候选 [(节点ID, 文本, 元数据, 向量相似度, RRF融合得分)]，按融合得分排序
+            top_k: 返回数量
+            novel_id: 检索的小说ID（读取候选向量时只访问该小说的分区）
+
+        Returns:
+            多样化后的候选
+        """
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+
+        order = list(range(len(candidates)))
+        if settings.RAG_MMR_ENABLED:
+            embeddings = self._candidate_embeddings([candidate[0] for candidate in candidates], novel_id)
+            if embeddings is not None:
+                # 相关性沿用融合排序所用的得分（有关键词结果时为RRF得分）
+                order = mmr_rank(
+                    [candidate[3] if candidate[4] is None else candidate[4] for candidate in candidates],
+                    embeddings,
+                    lambda_mult=settings.RAG_MMR_LAMBDA,
+                )
+
+        if settings.RAG_DEDUP_ENABLED:
+            order = suppress_overlaps(
+                [candidate[1] for candidate in candidates],
+                [candidate[2] for candidate in candidates],
+                order,
+                top_k,
+                adjacent_window=settings.RAG_DEDUP_ADJACENT_WINDOW,
+                overlap_threshold=settings.RAG_DEDUP_OVERLAP_THRESHOLD,
             )
+        return [candidates[index] for index in order[:top_k]]
+
+    def _candidate_embeddings(self, node_ids: List[str], novel_id: int) -> Optional[np.ndarray]:
+        """从向量库读取候选的向量；缺失的候选用零向量代替，读取失败时返回None"""
+        try:
+            stored = self._get_collection().get(
+                ids=node_ids, where={"novel_id": novel_id}, include=["embeddings"]
+            )
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"读取候选向量失败，跳过MMR: {e}")
+            return None
+
+        embeddings = stored.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return None
+        by_id = dict(zip(stored["ids"], embeddings))
+        dim = len(embeddings[0])
+        return np.stack([
+            np.asarray(by_id[node_id], dtype=np.float32) if node_id in by_id else np.zeros(dim, dtype=np.float32)
+            for node_id in node_ids
+        ])
+
+    @staticmethod
+    def _to_result(
+        content: str,
+        metadata: Dict[str, Any],
+        score: float,
+        fused_score: Optional[float] = None,
+    ) -> RAGResult:
+        """转换为RAGResult（score为向量相似度，fused_score为混合检索的RRF得分）"""
+        return RAGResult(
+            content=content,
+            metadata={
+                "chapter": metadata.get("chapter"),
+                "chunk_index": metadata.get("chunk_index"),
+                **{k: v for k, v in metadata.items()
+                   if k not in ["chapter", "chunk_index", "novel_id", "content_hash"]}
+            },
+            score=score,
+            fused_score=fused_score,
+        )
 
     async def retrieve_worldview(
         self,
@@ -273,14 +961,8 @@ class RAGService:
         Returns:
             相关内容列表
         """
-        rag_query = RAGQuery(
-            novel_id=novel_id,
-            query=query,
-            top_k=3,
-            max_chapter=max_chapter,
-        )
-        response = await self.hybrid_search(rag_query)
-        return [result.content for result in response.results]
+        grouped = await self.retrieve_many(novel_id, {"worldview": query}, max_chapter=max_chapter)
+        return grouped["worldview"]
 
     async def retrieve_character_info(
         self,
@@ -298,33 +980,74 @@ class RAGService:
         Returns:
             角色相关内容列表
         """
-        query = f"{character_name}的性格、外貌、背景"
-        rag_query = RAGQuery(
-            novel_id=novel_id,
-            query=query,
-            top_k=3,
-            max_chapter=max_chapter,
+        grouped = await self.retrieve_many(
+            novel_id, {"character": self.character_query(character_name)}, max_chapter=max_chapter
         )
-        response = await self.hybrid_search(rag_query)
-        return [result.content for result in response.results]
+        return grouped["character"]
+
+    async def retrieve_many(
+        self,
+        novel_id: int,
+        queries: Dict[str, str],
+        max_chapter: Optional[int] = None,
+        top_k: int = 3,
+    ) -> Dict[str, List[str]]:
+        """
+        同一本小说的多路检索：一次合批计算查询向量，并发检索，按名称分组返回
+
+        Args:
+            novel_id: 小说ID
+            queries: {分组名称: 查询内容}
+            max_chapter: 最大章节号（避免剧透）
+            top_k: 每路返回数量
 
-    def _split_text(self, text: str, chunk_size: int = 500) -> List[str]:
+        Returns:
+            {分组名称: 相关内容列表}
+        """
+        names = list(queries)
+        responses = await self.multi_search([
+            RAGQuery(novel_id=novel_id, query=queries[name], top_k=top_k, max_chapter=max_chapter)
+            for name in names
+        ])
+        return {
+            name: [result.content for result in response.results]
+            for name, response in zip(names, responses)
+        }
+
+    @staticmethod
+    def character_query(character_name: str) -> str:
+        """角色信息检索使用的查询文本"""
+        return f"{character_name}的性格、外貌、背景"
+
+    def _iter_chunks(self, text: str) -> Iterator[str]:
         """
-        分割文本为固定大小的块
+        按配置的大小与重叠，沿句子和段落边界流式分块
 
         Args:
             text: 原始文本
-            chunk_size: 块大小（字符数）
+
+        Returns:
+            分块生成器
+        """
+        return iter_chunks(
+            text,
+            chunk_size=settings.RAG_CHUNK_SIZE,
+            overlap=settings.RAG_CHUNK_OVERLAP,
+        )
+
+    def _split_text(self, text: str, chunk_size: int = 500, overlap: int = 0) -> List[str]:
+        """
+        分割文本为块（沿句子边界，单句超长时硬切分）
+
+        Args:
+            text: 原始文本
+            chunk_size: 目标块大小（字符数）
+            overlap: 相邻块重叠大小（字符数，按整句计）
 
         Returns:
             文本块列表
         """
-        chunks = []
-        for i in range(0, len(text), chunk_size):
-            chunk = text[i:i + chunk_size]
-            if chunk.strip():
-                chunks.append(chunk)
-        return chunks
+        return list(iter_chunks(text, chunk_size=chunk_size, overlap=overlap))
 
     async def delete_novel_index(self, novel_id: int) -> bool:
         """
@@ -336,8 +1059,8 @@ class RAGService:
         Returns:
             是否成功
         """
-        if not self.available:
-            logger.warning("RAG服务不可用，跳过删除")
+        if not await self.wait_until_ready():
+            logger.warning(f"RAG服务不可用（{self.status}），跳过删除")
             return False
 
         try:
@@ -346,12 +1069,13 @@ class RAGService:
             # 由于LlamaIndex的抽象层限制，我们直接操作collection
             if self.vector_store and hasattr(self.vector_store, '_collection'):
                 collection = self.vector_store._collection
-                # 获取所有该小说的ID
-                results = collection.get(
-                    where={"novel_id": novel_id}
+                # 获取并删除所有该小说的向量
+                count = await self.store_executor.run(
+                    "delete", self._delete_where, collection, {"novel_id": novel_id}
                 )
-                if results and results.get('ids'):
-                    collection.delete(ids=results['ids'])
+                self.keyword_index.drop_novel(novel_id)
+                self.query_cache.invalidate(novel_id)
+                if count:
                     logger.info(f"✅ 删除小说{novel_id}的所有索引")
                     return True
 
@@ -372,22 +1096,21 @@ class RAGService:
         Returns:
             清理的向量数量
         """
-        if not self.available:
-            logger.warning("RAG服务不可用，跳过清理向量")
+        if not await self.wait_until_ready():
+            logger.warning(f"RAG服务不可用（{self.status}），跳过清理向量")
             return 0
 
         try:
             if self.vector_store and hasattr(self.vector_store, '_collection'):
                 collection = self.vector_store._collection
-                # 获取所有该小说的向量
-                results = collection.get(
-                    where={"novel_id": novel_id}
+                # 获取并删除所有该小说的向量
+                count = await self.store_executor.run(
+                    "delete", self._delete_where, collection, {"novel_id": novel_id}
                 )
                 
-                count = 0
-                if results and results.get('ids'):
-                    count = len(results['ids'])
-                    collection.delete(ids=results['ids'])
+                self.keyword_index.drop_novel(novel_id)
+                self.query_cache.invalidate(novel_id)
+                if count:
                     logger.info(f"✅ 清理小说{novel_id}的{count}个向量")
                 
                 return count
@@ -430,19 +1153,10 @@ class RAGService:
             清理的缓存条目数量
         """
         try:
-            # 这里可以清理Redis缓存或其他缓存系统
-            # 目前只是模拟清理
-            cache_keys = [
-                f"novel:{novel_id}:worldview",
-                f"novel:{novel_id}:characters",
-                f"novel:{novel_id}:plot",
-                f"novel:{novel_id}:style",
-            ]
-            
-            # TODO: 实现实际的缓存清理
-            # 例如：redis_client.delete(*cache_keys)
-            logger.info(f"缓存清理功能待实现，小说ID: {novel_id}")
-            return len(cache_keys)
+            # 清理检索结果缓存（同时递增索引版本，进行中的检索结果不会再写入缓存）
+            count = self.query_cache.invalidate(novel_id)
+            logger.info(f"✅ 清理小说{novel_id}的{count}条检索缓存")
+            return count
             
         except Exception as e:
             logger.error(f"清理缓存失败: {e}")
@@ -459,23 +1173,21 @@ class RAGService:
         Returns:
             是否成功
         """
-        if not self.available:
-            logger.warning("RAG服务不可用，跳过清理章节数据")
+        if not await self.wait_until_ready():
+            logger.warning(f"RAG服务不可用（{self.status}），跳过清理章节数据")
             return False
 
         try:
             if self.vector_store and hasattr(self.vector_store, '_collection'):
                 collection = self.vector_store._collection
                 # 删除特定章节的向量数据
-                results = collection.get(
-                    where={
-                        "novel_id": novel_id,
-                        "chapter": chapter_id
-                    }
+                count = await self.store_executor.run(
+                    "delete", self._delete_where, collection, self._chapter_where(novel_id, chapter_id)
                 )
+                self.keyword_index.remove_chapter(novel_id, chapter_id)
+                self.query_cache.invalidate(novel_id)
                 
-                if results and results.get('ids'):
-                    collection.delete(ids=results['ids'])
+                if count:
                     logger.info(f"✅ 清理小说{novel_id}章节{chapter_id}的向量数据")
                 
                 return True
@@ -487,5 +1199,5 @@ class RAGService:
             return False
 
 
-# 创建全局实例
+# 创建全局实例（应用启动时调用start_warmup在后台初始化，首次使用时也会自动触发）
 rag_service = RAGService()
@@ -12,7 +12,7 @@
 """
 from typing import TypedDict, Dict, Any, List, Optional
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+from app.services.llm_client import llm_registry
 from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
 from app.models.workflow_schemas import AgentWorkflowStep, AgentWorkflowTrace
@@ -104,12 +104,7 @@ class ReviewAgentService:
     def __init__(self):
         """初始化审核服务"""
         # 初始化LLM（使用复杂模型进行审核）
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL_COMPLEX,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_API_BASE,
-            temperature=0.3  # 审核需要更稳定的输出
-        )
+        self.llm = llm_registry.get(settings.OPENAI_MODEL_COMPLEX, temperature=0.3, cache=True)  # 审核需要更稳定的输出，相同章节重复审核时命中缓存
         
         logger.info("审核Agent服务初始化完成")
 
@@ -9,6 +9,7 @@ from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
 from app.models.workflow_schemas import AgentWorkflowStep
 from app.services.rag_service import rag_service
+from app.services.character_matcher import character_matcher
 from loguru import logger
 import json
 
@@ -315,12 +316,19 @@ async def review_character_consistency_agent(
     
     step_start = datetime.utcnow()
     
-    # 从RAG检索角色信息
-    character_context = await rag_service.retrieve_character_info(
+    # 从RAG检索本章出场角色的信息：各角色多路并发检索，合并去重
+    character_names = await character_matcher.select_characters(
+        novel_id, content, limit=settings.RAG_CHARACTER_CONTEXT_MAX
+    )
+    queries = {f"character:{name}": rag_service.character_query(name) for name in character_names}
+    grouped = await rag_service.retrieve_many(
         novel_id=novel_id,
-        character_name="主角",
+        queries=queries,
         max_chapter=chapter_number - 1 if chapter_number > 1 else None,
     )
+    character_context = list(dict.fromkeys(
+        chunk for chunks in grouped.values() for chunk in chunks
+    ))
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", """你是一位专业的角色一致性审核专家。请检查角色在本章节中的表现是否与之前一致：
@@ -371,6 +379,7 @@ async def review_character_consistency_agent(
         input={
             "novel_id": novel_id,
             "chapter_number": chapter_number,
+            "characters": character_names,
         },
         output={
             "score": result["score"],
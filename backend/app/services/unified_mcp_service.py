@@ -19,6 +19,7 @@ from app.models.workflow_schemas import AgentWorkflowStep, AgentWorkflowTrace
 from app.services.character_mcp_service import character_mcp_service
 from app.services.agent_service import agent_service
 from app.services.mcp_audit_service import mcp_audit_service
+from app.services.llm_scheduler import llm_priority
 from app.crud.novel import get_novel_by_id
 from loguru import logger
 
@@ -242,6 +243,16 @@ class UnifiedMCPService:
             # 日志记录失败不应该影响主要操作
     
     async def analyze_novel_comprehensive(
+        self,
+        db: Session,
+        request: NovelAnalysisRequest,
+        user_id: int
+    ) -> NovelAnalysisResponse:
+        """全面分析小说（按batch优先级调用LLM，不与交互式写作争抢并发）"""
+        with llm_priority("batch", user_id):
+            return await self._analyze_novel_comprehensive(db, request, user_id)
+
+    async def _analyze_novel_comprehensive(
         self, 
         db: Session, 
         request: NovelAnalysisRequest,
@@ -468,6 +479,16 @@ class UnifiedMCPService:
             raise
     
     async def optimize_novel_comprehensive(
+        self,
+        db: Session,
+        request: NovelOptimizationRequest,
+        user_id: int
+    ) -> NovelOptimizationResponse:
+        """全面优化小说（按batch优先级调用LLM，不与交互式写作争抢并发）"""
+        with llm_priority("batch", user_id):
+            return await self._optimize_novel_comprehensive(db, request, user_id)
+
+    async def _optimize_novel_comprehensive(
         self, 
         db: Session, 
         request: NovelOptimizationRequest,
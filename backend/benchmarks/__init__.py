@@ -0,0 +1,4 @@
+"""
+性能基准测试
+不依赖Ollama、OpenAI等外部服务，使用合成数据与本地替身测量检索与生成链路的性能。
+"""
@@ -0,0 +1,60 @@
+"""
+基准测试公共工具
+延迟分位数统计、临时修改全局配置与限制并发的批量执行，供各基准测试共用。
+"""
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """延迟分位数（毫秒）"""
+    if not seconds:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    values = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+@contextmanager
+def override_settings(**values: Any) -> Iterator[None]:
+    """临时修改全局配置，结束后恢复"""
+    previous = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+
+async def gather_limited(concurrency: int, coroutines: Iterable[Awaitable[Any]]) -> List[Any]:
+    """
+    以有限并发执行协程
+
+    Args:
+        concurrency: 同时执行的协程数上限
+        coroutines: 待执行的协程
+
+    Returns:
+        按输入顺序排列的结果
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
@@ -0,0 +1,408 @@
+"""
+生成链路端到端基准测试
+
+用模拟LLM后端（见 app/services/llm_mock）和本地RAG替身（合成语料 + 哈希Embedding）
+驱动 AgentService.generate_content / generate_content_stream，测量：
+- 各工作流节点（retrieve_context、agent_a_worldview、agent_b_character、agent_c_plot、consistency_check）
+  耗时 p50/p95/p99（汇总 AgentWorkflowStep.duration_ms）
+- 端到端延迟、流式首token延迟、吞吐量
+- LLM调用重试率（模拟后端按比例注入429/5xx）与一致性检查触发的重新生成次数
+- 事件循环延迟（定时采样asyncio调度滞后，反映阻塞事件循环的同步代码）
+
+用法：
+    python -m benchmarks.generation_pipeline                                  # 默认配置
+    python -m benchmarks.generation_pipeline --concurrency 1 8 32 --requests 64
+    python -m benchmarks.generation_pipeline --latency-ms 800 --error-rate 0.05 --output result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, suppress
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from loguru import logger
+
+from app.core.config import settings
+from app.models.schemas import GenerationRequest
+from benchmarks.rag_corpus import SyntheticNovel, generate_corpus
+from benchmarks.common import gather_limited, latency_summary, override_settings
+
+
+NODE_IDS = ("retrieve_context", "agent_a_worldview", "agent_b_character", "agent_c_plot", "consistency_check")
+MODES = ("generate", "stream")
+
+
+class EventLoopLagMonitor:
+    """定时采样事件循环延迟：sleep实际唤醒时间与预期唤醒时间之差"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+@contextmanager
+def replace_globals(module: Any, **values: Any) -> Iterator[None]:
+    """临时替换模块级单例（服务通过模块全局名引用的依赖），结束后恢复"""
+    previous = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(module, name, value)
+
+
+def build_requests(corpus: List[SyntheticNovel], count: int, target_length: int) -> List[GenerationRequest]:
+    """按语料中的人物与章节轮流生成请求（提示词提到已知角色，触发按角色检索）"""
+    requests = []
+    num_chapters = len(corpus[0].chapters)
+    for index in range(count):
+        novel = corpus[index % len(corpus)]
+        a, b = novel.people[index % len(novel.people)], novel.people[(index + 1) % len(novel.people)]
+        requests.append(GenerationRequest(
+            novel_id=novel.novel_id,
+            prompt=f"{a}与{b}在山门外重逢，{a}察觉{b}隐瞒了一件旧事",
+            chapter=index % num_chapters + 1,
+            # 故事天数固定：并发请求完成顺序不定，递增天数会被时间线检查判为倒退而触发重新生成
+            current_day=1,
+            target_length=target_length,
+        ))
+    return requests
+
+
+async def _run_request(service: Any, mode: str, request: GenerationRequest, user_id: int) -> Dict[str, Any]:
+    """执行一次生成（以合成用户的身份参与LLM公平排队），返回延迟、各节点耗时与Agent C生成次数"""
+    from app.services.llm_scheduler import llm_priority
+
+    started = time.perf_counter()
+    first_token: Optional[float] = None
+    try:
+        with llm_priority("interactive", user_id):
+            if mode == "stream":
+                response = None
+                async for event in service.generate_content_stream(request):
+                    if event["type"] == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event["type"] == "final_response":
+                        response = event["data"]
+            else:
+                response = await service.generate_content(request)
+    except Exception as e:  # noqa: BLE001
+        return {"ok": False, "error": type(e).__name__, "latency": time.perf_counter() - started}
+
+    steps = response.workflow_trace.steps if response is not None and response.workflow_trace else []
+    return {
+        "ok": response is not None,
+        "latency": time.perf_counter() - started,
+        "first_token": first_token,
+        "chars": len(response.final_content) if response is not None else 0,
+        "steps": [(step.id, step.duration_ms) for step in steps if step.duration_ms is not None],
+        "plot_runs": sum(1 for step in steps if step.id == "agent_c_plot"),
+    }
+
+
+async def _run_level(mode: str, concurrency: int, requests: List[GenerationRequest],
+                     num_users: int, lag_interval: float) -> Dict[str, Any]:
+    """在给定并发下跑完全部请求（每轮使用新的LLM注册表与一致性服务，统计互不影响）"""
+    from app.services import agent_service as agent_module
+    from app.services import llm_client
+    from app.services.agent_service import AgentService
+    from app.services.consistency_service import ConsistencyService
+    from app.services.llm_client import LLMClientRegistry
+
+    registry = LLMClientRegistry()
+    monitor = EventLoopLagMonitor(lag_interval)
+    try:
+        with replace_globals(llm_client, llm_registry=registry), replace_globals(
+            agent_module, llm_registry=registry, consistency_service=ConsistencyService()
+        ):
+            service = AgentService()
+            monitor.start()
+            started = time.perf_counter()
+            results = await gather_limited(concurrency, [
+                # 请求轮流分配给合成用户
+                _run_request(service, mode, request, index % num_users + 1)
+                for index, request in enumerate(requests)
+            ])
+            elapsed = time.perf_counter() - started
+            llm_stats = registry.get_stats()
+    finally:
+        await monitor.stop()
+        await registry.aclose()
+
+    succeeded = [result for result in results if result["ok"]]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if not result["ok"]:
+            error = result.get("error") or "NoResponse"
+            errors[error] = errors.get(error, 0) + 1
+
+    node_durations: Dict[str, List[float]] = {node: [] for node in NODE_IDS}
+    for result in succeeded:
+        for step_id, duration_ms in result["steps"]:
+            if step_id in node_durations:
+                node_durations[step_id].append(duration_ms / 1000)
+
+    models = llm_stats["models"].values()
+    llm_requests = sum(model["requests"] for model in models)
+    llm_retries = sum(model["retries"] for model in models)
+    plot_runs = sum(result["plot_runs"] for result in succeeded)
+    first_tokens = [result["first_token"] for result in succeeded if result.get("first_token") is not None]
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": len(requests),
+        "succeeded": len(succeeded),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": {
+            "requests_per_second": round(len(succeeded) / elapsed, 3) if elapsed else 0.0,
+            "chars_per_second": round(sum(result["chars"] for result in succeeded) / elapsed, 1) if elapsed else 0.0,
+        },
+        "latency": latency_summary([result["latency"] for result in succeeded]),
+        "first_token": latency_summary(first_tokens) if mode == "stream" else None,
+        "nodes": {node: latency_summary(values) for node, values in node_durations.items()},
+        "retries": {
+            "llm_requests": llm_requests,
+            "llm_retries": llm_retries,
+            "llm_retry_rate": round(llm_retries / llm_requests, 4) if llm_requests else 0.0,
+            "rate_limited": sum(model["rate_limited"] for model in models),
+            "server_errors": sum(model["server_errors"] for model in models),
+            "consistency_regenerations": plot_runs - len(succeeded),
+        },
+        "event_loop_lag": latency_summary(monitor.samples),
+        "llm": {
+            "models": {
+                name: {key: model[key] for key in ("concurrency_limit", "peak_in_flight", "avg_wait_ms", "p95_wait_ms")}
+                for name, model in llm_stats["models"].items()
+            },
+            "mock_backend": llm_stats["mock_backend"],
+        },
+    }
+
+
+async def run_pipeline_benchmark(
+    modes: Sequence[str] = MODES,
+    concurrency_levels: Sequence[int] = (1, 4, 16),
+    num_requests: int = 32,
+    num_users: int = 8,
+    num_novels: int = 2,
+    num_chapters: int = 10,
+    chapter_chars: int = 2000,
+    target_length: int = 500,
+    latency_ms: float = 300.0,
+    jitter_ms: float = 100.0,
+    distribution: str = "lognormal",
+    token_delay_ms: float = 2.0,
+    error_rate: float = 0.0,
+    llm_concurrency: Optional[int] = None,
+    lag_interval: float = 0.01,
+    seed: int = 0,
+    work_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    运行生成链路基准测试
+
+    Args:
+        modes: 生成方式（generate / stream）
+        concurrency_levels: 并发数列表（每个并发数与每种生成方式各跑一轮）
+        num_requests: 每轮请求数
+        num_users: 发起请求的合成用户数（LLM调用按用户公平排队）
+        num_novels: 合成小说数
+        num_chapters: 每本小说章节数
+        chapter_chars: 每章大约字数
+        target_length: 请求的目标字数（Agent C输出长度）
+        latency_ms: 模拟LLM首token延迟中位数
+        jitter_ms: 模拟LLM延迟离散程度
+        distribution: 模拟LLM延迟分布（fixed/uniform/normal/lognormal）
+        token_delay_ms: 模拟LLM每个输出token的耗时
+        error_rate: 模拟LLM返回429/5xx的比例
+        llm_concurrency: 每个模型的LLM并发上限，默认沿用 LLM_MAX_CONCURRENCY_PER_MODEL
+        lag_interval: 事件循环延迟采样间隔（秒）
+        seed: 随机种子（语料与模拟LLM）
+        work_dir: RAG数据目录，默认使用临时目录并在结束后删除
+
+    Returns:
+        测试结果
+    """
+    from app.services import agent_service as agent_module
+    from app.services.character_matcher import CharacterMatcherRegistry
+    from app.services.rag_service import RAGService
+
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError(f"未知的生成方式: {mode}（可选: {', '.join(MODES)}）")
+    if num_users < 1:
+        raise ValueError("合成用户数至少为1")
+
+    corpus = generate_corpus(num_novels, num_chapters, chapter_chars, facts_per_novel=0, seed=seed)
+    requests = build_requests(corpus, num_requests, target_length)
+    temp_dir = work_dir or tempfile.mkdtemp(prefix="pipeline_bench_")
+
+    with override_settings(
+        LLM_BACKEND="mock",
+        LLM_CACHE_ENABLED=False,
+        LLM_MOCK_LATENCY_MS=latency_ms,
+        LLM_MOCK_LATENCY_JITTER_MS=jitter_ms,
+        LLM_MOCK_LATENCY_DISTRIBUTION=distribution,
+        LLM_MOCK_TOKEN_DELAY_MS=token_delay_ms,
+        LLM_MOCK_ERROR_RATE=error_rate,
+        LLM_MOCK_SEED=seed,
+        LLM_MAX_CONCURRENCY_PER_MODEL=llm_concurrency or settings.LLM_MAX_CONCURRENCY_PER_MODEL,
+        RAG_EMBED_PROVIDER="hash",
+        RAG_EMBED_CACHE_ENABLED=False,
+        RAG_QUERY_CACHE_ENABLED=False,
+        CHROMA_DB_PATH=os.path.join(temp_dir, "chroma"),
+        RAG_NUMPY_STORE_PATH=os.path.join(temp_dir, "numpy"),
+    ):
+        rag = RAGService()
+        try:
+            if not rag.initialize():
+                raise RuntimeError(f"RAG服务初始化失败：{rag.init_error}")
+            started = time.perf_counter()
+            indexed = await asyncio.gather(*(
+                rag.index_content(novel.novel_id, chapter, text, {"source": "chapter"})
+                for novel in corpus
+                for chapter, text in novel.chapters.items()
+            ))
+            index_seconds = time.perf_counter() - started
+
+            matcher = CharacterMatcherRegistry()
+            for novel in corpus:
+                matcher.preload(novel.novel_id, [
+                    (index, name, [], index < 3) for index, name in enumerate(novel.people, start=1)
+                ])
+
+            runs = []
+            with replace_globals(agent_module, rag_service=rag, character_matcher=matcher):
+                for mode in modes:
+                    for concurrency in concurrency_levels:
+                        runs.append(await _run_level(mode, concurrency, requests, num_users, lag_interval))
+
+            return {
+                "config": {
+                    "modes": list(modes),
+                    "concurrency_levels": list(concurrency_levels),
+                    "requests_per_run": num_requests,
+                    "users": num_users,
+                    "novels": num_novels,
+                    "chapters_per_novel": num_chapters,
+                    "chapter_chars": chapter_chars,
+                    "target_length": target_length,
+                    "mock_llm": {
+                        "distribution": distribution,
+                        "latency_ms": latency_ms,
+                        "jitter_ms": jitter_ms,
+                        "token_delay_ms": token_delay_ms,
+                        "error_rate": error_rate,
+                    },
+                    "llm_concurrency": settings.LLM_MAX_CONCURRENCY_PER_MODEL,
+                    "llm_max_retries": settings.LLM_MAX_RETRIES,
+                    "rag_backend": settings.RAG_VECTOR_BACKEND,
+                    "seed": seed,
+                },
+                "rag_index": {
+                    "chapters": len(indexed),
+                    "failed_chapters": sum(1 for ok in indexed if not ok),
+                    "seconds": round(index_seconds, 3),
+                },
+                "runs": runs,
+            }
+        finally:
+            rag.shutdown()
+            if work_dir is None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _print_summary(run: Dict[str, Any]) -> None:
+    latency, retries, lag = run["latency"], run["retries"], run["event_loop_lag"]
+    print(f"[INFO] {run['mode']} 并发{run['concurrency']}：成功{run['succeeded']}/{run['requests']}，"
+          f"{run['throughput']['requests_per_second']}次/秒，p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms "
+          f"p99={latency['p99_ms']}ms")
+    for node, summary in run["nodes"].items():
+        print(f"[INFO]   {node}: p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms")
+    print(f"[INFO]   LLM重试率={retries['llm_retry_rate']}（{retries['llm_retries']}/{retries['llm_requests']}），"
+          f"一致性重新生成={retries['consistency_regenerations']}，事件循环延迟p99={lag['p99_ms']}ms max={lag['max_ms']}ms")
+
+
+async def main(args: argparse.Namespace) -> int:
+    result = await run_pipeline_benchmark(
+        modes=args.modes,
+        concurrency_levels=args.concurrency,
+        num_requests=args.requests,
+        num_users=args.users,
+        num_novels=args.novels,
+        num_chapters=args.chapters,
+        chapter_chars=args.chapter_chars,
+        target_length=args.target_length,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        distribution=args.distribution,
+        token_delay_ms=args.token_delay_ms,
+        error_rate=args.error_rate,
+        llm_concurrency=args.llm_concurrency,
+        seed=args.seed,
+    )
+    for run in result["runs"]:
+        _print_summary(run)
+
+    output = json.dumps({"benchmark": "generation_pipeline", **result}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"[SUCCESS] 结果已写入 {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成链路端到端基准测试（模拟LLM + 本地RAG替身）")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="生成方式")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="并发数列表")
+    parser.add_argument("--requests", type=int, default=32, help="每轮请求数")
+    parser.add_argument("--users", type=int, default=8, help="发起请求的合成用户数")
+    parser.add_argument("--novels", type=int, default=2, help="合成小说数")
+    parser.add_argument("--chapters", type=int, default=10, help="每本小说章节数")
+    parser.add_argument("--chapter-chars", type=int, default=2000, help="每章大约字数")
+    parser.add_argument("--target-length", type=int, default=500, help="生成目标字数")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="模拟LLM首token延迟中位数")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="模拟LLM延迟离散程度")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "normal", "lognormal"], default="lognormal",
+                        help="模拟LLM延迟分布")
+    parser.add_argument("--token-delay-ms", type=float, default=2.0, help="模拟LLM每个输出token的耗时")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟LLM返回429/5xx的比例")
+    parser.add_argument("--llm-concurrency", type=int, help="每个模型的LLM并发上限")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", help="结果JSON输出路径（默认打印到标准输出）")
+    parser.add_argument("--verbose", action="store_true", help="输出服务的INFO日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,148 @@
+"""
+合成小说语料
+按固定随机种子生成多本中文小说的章节文本，并在随机章节中埋入"某人在某地得到某宝物"的事实句，
+每条事实句对应一条查询，作为召回率评估的标准答案。
+"""
+import random
+from typing import Dict, List, Optional
+
+
+SURNAMES = "林苏叶萧秦楚韩陆沈顾云白宁江柳唐"
+GIVEN_NAMES = "风瑶尘渊雪寒羽凌霄月岚辰烟青玄墨"
+PLACE_PREFIXES = ["青云", "落霞", "天机", "玄武", "紫竹", "寒潭", "赤焰", "幽冥", "碧水", "金鳞", "苍梧", "临渊"]
+PLACE_SUFFIXES = ["城", "山", "谷", "宗", "阁", "岛", "峰", "林"]
+SPOTS = ["古洞", "废墟", "石室", "地宫", "湖底", "藏经楼", "祭坛", "密林"]
+TREASURE_PREFIXES = ["紫霄", "玄冥", "九幽", "太虚", "赤霞", "星辰", "龙鳞", "凤羽", "寒冰", "雷光", "青冥", "落日"]
+TREASURE_SUFFIXES = ["剑", "鼎", "珠", "镜", "塔", "印", "扇", "琴", "令", "符"]
+
+FILLER_TEMPLATES = [
+    "{a}站在{place}的高处，远远望去，云海翻涌。",
+    "{a}与{b}并肩而行，谈起了{place}的旧事。",
+    "夜色渐深，{place}里灯火点点，{a}独自修炼。",
+    "{a}运转功法，体内灵力流转，修为又精进了一分。",
+    "{b}冷笑一声：“你以为凭这点本事就能离开{place}？”",
+    "山风吹过，{a}想起了师父的教诲，心中渐渐平静。",
+    "{a}和{b}在{place}外切磋了三百回合，不分胜负。",
+    "传闻{place}近来不太平，各派弟子纷纷赶来查探。",
+]
+FACT_TEMPLATE = "{person}在{place}的{spot}中得到了{treasure}，从此{treasure}便随身携带。"
+QUERY_TEMPLATE = "{person}在哪里得到了{treasure}"
+
+
+class PlantedFact:
+    """埋入语料的事实句及对应查询"""
+
+    def __init__(self, novel_id: int, chapter: int, text: str, query: str, max_chapter: Optional[int]):
+        self.novel_id = novel_id
+        self.chapter = chapter
+        self.text = text
+        self.query = query
+        self.max_chapter = max_chapter
+
+
+class SyntheticNovel:
+    """一本合成小说：章节号 -> 正文，埋入的事实，以及出场人物"""
+
+    def __init__(self, novel_id: int, chapters: Dict[int, str], facts: List[PlantedFact],
+                 people: Optional[List[str]] = None):
+        self.novel_id = novel_id
+        self.chapters = chapters
+        self.facts = facts
+        self.people = people or []
+
+    @property
+    def total_chars(self) -> int:
+        return sum(len(text) for text in self.chapters.values())
+
+
+def _names(rng: random.Random, count: int) -> List[str]:
+    names = [s + g for s in SURNAMES for g in GIVEN_NAMES]
+    rng.shuffle(names)
+    return names[:count]
+
+
+def _places() -> List[str]:
+    return [p + s for p in PLACE_PREFIXES for s in PLACE_SUFFIXES]
+
+
+def _chapter_text(rng: random.Random, chars: int, people: List[str], places: List[str]) -> List[str]:
+    """生成章节段落（每段3~6句填充句）"""
+    paragraphs, length = [], 0
+    while length < chars:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            a, b = rng.sample(people, 2)
+            sentences.append(rng.choice(FILLER_TEMPLATES).format(a=a, b=b, place=rng.choice(places)))
+        paragraph = "".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 1
+    return paragraphs
+
+
+def generate_novel(
+    novel_id: int,
+    num_chapters: int,
+    chapter_chars: int = 3000,
+    facts_per_novel: int = 10,
+    seed: int = 0,
+) -> SyntheticNovel:
+    """
+    生成一本合成小说
+
+    Args:
+        novel_id: 小说ID
+        num_chapters: 章节数
+        chapter_chars: 每章大约字数
+        facts_per_novel: 埋入的事实数（每条对应一次查询）
+        seed: 随机种子
+
+    Returns:
+        合成小说
+    """
+    rng = random.Random(f"{seed}-{novel_id}")
+    people = _names(rng, 12)
+    places = _places()
+    treasures = [p + s for p in TREASURE_PREFIXES for s in TREASURE_SUFFIXES]
+    rng.shuffle(treasures)
+
+    chapters = {
+        chapter: _chapter_text(rng, chapter_chars, people, places)
+        for chapter in range(1, num_chapters + 1)
+    }
+
+    facts = []
+    for treasure in treasures[:facts_per_novel]:
+        chapter = rng.randint(1, num_chapters)
+        person = rng.choice(people)
+        text = FACT_TEMPLATE.format(
+            person=person, place=rng.choice(places), spot=rng.choice(SPOTS), treasure=treasure
+        )
+        paragraphs = chapters[chapter]
+        position = rng.randrange(len(paragraphs))
+        paragraphs[position] = paragraphs[position] + text
+        # 一半查询限定"写到第N章"，N不早于事实所在章节
+        max_chapter = rng.randint(chapter, num_chapters) if rng.random() < 0.5 else None
+        facts.append(PlantedFact(
+            novel_id, chapter, text, QUERY_TEMPLATE.format(person=person, treasure=treasure), max_chapter
+        ))
+
+    return SyntheticNovel(
+        novel_id,
+        {chapter: "\n".join(paragraphs) for chapter, paragraphs in chapters.items()},
+        facts,
+        people,
+    )
+
+
+def generate_corpus(
+    num_novels: int,
+    num_chapters: int,
+    chapter_chars: int = 3000,
+    facts_per_novel: int = 10,
+    seed: int = 0,
+) -> List[SyntheticNovel]:
+    """生成多本合成小说，小说ID从1开始"""
+    return [
+        generate_novel(novel_id, num_chapters, chapter_chars, facts_per_novel, seed)
+        for novel_id in range(1, num_novels + 1)
+    ]
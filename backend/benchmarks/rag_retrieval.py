@@ -0,0 +1,293 @@
+"""
+RAG检索基准测试
+
+用合成语料和本地哈希Embedding驱动RAGService，测量：
+- 索引吞吐量（章节/秒、分块/秒、字/秒）
+- 检索延迟 p50/p95/p99
+- 内存占用（进程RSS、向量库常驻字节、磁盘占用）
+- 召回率 recall@k（命中埋入的事实句）与章节过滤违规数
+
+用法：
+    python -m benchmarks.rag_retrieval                          # 默认规模
+    python -m benchmarks.rag_retrieval --sizes 2x10 10x50       # 多种规模（小说数x章节数）
+    python -m benchmarks.rag_retrieval --backend numpy --numpy-dtype int8 --output result.json
+    python -m benchmarks.rag_retrieval --mmr --dedup            # 对比开启检索结果多样化后的召回
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.models.schemas import RAGQuery
+from benchmarks.common import gather_limited, latency_summary, override_settings
+from benchmarks.rag_corpus import PlantedFact, generate_corpus
+
+
+def current_rss_bytes() -> Optional[int]:
+    """当前进程常驻内存（仅Linux可用，其他平台返回None）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """进程峰值常驻内存（同一进程内跑多个规模时为累计峰值）"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def directory_bytes(path: str) -> int:
+    """目录下文件总大小"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+async def run_retrieval_benchmark(
+    num_novels: int = 3,
+    num_chapters: int = 20,
+    chapter_chars: int = 3000,
+    facts_per_novel: int = 10,
+    top_k: int = 3,
+    concurrency: int = 4,
+    backend: str = "chroma",
+    numpy_dtype: str = "float16",
+    embed_dim: int = 256,
+    query_rounds: int = 1,
+    seed: int = 0,
+    mmr: bool = False,
+    dedup: bool = False,
+    work_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    运行一次检索基准测试
+
+    Args:
+        num_novels: 小说数
+        num_chapters: 每本小说章节数
+        chapter_chars: 每章大约字数
+        facts_per_novel: 每本小说埋入的事实数（即查询数）
+        top_k: 每次检索返回数量
+        concurrency: 索引与检索的并发数
+        backend: 向量库后端（chroma / numpy）
+        numpy_dtype: NumPy后端的存储精度
+        embed_dim: 哈希Embedding维度
+        query_rounds: 查询重复轮数（检索缓存已关闭，每轮都会真实检索）
+        seed: 随机种子
+        mmr: 是否启用MMR重排
+        dedup: 是否启用重叠分块去重
+        work_dir: 数据目录，默认使用临时目录并在结束后删除
+
+    Returns:
+        测试结果
+    """
+    from app.services.rag_service import RAGService
+
+    corpus = generate_corpus(num_novels, num_chapters, chapter_chars, facts_per_novel, seed)
+    temp_dir = work_dir or tempfile.mkdtemp(prefix="rag_bench_")
+
+    with override_settings(
+        RAG_EMBED_PROVIDER="hash",
+        RAG_HASH_EMBED_DIM=embed_dim,
+        RAG_EMBED_CACHE_ENABLED=False,
+        RAG_QUERY_CACHE_ENABLED=False,
+        RAG_VECTOR_BACKEND=backend,
+        RAG_NUMPY_DTYPE=numpy_dtype,
+        RAG_MMR_ENABLED=mmr,
+        RAG_DEDUP_ENABLED=dedup,
+        CHROMA_DB_PATH=os.path.join(temp_dir, "chroma"),
+        RAG_NUMPY_STORE_PATH=os.path.join(temp_dir, "numpy"),
+    ):
+        service = RAGService()
+        try:
+            rss_start = current_rss_bytes()
+            if not service.initialize():
+                raise RuntimeError(f"RAG服务初始化失败：{service.init_error}")
+
+            # 索引
+            chapters = [
+                (novel.novel_id, chapter, text)
+                for novel in corpus
+                for chapter, text in novel.chapters.items()
+            ]
+            started = time.perf_counter()
+            indexed = await gather_limited(concurrency, [
+                service.index_content(novel_id, chapter, text, {"source": "chapter"})
+                for novel_id, chapter, text in chapters
+            ])
+            index_seconds = time.perf_counter() - started
+            chunk_count = service._get_collection().count()
+            total_chars = sum(novel.total_chars for novel in corpus)
+            rss_indexed = current_rss_bytes()
+
+            # 检索
+            facts: List[PlantedFact] = [fact for novel in corpus for fact in novel.facts]
+            latencies: List[float] = []
+            hits = 0
+            violations = 0
+
+            async def search(fact: PlantedFact) -> None:
+                nonlocal hits, violations
+                query = RAGQuery(
+                    novel_id=fact.novel_id, query=fact.query, max_chapter=fact.max_chapter, top_k=top_k
+                )
+                begin = time.perf_counter()
+                response = await service.hybrid_search(query)
+                latencies.append(time.perf_counter() - begin)
+                if any(fact.text in result.content for result in response.results):
+                    hits += 1
+                if fact.max_chapter is not None:
+                    violations += sum(
+                        1 for result in response.results
+                        if (result.metadata.get("chapter") or 0) > fact.max_chapter
+                    )
+
+            started = time.perf_counter()
+            for _ in range(max(1, query_rounds)):
+                await gather_limited(concurrency, [search(fact) for fact in facts])
+            query_seconds = time.perf_counter() - started
+
+            queries = len(facts) * max(1, query_rounds)
+            return {
+                "config": {
+                    "novels": num_novels,
+                    "chapters_per_novel": num_chapters,
+                    "chapter_chars": chapter_chars,
+                    "facts_per_novel": facts_per_novel,
+                    "top_k": top_k,
+                    "concurrency": concurrency,
+                    "backend": backend,
+                    "numpy_dtype": numpy_dtype if backend == "numpy" else None,
+                    "embed_dim": embed_dim,
+                    "chunk_size": settings.RAG_CHUNK_SIZE,
+                    "chunk_overlap": settings.RAG_CHUNK_OVERLAP,
+                    "bm25": settings.RAG_BM25_ENABLED,
+                    "mmr": settings.RAG_MMR_ENABLED,
+                    "dedup": settings.RAG_DEDUP_ENABLED,
+                    "seed": seed,
+                },
+                "index": {
+                    "chapters": len(chapters),
+                    "failed_chapters": sum(1 for ok in indexed if not ok),
+                    "chunks": chunk_count,
+                    "chars": total_chars,
+                    "seconds": round(index_seconds, 3),
+                    "chapters_per_second": round(len(chapters) / index_seconds, 2) if index_seconds else 0.0,
+                    "chunks_per_second": round(chunk_count / index_seconds, 2) if index_seconds else 0.0,
+                    "chars_per_second": round(total_chars / index_seconds, 1) if index_seconds else 0.0,
+                },
+                "query": {
+                    **latency_summary(latencies),
+                    "seconds": round(query_seconds, 3),
+                    "queries_per_second": round(queries / query_seconds, 2) if query_seconds else 0.0,
+                },
+                "quality": {
+                    f"recall@{top_k}": round(hits / queries, 4) if queries else 0.0,
+                    "filter_violations": violations,
+                },
+                "memory": {
+                    "rss_start_bytes": rss_start,
+                    "rss_after_index_bytes": rss_indexed,
+                    "peak_rss_bytes": peak_rss_bytes(),
+                    "disk_bytes": directory_bytes(temp_dir),
+                    "storage": service.get_storage_stats(),
+                },
+            }
+        finally:
+            service.shutdown()
+            if work_dir is None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _parse_size(value: str) -> tuple:
+    try:
+        novels, chapters = value.lower().split("x")
+        return int(novels), int(chapters)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"规模格式应为 小说数x章节数，例如 5x20：{value}")
+
+
+def _print_summary(result: Dict[str, Any]) -> None:
+    config, index, query, quality = result["config"], result["index"], result["query"], result["quality"]
+    print(f"[INFO] 规模：{config['novels']}本 x {config['chapters_per_novel']}章（后端：{config['backend']}）")
+    print(f"[INFO] 索引：{index['chunks']}个分块，{index['seconds']}秒，"
+          f"{index['chunks_per_second']}分块/秒，{index['chars_per_second']}字/秒")
+    print(f"[INFO] 检索：{query['count']}次，p50={query['p50_ms']}ms p95={query['p95_ms']}ms "
+          f"p99={query['p99_ms']}ms，{query['queries_per_second']}次/秒")
+    recall_key = next(key for key in quality if key.startswith("recall@"))
+    print(f"[INFO] 质量：{recall_key}={quality[recall_key]}，章节过滤违规={quality['filter_violations']}")
+
+
+async def main(args: argparse.Namespace) -> int:
+    results = []
+    for novels, chapters in args.sizes:
+        result = await run_retrieval_benchmark(
+            num_novels=novels,
+            num_chapters=chapters,
+            chapter_chars=args.chapter_chars,
+            facts_per_novel=args.facts,
+            top_k=args.top_k,
+            concurrency=args.concurrency,
+            backend=args.backend,
+            numpy_dtype=args.numpy_dtype,
+            embed_dim=args.embed_dim,
+            query_rounds=args.rounds,
+            seed=args.seed,
+            mmr=args.mmr,
+            dedup=args.dedup,
+        )
+        _print_summary(result)
+        results.append(result)
+
+    output = json.dumps({"benchmark": "rag_retrieval", "results": results}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"[SUCCESS] 结果已写入 {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG检索基准测试（合成语料 + 本地哈希Embedding）")
+    parser.add_argument("--sizes", type=_parse_size, nargs="+", default=[(3, 20)], help="规模列表，格式 小说数x章节数")
+    parser.add_argument("--chapter-chars", type=int, default=3000, help="每章大约字数")
+    parser.add_argument("--facts", type=int, default=10, help="每本小说埋入的事实数（查询数）")
+    parser.add_argument("--top-k", type=int, default=3, help="每次检索返回数量")
+    parser.add_argument("--concurrency", type=int, default=4, help="索引与检索并发数")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma", help="向量库后端")
+    parser.add_argument("--numpy-dtype", default="float16", help="NumPy后端存储精度（float16/float32/int8/pq）")
+    parser.add_argument("--embed-dim", type=int, default=256, help="哈希Embedding维度")
+    parser.add_argument("--rounds", type=int, default=1, help="查询重复轮数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--mmr", action="store_true", help="启用MMR重排")
+    parser.add_argument("--dedup", action="store_true", help="启用重叠分块去重")
+    parser.add_argument("--output", help="结果JSON输出路径（默认打印到标准输出）")
+    parser.add_argument("--verbose", action="store_true", help="输出RAG服务的INFO日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+    sys.exit(asyncio.run(main(args)))
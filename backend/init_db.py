@@ -3,11 +3,17 @@
 
 创建所有数据表
 """
-from app.db.base import Base, engine
+from app.db.base import Base, engine, ensure_columns
 from app.models.user import User  # 导入所有模型，确保被SQLAlchemy发现
 from app.models.novel import Novel, Chapter, StyleSample
+from app.models.character import Character
 
 print("正在创建数据库表...")
 Base.metadata.create_all(bind=engine)
+
+# create_all不会修改已存在的表，旧数据库需要补上新增的列
+for column in ensure_columns(engine):
+    print(f"[INFO] 已添加{column}列")
+
 print("[SUCCESS] 数据库初始化完成！")
 print(f"[INFO] 创建的表：{', '.join(Base.metadata.tables.keys())}")
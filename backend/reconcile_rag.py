@@ -0,0 +1,54 @@
+"""
+RAG向量库对账脚本
+
+比较数据库中的章节与向量库中的分块：删除已不存在的小说/章节留下的孤儿向量，
+重新索引缺失向量的章节，并输出漂移汇总。
+
+用法：
+    python reconcile_rag.py                  # 对账全部小说
+    python reconcile_rag.py --novel-id 1 2   # 只对账指定小说
+    python reconcile_rag.py --dry-run        # 只统计，不做修改
+"""
+import argparse
+import asyncio
+import sys
+
+from app.services.rag_reconcile import rag_reconciler
+from app.services.rag_service import rag_service
+
+
+async def main(args: argparse.Namespace) -> int:
+    # 命令行直接同步初始化，不走后台预热
+    if not rag_service.initialize():
+        print(f"[ERROR] RAG服务初始化失败：{rag_service.init_error}")
+        return 1
+
+    try:
+        report = await rag_reconciler.run(args.novel_id, dry_run=args.dry_run)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    finally:
+        rag_service.shutdown()
+
+    result = report.to_dict()
+    print(f"[INFO] 检查小说：{result['novels_checked']}本，数据库章节：{result['db_chapters']}，"
+          f"向量库章节：{result['store_chapters']}（{result['store_vectors']}个向量）")
+    print(f"[INFO] 孤儿小说：{result['orphan_novels'] or '无'}，孤儿章节：{result['orphan_chapters']}个"
+          f"（{result['orphan_vectors']}个向量），缺失章节：{result['missing_chapters']}个")
+    if result["status"] != "completed":
+        print(f"[ERROR] 对账未完成：{result['error'] or result['status']}")
+        return 1
+    if args.dry_run:
+        print("[SUCCESS] 检查完成（未做修改）")
+    else:
+        print(f"[SUCCESS] 对账完成：删除{result['vectors_deleted']}个孤儿向量，"
+              f"重新索引{result['chapters_reindexed']}章（{result['chunks_indexed']}个分块）")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG向量库对账与垃圾回收")
+    parser.add_argument("--novel-id", type=int, nargs="+", help="只对账指定小说")
+    parser.add_argument("--dry-run", action="store_true", help="只统计漂移，不删除也不重新索引")
+    sys.exit(asyncio.run(main(parser.parse_args())))
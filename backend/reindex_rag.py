@@ -0,0 +1,52 @@
+"""
+RAG批量重建索引脚本
+
+从数据库读取章节，按当前Embedding配置重建向量索引，支持断点续跑。
+
+用法：
+    python reindex_rag.py                  # 重建全部小说
+    python reindex_rag.py --novel-id 1 2   # 只重建指定小说
+    python reindex_rag.py --force          # 强制重新计算全部向量
+    python reindex_rag.py --restart        # 忽略检查点，从头开始
+"""
+import argparse
+import asyncio
+import sys
+
+from app.services.rag_reindex import rag_reindexer
+from app.services.rag_service import rag_service
+
+
+async def main(args: argparse.Namespace) -> int:
+    # 命令行直接同步初始化，不走后台预热
+    if not rag_service.initialize():
+        print(f"[ERROR] RAG服务初始化失败：{rag_service.init_error}")
+        return 1
+
+    try:
+        job = await rag_reindexer.run(args.novel_id, force=args.force, resume=not args.restart)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    finally:
+        rag_service.shutdown()
+
+    result = job.to_dict()
+    print(f"[INFO] 任务：{result['job_id']}（状态：{result['status']}）")
+    print(f"[INFO] 章节：{result['chapters_done']}/{result['total_chapters']}，"
+          f"分块：{result['chunks_total']}，计算向量：{result['chunks_embedded']}，"
+          f"删除失效分块：{result['chunks_deleted']}")
+    print(f"[INFO] 耗时：{result['elapsed_seconds']}秒，吞吐量：{result['chunks_per_second']}分块/秒")
+    if result["status"] != "completed":
+        print(f"[ERROR] 任务未完成：{result['error'] or result['status']}，再次运行即可从检查点继续")
+        return 1
+    print("[SUCCESS] 重建索引完成！")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG批量重建索引")
+    parser.add_argument("--novel-id", type=int, nargs="+", help="只重建指定小说")
+    parser.add_argument("--force", action="store_true", help="强制重新计算全部向量")
+    parser.add_argument("--restart", action="store_true", help="忽略已有检查点，从头开始")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,88 @@
+"""
+Agent流式生成单元测试
+使用假的流式Chat模型替代OpenAI，测试Agent C的输出逐token推送以及一致性重试时的reset事件
+"""
+from itertools import cycle
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.models.schemas import GenerationRequest
+from app.services import agent_service as agent_module
+from app.services.agent_service import AgentService
+
+
+PLOT_TEXT = "夜色 渐深， 李明 推开了 魔法塔 的 大门。"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """屏蔽RAG、角色匹配与一致性检查外部依赖的Agent服务"""
+    async def fake_retrieve_many(novel_id, queries, max_chapter, top_k=3):
+        return {name: [f"{name}片段"] for name in queries}
+
+    async def fake_select_characters(novel_id, text, limit=3):
+        return ["李明"]
+
+    monkeypatch.setattr(agent_module.rag_service, "retrieve_many", fake_retrieve_many)
+    monkeypatch.setattr(agent_module.character_matcher, "select_characters", fake_select_characters)
+
+    svc = AgentService()
+    svc.llm_simple = GenericFakeChatModel(messages=cycle([AIMessage(content="铺垫 内容")]))
+    svc.llm_complex = GenericFakeChatModel(messages=cycle([AIMessage(content=PLOT_TEXT)]))
+    return svc
+
+
+def _set_consistency(monkeypatch, results):
+    """按调用顺序返回一致性检查结果"""
+    results = iter(results)
+
+    async def fake_check_content(**kwargs):
+        return next(results)
+
+    monkeypatch.setattr(agent_module.consistency_service, "check_content", fake_check_content)
+
+
+async def _collect(service):
+    request = GenerationRequest(novel_id=1, prompt="李明进入魔法塔", chapter=2)
+    return [event async for event in service.generate_content_stream(request)]
+
+
+class TestGenerateContentStream:
+    """流式生成测试"""
+
+    @pytest.mark.asyncio
+    async def test_tokens_streamed_before_consistency_check(self, service, monkeypatch):
+        """测试Agent C的正文逐token推送，且全部先于一致性检查事件"""
+        _set_consistency(monkeypatch, [{"has_conflict": False}])
+        events = await _collect(service)
+
+        tokens = [event for event in events if event["type"] == "token"]
+        assert len(tokens) > 1
+        assert "".join(event["content"] for event in tokens) == PLOT_TEXT
+        assert {event["attempt"] for event in tokens} == {1}
+        # Agent A/B的输出不混入正文
+        assert all("铺垫" not in event["content"] for event in tokens)
+
+        last_token = max(i for i, event in enumerate(events) if event["type"] == "token")
+        check_done = next(i for i, event in enumerate(events) if event.get("status") == "检查通过")
+        assert last_token < check_done
+        assert not any(event["type"] == "reset" for event in events)
+        assert events[-1]["type"] == "final_response"
+        assert events[-1]["data"].final_content == PLOT_TEXT
+
+    @pytest.mark.asyncio
+    async def test_reset_on_retry(self, service, monkeypatch):
+        """测试一致性冲突重试时先推送reset，再推送新一轮正文"""
+        _set_consistency(monkeypatch, [
+            {"has_conflict": True, "violations": ["时间倒退"]},
+            {"has_conflict": False},
+        ])
+        events = await _collect(service)
+
+        resets = [i for i, event in enumerate(events) if event["type"] == "reset"]
+        assert len(resets) == 1
+        after = [event for event in events[resets[0]:] if event["type"] == "token"]
+        assert {event["attempt"] for event in after} == {2}
+        assert "".join(event["content"] for event in after) == PLOT_TEXT
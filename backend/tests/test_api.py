@@ -19,6 +19,14 @@ class TestHealthAPI:
         assert "app_name" in data
         assert "version" in data
 
+    def test_rag_health(self, client: TestClient):
+        """测试RAG就绪状态接口"""
+        response = client.get("/api/health/rag")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] in ("initializing", "ready", "degraded")
+
     def test_ping(self, client: TestClient):
         """测试ping接口"""
         response = client.get("/api/ping")
@@ -53,6 +61,26 @@ class TestGenerationAPI:
 
         assert response.status_code == 422
 
+    def test_generate_content_anonymous_priority(self, client: TestClient, monkeypatch):
+        """测试匿名调用按客户端地址标注LLM优先级，而不是共用一个排队份额"""
+        from app.api.routes import generation
+        from app.services.llm_scheduler import current_llm_priority
+
+        seen = []
+
+        async def fake_generate(request):
+            seen.append(current_llm_priority())
+            raise RuntimeError("跳过生成")
+
+        monkeypatch.setattr(generation.agent_service, "generate_content", fake_generate)
+        response = client.post(
+            "/api/generation/generate",
+            json={"novel_id": 1, "prompt": "测试", "chapter": 1},
+        )
+
+        assert response.status_code == 500
+        assert seen == [("interactive", "anon:testclient")]
+
     @pytest.mark.asyncio
     async def test_generate_content_success(self, client: TestClient, request):
         """测试生成接口 - 成功（需要真实API）"""
@@ -0,0 +1,174 @@
+"""
+角色名匹配单元测试
+测试Aho-Corasick自动机、别名识别、最长匹配、增量更新以及从数据库加载
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.db.base import Base, ensure_columns
+from app.models.character import Character
+from app.models.novel import Novel
+from app.models.user import User
+from app.services.character_matcher import (
+    AhoCorasick,
+    CharacterMatcherRegistry,
+    NovelCharacterMatcher,
+)
+
+
+@pytest.fixture
+def session_factory():
+    """内存数据库：1本小说和3个角色"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    db.add(Novel(id=1, title="测试小说", user_id=1))
+    db.add(Character(id=1, novel_id=1, name="李明", aliases=["明哥"], importance_level="main"))
+    db.add(Character(id=2, novel_id=1, name="张三", aliases=[]))
+    db.add(Character(id=3, novel_id=1, name="王五", aliases=None))
+    db.commit()
+    db.close()
+    return factory
+
+
+class TestAhoCorasick:
+    """自动机测试"""
+
+    def test_overlapping_patterns(self):
+        """测试相互重叠、互为后缀的模式串全部命中"""
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+        text = "ushers"
+        matches = sorted((text[start:end], start) for start, end in automaton.iter_matches(text))
+        assert matches == [("he", 2), ("hers", 2), ("she", 1)]
+
+    def test_no_patterns(self):
+        """测试空模式集不产生命中"""
+        assert list(AhoCorasick([]).iter_matches("任意文本")) == []
+
+
+class TestNovelCharacterMatcher:
+    """单本小说匹配器测试"""
+
+    def test_aliases_and_counts(self):
+        """测试姓名与别名都归到同一角色并计数"""
+        matcher = NovelCharacterMatcher()
+        matcher.upsert(1, "李明", ["明哥"])
+        matcher.upsert(2, "张三")
+
+        mentions = matcher.find("张三对明哥说：李明，你来了。")
+        assert [mention.name for mention in mentions] == ["张三", "李明"]
+        assert mentions[1].count == 2
+        assert mentions[1].terms == {"李明", "明哥"}
+        assert mentions[1].first_position == 3
+
+    def test_longest_match_wins(self):
+        """测试"林风华"不会同时算作"林风"，单字别名被忽略"""
+        matcher = NovelCharacterMatcher()
+        matcher.upsert(1, "林风")
+        matcher.upsert(2, "林风华", ["华"])
+
+        assert [mention.name for mention in matcher.find("林风华走了")] == ["林风华"]
+        assert [mention.name for mention in matcher.find("林风走了，华在等")] == ["林风"]
+
+    def test_incremental_update(self):
+        """测试改名、删除后重新扫描即生效"""
+        matcher = NovelCharacterMatcher()
+        matcher.upsert(1, "李明")
+        assert matcher.find("李明来了")
+
+        matcher.upsert(1, "李大明")
+        assert matcher.find("李明来了") == []
+        assert matcher.find("李大明来了")[0].character_id == 1
+
+        matcher.remove(1)
+        assert matcher.find("李大明来了") == []
+
+
+class TestCharacterMatcherRegistry:
+    """匹配器注册表测试"""
+
+    def test_load_from_database(self, session_factory):
+        """测试首次使用时从characters表加载，识别主要角色"""
+        registry = CharacterMatcherRegistry(session_factory)
+        assert not registry.is_loaded(1)
+
+        mentions = registry.find_characters(1, "王五和明哥在酒馆")
+        assert [mention.character_id for mention in mentions] == [3, 1]
+        assert registry.is_loaded(1)
+        assert registry.main_characters(1) == [(1, "李明")]
+
+    def test_crud_hooks(self, session_factory):
+        """测试增删改钩子只更新已加载的小说"""
+        registry = CharacterMatcherRegistry(session_factory)
+        # 未加载时忽略
+        registry.upsert_character(Character(id=9, novel_id=1, name="赵六"))
+        registry.get(1)
+        assert registry.find_characters(1, "赵六") == []
+
+        registry.upsert_character(Character(id=9, novel_id=1, name="赵六", aliases=["六爷"]))
+        assert registry.find_characters(1, "六爷")[0].name == "赵六"
+
+        registry.remove_character(1, 2)
+        assert registry.find_characters(1, "张三") == []
+
+        registry.drop_novel(1)
+        assert not registry.is_loaded(1)
+
+    def test_lru_eviction(self, session_factory):
+        """测试超过上限时淘汰最久未使用的小说"""
+        registry = CharacterMatcherRegistry(session_factory, max_novels=1)
+        registry.get(1)
+        registry.get(2)
+        assert not registry.is_loaded(1)
+        assert registry.is_loaded(2)
+
+    def test_reload_on_version_change(self, session_factory):
+        """测试其他进程修改角色后，到了核对时间按版本重新加载"""
+        registry = CharacterMatcherRegistry(session_factory, recheck_seconds=0)
+        first = registry.get(1)
+        assert registry.get(1) is first
+
+        # 绕过钩子直接写库，模拟其他进程的修改
+        db = session_factory()
+        db.add(Character(id=4, novel_id=1, name="赵六", updated_at=datetime(2030, 1, 1)))
+        db.commit()
+        db.close()
+
+        assert registry.find_characters(1, "赵六")[0].character_id == 4
+        assert registry.get(1) is not first
+
+    def test_version_not_checked_within_interval(self, session_factory):
+        """测试核对间隔内直接使用已加载的匹配器"""
+        registry = CharacterMatcherRegistry(session_factory, recheck_seconds=3600)
+        registry.get(1)
+        assert not registry.needs_database(1)
+        assert registry.needs_database(2)
+
+
+def test_ensure_columns_adds_missing_column():
+    """测试为缺列的旧表补上新增列，重复执行无副作用"""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE characters (id INTEGER PRIMARY KEY, name VARCHAR(100))"))
+
+    assert ensure_columns(engine) == ["characters.aliases"]
+    assert ensure_columns(engine) == []
+    assert "aliases" in {c["name"] for c in inspect(engine).get_columns("characters")}
+
+    @pytest.mark.asyncio
+    async def test_select_characters(self, session_factory):
+        """测试按提及次数选角色，未提及时回退到主要角色"""
+        registry = CharacterMatcherRegistry(session_factory)
+        names = await registry.select_characters(1, "张三见到王五，王五笑了", limit=1)
+        assert names == ["王五"]
+        assert await registry.select_characters(1, "无人提及", limit=3) == ["李明"]
+        assert await registry.select_characters(2, "无人提及") == ["主角"]
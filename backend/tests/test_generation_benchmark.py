@@ -0,0 +1,77 @@
+"""
+生成链路基准测试单元测试
+测试事件循环延迟采样、角色预加载与小规模端到端基准测试流程
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.character_matcher import CharacterMatcherRegistry
+from benchmarks.generation_pipeline import NODE_IDS, EventLoopLagMonitor, run_pipeline_benchmark
+
+
+class TestEventLoopLagMonitor:
+    """事件循环延迟采样测试"""
+
+    @pytest.mark.asyncio
+    async def test_detects_blocking(self):
+        """测试同步阻塞事件循环时采样到相应的延迟"""
+        monitor = EventLoopLagMonitor(interval=0.005)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+        assert len(monitor.samples) >= 3
+        assert max(monitor.samples) >= 0.04
+
+
+class TestCharacterPreload:
+    """角色预加载测试"""
+
+    @pytest.mark.asyncio
+    async def test_preload_without_database(self):
+        """测试预加载的角色无需查询数据库即可匹配"""
+        def no_database():
+            raise AssertionError("不应查询数据库")
+
+        matcher = CharacterMatcherRegistry(session_factory=no_database)
+        matcher.preload(1, [(1, "林风", ["小风"], True), (2, "苏瑶", [], False)])
+
+        assert await matcher.select_characters(1, "苏瑶找到小风") == ["苏瑶", "林风"]
+        assert await matcher.select_characters(1, "无人提及") == ["林风"]
+
+
+class TestPipelineBenchmark:
+    """基准测试流程测试"""
+
+    @pytest.mark.slow
+    @pytest.mark.asyncio
+    async def test_small_benchmark(self):
+        """测试小规模基准测试可离线跑通，并统计各节点耗时与注入错误的重试"""
+        result = await run_pipeline_benchmark(
+            concurrency_levels=[2],
+            num_requests=4,
+            num_users=2,
+            num_chapters=3,
+            chapter_chars=500,
+            target_length=200,
+            latency_ms=5,
+            jitter_ms=1,
+            token_delay_ms=0,
+            error_rate=0.2,
+        )
+
+        assert result["rag_index"]["failed_chapters"] == 0
+        assert result["config"]["users"] == 2
+        assert [run["mode"] for run in result["runs"]] == ["generate", "stream"]
+        for run in result["runs"]:
+            assert run["succeeded"] == 4
+            assert set(run["nodes"]) == set(NODE_IDS)
+            assert all(summary["count"] >= 4 for summary in run["nodes"].values())
+            assert run["retries"]["llm_retries"] > 0
+            assert run["llm"]["mock_backend"]["families"].keys() == {"agent_a", "agent_b", "agent_c"}
+            assert run["event_loop_lag"]["count"] > 0
+        assert result["runs"][1]["first_token"]["count"] == 4
@@ -0,0 +1,173 @@
+"""
+LLM响应缓存单元测试
+测试缓存键、温度上限、过期、容量淘汰、持久化以及客户端按调用点开启缓存
+"""
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+
+from app.core.config import settings
+from app.services import llm_client
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_client import LLMClientRegistry
+
+
+MESSAGES = [SystemMessage(content="你是小说编辑"), HumanMessage(content="分析第1章")]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.db"), max_entries=10, ttl_seconds=60, max_temperature=0.5)
+    yield cache
+    cache.close()
+
+
+class TestLLMResponseCache:
+    """缓存存储测试"""
+
+    def test_roundtrip_and_key(self, cache):
+        """测试写入后命中，消息、模型、温度或接口不同则不命中"""
+        key = cache.make_key("gpt-4o", 0.3, MESSAGES)
+        assert cache.get(key) is None
+        cache.put(key, "节奏偏慢", {"finish_reason": "stop"})
+
+        assert cache.get(cache.make_key("gpt-4o", 0.3, MESSAGES)) == {
+            "content": "节奏偏慢", "metadata": {"finish_reason": "stop"},
+        }
+        assert cache.get(cache.make_key("gpt-4o", 0.3, MESSAGES[:1])) is None
+        assert cache.get(cache.make_key("gpt-4o-mini", 0.3, MESSAGES)) is None
+        assert cache.get(cache.make_key("gpt-4o", 0.2, MESSAGES)) is None
+        assert cache.get(cache.make_key("gpt-4o", 0.3, MESSAGES, stop=["\n"])) is None
+        assert cache.get(cache.make_key("gpt-4o", 0.3, MESSAGES, endpoint="mock:http://a/v1")) is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 6
+
+    def test_high_temperature_bypassed(self, cache):
+        """测试温度高于上限时不生成缓存键"""
+        assert cache.make_key("gpt-4o", 0.8, MESSAGES) is None
+        assert cache.make_key("gpt-4o", 0.5, MESSAGES) is not None
+        assert cache.stats()["bypassed"] == 1
+
+    def test_ttl_expiry(self, cache):
+        """测试过期条目读取时删除"""
+        key = cache.make_key("gpt-4o", 0.3, MESSAGES)
+        cache.put(key, "旧结果")
+        cache.ttl_seconds = 0.01
+        time.sleep(0.02)
+        assert cache.get(key) is None
+        assert len(cache) == 0
+        assert cache.stats()["expired"] == 1
+
+    def test_eviction(self, cache):
+        """测试超过容量后淘汰最久未访问的条目"""
+        keys = [cache.make_key("gpt-4o", 0.3, [HumanMessage(content=f"第{i}章")]) for i in range(11)]
+        for i, key in enumerate(keys[:10]):
+            cache.put(key, f"结果{i}")
+        # 访问第0条，使其不被淘汰
+        assert cache.get(keys[0]) is not None
+        cache.put(keys[10], "结果10")
+
+        assert len(cache) == 9
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[10]) is not None
+
+    def test_persistent(self, tmp_path):
+        """测试重新打开后仍能命中"""
+        path = str(tmp_path / "llm.db")
+        cache = LLMResponseCache(path)
+        key = cache.make_key("gpt-4o", 0.3, MESSAGES)
+        cache.put(key, "持久化结果")
+        cache.close()
+
+        reopened = LLMResponseCache(path)
+        assert reopened.get(key)["content"] == "持久化结果"
+        reopened.close()
+
+
+class TestCachedClient:
+    """客户端按调用点开启缓存测试"""
+
+    @pytest.fixture
+    def registry(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+        monkeypatch.setattr(settings, "LLM_CACHE_PATH", str(tmp_path / "responses.db"))
+        registry = LLMClientRegistry()
+        monkeypatch.setattr(llm_client, "llm_registry", registry)
+        yield registry
+        asyncio.run(registry.aclose())
+
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        """替换底层请求，记录实际发出的调用"""
+        calls = []
+
+        async def fake_agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            calls.append(kwargs.get("temperature", self.temperature))
+            message = AIMessage(content=f"回复{len(calls)}", response_metadata={"finish_reason": "stop"})
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        monkeypatch.setattr(ChatOpenAI, "_agenerate", fake_agenerate)
+        return calls
+
+    @pytest.mark.asyncio
+    async def test_cache_hit(self, registry, calls):
+        """测试开启缓存的调用点重复调用只请求一次"""
+        llm = registry.get("gpt-4o", temperature=0.3, cache=True)
+        first = await llm.ainvoke(MESSAGES)
+        second = await llm.ainvoke(MESSAGES)
+
+        assert len(calls) == 1
+        assert second.content == first.content == "回复1"
+        assert second.response_metadata["cache_hit"] is True
+        stats = registry.get_stats()["response_cache"]
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_sync_invoke_shares_cache(self, registry, calls, monkeypatch):
+        """测试同步调用同样读写缓存，与异步调用互相命中"""
+        def fake_generate(self, messages, stop=None, run_manager=None, **kwargs):
+            calls.append(kwargs.get("temperature", self.temperature))
+            message = AIMessage(content="同步回复", response_metadata={"finish_reason": "stop"})
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        monkeypatch.setattr(ChatOpenAI, "_generate", fake_generate)
+        llm = registry.get("gpt-4o", temperature=0.3, cache=True)
+        first = llm.invoke(MESSAGES)
+        second = await llm.ainvoke(MESSAGES)
+
+        assert len(calls) == 1
+        assert second.content == first.content == "同步回复"
+        assert second.response_metadata["cache_hit"] is True
+
+    @pytest.mark.asyncio
+    async def test_opt_in_and_temperature(self, registry, calls):
+        """测试未开启缓存的调用点、以及高温度调用不走缓存"""
+        plain = registry.get("gpt-4o", temperature=0.3)
+        await plain.ainvoke(MESSAGES)
+        await plain.ainvoke(MESSAGES)
+
+        creative = registry.get("gpt-4o", temperature=0.8, cache=True)
+        await creative.ainvoke(MESSAGES)
+        await creative.ainvoke(MESSAGES)
+
+        assert len(calls) == 4
+        assert registry.get_stats()["response_cache"]["bypassed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_endpoint_isolated(self, registry, calls, monkeypatch):
+        """测试不同API地址或模拟后端的同名模型互不命中缓存"""
+        await registry.get("gpt-4o", temperature=0.3, cache=True).ainvoke(MESSAGES)
+        await registry.get("gpt-4o", temperature=0.3, base_url="http://other:8000/v1", cache=True).ainvoke(MESSAGES)
+        monkeypatch.setattr(settings, "LLM_BACKEND", "mock")
+        await registry.get("gpt-4o", temperature=0.3, cache=True).ainvoke(MESSAGES)
+
+        assert len(calls) == 3
+        assert registry.get_stats()["response_cache"]["hits"] == 0
@@ -0,0 +1,98 @@
+"""
+LLM客户端注册表单元测试
+测试按温度档位复用客户端、共享HTTP连接池、按模型的并发上限与统计
+"""
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+
+from app.core.config import settings
+from app.services import llm_client
+from app.services.llm_client import LLMClientRegistry, temperature_class
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """独立的注册表，并让PooledChatOpenAI使用它"""
+    registry = LLMClientRegistry()
+    monkeypatch.setattr(llm_client, "llm_registry", registry)
+    yield registry
+    asyncio.run(registry.aclose())
+
+
+class TestLLMClientRegistry:
+    """客户端注册表测试"""
+
+    def test_temperature_class(self):
+        """测试温度映射到档位"""
+        assert temperature_class(0.3) == ("precise", 0.3)
+        assert temperature_class(0.5) == ("balanced", 0.5)
+        assert temperature_class(0.8) == ("creative", 0.8)
+        assert temperature_class(1.2)[0] == "creative"
+
+    def test_clients_shared_by_class(self, registry):
+        """测试同一档位复用客户端、精确温度在调用时绑定，所有客户端共享连接池"""
+        base = registry.get("model-a", temperature=0.8)
+        assert registry.get("model-a", temperature=0.8) is base
+
+        bound = registry.get("model-a", temperature=0.7)
+        assert bound.bound is base
+        assert bound.kwargs == {"temperature": 0.7}
+
+        other = registry.get("model-b", temperature=0.3)
+        assert other is not base
+        assert other.http_async_client is base.http_async_client
+        assert other.http_client is base.http_client
+
+        stats = registry.get_stats()
+        assert len(stats["clients"]) == 2
+        assert stats["http_pool"]["max_connections"] == settings.LLM_HTTP_MAX_CONNECTIONS
+
+    @pytest.mark.asyncio
+    async def test_per_model_concurrency(self, registry, monkeypatch):
+        """测试按模型的并发上限与覆盖配置"""
+        monkeypatch.setitem(settings.LLM_MODEL_CONCURRENCY, "model-a", 2)
+
+        async def call(model):
+            async with registry.slot(model):
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call("model-a") for _ in range(6)), *(call("model-b") for _ in range(3)))
+
+        stats = registry.get_stats()["models"]
+        assert stats["model-a"]["max_concurrency"] == 2
+        assert stats["model-a"]["peak_in_flight"] == 2
+        assert stats["model-a"]["requests"] == 6
+        assert stats["model-b"]["max_concurrency"] == settings.LLM_MAX_CONCURRENCY_PER_MODEL
+        assert stats["model-b"]["peak_in_flight"] == 3
+
+    @pytest.mark.asyncio
+    async def test_slot_reentrant(self, registry, monkeypatch):
+        """测试同一调用链内重入不会在上限为1时死锁"""
+        monkeypatch.setitem(settings.LLM_MODEL_CONCURRENCY, "model-a", 1)
+        async with registry.slot("model-a"):
+            async with registry.slot("model-a"):
+                pass
+        assert registry.get_stats()["models"]["model-a"]["requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_pooled_client_limits_calls(self, registry, monkeypatch):
+        """测试客户端调用经过按模型的并发限制"""
+        monkeypatch.setitem(settings.LLM_MODEL_CONCURRENCY, "model-a", 1)
+        in_flight = []
+
+        async def fake_agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            in_flight.append(registry.limiter(self.model_name).in_flight)
+            await asyncio.sleep(0.01)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="好"))])
+
+        monkeypatch.setattr(ChatOpenAI, "_agenerate", fake_agenerate)
+        llm = registry.get("model-a", temperature=0.3)
+
+        results = await asyncio.gather(*(llm.ainvoke([HumanMessage(content="你好")]) for _ in range(3)))
+        assert [result.content for result in results] == ["好"] * 3
+        assert in_flight == [1, 1, 1]
+        assert registry.get_stats()["models"]["model-a"]["requests"] == 3
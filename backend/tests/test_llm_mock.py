@@ -0,0 +1,184 @@
+"""
+模拟LLM后端单元测试
+测试调用类型识别、确定性且符合结构的响应、延迟分布、流式输出、错误注入以及经注册表的完整调用路径
+"""
+import asyncio
+import json
+import statistics
+from types import SimpleNamespace
+
+import openai
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.core.config import settings
+from app.services import editor_service as editor_module
+from app.services import llm_client
+from app.services.llm_client import LLMClientRegistry
+from app.services.llm_mock import MockLLMBackend, classify_prompt
+from app.services.review_agents import review_pace_agent
+
+
+def _messages(system: str, user: str = "剧情提示：主角夜探藏书阁"):
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+class TestMockResponses:
+    """响应内容测试"""
+
+    def test_classify(self):
+        """测试按提示词关键词识别调用类型，未识别时按是否要求JSON区分"""
+        assert classify_prompt("你是一位专业的小说世界观描写专家。") == "agent_a"
+        assert classify_prompt("你是一位内容安全审核专家。") == "review_safety"
+        assert classify_prompt("请基于以下信息给出3个下一步剧情走向选项") == "plot_options"
+        assert classify_prompt("请以JSON格式返回") == "json"
+        assert classify_prompt("请改写这段文字") == "prose"
+
+    def test_deterministic(self):
+        """测试相同模型与提示词得到相同内容，提示词不同则内容不同"""
+        backend = MockLLMBackend()
+        messages = _messages("你是一位专业的小说剧情控制专家。控制在总计300字左右")
+        family, first = backend.complete("gpt-4o", messages)
+        assert family == "agent_c"
+        assert MockLLMBackend(seed=7).complete("gpt-4o", messages)[1] == first
+        assert backend.complete("gpt-4o", _messages("你是一位专业的小说剧情控制专家。控制在总计300字左右", "另一个提示"))[1] != first
+        assert len(first.replace("\n", "")) >= 300
+
+    @pytest.mark.parametrize("system,keys", [
+        ("你是一位专业的小说节奏审核专家。", {"score", "pace_type", "issues", "suggestions", "details"}),
+        ("你是一位专业的小说质量审核专家。", {"score", "grammar_score", "logic_score", "description_score"}),
+        ("你是一位专业的情节连贯性审核专家。", {"score", "coherence_issues", "plot_holes", "suggestions"}),
+        ("你是一位专业的角色一致性审核专家。", {"score", "inconsistencies", "suggestions"}),
+        ("你是一位专业的文学风格审核专家。", {"score", "style_type", "consistency_score"}),
+        ("你是一位内容安全审核专家。", {"is_safe", "risk_level", "flagged_content", "suggestions"}),
+        ("你是一个专业的角色分析师。", {"personality_analysis", "consistency_check", "overall_score", "summary"}),
+        ("你是一个专业的小说角色设计师。", {"name", "age", "skills", "importance_level"}),
+        ("负责为作者自动生成新章节。目标字数：约500字", {"title", "content"}),
+    ])
+    def test_json_schema(self, system, keys):
+        """测试各JSON调用类型返回可解析且包含调用点所需字段的JSON"""
+        _, content = MockLLMBackend().complete("gpt-4o", _messages(system))
+        assert keys <= set(json.loads(content))
+
+    def test_plot_options_count(self):
+        """测试剧情选项数量与提示词要求一致"""
+        _, content = MockLLMBackend().complete("gpt-4o", _messages("剧情策划编辑", "请基于以下信息给出5个下一步剧情走向选项"))
+        options = json.loads(content)["options"]
+        assert len(options) == 5
+        assert all({"title", "summary", "impact", "risk"} <= set(option) for option in options)
+
+
+class TestMockBehaviour:
+    """延迟、流式与错误注入测试"""
+
+    def test_latency_distributions(self):
+        """测试固定延迟精确，对数正态分布中位数接近配置值"""
+        assert MockLLMBackend(latency_ms=120, distribution="fixed").sample_latency() == pytest.approx(0.12)
+        backend = MockLLMBackend(latency_ms=200, jitter_ms=100, distribution="lognormal")
+        samples = [backend.sample_latency() for _ in range(2000)]
+        assert statistics.median(samples) == pytest.approx(0.2, rel=0.1)
+        assert max(samples) > 0.4
+        with pytest.raises(ValueError):
+            MockLLMBackend(distribution="pareto")
+
+    def test_streaming_reply(self):
+        """测试流式应答按片段输出，并以[DONE]结束"""
+        backend = MockLLMBackend(latency_ms=0, chunk_tokens=5, token_delay_ms=1)
+        reply = backend.reply({"model": "m", "stream": True, "messages": _messages("你是一位专业的小说角色描写专家。")})
+        events = [data.decode() for _, data in reply.chunks]
+        assert events[-1] == "data: [DONE]\n\n"
+        pieces = [json.loads(event[6:])["choices"][0]["delta"].get("content", "") for event in events[:-2]]
+        _, content = backend.complete("m", _messages("你是一位专业的小说角色描写专家。"))
+        assert "".join(pieces) == content
+        assert max(len(piece) for piece in pieces) == 5
+        assert sum(delay for delay, _ in reply.chunks) == pytest.approx(len(content) / 1000)
+
+    def test_max_tokens_truncates(self):
+        """测试超过max_tokens时截断并返回finish_reason=length"""
+        reply = MockLLMBackend().reply({"model": "m", "max_tokens": 10, "messages": _messages("请改写")})
+        choice = json.loads(reply.body)["choices"][0]
+        assert len(choice["message"]["content"]) == 10
+        assert choice["finish_reason"] == "length"
+
+    def test_error_injection(self):
+        """测试按比例注入错误，429附带retry-after-ms"""
+        backend = MockLLMBackend(error_rate=0.3, error_statuses=[429], retry_after_ms=50)
+        replies = [backend.reply({"model": "m", "messages": _messages("请改写")}) for _ in range(500)]
+        errors = [reply for reply in replies if reply.status == 429]
+        assert 100 < len(errors) < 200
+        assert errors[0].headers["retry-after-ms"] == "50"
+        assert backend.stats()["errors"] == {"429": len(errors)}
+
+
+class TestMockRegistry:
+    """经LLM客户端注册表调用模拟后端的测试"""
+
+    @pytest.fixture
+    def registry(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_BACKEND", "mock")
+        monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+        monkeypatch.setattr(settings, "LLM_MOCK_LATENCY_MS", 1.0)
+        monkeypatch.setattr(settings, "LLM_MOCK_TOKEN_DELAY_MS", 0.0)
+        monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.001)
+        monkeypatch.setattr(settings, "LLM_MOCK_RETRY_AFTER_MS", 1.0)
+        registry = LLMClientRegistry()
+        monkeypatch.setattr(llm_client, "llm_registry", registry)
+        yield registry
+        asyncio.run(registry.aclose())
+
+    @pytest.mark.asyncio
+    async def test_invoke_and_stream(self, registry):
+        """测试非流式与流式调用均得到同一确定性内容"""
+        llm = registry.get("gpt-4o", temperature=0.8)
+        messages = [SystemMessage(content="你是一位专业的小说世界观描写专家。"), HumanMessage(content="剧情提示：雨夜")]
+        response = await llm.ainvoke(messages)
+        chunks = [chunk.content async for chunk in llm.astream(messages)]
+
+        assert len(chunks) > 10
+        assert "".join(chunks) == response.content
+        stats = registry.get_stats()["mock_backend"]
+        assert stats["requests"] == 2
+        assert stats["streamed"] == 1
+        assert stats["families"] == {"agent_a": 2}
+
+    @pytest.mark.asyncio
+    async def test_injected_errors_retried(self, registry, monkeypatch):
+        """测试注入的429经准入控制重试，重试耗尽后抛出"""
+        monkeypatch.setattr(settings, "LLM_MOCK_ERROR_RATE", 1.0)
+        monkeypatch.setattr(settings, "LLM_MOCK_ERROR_STATUSES", [429])
+        monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+        llm = registry.get("gpt-4o", temperature=0.3)
+
+        with pytest.raises(openai.RateLimitError):
+            await llm.ainvoke("你好")
+        model_stats = registry.get_stats()["models"]["gpt-4o"]
+        assert model_stats["retries"] == 2
+        assert model_stats["rate_limited"] == 3
+
+    def test_sync_invoke_uses_sdk_retries(self, registry, monkeypatch):
+        """测试同步调用不经过准入控制，注入的429由SDK自身重试"""
+        monkeypatch.setattr(settings, "LLM_MOCK_ERROR_RATE", 1.0)
+        monkeypatch.setattr(settings, "LLM_MOCK_ERROR_STATUSES", [429])
+        monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+        llm = registry.get("gpt-4o", temperature=0.3)
+
+        assert llm.async_client._client.max_retries == 0
+        with pytest.raises(openai.RateLimitError):
+            llm.invoke("你好")
+        assert registry.get_stats()["mock_backend"]["requests"] == 3
+
+    @pytest.mark.asyncio
+    async def test_review_and_editor_parse(self, registry, monkeypatch):
+        """测试审核Agent与编辑点评能解析模拟后端的真实提示词响应"""
+        steps = []
+        result = await review_pace_agent(registry.get("gpt-4o", temperature=0.3), 1, 1, "夜雨。", steps)
+        assert result["pace_type"] in {"slow", "medium", "fast", "uneven"}
+        assert not result["issues"][0].startswith("审核过程出错")
+
+        monkeypatch.setattr(editor_module, "llm_registry", registry)
+        novel = SimpleNamespace(id=1, title="长夜", genre="玄幻", worldview="灵脉")
+        chapter = SimpleNamespace(id=1, chapter_number=1, title="雨夜", content="夜雨。")
+        review = await editor_module.EditorService().review_chapter(novel=novel, chapter=chapter)
+        assert review is not None
+        assert 60 <= review.score <= 95
+        assert review.issues
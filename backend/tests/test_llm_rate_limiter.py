@@ -0,0 +1,168 @@
+"""
+LLM准入控制单元测试
+测试令牌桶、AIMD自适应并发、Retry-After解析与退避重试
+"""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.core.config import settings
+from app.services.llm_client import LLMClientRegistry
+from app.services.llm_rate_limiter import (
+    ModelAdmission,
+    TokenBucket,
+    backoff_delay,
+    classify_error,
+)
+
+
+def _status_error(status: int, headers=None) -> openai.APIStatusError:
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "http://llm.test"))
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_class("error", response=response, body=None)
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    def test_reserve(self):
+        """测试配额内立即可用，透支部分换算为等待时间"""
+        bucket = TokenBucket(60)
+        assert bucket.reserve(60) == 0
+        assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+        assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+    def test_adjust(self):
+        """测试按实际用量退还多预占的配额"""
+        bucket = TokenBucket(600)
+        bucket.reserve(600)
+        bucket.adjust(-300)
+        assert bucket.reserve(300) == 0
+
+
+class TestErrorHandling:
+    """错误分类与退避测试"""
+
+    def test_classify(self):
+        """测试429/5xx为过载信号，连接错误可重试，其他错误不重试"""
+        assert classify_error(_status_error(429, {"retry-after": "2"})) == (True, True, 2.0)
+        assert classify_error(_status_error(503, {"retry-after-ms": "1500"})) == (True, True, 1.5)
+        assert classify_error(_status_error(500)) == (True, True, None)
+        request = httpx.Request("POST", "http://llm.test")
+        assert classify_error(openai.APIConnectionError(request=request)) == (True, False, None)
+        assert classify_error(ValueError("bad")) == (False, False, None)
+
+    def test_backoff_honours_retry_after(self):
+        """测试退避时间不超过上限，且不短于Retry-After"""
+        for attempt in range(1, 6):
+            assert 0 <= backoff_delay(attempt, None, base=1.0, maximum=4.0) <= 4.0
+            assert 3.0 <= backoff_delay(attempt, 3.0, base=1.0, maximum=4.0) <= 4.0
+
+
+class TestModelAdmission:
+    """AIMD并发测试"""
+
+    def test_aimd(self):
+        """测试过载时乘性减小（冷却期内只减一次），成功时逐步恢复"""
+        admission = ModelAdmission(max_concurrency=8, min_concurrency=1, cooldown_seconds=60)
+        admission.on_overload(True)
+        admission.on_overload(True)
+        assert admission.limit == 4
+        assert admission.rate_limited == 2
+
+        for _ in range(100):
+            admission.on_success()
+        assert admission.limit == 8
+
+    @pytest.mark.asyncio
+    async def test_limit_applies_to_queue(self):
+        """测试缩减后的并发上限约束排队中的请求"""
+        admission = ModelAdmission(max_concurrency=4, cooldown_seconds=0)
+        admission.on_overload(False)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with admission.slot():
+                peak = max(peak, admission.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        assert peak == 2
+        stats = admission.to_dict()
+        assert stats["concurrency_limit"] == 2
+        assert stats["requests"] == 6
+        assert stats["max_wait_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_cancel_while_waiting(self):
+        """测试排队中取消不占用名额"""
+        admission = ModelAdmission(max_concurrency=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with admission.slot():
+                await release.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(admission.slot().__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        await task
+        assert admission.in_flight == 0
+        assert admission.waiting == 0
+
+
+class TestRegistryCall:
+    """注册表重试测试"""
+
+    @pytest.fixture
+    def registry(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.001)
+        monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+        return LLMClientRegistry()
+
+    @pytest.mark.asyncio
+    async def test_retry_after_429(self, registry):
+        """测试429后按Retry-After重试成功，并记录限流与重试次数"""
+        attempts = []
+
+        async def func():
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) == 1:
+                raise _status_error(429, {"retry-after-ms": "50"})
+            return "ok"
+
+        assert await registry.call("model-a", func) == "ok"
+        assert attempts[1] - attempts[0] >= 0.05
+        stats = registry.get_stats()["models"]["model-a"]
+        assert stats["retries"] == 1
+        assert stats["rate_limited"] == 1
+        assert stats["concurrency_limit"] < stats["max_concurrency"]
+
+    @pytest.mark.asyncio
+    async def test_gives_up(self, registry):
+        """测试超过重试次数后抛出，不可重试的错误立即抛出"""
+        calls = 0
+
+        async def overloaded():
+            nonlocal calls
+            calls += 1
+            raise _status_error(502)
+
+        with pytest.raises(openai.InternalServerError):
+            await registry.call("model-a", overloaded)
+        assert calls == 3
+
+        async def broken():
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            await registry.call("model-b", broken)
+        assert registry.get_stats()["models"]["model-b"]["retries"] == 0
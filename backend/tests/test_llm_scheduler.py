@@ -0,0 +1,158 @@
+"""
+LLM优先级调度单元测试
+测试优先级标注、类别优先、用户间公平排队、防饿死以及batch并发份额
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm_rate_limiter import ModelAdmission
+from app.services.llm_scheduler import (
+    FairScheduler,
+    current_llm_priority,
+    llm_priority,
+    set_llm_priority,
+)
+
+
+def _drain(scheduler):
+    order = []
+    while True:
+        waiter = scheduler.pop()
+        if waiter is None:
+            return order
+        waiter.future.set_result(None)
+        order.append((waiter.priority_class, waiter.user_id))
+
+
+class TestPriorityContext:
+    """优先级标注测试"""
+
+    def test_nested_context(self):
+        """测试内层只覆盖指定字段，退出后恢复"""
+        assert current_llm_priority() == ("standard", None)
+        with llm_priority("interactive", 1):
+            with llm_priority("batch"):
+                assert current_llm_priority() == ("batch", 1)
+            assert current_llm_priority() == ("interactive", 1)
+        assert current_llm_priority() == ("standard", None)
+
+    def test_anonymous_user_key(self):
+        """测试未登录请求可用字符串标识区分"""
+        with llm_priority("interactive", "anon:10.0.0.1"):
+            assert current_llm_priority() == ("interactive", "anon:10.0.0.1")
+
+    def test_unknown_class(self):
+        """测试未知类别报错"""
+        with pytest.raises(ValueError):
+            set_llm_priority("urgent")
+
+
+class TestFairScheduler:
+    """等待队列测试"""
+
+    @pytest.mark.asyncio
+    async def test_class_priority(self):
+        """测试高优先级类别先出队，与入队顺序无关"""
+        loop = asyncio.get_running_loop()
+        scheduler = FairScheduler()
+        scheduler.push(loop.create_future(), "batch", 1)
+        scheduler.push(loop.create_future(), "standard", 1)
+        scheduler.push(loop.create_future(), "interactive", 2)
+        assert _drain(scheduler) == [("interactive", 2), ("standard", 1), ("batch", 1)]
+
+    @pytest.mark.asyncio
+    async def test_fair_between_users(self):
+        """测试同一类别内用户轮流获得名额，按计费量加权"""
+        loop = asyncio.get_running_loop()
+        scheduler = FairScheduler()
+        for _ in range(3):
+            scheduler.push(loop.create_future(), "batch", 1, cost=100)
+        scheduler.push(loop.create_future(), "batch", 2, cost=100)
+        scheduler.push(loop.create_future(), "batch", 3, cost=250)
+        assert [user for _, user in _drain(scheduler)] == [1, 2, 1, 3, 1]
+
+    @pytest.mark.asyncio
+    async def test_starvation_promotion(self):
+        """测试等待过久的batch调用提升优先级"""
+        loop = asyncio.get_running_loop()
+        scheduler = FairScheduler(starvation_seconds=0.01)
+        scheduler.push(loop.create_future(), "batch", 1)
+        time.sleep(0.025)
+        scheduler.push(loop.create_future(), "standard", 2)
+        assert _drain(scheduler)[0] == ("batch", 1)
+        assert scheduler.promoted == 1
+
+    @pytest.mark.asyncio
+    async def test_promotion_never_passes_interactive(self):
+        """测试等待再久的batch调用也不会排到交互调用之前，提升后与standard调用按入队时间排队"""
+        loop = asyncio.get_running_loop()
+        scheduler = FairScheduler(starvation_seconds=0.01)
+        scheduler.push(loop.create_future(), "batch", 1, cost=1)
+        scheduler.push(loop.create_future(), "standard", 2, cost=1)
+        time.sleep(0.05)
+        # 交互调用的虚拟完成时间远大于batch调用，仍应先出队
+        for _ in range(3):
+            scheduler.push(loop.create_future(), "interactive", 3, cost=1000)
+        assert _drain(scheduler) == [
+            ("interactive", 3), ("interactive", 3), ("interactive", 3), ("batch", 1), ("standard", 2),
+        ]
+
+
+class TestPriorityAdmission:
+    """准入控制中的优先级测试"""
+
+    @pytest.mark.asyncio
+    async def test_interactive_jumps_queue(self):
+        """测试名额空出时排队的交互调用先于更早排队的batch调用"""
+        admission = ModelAdmission(max_concurrency=1, starvation_seconds=0)
+        release = asyncio.Event()
+        order = []
+
+        async def call(priority_class, user_id, hold=None):
+            with llm_priority(priority_class, user_id):
+                async with admission.slot():
+                    order.append(priority_class)
+                    if hold is not None:
+                        await hold.wait()
+
+        holder = asyncio.create_task(call("batch", 1, release))
+        await asyncio.sleep(0)
+        batch = [asyncio.create_task(call("batch", 1)) for _ in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call("interactive", 2))
+        await asyncio.sleep(0)
+
+        release.set()
+        await asyncio.gather(holder, interactive, *batch)
+        assert order == ["batch", "interactive", "batch", "batch", "batch"]
+        classes = admission.to_dict()["classes"]
+        assert classes["interactive"]["admitted"] == 1
+        assert classes["batch"]["admitted"] == 4
+
+    @pytest.mark.asyncio
+    async def test_batch_share_reserves_capacity(self):
+        """测试batch调用最多占用一部分并发，其余名额留给交互调用"""
+        admission = ModelAdmission(max_concurrency=4, batch_share=0.5)
+        release = asyncio.Event()
+        peak_batch = 0
+
+        async def call(priority_class):
+            nonlocal peak_batch
+            with llm_priority(priority_class, 1):
+                async with admission.slot():
+                    peak_batch = max(peak_batch, admission.to_dict()["classes"]["batch"]["in_flight"])
+                    await release.wait()
+
+        tasks = [asyncio.create_task(call("batch")) for _ in range(5)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call("interactive"))
+        await asyncio.sleep(0)
+        stats = admission.to_dict()
+        assert stats["classes"]["interactive"]["in_flight"] == 1
+        assert stats["classes"]["batch"]["waiting"] == 3
+
+        release.set()
+        await asyncio.gather(interactive, *tasks)
+        assert peak_batch == 2
@@ -0,0 +1,76 @@
+"""
+RAG检索基准测试单元测试
+测试合成语料、本地哈希Embedding与小规模基准测试流程
+"""
+import numpy as np
+import pytest
+from app.services.rag_local_embedding import HashEmbedding, hash_embedding
+from benchmarks.common import latency_summary
+from benchmarks.rag_corpus import generate_corpus
+from benchmarks.rag_retrieval import run_retrieval_benchmark
+
+
+class TestHashEmbedding:
+    """本地哈希Embedding测试"""
+
+    def test_deterministic_and_normalized(self):
+        """测试结果确定且已归一化"""
+        embedding = HashEmbedding(dim=64)
+        vector = embedding.get_text_embedding("林风在青云城修炼")
+
+        assert vector == hash_embedding("林风在青云城修炼", 64)
+        assert len(vector) == 64
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+        assert hash_embedding("", 8) == [0.0] * 8
+
+    def test_lexical_similarity(self):
+        """测试词面相近的文本向量更相近"""
+        embedding = HashEmbedding(dim=256)
+        fact, query, other = (
+            np.asarray(embedding.get_text_embedding(text))
+            for text in ["林风在青云城得到了紫霄剑", "林风在哪里得到了紫霄剑", "苏瑶在药园清点灵草"]
+        )
+        assert fact @ query > fact @ other
+
+
+class TestSyntheticCorpus:
+    """合成语料测试"""
+
+    def test_corpus_is_reproducible_with_planted_facts(self):
+        """测试同一种子生成相同语料，事实句位于声明的章节中"""
+        corpus = generate_corpus(2, 5, chapter_chars=500, facts_per_novel=4, seed=7)
+        again = generate_corpus(2, 5, chapter_chars=500, facts_per_novel=4, seed=7)
+
+        assert [novel.chapters for novel in corpus] == [novel.chapters for novel in again]
+        for novel in corpus:
+            assert len(novel.facts) == 4
+            for fact in novel.facts:
+                assert fact.text in novel.chapters[fact.chapter]
+                assert fact.max_chapter is None or fact.max_chapter >= fact.chapter
+
+
+class TestRetrievalBenchmark:
+    """基准测试流程测试"""
+
+    def test_latency_summary(self):
+        """测试延迟分位数换算为毫秒"""
+        summary = latency_summary([0.001 * i for i in range(1, 101)])
+        assert summary["count"] == 100
+        assert summary["p50_ms"] == pytest.approx(50.5)
+        assert summary["max_ms"] == pytest.approx(100.0)
+        assert latency_summary([])["count"] == 0
+
+    @pytest.mark.slow
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    async def test_small_benchmark(self, backend):
+        """测试小规模基准测试可离线跑通并召回埋入的事实"""
+        result = await run_retrieval_benchmark(
+            num_novels=2, num_chapters=3, chapter_chars=600, facts_per_novel=3, backend=backend
+        )
+
+        assert result["index"]["failed_chapters"] == 0
+        assert result["index"]["chunks"] > 0
+        assert result["query"]["count"] == 6
+        assert result["quality"]["filter_violations"] == 0
+        assert result["quality"]["recall@3"] >= 0.5
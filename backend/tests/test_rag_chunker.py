@@ -0,0 +1,66 @@
+"""
+RAG文本分块单元测试
+测试句子切分、分块大小、重叠以及流式输入
+"""
+from app.services.rag_chunker import iter_chunks, iter_sentences
+
+
+def test_iter_sentences_keeps_closing_quotes():
+    """测试句末标点后的引号归属于同一句"""
+    sentences = list(iter_sentences("他说：“走吧！”她没有回答……\n第二段。"))
+    assert sentences == [
+        ("他说：“走吧！”", False),
+        ("她没有回答……\n", True),
+        ("第二段。", False),
+    ]
+
+
+def test_iter_sentences_across_pieces():
+    """测试文本分片到达时，跨片段的句子和引号保持完整"""
+    pieces = ["李明走进青云", "城。“你来了？", "”城主问道。"]
+    sentences = [s for s, _ in iter_sentences(pieces)]
+    assert sentences == ["李明走进青云城。", "“你来了？”", "城主问道。"]
+
+
+def test_chunks_respect_sentence_boundaries():
+    """测试分块不切断句子且不超过目标大小"""
+    text = "".join(f"第{i}句话，主角继续前行。" for i in range(100))
+    chunks = list(iter_chunks(text, chunk_size=60))
+
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert all(chunk.endswith("。") for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_chunks_overlap():
+    """测试相邻分块之间保留整句重叠"""
+    text = "".join(f"句子{i:02d}。" for i in range(20))
+    chunks = list(iter_chunks(text, chunk_size=25, overlap=6))
+
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.split("。")[-2] + "。"
+        assert current.startswith(last_sentence)
+
+
+def test_long_sentence_is_hard_split():
+    """测试没有标点的超长文本按目标大小硬切分"""
+    chunks = list(iter_chunks("A" * 1500, chunk_size=500))
+    assert [len(chunk) for chunk in chunks] == [500, 500, 500]
+
+
+def test_long_sentence_is_hard_split_by_length_fn():
+    """测试硬切分按length_fn计量：每个片段都不超过目标大小"""
+    # 英文字母按2计，中文按1计
+    def weighted(text):
+        return sum(2 if char.isascii() else 1 for char in text)
+
+    sentence = "AB青云" * 100
+    chunks = list(iter_chunks(sentence, chunk_size=50, length_fn=weighted))
+    assert "".join(chunks) == sentence
+    assert all(weighted(chunk) <= 50 for chunk in chunks)
+    assert all(weighted(chunk) >= 49 for chunk in chunks[:-1])
+
+
+def test_blank_text_yields_nothing():
+    """测试空白文本不产生分块"""
+    assert list(iter_chunks("  \n\n  ", chunk_size=10)) == []
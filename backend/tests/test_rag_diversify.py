@@ -0,0 +1,65 @@
+"""
+RAG检索结果多样化单元测试
+测试MMR重排与同章节重叠分块去重
+"""
+import numpy as np
+from app.services.rag_diversify import is_overlapping, mmr_rank, suppress_overlaps
+
+
+class TestMMR:
+    """MMR重排测试"""
+
+    def test_lambda_one_keeps_relevance_order(self):
+        """测试lambda为1时按相关性排序"""
+        embeddings = np.eye(3)
+        assert mmr_rank([0.2, 0.9, 0.5], embeddings, lambda_mult=1.0) == [1, 2, 0]
+
+    def test_near_duplicates_are_pushed_down(self):
+        """测试与已选结果几乎相同的候选被排到后面"""
+        embeddings = np.array([
+            [1.0, 0.0, 0.0],
+            [0.99, 0.01, 0.0],   # 与第0个几乎相同
+            [0.0, 1.0, 0.0],
+        ])
+        order = mmr_rank([1.0, 0.95, 0.6], embeddings, lambda_mult=0.5)
+        assert order == [0, 2, 1]
+
+    def test_k_and_zero_vectors(self):
+        """测试截取数量，以及缺失向量（全零）不会报错"""
+        embeddings = np.zeros((4, 3))
+        assert mmr_rank([0.1, 0.4, 0.3, 0.2], embeddings, k=2) == [1, 2]
+        assert mmr_rank([], np.zeros((0, 3))) == []
+
+
+class TestOverlapSuppression:
+    """重叠分块去重测试"""
+
+    def test_adjacent_chunks_in_same_chapter(self):
+        """测试同章节相邻分块视为重叠，不同章节或来源不视为重叠"""
+        meta = {"chapter": 3, "chunk_index": 4, "source": "chapter"}
+        assert is_overlapping("甲", meta, "乙", {**meta, "chunk_index": 5})
+        assert not is_overlapping("甲", meta, "乙", {**meta, "chunk_index": 7})
+        assert not is_overlapping("甲", meta, "乙", {**meta, "chapter": 4, "chunk_index": 5})
+        assert not is_overlapping("甲", meta, "乙", {**meta, "source": "worldview", "chunk_index": 5})
+
+    def test_text_overlap_threshold(self):
+        """测试同章节中文本高度重合的分块视为重叠"""
+        text = "林风走进青云城，抬头望见城门上的古老符文，心中一动。"
+        a = {"chapter": 1, "chunk_index": 0}
+        b = {"chapter": 1, "chunk_index": 8}
+        assert is_overlapping(text, a, text[:-3] + "，随后离开。", b)
+        assert not is_overlapping(text, a, "苏瑶在药园里清点灵草，一株也没有少。", b)
+        assert not is_overlapping(text, a, text, b, overlap_threshold=1.1)
+
+    def test_suppress_keeps_priority_order(self):
+        """测试按优先顺序保留，跳过与已选分块重叠的候选"""
+        metadatas = [
+            {"chapter": 1, "chunk_index": 0},
+            {"chapter": 1, "chunk_index": 1},
+            {"chapter": 2, "chunk_index": 0},
+            {"chapter": 1, "chunk_index": 5},
+        ]
+        texts = ["第一段内容", "第二段内容描写", "另一章的情节", "远处的段落"]
+
+        assert suppress_overlaps(texts, metadatas, [0, 1, 2, 3], limit=3) == [0, 2, 3]
+        assert suppress_overlaps(texts, metadatas, [1, 0, 2, 3], limit=2) == [1, 2]
@@ -0,0 +1,70 @@
+"""
+RAG Embedding微批处理单元测试
+测试并发请求合批、批量上限、去重与异常分发
+"""
+import asyncio
+import pytest
+from app.services.rag_embedding_batcher import EmbeddingBatcher, embed_query_batch
+
+
+def make_batcher(calls, max_batch_size=8, max_wait_ms=5.0, fail=False):
+    """创建记录每次批量调用的批处理器"""
+    def batch_fn(texts):
+        if fail:
+            raise RuntimeError("embedding down")
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    async def runner(fn, texts):
+        return fn(texts)
+
+    return EmbeddingBatcher("test", batch_fn, runner, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_batch():
+    """测试并发调用合并为一次批量调用，结果按调用方顺序返回"""
+    calls = []
+    batcher = make_batcher(calls)
+
+    results = await asyncio.gather(
+        batcher.embed(["a", "bb"]),
+        batcher.embed(["ccc"]),
+        batcher.embed(["a"]),
+    )
+
+    assert results == [[[1.0], [2.0]], [[3.0]], [[1.0]]]
+    assert len(calls) == 1
+    # 同一批内相同文本只计算一次
+    assert sorted(calls[0]) == ["a", "bb", "ccc"]
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size_splits():
+    """测试超过批量上限时拆分为多批"""
+    calls = []
+    batcher = make_batcher(calls, max_batch_size=3)
+
+    results = await batcher.embed([str(i) for i in range(7)])
+
+    assert len(results) == 7
+    assert [len(c) for c in calls] == [3, 3, 1]
+
+
+@pytest.mark.asyncio
+async def test_failure_propagates_to_all_callers():
+    """测试批量失败时所有调用方都收到异常"""
+    batcher = make_batcher([], fail=True)
+
+    outcomes = await asyncio.gather(batcher.embed(["x"]), batcher.embed(["y"]), return_exceptions=True)
+
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+
+
+def test_embed_query_batch_fallback():
+    """测试底层模型不支持批量查询时逐条计算"""
+    class QueryOnly:
+        def get_query_embedding(self, query):
+            return [float(len(query))]
+
+    assert embed_query_batch(QueryOnly(), ["a", "bcd"]) == [[1.0], [3.0]]
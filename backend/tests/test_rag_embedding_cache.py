@@ -0,0 +1,99 @@
+"""
+RAG Embedding缓存单元测试
+测试缓存命中、LRU淘汰以及Embedding包装器的调用次数
+"""
+import pytest
+from typing import List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from app.services.rag_embedding_cache import EmbeddingCache, CachedEmbedding, text_sha256
+
+
+class CountingEmbedding(BaseEmbedding):
+    """记录调用次数的假Embedding模型"""
+
+    calls: int = 0
+    embedded_texts: int = 0
+
+    def _vector(self, text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.embedded_texts += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+
+class TestEmbeddingCache:
+    """Embedding缓存测试"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """创建临时缓存"""
+        cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10)
+        yield cache
+        cache.close()
+
+    def test_put_and_get(self, cache):
+        """测试写入后读取"""
+        h = text_sha256("青云城")
+        cache.put_many("m3e", 3, {h: [1.0, 2.0, 3.0]})
+
+        found = cache.get_many("m3e", 3, [h])
+        assert found[h] == [1.0, 2.0, 3.0]
+        # 模型或维度不同视为不同的键
+        assert cache.get_many("bge", 3, [h]) == {}
+        assert cache.get_many("m3e", 4, [h]) == {}
+
+    def test_lru_eviction(self, cache):
+        """测试超出上限后淘汰最久未访问的条目"""
+        first = text_sha256("first")
+        cache.put_many("m3e", 1, {first: [0.0]})
+        for i in range(12):
+            # 持续访问first，使其保持为最近使用
+            cache.get_many("m3e", 1, [first])
+            cache.put_many("m3e", 1, {text_sha256(f"chunk-{i}"): [float(i)]})
+
+        assert len(cache) <= 10
+        assert first in cache.get_many("m3e", 1, [first])
+        assert cache.get_many("m3e", 1, [text_sha256("chunk-0")]) == {}
+
+    def test_persistence(self, tmp_path):
+        """测试缓存在重新打开后依然可用"""
+        path = str(tmp_path / "persist.db")
+        h = text_sha256("持久化")
+        cache = EmbeddingCache(path)
+        cache.put_many("m3e", 2, {h: [0.5, 0.25]})
+        cache.close()
+
+        reopened = EmbeddingCache(path)
+        assert reopened.get_many("m3e", 2, [h])[h] == [0.5, 0.25]
+        reopened.close()
+
+
+class TestCachedEmbedding:
+    """Embedding包装器测试"""
+
+    def test_only_missing_texts_are_embedded(self, tmp_path):
+        """测试只有未命中的文本才会调用底层模型"""
+        inner = CountingEmbedding(model_name="fake")
+        cache = EmbeddingCache(str(tmp_path / "cache.db"))
+        embed_model = CachedEmbedding(inner, cache, embed_dim=3)
+
+        first = embed_model.get_text_embedding_batch(["段落一", "段落二", "段落一"])
+        assert inner.embedded_texts == 2
+        assert first[0] == first[2]
+
+        second = embed_model.get_text_embedding_batch(["段落一", "段落二", "段落三"])
+        assert inner.embedded_texts == 3
+        assert second[:2] == first[:2]
+        assert cache.stats()["hits"] >= 2
+        cache.close()
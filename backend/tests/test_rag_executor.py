@@ -0,0 +1,61 @@
+"""
+RAG执行器单元测试
+测试阻塞调用不阻塞事件循环、按操作类型限制并发以及排队统计
+"""
+import asyncio
+import threading
+import time
+import pytest
+from app.services.rag_executor import RAGExecutor
+
+
+class TestRAGExecutor:
+    """RAG执行器测试"""
+
+    @pytest.fixture
+    def executor(self):
+        """创建执行器（index操作并发限制为1）"""
+        executor = RAGExecutor("test-rag", max_workers=4, limits={"index": 1})
+        yield executor
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_runs_off_event_loop(self, executor):
+        """测试阻塞函数在线程池中执行"""
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run("search", threading.get_ident)
+        assert worker_thread != loop_thread
+
+    @pytest.mark.asyncio
+    async def test_operation_limit(self, executor):
+        """测试按操作类型限制并发"""
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+
+        await asyncio.gather(*(executor.run("index", work) for _ in range(4)))
+
+        assert peak == 1
+        stats = executor.stats()["operations"]["index"]
+        assert stats["completed"] == 4
+        assert stats["queue_depth"] == 0
+        assert stats["max_queue_depth"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_failure_is_counted(self, executor):
+        """测试异常向调用方抛出并计入失败次数"""
+        def boom():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await executor.run("delete", boom)
+        assert executor.stats()["operations"]["delete"]["failed"] == 1
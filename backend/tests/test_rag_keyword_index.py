@@ -0,0 +1,115 @@
+"""
+RAG关键词索引单元测试
+测试中文二元组分词、BM25检索、增量删除与RRF融合
+"""
+import pytest
+from app.services.rag_keyword_index import (
+    KeywordIndex,
+    NovelKeywordIndex,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+
+def test_tokenize_bigrams():
+    """测试中文二元组与英文整词分词"""
+    assert tokenize("青云城") == ["青云", "云城"]
+    assert tokenize("剑，Magic 9级") == ["剑", "magic", "9", "级"]
+
+
+class TestNovelKeywordIndex:
+    """单本小说BM25索引测试"""
+
+    @pytest.fixture
+    def index(self):
+        """创建包含三个分块的索引"""
+        index = NovelKeywordIndex()
+        index.add("a", "李明走进青云城，城门高耸。", {"chapter": 1})
+        index.add("b", "山林之中，风声鹤唳。", {"chapter": 2})
+        index.add("c", "青云城主召见李明。", {"chapter": 3})
+        return index
+
+    def test_exact_term_ranking(self, index):
+        """测试精确词匹配排序"""
+        hits = index.search("青云城", top_k=5)
+        assert {hit.node_id for hit in hits} == {"a", "c"}
+
+    def test_max_chapter_filter(self, index):
+        """测试章节过滤"""
+        hits = index.search("青云城", top_k=5, max_chapter=2)
+        assert [hit.node_id for hit in hits] == ["a"]
+
+    def test_remove_and_replace(self, index):
+        """测试删除与替换分块"""
+        index.remove_chapter(1)
+        assert [hit.node_id for hit in index.search("青云城", top_k=5)] == ["c"]
+
+        index.add("c", "山林深处。", {"chapter": 3})
+        assert index.search("青云城", top_k=5) == []
+        assert len(index) == 2
+
+
+def test_keyword_index_per_novel():
+    """测试按小说隔离与未加载小说的增量写入"""
+    keyword_index = KeywordIndex()
+    keyword_index.load(1, [("x", "青云城", {"chapter": 1})])
+    keyword_index.upsert(2, [("y", "青云城", {"chapter": 1})])
+
+    assert [hit.node_id for hit in keyword_index.search(1, "青云城", top_k=3)] == ["x"]
+    assert keyword_index.search(2, "青云城", top_k=3) == []
+    assert not keyword_index.is_loaded(2)
+
+
+def test_keyword_index_buffers_writes_during_load():
+    """测试加载期间到达的增删在安装索引时重放，不会丢失快照之后的分块"""
+    keyword_index = KeywordIndex()
+    keyword_index.begin_load(1)
+    snapshot = [("x", "青云城", {"chapter": 1}), ("old", "青云城旧稿", {"chapter": 1})]
+    keyword_index.upsert(1, [("y", "青云城外", {"chapter": 2})])
+    keyword_index.remove(1, ["old"])
+    keyword_index.load(1, snapshot)
+
+    hits = {hit.node_id for hit in keyword_index.search(1, "青云城", top_k=5)}
+    assert hits == {"x", "y"}
+
+    # 加载结束后不再缓冲，未加载的小说仍忽略增量写入
+    keyword_index.upsert(2, [("z", "青云城", {"chapter": 1})])
+    assert not keyword_index.is_loaded(2)
+
+
+def test_keyword_index_abort_and_drop_during_load():
+    """测试放弃加载后不再缓冲，加载期间丢弃小说会清空快照"""
+    keyword_index = KeywordIndex()
+    keyword_index.begin_load(1)
+    keyword_index.abort_load(1)
+    keyword_index.upsert(1, [("x", "青云城", {"chapter": 1})])
+    keyword_index.load(1, [])
+    assert keyword_index.search(1, "青云城", top_k=3) == []
+
+    keyword_index.begin_load(2)
+    keyword_index.drop_novel(2)
+    keyword_index.upsert(2, [("new", "青云城", {"chapter": 1})])
+    keyword_index.load(2, [("stale", "青云城", {"chapter": 1})])
+    assert [hit.node_id for hit in keyword_index.search(2, "青云城", top_k=3)] == ["new"]
+
+
+def test_keyword_index_lru_eviction():
+    """测试超过上限时淘汰最久未检索的小说"""
+    keyword_index = KeywordIndex(max_novels=2)
+    keyword_index.load(1, [("a", "青云城", {"chapter": 1})])
+    keyword_index.load(2, [("b", "青云城", {"chapter": 1})])
+    keyword_index.search(1, "青云城", top_k=1)
+    keyword_index.load(3, [("c", "青云城", {"chapter": 1})])
+
+    assert keyword_index.is_loaded(1)
+    assert not keyword_index.is_loaded(2)
+    assert keyword_index.is_loaded(3)
+    assert keyword_index.stats()["evicted"] == 1
+
+
+def test_reciprocal_rank_fusion():
+    """测试RRF融合：两路都靠前的结果排名最高"""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    assert ranked[0] == "b"
+    assert set(ranked) == {"a", "b", "c", "d"}
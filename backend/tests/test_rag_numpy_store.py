@@ -0,0 +1,161 @@
+"""
+NumPy向量库后端单元测试
+测试Chroma兼容接口、元数据过滤、精确top-k、持久化与多实例共享
+"""
+import multiprocessing
+
+import numpy as np
+import pytest
+from app.services.rag_numpy_store import NumpyVectorCollection
+
+
+def _chunks(novel_id, chapters, dim=8, seed=0):
+    """生成测试分块：每章3个随机向量"""
+    rng = np.random.default_rng(seed)
+    ids, vectors, documents, metadatas = [], [], [], []
+    for chapter in chapters:
+        for i in range(3):
+            ids.append(f"{novel_id}_{chapter}_{i}")
+            vectors.append(rng.normal(size=dim).tolist())
+            documents.append(f"小说{novel_id}第{chapter}章片段{i}")
+            metadatas.append({"novel_id": novel_id, "chapter": chapter, "chunk_index": i})
+    return ids, vectors, documents, metadatas
+
+
+def _concurrent_writer(root, worker, batches):
+    """子进程：向同一本小说的分区写入互不重复的分块，并删除其中一部分"""
+    collection = NumpyVectorCollection(root, "shared_8", dtype="float32")
+    for batch in range(batches):
+        ids = [f"1_{worker}_{batch}_{i}" for i in range(4)]
+        vectors = [[float(worker), float(batch), float(i)] + [0.0] * 5 for i in range(4)]
+        metadatas = [{"novel_id": 1, "chapter": worker} for _ in ids]
+        collection.upsert(ids, vectors, ids, metadatas)
+        collection.delete(ids=[ids[0]])
+    collection.close()
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = NumpyVectorCollection(str(tmp_path), "test_8", dtype="float32")
+    yield collection
+    collection.close()
+
+
+class TestNumpyVectorCollection:
+    """NumPy向量集合测试"""
+
+    def test_upsert_and_get_with_filters(self, collection):
+        """测试写入后按章节条件读取"""
+        collection.upsert(*_chunks(1, [1, 2, 3]))
+        collection.upsert(*_chunks(2, [1]))
+
+        assert collection.count() == 12
+        result = collection.get(
+            where={"$and": [{"novel_id": 1}, {"chapter": {"$in": [1, 3]}}]},
+            include=["metadatas"],
+        )
+        assert len(result["ids"]) == 6
+        assert {meta["chapter"] for meta in result["metadatas"]} == {1, 3}
+        assert result["documents"] is None
+
+    def test_query_is_exact_and_respects_chapter_range(self, collection):
+        """测试检索结果与暴力计算一致，且只返回章节范围内的分块"""
+        ids, vectors, documents, metadatas = _chunks(1, range(1, 11))
+        collection.upsert(ids, vectors, documents, metadatas)
+        query = np.random.default_rng(42).normal(size=8)
+
+        result = collection.query(
+            query_embeddings=query.tolist(),
+            n_results=4,
+            where={"$and": [{"novel_id": {"$eq": 1}}, {"chapter": {"$lte": 5}}]},
+        )
+
+        allowed = [i for i, meta in enumerate(metadatas) if meta["chapter"] <= 5]
+        expected = sorted(allowed, key=lambda i: float(np.sum((np.asarray(vectors[i]) - query) ** 2)))[:4]
+        assert result["ids"][0] == [ids[i] for i in expected]
+        assert result["distances"][0] == sorted(result["distances"][0])
+        assert all(meta["chapter"] <= 5 for meta in result["metadatas"][0])
+
+    def test_upsert_overwrites_and_delete_reuses_slots(self, collection):
+        """测试覆盖写入与删除"""
+        ids, vectors, documents, metadatas = _chunks(1, [1, 2])
+        collection.upsert(ids, vectors, documents, metadatas)
+        collection.upsert([ids[0]], [vectors[1]], ["新内容"], [metadatas[0]])
+        assert collection.count() == 6
+        assert collection.get(ids=[ids[0]])["documents"] == ["新内容"]
+
+        collection.delete(where={"$and": [{"novel_id": 1}, {"chapter": 2}]})
+        assert collection.count() == 3
+        collection.delete(ids=[ids[0]])
+        assert collection.count() == 2
+
+        collection.upsert(*_chunks(1, [3], seed=1))
+        assert collection.count() == 5
+
+    def test_update_metadata_keeps_vectors(self, collection):
+        """测试只更新元数据时向量不变，不存在的ID被忽略"""
+        ids, vectors, documents, metadatas = _chunks(1, [1])
+        collection.upsert(ids, vectors, documents, metadatas)
+        before = collection.get(ids=[ids[0]], include=["embeddings"])["embeddings"]
+
+        collection.update(ids=[ids[0], "1_9_missing"], metadatas=[{**metadatas[0], "chunk_index": 7}, {"novel_id": 1}])
+        after = collection.get(ids=[ids[0]], include=["metadatas", "embeddings"])
+        assert after["metadatas"][0]["chunk_index"] == 7
+        assert after["embeddings"] == before
+        assert collection.count() == len(ids)
+
+    def test_delete_by_novel_drops_partition(self, collection):
+        """测试按小说删除直接移除分区"""
+        collection.upsert(*_chunks(1, [1]))
+        collection.upsert(*_chunks(2, [1]))
+
+        collection.delete(where={"novel_id": 1})
+
+        assert collection.count() == 3
+        assert collection.get(where={"novel_id": 1})["ids"] == []
+
+    def test_persistence_and_shared_directory(self, tmp_path):
+        """测试重新打开后数据仍在，且另一实例的写入可被感知"""
+        writer = NumpyVectorCollection(str(tmp_path), "shared_8", dtype="float16")
+        reader = NumpyVectorCollection(str(tmp_path), "shared_8")
+        writer.upsert(*_chunks(1, [1]))
+        assert reader.count() == 3
+
+        writer.upsert(*_chunks(1, [2]))
+        assert reader.count() == 6
+        result = reader.query(query_embeddings=[[0.0] * 8], n_results=2, where={"novel_id": 1})
+        assert len(result["ids"][0]) == 2
+        writer.close()
+        reader.close()
+
+        reopened = NumpyVectorCollection(str(tmp_path), "shared_8")
+        assert reopened.count() == 6
+        reopened.close()
+
+    def test_concurrent_processes_do_not_share_slots(self, tmp_path):
+        """测试多个进程同时写入同一分区时槽位不冲突，向量与元数据一一对应"""
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=_concurrent_writer, args=(str(tmp_path), worker, 15))
+            for worker in (1, 2, 3)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join(timeout=120)
+            assert process.exitcode == 0
+
+        reader = NumpyVectorCollection(str(tmp_path), "shared_8")
+        stored = reader.get(where={"novel_id": 1}, include=["documents", "embeddings"])
+        assert len(stored["ids"]) == 3 * 15 * 3
+        for chunk_id, document, vector in zip(stored["ids"], stored["documents"], stored["embeddings"]):
+            _, worker, batch, index = chunk_id.split("_")
+            assert document == chunk_id
+            assert vector[:3] == [float(worker), float(batch), float(index)]
+        reader.close()
+
+    def test_dimension_mismatch(self, collection):
+        """测试同一分区写入不同维度向量时报错"""
+        collection.upsert(*_chunks(1, [1]))
+        with pytest.raises(ValueError):
+            collection.upsert(["1_9_0"], [[0.0] * 4], ["x"], [{"novel_id": 1, "chapter": 9}])
@@ -0,0 +1,156 @@
+"""
+按小说分区的向量集合单元测试
+测试where条件路由、分区LRU关闭、整本删除，以及Chroma分区集合
+"""
+import threading
+import chromadb
+import numpy as np
+import pytest
+from chromadb.config import Settings as ChromaSettings
+from app.services.rag_numpy_store import NumpyVectorCollection
+from app.services.rag_partitions import ChromaPartitionedCollection, novel_ids_in_where
+
+
+def _chunks(novel_id, chapters, dim=8, seed=0):
+    """生成测试分块：每章2个随机向量"""
+    rng = np.random.default_rng(seed + novel_id)
+    ids, vectors, documents, metadatas = [], [], [], []
+    for chapter in chapters:
+        for i in range(2):
+            ids.append(f"{novel_id}_{chapter}_{i}")
+            vectors.append(rng.normal(size=dim).tolist())
+            documents.append(f"小说{novel_id}第{chapter}章片段{i}")
+            metadatas.append({"novel_id": novel_id, "chapter": chapter})
+    return ids, vectors, documents, metadatas
+
+
+@pytest.fixture
+def chroma_collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path), settings=ChromaSettings(anonymized_telemetry=False))
+    return ChromaPartitionedCollection(client, "novels_8", max_open_partitions=2)
+
+
+class TestPartitionRouting:
+    """where条件路由测试"""
+
+    def test_novel_ids_in_where(self):
+        """测试从where条件推断小说分区"""
+        assert novel_ids_in_where({"novel_id": 1}) == {1}
+        assert novel_ids_in_where({"$and": [{"novel_id": {"$eq": 2}}, {"chapter": {"$lte": 3}}]}) == {2}
+        assert novel_ids_in_where({"novel_id": {"$in": [1, 3]}}) == {1, 3}
+        assert novel_ids_in_where({"chapter": 1}) is None
+        assert novel_ids_in_where(None) is None
+
+    def test_upsert_requires_novel_id(self, tmp_path):
+        """测试缺少novel_id的分块无法路由"""
+        collection = NumpyVectorCollection(str(tmp_path), "test_8")
+        with pytest.raises(ValueError):
+            collection.upsert(["x"], [[0.0] * 8], ["x"], [{"chapter": 1}])
+        collection.close()
+
+
+class TestNumpyPartitions:
+    """NumPy后端分区测试"""
+
+    def test_lru_closes_idle_partitions(self, tmp_path):
+        """测试打开的分区数不超过上限，被关闭的分区可重新打开"""
+        collection = NumpyVectorCollection(str(tmp_path), "test_8", max_open_partitions=2)
+        for novel_id in (1, 2, 3):
+            collection.upsert(*_chunks(novel_id, [1, 2]))
+
+        stats = collection.stats()
+        assert stats["open_partitions"] <= 2
+        assert stats["partitions_evicted"] >= 1
+
+        result = collection.query(query_embeddings=[[0.0] * 8], n_results=3, where={"novel_id": 1})
+        assert all(meta["novel_id"] == 1 for meta in result["metadatas"][0])
+        assert collection.count() == 12
+        collection.close()
+
+    def test_get_by_ids_opens_only_owning_partition(self, tmp_path):
+        """测试按ID读取时按前缀定位分区，不打开其他小说的分区"""
+        collection = NumpyVectorCollection(str(tmp_path), "test_8", max_open_partitions=2)
+        for novel_id in (1, 2, 3, 4):
+            collection.upsert(*_chunks(novel_id, [1]))
+        collection.close()
+        opened = collection.stats()["partitions_opened"]
+
+        result = collection.get(ids=["3_1_0", "3_1_1", "1_1_0"], where={"novel_id": 3}, include=["embeddings"])
+        assert sorted(result["ids"]) == ["3_1_0", "3_1_1"]
+        assert len(result["embeddings"]) == 2
+        assert collection.stats()["partitions_opened"] == opened + 1
+        assert collection.get(ids=["2_1_0"])["ids"] == ["2_1_0"]
+        assert collection.stats()["partitions_opened"] == opened + 2
+        collection.close()
+
+    def test_drop_partition_removes_files(self, tmp_path):
+        """测试整本删除直接移除分区目录"""
+        collection = NumpyVectorCollection(str(tmp_path), "test_8")
+        collection.upsert(*_chunks(1, [1, 2]))
+        collection.upsert(*_chunks(2, [1]))
+
+        assert collection.drop_partition(1) == 4
+        assert collection.drop_partition(1) == 0
+        assert not (tmp_path / "test_8" / "novel_1").exists()
+        assert collection.count() == 2
+        collection.close()
+
+    def test_drop_partition_waits_for_in_use(self, tmp_path):
+        """测试删除分区时等待正在使用的检索释放，期间分区不被关闭"""
+        collection = NumpyVectorCollection(str(tmp_path), "test_8")
+        collection.upsert(*_chunks(1, [1, 2]))
+
+        dropped = []
+        with collection._use(1) as partition:
+            worker = threading.Thread(target=lambda: dropped.append(collection.drop_partition(1)))
+            worker.start()
+            worker.join(timeout=0.2)
+            assert worker.is_alive()
+            assert partition.count() == 4
+        worker.join(timeout=5)
+
+        assert dropped == [4]
+        assert not (tmp_path / "test_8" / "novel_1").exists()
+        collection.close()
+
+
+class TestChromaPartitions:
+    """Chroma分区集合测试"""
+
+    def test_each_novel_gets_own_collection(self, chroma_collection):
+        """测试每本小说写入独立集合，检索只访问目标小说"""
+        chroma_collection.upsert(*_chunks(1, [1, 2, 3]))
+        chroma_collection.upsert(*_chunks(2, [1]))
+
+        names = {c.name for c in chroma_collection.client.list_collections()}
+        assert names == {"novels_8_n1", "novels_8_n2"}
+        assert chroma_collection.count() == 8
+
+        result = chroma_collection.query(
+            query_embeddings=[0.0] * 8,
+            n_results=10,
+            where={"$and": [{"novel_id": {"$eq": 1}}, {"chapter": {"$lte": 2}}]},
+        )
+        assert len(result["ids"][0]) == 4
+        assert all(meta["novel_id"] == 1 and meta["chapter"] <= 2 for meta in result["metadatas"][0])
+        assert result["distances"][0] == sorted(result["distances"][0])
+
+    def test_delete_by_novel_drops_collection(self, chroma_collection):
+        """测试按小说删除时删除整个分区集合，按章节删除只删分区内数据"""
+        chroma_collection.upsert(*_chunks(1, [1, 2]))
+        chroma_collection.upsert(*_chunks(2, [1]))
+
+        chroma_collection.delete(where={"$and": [{"novel_id": 1}, {"chapter": 2}]})
+        assert chroma_collection.count() == 4
+
+        chroma_collection.delete(where={"novel_id": 1})
+        names = {c.name for c in chroma_collection.client.list_collections()}
+        assert names == {"novels_8_n2"}
+        assert chroma_collection.get(where={"novel_id": 1})["ids"] == []
+
+    def test_missing_partition_returns_empty(self, chroma_collection):
+        """测试查询不存在的小说时不会创建空集合"""
+        result = chroma_collection.query(query_embeddings=[[0.0] * 8], n_results=3, where={"novel_id": 9})
+
+        assert result["ids"] == [[]]
+        assert list(chroma_collection.client.list_collections()) == []
@@ -0,0 +1,136 @@
+"""
+RAG向量量化单元测试
+测试int8/PQ编码精度，以及量化存储的NumPy向量库检索与重排
+"""
+import numpy as np
+import pytest
+from app.services.rag_numpy_store import NumpyVectorCollection
+from app.services.rag_quantization import ProductQuantizer, choose_subvectors, dequantize_int8, quantize_int8
+
+
+def _clustered(n, dim=32, clusters=20, seed=0):
+    """生成带簇结构的测试向量（更接近真实Embedding分布）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _fill(collection, vectors, novel_id=1):
+    collection.upsert(
+        [f"{novel_id}_{i}" for i in range(len(vectors))],
+        vectors.tolist(),
+        [f"片段{i}" for i in range(len(vectors))],
+        [{"novel_id": novel_id, "chapter": i % 10 + 1} for i in range(len(vectors))],
+    )
+
+
+def _pq_trained(collection, novel_id=1):
+    with collection._use(novel_id) as partition:
+        return partition.stats()["pq_trained"]
+
+
+def _exact_top(vectors, query, k):
+    return [f"1_{i}" for i in np.argsort(((vectors - query) ** 2).sum(axis=1), kind="stable")[:k]]
+
+
+class TestQuantizers:
+    """量化器测试"""
+
+    def test_int8_roundtrip(self):
+        """测试int8量化的还原误差"""
+        vectors = _clustered(100)
+        codes, scales = quantize_int8(vectors)
+        restored = dequantize_int8(codes, scales)
+
+        assert codes.dtype == np.int8
+        assert np.abs(restored - vectors).max() <= scales.max() / 2 + 1e-6
+
+    def test_int8_zero_vector(self):
+        """测试全零向量不会除零"""
+        codes, scales = quantize_int8(np.zeros((1, 4)))
+        assert np.all(codes == 0) and scales[0] == 1.0
+
+    def test_choose_subvectors(self):
+        """测试子空间数取维度的约数"""
+        assert choose_subvectors(768, 16) == 16
+        assert choose_subvectors(30, 16) == 15
+        assert choose_subvectors(7, 16) == 7
+
+    def test_pq_reduces_error_against_random_codes(self):
+        """测试PQ编码的还原误差明显小于数据本身的方差"""
+        vectors = _clustered(600)
+        quantizer = ProductQuantizer.train(vectors, num_subvectors=8, iterations=8)
+        codes = quantizer.encode(vectors)
+
+        assert codes.shape == (600, 8) and codes.dtype == np.uint8
+        error = ((quantizer.decode(codes) - vectors) ** 2).sum(axis=1).mean()
+        variance = ((vectors - vectors.mean(axis=0)) ** 2).sum(axis=1).mean()
+        assert error < variance * 0.5
+
+        table = quantizer.distance_table(vectors[0])
+        approx = quantizer.distances(table, codes[:5])
+        expected = ((quantizer.decode(codes[:5]) - vectors[0]) ** 2).sum(axis=1)
+        assert np.allclose(approx, expected, rtol=1e-4, atol=1e-4)
+
+    def test_pq_requires_enough_samples(self):
+        """测试训练样本不足时报错"""
+        with pytest.raises(ValueError):
+            ProductQuantizer.train(_clustered(100), num_subvectors=4)
+
+
+class TestQuantizedCollection:
+    """量化存储的向量集合测试"""
+
+    def test_int8_with_rerank_matches_exact(self, tmp_path):
+        """测试int8检索经全精度重排后与精确结果一致，且常驻内存约为float32的1/4"""
+        vectors = _clustered(500)
+        collection = NumpyVectorCollection(str(tmp_path), "int8_32", dtype="int8")
+        _fill(collection, vectors)
+        query = vectors[7] + 0.05
+
+        result = collection.query(query_embeddings=query.tolist(), n_results=5, where={"novel_id": 1})
+
+        assert result["ids"][0] == _exact_top(vectors, query, 5)
+        stats = collection.stats()
+        assert stats["resident_bytes"] <= stats["full_precision_bytes"] / 3
+        collection.close()
+
+    def test_int8_without_full_precision(self, tmp_path):
+        """测试不保留全精度副本时仍能检索（近似结果）"""
+        vectors = _clustered(200)
+        collection = NumpyVectorCollection(str(tmp_path), "int8_32", dtype="int8", keep_full_precision=False)
+        _fill(collection, vectors)
+
+        result = collection.query(query_embeddings=vectors[3].tolist(), n_results=3, where={"novel_id": 1})
+
+        assert result["ids"][0][0] == "1_3"
+        assert collection.stats()["full_precision_bytes"] == 0
+        collection.close()
+
+    def test_pq_trains_at_threshold_and_reranks(self, tmp_path):
+        """测试PQ在达到阈值后训练码本，重排后的top结果与精确结果一致，重新打开后沿用码本"""
+        vectors = _clustered(400)
+        collection = NumpyVectorCollection(
+            str(tmp_path), "pq_32", dtype="pq", pq_subvectors=8, pq_train_size=300, rerank_factor=10
+        )
+        _fill(collection, vectors[:200])
+        assert collection.stats()["open_partitions"] == 1
+        assert not _pq_trained(collection)
+
+        collection.upsert(
+            [f"1_{i}" for i in range(200, 400)],
+            vectors[200:].tolist(),
+            [f"片段{i}" for i in range(200, 400)],
+            [{"novel_id": 1, "chapter": 1} for _ in range(200)],
+        )
+        assert _pq_trained(collection)
+
+        query = vectors[42] + 0.05
+        result = collection.query(query_embeddings=query.tolist(), n_results=3, where={"novel_id": 1})
+        assert result["ids"][0] == _exact_top(vectors, query, 3)
+        collection.close()
+
+        reopened = NumpyVectorCollection(str(tmp_path), "pq_32")
+        assert _pq_trained(reopened)
+        assert reopened.count() == 400
+        reopened.close()
@@ -0,0 +1,70 @@
+"""
+RAG检索结果缓存单元测试
+测试查询规范化、版本失效、LRU淘汰与过期
+"""
+import time
+from app.services.rag_query_cache import QueryResultCache, normalize_query
+
+
+class TestQueryResultCache:
+    """检索结果缓存测试"""
+
+    def test_normalize_query(self):
+        """测试全半角、空白与大小写规范化"""
+        assert normalize_query("  主角的性格、\n外貌  ") == "主角的性格、 外貌"
+        assert normalize_query("ＡＢＣ 主角") == "abc 主角"
+
+    def test_hit_with_normalized_query(self):
+        """测试规范化后相同的查询命中缓存"""
+        cache = QueryResultCache()
+        cache.put(cache.make_key(1, "主角的性格", 3, None), ["结果"])
+
+        assert cache.get(cache.make_key(1, " 主角的性格 ", 3, None)) == ["结果"]
+        assert cache.get(cache.make_key(1, "主角的性格", 5, None)) is None
+        assert cache.get(cache.make_key(1, "主角的性格", 3, 10)) is None
+        assert cache.stats()["hits"] == 1
+
+    def test_invalidate_only_affects_novel(self):
+        """测试失效只影响对应小说"""
+        cache = QueryResultCache()
+        key_a = cache.make_key(1, "世界观", 3, None)
+        key_b = cache.make_key(2, "世界观", 3, None)
+        cache.put(key_a, ["a"])
+        cache.put(key_b, ["b"])
+
+        assert cache.invalidate(1) == 1
+        assert cache.get(cache.make_key(1, "世界观", 3, None)) is None
+        assert cache.get(key_b) == ["b"]
+
+    def test_stale_put_is_dropped(self):
+        """测试检索期间索引变化时，旧版本结果不会写入缓存"""
+        cache = QueryResultCache()
+        key = cache.make_key(1, "世界观", 3, None)
+        cache.invalidate(1)
+        cache.put(key, ["旧结果"])
+
+        assert cache.get(key) is None
+        assert cache.get(cache.make_key(1, "世界观", 3, None)) is None
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = QueryResultCache(max_entries=2)
+        keys = [cache.make_key(1, f"查询{i}", 3, None) for i in range(3)]
+        cache.put(keys[0], [0])
+        cache.put(keys[1], [1])
+        cache.get(keys[0])
+        cache.put(keys[2], [2])
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == [0]
+        assert cache.get(keys[2]) == [2]
+
+    def test_ttl_expiry(self):
+        """测试条目过期"""
+        cache = QueryResultCache(ttl_seconds=0.01)
+        key = cache.make_key(1, "世界观", 3, None)
+        cache.put(key, ["结果"])
+        time.sleep(0.02)
+
+        assert cache.get(key) is None
+        assert cache.stats()["entries"] == 0
@@ -0,0 +1,120 @@
+"""
+RAG向量库对账单元测试
+使用内存SQLite、临时Chroma集合和本地哈希Embedding，测试孤儿向量删除、缺失章节补齐与漂移汇总
+"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.config import settings
+from app.db.base import Base
+from app.models.novel import Chapter, Novel
+from app.models.user import User
+from app.services.rag_local_embedding import HashEmbedding
+from app.services.rag_reconcile import RAGReconciler
+from app.services.rag_reindex import RAGReindexer, ReindexJob
+from app.services.rag_service import RAGService
+
+
+@pytest.fixture
+def session_factory():
+    """内存数据库：1本小说（含世界观）和3个章节"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    db.add(Novel(id=1, title="测试小说", user_id=1, worldview="魔法世界。魔法等级分为九级。"))
+    for number in range(1, 4):
+        db.add(Chapter(novel_id=1, chapter_number=number, title=f"第{number}章",
+                       content=f"第{number}章内容。李明在魔法塔修炼。" * 3))
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture(params=["partitioned", "shared"])
+def service(request, monkeypatch):
+    """使用临时Chroma集合（按小说分区或共享集合）的RAG服务"""
+    chromadb = pytest.importorskip("chromadb")
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+    from app.services.rag_partitions import ChromaPartitionedCollection
+
+    # 共享集合按小页扫描，覆盖分页逻辑
+    monkeypatch.setattr(settings, "RAG_RECONCILE_SCAN_PAGE_SIZE", 4)
+    monkeypatch.setattr(settings, "RAG_RECONCILE_DELETE_BATCH_SIZE", 2)
+
+    client = chromadb.EphemeralClient()
+    name = f"reconcile_{uuid.uuid4().hex[:8]}"
+    if request.param == "partitioned":
+        collection = ChromaPartitionedCollection(client, name)
+    else:
+        collection = client.get_or_create_collection(name)
+
+    svc = RAGService()
+    svc.embed_model = HashEmbedding(dim=16)
+    svc.vector_store = ChromaVectorStore(chroma_collection=collection)
+    svc.index = object()
+    svc.available = True
+    svc.status = "ready"
+    svc._ready_event.set()
+    yield svc
+    svc.shutdown()
+
+
+def _chapters(collection, novel_id):
+    result = collection.get(where={"novel_id": novel_id}, include=["metadatas"])
+    return sorted({meta["chapter"] for meta in result["metadatas"]})
+
+
+class TestRAGReconciler:
+    """向量库对账测试"""
+
+    @pytest.mark.asyncio
+    async def test_reconcile_drift(self, service, session_factory, tmp_path):
+        """测试先只统计漂移，再删除孤儿并补齐缺失章节，之后不再有漂移"""
+        reindexer = RAGReindexer(service, session_factory, checkpoint_dir=str(tmp_path))
+        await reindexer.run()
+        collection = service._get_collection()
+
+        # 制造漂移：已删除的小说、已删除的章节，以及丢失向量的第2章
+        await service.index_content(99, 1, "已删除小说的内容。", {"source": "chapter"})
+        await service.index_content(1, 7, "已删除章节的内容。", {"source": "chapter"})
+        ids = collection.get(where={"$and": [{"novel_id": 1}, {"chapter": 2}]}, include=[])["ids"]
+        collection.delete(ids=ids)
+
+        reconciler = RAGReconciler(service, reindexer, session_factory)
+        report = (await reconciler.run(dry_run=True)).to_dict()
+        assert report["status"] == "completed"
+        assert report["orphan_novels"] == [99]
+        assert report["orphan_chapters"] == 2
+        assert report["missing_chapters"] == 1
+        assert report["missing_samples"] == [[1, 2]]
+        assert report["vectors_deleted"] == 0
+        assert _chapters(collection, 1) == [0, 1, 3, 7]
+
+        report = (await reconciler.run()).to_dict()
+        assert report["vectors_deleted"] == report["orphan_vectors"] > 0
+        assert report["chapters_reindexed"] == 1
+        assert _chapters(collection, 1) == [0, 1, 2, 3]
+        assert collection.get(where={"novel_id": 99})["ids"] == []
+        assert not service.keyword_index.search(99, "已删除小说", 3)
+
+        report = (await reconciler.run()).to_dict()
+        assert report["orphan_chapters"] == report["missing_chapters"] == 0
+        assert report["db_chapters"] == report["store_chapters"] == 4
+
+    @pytest.mark.asyncio
+    async def test_refuses_while_reindex_running(self, service, session_factory, tmp_path):
+        """测试重建索引任务运行期间拒绝对账"""
+        reindexer = RAGReindexer(service, session_factory, checkpoint_dir=str(tmp_path))
+        reindexer._running_job = ReindexJob("busy", None, force=False, collection="test")
+
+        with pytest.raises(RuntimeError):
+            await RAGReconciler(service, reindexer, session_factory).run()
@@ -0,0 +1,130 @@
+"""
+RAG批量重建索引单元测试
+使用内存SQLite、临时Chroma集合和确定性Embedding，测试分页重建、增量跳过与断点续跑
+"""
+import hashlib
+import json
+import uuid
+from typing import List
+
+import pytest
+from llama_index.core.embeddings import BaseEmbedding
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.db.base import Base
+from app.models.novel import Chapter, Novel
+from app.models.user import User
+from app.services.rag_reindex import RAGReindexer
+from app.services.rag_service import RAGService
+
+
+class HashEmbedding(BaseEmbedding):
+    """按文本哈希生成向量的确定性Embedding"""
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:8]]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._vector(query)
+
+
+@pytest.fixture
+def session_factory():
+    """内存数据库：1本小说（含世界观）和3个章节"""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    db.add(Novel(id=1, title="测试小说", user_id=1, worldview="魔法世界。魔法等级分为九级。"))
+    for number in range(1, 4):
+        db.add(Chapter(novel_id=1, chapter_number=number, title=f"第{number}章",
+                       content=f"第{number}章内容。李明在魔法塔修炼。" * 3))
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def service():
+    """使用临时Chroma集合的RAG服务"""
+    chromadb = pytest.importorskip("chromadb")
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
+    svc = RAGService()
+    svc.embed_model = HashEmbedding()
+    collection = chromadb.EphemeralClient().get_or_create_collection(f"reindex_{uuid.uuid4().hex}")
+    svc.vector_store = ChromaVectorStore(chroma_collection=collection)
+    svc.index = object()
+    svc.available = True
+    svc.status = "ready"
+    svc._ready_event.set()
+    yield svc
+    svc.shutdown()
+
+
+class TestRAGReindexer:
+    """批量重建索引测试"""
+
+    @pytest.mark.asyncio
+    async def test_reindex_all(self, service, session_factory, tmp_path):
+        """测试全量重建：世界观与全部章节写入，检查点标记完成"""
+        reindexer = RAGReindexer(service, session_factory, checkpoint_dir=str(tmp_path))
+        job = await reindexer.run()
+
+        assert job.status == "completed"
+        assert job.total_chapters == 4
+        assert job.chapters_done == 4
+        assert job.chunks_embedded == job.chunks_total > 0
+        collection = service._get_collection()
+        assert collection.count() == job.chunks_total
+        chapters = {meta["chapter"] for meta in collection.get(include=["metadatas"])["metadatas"]}
+        assert chapters == {0, 1, 2, 3}
+
+        checkpoint = json.loads((tmp_path / f"{job.job_id}.json").read_text(encoding="utf-8"))
+        assert checkpoint["status"] == "completed"
+        assert checkpoint["cursor_chapter"] == 3
+
+    @pytest.mark.asyncio
+    async def test_unchanged_chunks_skipped_unless_forced(self, service, session_factory, tmp_path):
+        """测试内容未变化时不重新计算向量，force时全部重新计算"""
+        reindexer = RAGReindexer(service, session_factory, checkpoint_dir=str(tmp_path))
+        first = await reindexer.run()
+
+        second = await reindexer.run()
+        assert second.chunks_embedded == 0
+        assert second.chunks_total == first.chunks_total
+
+        forced = await reindexer.run(force=True)
+        assert forced.chunks_embedded == first.chunks_total
+
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint(self, service, session_factory, tmp_path, monkeypatch):
+        """测试从未完成的检查点继续，只处理游标之后的章节"""
+        monkeypatch.setattr("app.core.config.settings.RAG_REINDEX_PAGE_SIZE", 1)
+        reindexer = RAGReindexer(service, session_factory, checkpoint_dir=str(tmp_path))
+        job_id = reindexer._job_id([1], service._get_collection().name)
+        (tmp_path / f"{job_id}.json").write_text(json.dumps({
+            "job_id": job_id, "novel_ids": [1], "force": False, "status": "running",
+            "cursor_novel_id": 1, "cursor_chapter": 1, "chapters_done": 2,
+        }), encoding="utf-8")
+
+        job = await reindexer.run([1])
+
+        assert job.resumed
+        assert job.status == "completed"
+        assert job.chapters_done == 4
+        chapters = {meta["chapter"] for meta in service._get_collection().get(include=["metadatas"])["metadatas"]}
+        assert chapters == {2, 3}
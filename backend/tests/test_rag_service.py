@@ -2,7 +2,11 @@
 RAG服务单元测试
 测试向量检索、内容索引、混合检索等功能
 """
+import uuid
+
 import pytest
+from app.core.config import settings
+from app.services.rag_local_embedding import HashEmbedding
 from app.services.rag_service import RAGService
 from app.models.schemas import RAGQuery
 
@@ -126,3 +130,141 @@ class TestRAGService:
         assert len(chunks[0]) == 500
         assert len(chunks[1]) == 500
         assert len(chunks[2]) == 500
+
+    def test_build_chunk_nodes_stable_ids(self):
+        """测试分块节点ID由内容决定，便于增量索引"""
+        nodes = RAGService._build_chunk_nodes(1, 2, ["甲段", "乙段", "甲段"], {"source": "chapter"})
+        again = RAGService._build_chunk_nodes(1, 2, ["甲段", "乙段", "甲段"], {"source": "chapter"})
+        shifted = RAGService._build_chunk_nodes(1, 2, ["新段", "甲段"], {"source": "chapter"})
+
+        ids = [node.node_id for node in nodes]
+        assert len(set(ids)) == 3
+        assert ids == [node.node_id for node in again]
+        assert all(node_id.startswith("1_2_") for node_id in ids)
+        # 文本不变但位置变化：ID与content_hash都不变，只有chunk_index变化（只需更新元数据）
+        assert shifted[1].node_id == nodes[0].node_id
+        assert shifted[1].metadata["content_hash"] == nodes[0].metadata["content_hash"]
+        assert (shifted[1].metadata["chunk_index"], nodes[0].metadata["chunk_index"]) == (1, 0)
+
+    def test_metadata_filters_pushdown(self):
+        """测试检索请求转换为向量库元数据过滤条件"""
+        query = RAGQuery(novel_id=7, query="青云城", max_chapter=3, top_k=5)
+        filters = RAGService._build_metadata_filters(query)
+
+        assert [(f.key, f.value, f.operator.value) for f in filters.filters] == [
+            ("novel_id", 7, "=="),
+            ("chapter", 3, "<="),
+        ]
+        assert RAGService._match_query({"novel_id": 7, "chapter": 3}, query)
+        assert not RAGService._match_query({"novel_id": 7, "chapter": 4}, query)
+        assert not RAGService._match_query({"novel_id": 8, "chapter": 1}, query)
+
+    def test_fused_results_keep_vector_similarity(self):
+        """测试混合检索按RRF排序，score仍为向量相似度，RRF得分单独给出"""
+        from llama_index.core.schema import NodeWithScore, TextNode
+        from app.services.rag_keyword_index import KeywordHit
+
+        service = RAGService()
+        vector_nodes = [
+            NodeWithScore(node=TextNode(id_="a", text="甲", metadata={"chapter": 1}), score=0.82),
+            NodeWithScore(node=TextNode(id_="b", text="乙", metadata={"chapter": 1}), score=0.75),
+        ]
+        keyword_hits = [
+            KeywordHit("b", 3.2, "乙", {"chapter": 1}),
+            KeywordHit("c", 2.1, "丙", {"chapter": 2}),
+        ]
+        candidates = service._fuse_candidates(vector_nodes, keyword_hits, top_k=3)
+        results = [service._to_result(content, metadata, score, fused) for _, content, metadata, score, fused in candidates]
+
+        assert [candidate[0] for candidate in candidates] == ["b", "a", "c"]
+        assert [result.score for result in results] == [0.75, 0.82, 0.0]
+        assert results[0].fused_score > results[1].fused_score > 0
+
+        vector_only = service._fuse_candidates(vector_nodes, [], top_k=1)
+        assert vector_only == [("a", "甲", {"chapter": 1}, 0.82, None)]
+
+
+@pytest.fixture
+def offline_service():
+    """使用本地哈希Embedding与临时Chroma集合的RAG服务（不依赖Ollama）"""
+    chromadb = pytest.importorskip("chromadb")
+    from llama_index.core import VectorStoreIndex
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
+    svc = RAGService()
+    svc.embed_model = HashEmbedding(dim=64)
+    collection = chromadb.EphemeralClient().get_or_create_collection(f"multi_{uuid.uuid4().hex[:8]}")
+    svc.vector_store = ChromaVectorStore(chroma_collection=collection)
+    svc.index = VectorStoreIndex.from_vector_store(svc.vector_store, embed_model=svc.embed_model)
+    svc.available = True
+    svc.status = "ready"
+    svc._ready_event.set()
+    yield svc
+    svc.shutdown()
+
+
+class TestMultiQueryRetrieval:
+    """多路检索测试"""
+
+    @pytest.mark.asyncio
+    async def test_multi_search_batches_embeddings(self, offline_service):
+        """测试多个查询只合批计算一次向量，结果与请求顺序一一对应"""
+        await offline_service.index_content(1, 1, "魔法分为九个等级。李明是一位5级火系魔法师。", {"source": "chapter"})
+        await offline_service.index_content(2, 1, "苏瑶在药园里清点灵草。", {"source": "chapter"})
+        batches = offline_service.query_batcher.batches
+
+        responses = await offline_service.multi_search([
+            RAGQuery(novel_id=1, query="李明的魔法等级", top_k=2),
+            RAGQuery(novel_id=2, query="药园灵草", top_k=2),
+            RAGQuery(novel_id=1, query="李明的魔法等级", top_k=1),
+        ])
+
+        assert offline_service.query_batcher.batches == batches + 1
+        assert [response.query for response in responses] == ["李明的魔法等级", "药园灵草", "李明的魔法等级"]
+        assert "李明" in responses[0].results[0].content
+        assert "苏瑶" in responses[1].results[0].content
+        assert len(responses[2].results) == 1
+
+    @pytest.mark.asyncio
+    async def test_retrieve_many_groups_results(self, offline_service):
+        """测试按分组名称返回，命中缓存的查询不再计算向量"""
+        await offline_service.index_content(1, 1, "青云城是修仙者聚集之地。林风性格沉稳，擅长剑法。", {"source": "chapter"})
+
+        queries = {"worldview": "青云城", "character": RAGService.character_query("林风")}
+        grouped = await offline_service.retrieve_many(1, queries, max_chapter=1)
+        assert set(grouped) == {"worldview", "character"}
+        assert all(grouped.values())
+
+        batches = offline_service.query_batcher.batches
+        assert await offline_service.retrieve_many(1, queries, max_chapter=1) == grouped
+        assert offline_service.query_batcher.batches == batches
+
+
+class TestIncrementalIndex:
+    """增量索引测试"""
+
+    @pytest.mark.asyncio
+    async def test_shifted_chunks_not_reembedded(self, offline_service, monkeypatch):
+        """测试章节开头插入段落时只为新分块计算向量，后续分块只更新chunk_index"""
+        monkeypatch.setattr(settings, "RAG_CHUNK_SIZE", 20)
+        monkeypatch.setattr(settings, "RAG_CHUNK_OVERLAP", 0)
+        paragraphs = ["林风在山门外等候师兄归来。", "苏瑶在药园里清点新采的灵草。", "青云城的城门在黄昏时关闭。"]
+        await offline_service.index_content(1, 1, "\n\n".join(paragraphs), {"source": "chapter"})
+
+        embedded = []
+        embed = offline_service.text_batcher.embed
+
+        async def record(texts):
+            embedded.extend(texts)
+            return await embed(texts)
+
+        monkeypatch.setattr(offline_service.text_batcher, "embed", record)
+        new_paragraph = "夜里下起了小雨，山路泥泞。"
+        assert await offline_service.index_content(
+            1, 1, "\n\n".join([new_paragraph, *paragraphs]), {"source": "chapter"}
+        )
+
+        assert embedded == [new_paragraph]
+        stored = offline_service._get_collection().get(where={"novel_id": 1}, include=["documents", "metadatas"])
+        positions = {document: metadata["chunk_index"] for document, metadata in zip(stored["documents"], stored["metadatas"])}
+        assert positions == {text: index for index, text in enumerate([new_paragraph, *paragraphs])}
@@ -162,6 +162,12 @@ const AiWritingAssistant = forwardRef<AiWritingAssistantRef, AiWritingAssistantP
             generatedTextRef.current += chunk;
             setGenerationStep('AI正在创作...');
           },
+          onReset: () => {
+            // 一致性检查未通过，后端重新生成
+            setGeneratedText('');
+            generatedTextRef.current = '';
+            setGenerationStep('检测到一致性问题，重新生成中...');
+          },
           onEvent: (event: SSEEvent) => {
             const timestamp = new Date();
             setSseEvents(prev => {
@@ -182,6 +188,8 @@ const AiWritingAssistant = forwardRef<AiWritingAssistantRef, AiWritingAssistantP
                 label = '生成阶段';
               } else if (event.type === 'chunk') {
                 label = '输出正文片段';
+              } else if (event.type === 'reset') {
+                label = '重新生成正文';
               } else if (event.type === 'metadata') {
                 label = '同步元数据（文风与工作流）';
               } else if (event.type === 'done') {
@@ -346,6 +346,7 @@ export const api = {
     },
     callbacks: {
       onChunk: (chunk: string) => void;
+      onReset?: () => void;
       onMetadata?: (metadata: any) => void;
       onDone?: () => void;
       onEvent?: (event: SSEEvent) => void;
@@ -371,6 +372,9 @@ export const api = {
         onChunk: (chunk) => {
           callbacks.onChunk(chunk);
         },
+        onReset: () => {
+          callbacks.onReset?.();
+        },
         onMetadata: (metadata) => {
           callbacks.onMetadata?.(metadata);
         },
@@ -1,6 +1,7 @@
 export type SSEEvent =
   | { type: 'chunk'; content: string }
   | { type: 'metadata'; data: any }
+  | { type: 'reset'; attempt?: number }
   | { type: 'done' }
   | { type: string; [key: string]: any };
 
@@ -9,6 +10,8 @@ export interface SSECallbacks {
   onEvent?: (event: SSEEvent) => void;
   /** 收到文本块事件时的回调 */
   onChunk?: (content: string) => void;
+  /** 重新生成、需要丢弃已收到的文本块时的回调 */
+  onReset?: () => void;
   /** 收到元数据事件时的回调 */
   onMetadata?: (metadata: any) => void;
   /** 收到完成事件或流结束时的回调 */
@@ -21,6 +24,7 @@ export interface SSECallbacks {
  * 约定后端以 `data: { json }` 形式推送，每个事件一行，以 `\n\n` 分隔。
  * 事件结构形如：
  * - { "type": "chunk", "content": "..." }
+ * - { "type": "reset" }：后端重新生成，此前收到的文本块作废
  * - { "type": "metadata", "data": { ... } }
  * - { "type": "done" }
  */
@@ -67,6 +71,8 @@ export async function readSSEFromResponse(
 
           if (json.type === 'chunk' && typeof (json as any).content === 'string') {
             callbacks.onChunk?.((json as any).content);
+          } else if (json.type === 'reset') {
+            callbacks.onReset?.();
           } else if (json.type === 'metadata') {
             callbacks.onMetadata?.((json as any).data);
           } else if (json.type === 'done') {